@@ -4,17 +4,35 @@ try:
     import google.genai as genai
 except Exception:  # pragma: no cover - optional runtime dependency
     genai = None
+import hashlib
 import json
 import logging
 import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 
 import requests
 
 from django.conf import settings as django_settings
+from django.core.cache import cache
 from core.security_utils import sanitize_ai_prompt
 
 logger = logging.getLogger(__name__)
 
+# Gateway tuning (overridable from Django settings)
+AI_RESPONSE_TTL = getattr(django_settings, "AI_RESPONSE_TTL", 60 * 60 * 24)
+AI_TENANT_CONCURRENCY = getattr(django_settings, "AI_TENANT_CONCURRENCY", 2)
+AI_TENANT_WAIT = getattr(django_settings, "AI_TENANT_WAIT", 10)
+AI_FLIGHT_TIMEOUT = getattr(django_settings, "AI_FLIGHT_TIMEOUT", 120)
+AI_REQUEST_TIMEOUT = 60  # per OpenRouter attempt
+# A slot lease outlives the longest call: Gemini plus three OpenRouter fallbacks
+AI_SLOT_TIMEOUT = getattr(django_settings, "AI_SLOT_TIMEOUT", AI_REQUEST_TIMEOUT * 4)
+AI_CONFIG_CHECK_INTERVAL = 30
+AI_POLL_INTERVAL = 0.25
+AI_CONFIG_VERSION_KEY = "ai:config-version"
+
 
 def _get_ai_config():
     """Read AI provider config from PlatformSettings, with django.conf.settings fallback."""
@@ -54,14 +72,190 @@ def _get_ai_config():
     }
 
 
-class AcademicAI:
+_config_lock = threading.Lock()
+_config_state = {"config": None, "version": None, "checked": 0.0}
+_clients = {}
+_http = threading.local()
+
+
+def get_ai_config():
+    """
+    Process-level cached _get_ai_config(). Saving PlatformSettings bumps a
+    shared version (see invalidate_ai_config), which every process notices
+    within AI_CONFIG_CHECK_INTERVAL seconds.
+    """
+    now = time.monotonic()
+    with _config_lock:
+        config, version, checked = _config_state["config"], _config_state["version"], _config_state["checked"]
+    if config is not None and now - checked < AI_CONFIG_CHECK_INTERVAL:
+        return config
+
+    current = cache.get(AI_CONFIG_VERSION_KEY)
+    if config is None or current != version:
+        config = _get_ai_config()
+    with _config_lock:
+        _config_state.update(config=config, version=current, checked=now)
+    return config
+
+
+def invalidate_ai_config():
+    """Drop the cached config and clients here, and tell other processes to reload theirs."""
+    with _config_lock:
+        _config_state.update(config=None, version=None, checked=0.0)
+        _clients.clear()
+    cache.set(AI_CONFIG_VERSION_KEY, time.time_ns(), None)
+
+
+def _gemini_model(api_key):
+    """Configured Gemini model, shared by every AcademicAI in the process using the same key."""
+    with _config_lock:
+        model = _clients.get(("gemini", api_key))
+        if model is None:
+            genai.configure(api_key=api_key)
+            model = _clients[("gemini", api_key)] = genai.GenerativeModel("gemini-1.5-flash")
+        return model
+
+
+def _http_session():
+    """Per-thread requests.Session so OpenRouter calls reuse connections."""
+    session = getattr(_http, "session", None)
+    if session is None:
+        session = _http.session = requests.Session()
+    return session
+
+
+class AIGatewayBusy(Exception):
+    """The tenant already has AI_TENANT_CONCURRENCY calls in flight."""
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class AIGateway:
+    """
+    Front door for remote model calls, shared by the whole process.
+
+    - responses are cached by a hash of (provider, model, prompt) for AI_RESPONSE_TTL;
+      the cache backend evicts least-recently-used entries under memory pressure
+    - identical prompts in flight are coalesced: threads of this process wait on
+      the first call, other processes wait on its cache lock and read the result
+    - each tenant has at most AI_TENANT_CONCURRENCY remote calls running across
+      all processes (one expiring cache lease per slot); beyond that, callers
+      wait up to AI_TENANT_WAIT seconds
+    """
+
     def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    @staticmethod
+    def response_key(identity, prompt):
+        payload = json.dumps([identity, prompt], default=str)
+        return f"ai:response:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def generate(self, prompt, call, identity=None, tenant=None, use_cache=True):
+        """Result of `call()` (the provider round trip) for `prompt`, or None if no provider answered."""
+        key = self.response_key(identity, prompt)
+        if use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.event.wait(AI_FLIGHT_TIMEOUT)
+            return flight.result
+
+        try:
+            flight.result = self._fetch(key, call, tenant, use_cache)
+            return flight.result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _fetch(self, key, call, tenant, use_cache):
+        lock_key = f"{key}:lock"
+        owns_lock = not use_cache or cache.add(lock_key, 1, AI_FLIGHT_TIMEOUT)
+        if not owns_lock:
+            # Another process is making this exact call: wait for its answer
+            deadline = time.monotonic() + AI_FLIGHT_TIMEOUT
+            while time.monotonic() < deadline and cache.get(lock_key) is not None:
+                time.sleep(AI_POLL_INTERVAL)
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            with self.tenant_slot(tenant):
+                result = call()
+        except AIGatewayBusy:
+            logger.warning("AI call skipped: tenant %s is at its concurrency limit", tenant)
+            return None
+        finally:
+            if use_cache and owns_lock:
+                cache.delete(lock_key)
+
+        if result is not None and use_cache:
+            cache.set(key, result, AI_RESPONSE_TTL)
+        return result
+
+    @contextmanager
+    def tenant_slot(self, tenant):
+        """Hold one of the tenant's concurrent-call slots, raising AIGatewayBusy if none frees up in time."""
+        prefix = f"ai:slot:{tenant or 'platform'}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + AI_TENANT_WAIT
+        while True:
+            # Each slot is a lease that expires, so a crashed worker can't hold it forever
+            slot = next(
+                (
+                    key
+                    for key in (f"{prefix}:{index}" for index in range(AI_TENANT_CONCURRENCY))
+                    if cache.add(key, token, AI_SLOT_TIMEOUT)
+                ),
+                None,
+            )
+            if slot:
+                break
+            if time.monotonic() >= deadline:
+                raise AIGatewayBusy(tenant)
+            time.sleep(AI_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            # Only drop our own lease: after an overrun the slot may belong to another call
+            if cache.get(slot) == token:
+                cache.delete(slot)
+
+
+gateway = AIGateway()
+
+
+class AcademicAI:
+    def __init__(self, school=None, use_cache=True):
+        """
+        `school` (a School or its id) is the tenant whose concurrency limit the
+        calls count against; `use_cache=False` always asks the model afresh.
+        """
         self.provider = "gemini"
         self.model = None
         self.openrouter_key = ""
         self.openrouter_model = "google/gemini-2.0-flash-001"
+        self.tenant = getattr(school, "pk", school)
+        self.use_cache = use_cache
         try:
-            config = _get_ai_config()
+            config = get_ai_config()
             self.provider = config["provider"]
             self.openrouter_model = config.get("openrouter_model", "google/gemini-2.0-flash-001")
 
@@ -71,8 +265,7 @@ class AcademicAI:
                 self.model = "openrouter"
                 logger.debug("AI initialized with OpenRouter")
             elif config["gemini_key"] and genai is not None:
-                genai.configure(api_key=config["gemini_key"])
-                self.model = genai.GenerativeModel("gemini-1.5-flash")
+                self.model = _gemini_model(config["gemini_key"])
                 self.provider = "gemini"
                 logger.debug("AI initialized with Gemini Flash")
             elif config["gemini_key"] and genai is None:
@@ -97,6 +290,23 @@ class AcademicAI:
         if not prompt:
             logger.warning("Empty prompt after sanitization")
             return None
+        if not self.model:
+            return None
+        try:
+            return gateway.generate(
+                prompt,
+                lambda: self._call_provider(prompt, model_override),
+                identity=[self.provider, model_override or self.openrouter_model],
+                tenant=self.tenant,
+                use_cache=self.use_cache,
+            )
+        except Exception as e:
+            # Cache backend outages (Redis down, timeouts) degrade to "no answer" like a provider failure
+            logger.error(f"AI gateway error: {str(e)}")
+            return None
+
+    def _call_provider(self, prompt, model_override=None):
+        """One remote generation, falling back from Gemini through the OpenRouter models."""
         if self.provider == "gemini" and self.model and not model_override:
             try:
                 response = self.model.generate_content(prompt)
@@ -138,7 +348,9 @@ class AcademicAI:
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": 4096,
         }
-        resp = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload, timeout=60)
+        resp = _http_session().post(
+            "https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload, timeout=AI_REQUEST_TIMEOUT
+        )
         resp.raise_for_status()
         data = resp.json()
         return data["choices"][0]["message"]["content"].strip()
@@ -181,6 +393,50 @@ class AcademicAI:
             logger.error(f"AI Remark Generation Error: {str(e)}")
             return None
 
+    def generate_class_remarks(self, students):
+        """
+        Generates report card remarks for several students in one request.
+        students: List[Dict] of compact summaries, each with an "id"
+        Returns {id (str): remark} for the students the model answered, or None.
+        """
+        if not self.model:
+            return None
+
+        prompt = f"""
+        Act as an experienced and empathetic school teacher.
+        Write a professional terminal report remark for EACH of these students.
+
+        Students (avg = term average, pos = class position, best/weak = subject scores, att = days present/total,
+        conduct = average conduct score out of 5):
+        {json.dumps(students, separators=(",", ":"))}
+
+        Guidelines:
+        1. Be encouraging but honest, and specific to each student's data.
+        2. Highlight strengths and suggest areas for improvement where needed.
+        3. Keep each remark between 2 to 4 sentences, addressing the student by name.
+        4. OUTPUT FORMAT: Return ONLY a JSON object mapping each student's "id" to their remark text.
+        """
+
+        try:
+            text = self._generate(prompt)
+            if not text:
+                return None
+
+            start = text.find("{")
+            end = text.rfind("}")
+            cleaned_text = text[start : end + 1] if start != -1 and end != -1 else text
+            try:
+                data = json.loads(cleaned_text)
+            except json.JSONDecodeError as je:
+                logger.error(f"AI Class Remarks JSON Parse Error: {str(je)}")
+                return None
+            if not isinstance(data, dict):
+                return None
+            return {str(key): str(value).strip() for key, value in data.items() if value and str(value).strip()}
+        except Exception as e:
+            logger.error(f"AI Class Remarks Generation Error: {str(e)}")
+            return None
+
     def generate_student_intro(self, student_data):
         """
         Generates a professional academic introduction for a report card.
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AcademicConfig(AppConfig):
     name = "academic"
+
+    def ready(self):
+        import academic.signals  # noqa
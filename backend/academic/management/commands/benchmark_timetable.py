@@ -0,0 +1,80 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from academic.services.timetable import DEFAULT_DAYS, TimetableProblem, load_problem, solve
+from schools.models import School
+
+
+def synthetic_problem(classes, subjects, periods, periods_per_week, classes_per_teacher):
+    """A school where each subject's classes are shared out among teachers, `classes_per_teacher` each."""
+    lessons = []
+    for subject in range(subjects):
+        for class_index in range(classes):
+            teacher = subject * classes + class_index // classes_per_teacher
+            lessons.append((class_index, subject, teacher, periods_per_week))
+    return TimetableProblem(DEFAULT_DAYS, list(range(periods)), lessons)
+
+
+class Command(BaseCommand):
+    help = "Time the timetable solver on a synthetic school (or a real one, without saving)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--classes", type=int, default=40)
+        parser.add_argument("--subjects", type=int, default=9)
+        parser.add_argument("--periods", type=int, default=8, help="Regular periods per day")
+        parser.add_argument("--periods-per-week", type=int, default=4)
+        parser.add_argument("--classes-per-teacher", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--school", type=int, help="Benchmark this school's data instead")
+
+    def handle(self, *args, **options):
+        if options["school"]:
+            school = School.objects.filter(id=options["school"]).first()
+            if not school:
+                raise CommandError(f"School {options['school']} not found")
+            problem = load_problem(school)[0]
+        else:
+            problem = synthetic_problem(
+                options["classes"],
+                options["subjects"],
+                options["periods"],
+                options["periods_per_week"],
+                options["classes_per_teacher"],
+            )
+
+        units = sum(lesson[3] for lesson in problem.lessons)
+        classes = len({lesson[0] for lesson in problem.lessons})
+        teachers = len({lesson[2] for lesson in problem.lessons})
+        self.stdout.write(f"{classes} classes, {teachers} teachers, {units} lessons over {problem.slot_count} slots")
+
+        timings = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            solution = solve(problem)
+            timings.append(time.perf_counter() - started)
+        unplaced = sum(item["missing"] for item in solution.unplaced)
+        self.stdout.write(
+            f"full solve: best {min(timings):.3f}s, worst {max(timings):.3f}s, "
+            f"placed {len(solution.placements)}, unplaced {unplaced}, penalty {solution.penalty}"
+        )
+
+        # Re-solve around the busiest teacher with everyone else's lessons kept
+        teacher = max(
+            (lesson[2] for lesson in problem.lessons if lesson[2] is not None),
+            key=lambda t: sum(lesson[3] for lesson in problem.lessons if lesson[2] == t),
+            default=None,
+        )
+        if teacher is not None:
+            pinned = {key: lesson for key, lesson in solution.placements.items() if lesson[1] != teacher}
+            incremental = TimetableProblem(problem.days, problem.periods, problem.lessons, pinned, problem.busy)
+            started = time.perf_counter()
+            resolved = solve(incremental)
+            elapsed = time.perf_counter() - started
+            moved = sum(1 for key, lesson in pinned.items() if resolved.placements.get(key) != lesson)
+            self.stdout.write(
+                f"teacher re-solve: {elapsed:.3f}s, {len(pinned)} lessons kept, {moved} moved, "
+                f"unplaced {sum(item['missing'] for item in resolved.unplaced)}"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Timetable benchmark complete."))
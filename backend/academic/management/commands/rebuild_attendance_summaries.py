@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from schools.models import School
+
+from ...services.attendance import rebuild_attendance_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute per-term attendance summaries (and report card attendance) from the attendance records"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--school", type=int, help="Only rebuild this school id")
+        parser.add_argument("--session", help="Only rebuild this session")
+        parser.add_argument("--term", help="Only rebuild this term")
+
+    def handle(self, *args, **options):
+        schools = School.objects.all()
+        if options["school"]:
+            schools = schools.filter(id=options["school"])
+        written = 0
+        for school_id in schools.values_list("id", flat=True):
+            written += rebuild_attendance_summaries(school_id, options["session"], options["term"])
+        self.stdout.write(self.style.SUCCESS(f"Attendance summaries rebuilt ({written} rows)."))
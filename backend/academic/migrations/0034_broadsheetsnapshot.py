@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0033_delete_admissionintake'),
+        ('schools', '0023_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadsheetSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.CharField(max_length=50)),
+                ('term', models.CharField(max_length=50)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('etag', models.CharField(blank=True, max_length=64)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('built_version', models.PositiveIntegerField(default=0)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_related', to='schools.school')),
+                ('student_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='broadsheet_snapshots', to='academic.class')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'session', 'term'], name='academic_br_school__1cd960_idx')],
+                'constraints': [models.UniqueConstraint(fields=('school', 'student_class', 'session', 'term'), name='unique_broadsheet_per_class_term')],
+            },
+        ),
+    ]
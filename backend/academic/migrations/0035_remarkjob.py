@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0034_broadsheetsnapshot'),
+        ('schools', '0023_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemarkJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.CharField(max_length=50)),
+                ('term', models.CharField(max_length=50)),
+                ('overwrite', models.BooleanField(default=False, help_text='Replace remarks that are already written')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('ai_generated', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_related', to='schools.school')),
+                ('student_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='remark_jobs', to='academic.class')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['school', 'student_class', 'session', 'term'], name='academic_re_school__a1cc1a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0035_remarkjob'),
+        ('schools', '0023_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subjectscore',
+            name='position',
+            field=models.IntegerField(blank=True, help_text='Position in the subject within the class', null=True),
+        ),
+        migrations.CreateModel(
+            name='ClassTermResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.CharField(max_length=50)),
+                ('term', models.CharField(max_length=50)),
+                ('student_count', models.PositiveIntegerField(default=0)),
+                ('class_average', models.FloatField(default=0.0)),
+                ('highest_average', models.FloatField(default=0.0)),
+                ('lowest_average', models.FloatField(default=0.0)),
+                ('subject_stats', models.JSONField(blank=True, default=dict)),
+                ('source_signature', models.CharField(blank=True, max_length=255)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_related', to='schools.school')),
+                ('student_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_results', to='academic.class')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'session', 'term'], name='academic_cl_school__dba68a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('school', 'student_class', 'session', 'term'), name='unique_term_result_per_class')],
+            },
+        ),
+    ]
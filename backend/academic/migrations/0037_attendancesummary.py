@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def backfill_attendance_summaries(apps, schema_editor):
+    AttendanceRecord = apps.get_model("academic", "AttendanceRecord")
+    AttendanceSummary = apps.get_model("academic", "AttendanceSummary")
+    counts = AttendanceRecord.objects.values(
+        "school_id", "student_id", session=F("attendance_session__session"), term=F("attendance_session__term")
+    ).annotate(
+        total=Count("id"),
+        present=Count("id", filter=Q(status="present")),
+        absent=Count("id", filter=Q(status="absent")),
+        late=Count("id", filter=Q(status="late")),
+    )
+    AttendanceSummary.objects.bulk_create((AttendanceSummary(**row) for row in counts.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0036_classtermresult_subjectscore_position'),
+        ('schools', '0023_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.CharField(max_length=50)),
+                ('term', models.CharField(max_length=50)),
+                ('present', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('late', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_related', to='schools.school')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='academic.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'session', 'term'], name='academic_at_school__fc4593_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'session', 'term'), name='unique_attendance_summary')],
+            },
+        ),
+        migrations.RunPython(backfill_attendance_summaries, migrations.RunPython.noop, elidable=True),
+    ]
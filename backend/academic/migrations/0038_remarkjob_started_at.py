@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("academic", "0037_attendancesummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="remarkjob",
+            name="started_at",
+            field=models.DateTimeField(blank=True, help_text="When a worker claimed the job", null=True),
+        ),
+    ]
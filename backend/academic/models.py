@@ -307,15 +307,9 @@ class ReportCard(AuditTrailMixin, TenantModel):
         constraints = [models.UniqueConstraint(fields=["student", "session", "term"], name="unique_report_per_term")]
 
     def update_totals(self, save=True):
-        scores = self.scores.all()
-        if scores.exists():
-            total = sum(s.total for s in scores)
-            count = scores.count()
-            self.total_score = total
-            self.average = total / count if count > 0 else 0
-        else:
-            self.total_score = 0
-            self.average = 0
+        totals = list(self.scores.values_list("total", flat=True))
+        self.total_score = sum(totals)
+        self.average = self.total_score / len(totals) if totals else 0
         
         # Calculate trend based on historical data
         self.calculate_trend(save=False)
@@ -331,12 +325,12 @@ class ReportCard(AuditTrailMixin, TenantModel):
         
         # Fetch historical reports for this student in this school
         # Ordering by created_at is a safe proxy for chronological order of terms
-        past_reports = ReportCard.objects.filter(
-            student=self.student,
-            school=self.school
-        ).exclude(id=self.id).order_by("created_at")
-        
-        averages = [r.average for r in past_reports]
+        averages = list(
+            ReportCard.objects.filter(student_id=self.student_id, school_id=self.school_id)
+            .exclude(id=self.id)
+            .order_by("created_at")
+            .values_list("average", flat=True)
+        )
         averages.append(self.average)
         
         self.performance_trend = compute_performance_trend(averages)
@@ -367,6 +361,23 @@ class ReportCard(AuditTrailMixin, TenantModel):
 
         cls.objects.bulk_update(reports, ["position"])
 
+        from .services.report_pdf import invalidate_report_pdfs
+
+        invalidate_report_pdfs(reports[0].school_id, {report.student_id for report in reports})
+
+
+def default_grade_for(total):
+    """Legacy grade bands used when a report card has no grading scheme (or no range matches)."""
+    if total >= 75:
+        return "A"
+    elif total >= 65:
+        return "B"
+    elif total >= 50:
+        return "C"
+    elif total >= 40:
+        return "D"
+    return "F"
+
 
 class SubjectScore(AuditTrailMixin, TenantModel):
     report_card = models.ForeignKey(ReportCard, on_delete=models.CASCADE, related_name="scores")
@@ -377,6 +388,7 @@ class SubjectScore(AuditTrailMixin, TenantModel):
     total = models.FloatField(default=0)
     grade = models.CharField(max_length=5, blank=True)
     comment = models.CharField(max_length=255, blank=True)
+    position = models.IntegerField(null=True, blank=True, help_text="Position in the subject within the class")
 
     class Meta:
         indexes = [
@@ -398,16 +410,7 @@ class SubjectScore(AuditTrailMixin, TenantModel):
 
             # 2. Fallback to Hardcoded Logic (Legacy/Default)
             if not self.grade:
-                if self.total >= 75:
-                    self.grade = "A"
-                elif self.total >= 65:
-                    self.grade = "B"
-                elif self.total >= 50:
-                    self.grade = "C"
-                elif self.total >= 40:
-                    self.grade = "D"
-                else:
-                    self.grade = "F"
+                self.grade = default_grade_for(self.total)
 
         self.track_changes(user=getattr(self, "_user", None))
         super().save(*args, **kwargs)
@@ -446,6 +449,32 @@ class AttendanceRecord(TenantModel):
         unique_together = ("attendance_session", "student")
 
 
+class AttendanceSummary(TenantModel):
+    """
+    Per-student attendance counts for one term, kept in step with
+    AttendanceRecord (see academic.services.attendance).
+    """
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="attendance_summaries")
+    session = models.CharField(max_length=50)
+    term = models.CharField(max_length=50)
+    present = models.IntegerField(default=0)
+    absent = models.IntegerField(default=0)
+    late = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["student", "session", "term"], name="unique_attendance_summary"),
+        ]
+        indexes = [
+            models.Index(fields=["school", "session", "term"]),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} {self.session} {self.term}: {self.present}/{self.total}"
+
+
 class SchoolEvent(TenantModel):
     """Calendar events for schools"""
 
@@ -724,3 +753,101 @@ class AcademicTerm(TenantModel):
     def __str__(self):
         return f"{self.name} {self.session} ({self.school.name})"
 
+
+class BroadsheetSnapshot(TenantModel):
+    """
+    Materialized, already-pivoted broadsheet for one class/session/term.
+    `version` is bumped by score/report writes; the snapshot is rebuilt lazily
+    on the next read whenever `built_version` lags behind it.
+    """
+
+    student_class = models.ForeignKey(Class, on_delete=models.CASCADE, related_name="broadsheet_snapshots")
+    session = models.CharField(max_length=50)
+    term = models.CharField(max_length=50)
+    data = models.JSONField(default=dict, blank=True)  # {subjects: [...], students: [...]}
+    etag = models.CharField(max_length=64, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    built_version = models.PositiveIntegerField(default=0)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["school", "student_class", "session", "term"], name="unique_broadsheet_per_class_term"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["school", "session", "term"]),
+        ]
+
+    @property
+    def is_stale(self):
+        return self.built_version != self.version
+
+    def __str__(self):
+        return f"Broadsheet {self.student_class_id} - {self.term} {self.session}"
+
+
+class RemarkJob(TenantModel):
+    """Background AI remark generation for every report card of a class (see academic.services.remarks)."""
+
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    )
+
+    student_class = models.ForeignKey(Class, on_delete=models.CASCADE, related_name="remark_jobs")
+    session = models.CharField(max_length=50)
+    term = models.CharField(max_length=50)
+    overwrite = models.BooleanField(default=False, help_text="Replace remarks that are already written")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    ai_generated = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True, help_text="When a worker claimed the job")
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["school", "student_class", "session", "term"]),
+        ]
+
+    def __str__(self):
+        return f"Remarks {self.student_class_id} - {self.term} {self.session} ({self.status})"
+
+
+class ClassTermResult(TenantModel):
+    """
+    Class statistics for one term, written by the term results engine
+    (academic.services.results) with the report card totals and positions.
+    `source_signature` summarises the scores and report cards they were
+    computed from, so unchanged classes are skipped on the next run.
+    """
+
+    student_class = models.ForeignKey(Class, on_delete=models.CASCADE, related_name="term_results")
+    session = models.CharField(max_length=50)
+    term = models.CharField(max_length=50)
+    student_count = models.PositiveIntegerField(default=0)
+    class_average = models.FloatField(default=0.0)
+    highest_average = models.FloatField(default=0.0)
+    lowest_average = models.FloatField(default=0.0)
+    subject_stats = models.JSONField(default=dict, blank=True)  # {subject_id: {name, highest, lowest, mean, count}}
+    source_signature = models.CharField(max_length=255, blank=True)
+    computed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["school", "student_class", "session", "term"], name="unique_term_result_per_class"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["school", "session", "term"]),
+        ]
+
+    def __str__(self):
+        return f"Results {self.student_class_id} - {self.term} {self.session}"
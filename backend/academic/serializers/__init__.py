@@ -12,8 +12,8 @@ from .students import (
 from .teachers import TeacherSerializer
 from .classes import ClassSerializer, SubjectSerializer, SubjectTeacherSerializer
 from .lessons import LessonSerializer
-from .reports import ReportCardSerializer, SubjectScoreSerializer
-from .attendance import AttendanceRecordSerializer, AttendanceSessionSerializer
+from .reports import ClassTermResultSerializer, RemarkJobSerializer, ReportCardSerializer, SubjectScoreSerializer
+from .attendance import AttendanceRecordSerializer, AttendanceSessionSerializer, AttendanceSummarySerializer
 from .timetables import (
     PeriodSerializer,
     TimetableEntrySerializer,
@@ -35,8 +35,11 @@ __all__ = [
     "SubjectTeacherSerializer",
     "LessonSerializer",
     "ReportCardSerializer",
+    "ClassTermResultSerializer",
+    "RemarkJobSerializer",
     "SubjectScoreSerializer",
     "AttendanceRecordSerializer",
+    "AttendanceSummarySerializer",
     "AttendanceSessionSerializer",
     "PeriodSerializer",
     "TimetableEntrySerializer",
@@ -1,7 +1,7 @@
 """Attendance serializers."""
 
 from rest_framework import serializers
-from ..models import AttendanceRecord, AttendanceSession
+from ..models import AttendanceRecord, AttendanceSession, AttendanceSummary
 
 
 class AttendanceRecordSerializer(serializers.ModelSerializer):
@@ -19,3 +19,27 @@ class AttendanceSessionSerializer(serializers.ModelSerializer):
         model = AttendanceSession
         fields = "__all__"
         read_only_fields = ("school",)
+
+
+class AttendanceSummarySerializer(serializers.ModelSerializer):
+    student_name = serializers.CharField(source="student.names", read_only=True)
+    student_no = serializers.CharField(source="student.student_no", read_only=True)
+    rate = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AttendanceSummary
+        fields = (
+            "student",
+            "student_name",
+            "student_no",
+            "session",
+            "term",
+            "present",
+            "absent",
+            "late",
+            "total",
+            "rate",
+        )
+
+    def get_rate(self, obj):
+        return round(obj.present / obj.total * 100, 1) if obj.total else None
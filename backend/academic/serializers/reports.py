@@ -3,7 +3,7 @@
 import logging
 from rest_framework import serializers
 from django.db import transaction
-from ..models import Class, ReportCard, Student, Subject, SubjectScore
+from ..models import Class, ClassTermResult, RemarkJob, ReportCard, Student, SubjectScore
 from .base import _school_from_request
 from .grading import GradingSchemeSerializer
 
@@ -15,8 +15,8 @@ class SubjectScoreSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SubjectScore
-        fields = ["id", "subject", "ca1", "ca2", "exam", "total", "grade", "comment"]
-        read_only_fields = ("school",)
+        fields = ["id", "subject", "ca1", "ca2", "exam", "total", "grade", "comment", "position"]
+        read_only_fields = ("school", "position")
 
 
 class ReportCardSerializer(serializers.ModelSerializer):
@@ -150,33 +150,65 @@ class ReportCardSerializer(serializers.ModelSerializer):
         return instance
 
     def _update_scores(self, report_card, scores_data, school):
-        """Helper to sync scores without deleting everything if possible"""
-        existing_scores = {s.subject.name: s for s in report_card.scores.all()}
-
-        for score_item in scores_data:
-            subject_val = score_item.pop("subject", None)
-
-            # Handle source='subject.name' which can return a dict for input in some DRF versions/configs
-            if isinstance(subject_val, dict):
-                subject_name = subject_val.get("name")
-            else:
-                subject_name = subject_val
-
-            if not subject_name:
-                continue
-
-            if subject_name in existing_scores:
-                score_obj = existing_scores.pop(subject_name)
-                for attr, value in score_item.items():
-                    setattr(score_obj, attr, value)
-                score_obj.save(skip_report_update=True)
-            else:
-                subject, _ = Subject.objects.get_or_create(name=subject_name, school=school)
-                new_score = SubjectScore(report_card=report_card, school=school, subject=subject, **score_item)
-                new_score.save(skip_report_update=True)
-
-        # Delete scores for subjects no longer in the report card
-        for remaining_score in existing_scores.values():
-            remaining_score.delete()
-
-        report_card.update_totals()
+        """Sync the score sheet in one batch; scores missing from the payload are deleted."""
+        from core.models import log_field_changes_bulk
+
+        from ..services.scores import ingest_scores, recalculate_report_totals
+
+        request = self.context.get("request")
+        user = getattr(request, "user", None) if request else None
+        user = user if getattr(user, "is_authenticated", False) else None
+        entries = [{**score_item, "report_card": report_card} for score_item in scores_data]
+        if not entries:
+            report_card.scores.all().delete()
+            log_field_changes_bulk(recalculate_report_totals([report_card]), user=user, request=request)
+            return
+
+        ingest_scores(
+            school,
+            entries,
+            user=user,
+            replace=True,
+            update_positions=False,
+            request=request,
+        )
+
+
+class RemarkJobSerializer(serializers.ModelSerializer):
+    class_id = serializers.IntegerField(source="student_class_id", read_only=True)
+
+    class Meta:
+        model = RemarkJob
+        fields = [
+            "id",
+            "class_id",
+            "session",
+            "term",
+            "overwrite",
+            "status",
+            "total",
+            "processed",
+            "ai_generated",
+            "error",
+            "created_at",
+            "completed_at",
+        ]
+        read_only_fields = fields
+
+
+class ClassTermResultSerializer(serializers.ModelSerializer):
+    class_id = serializers.IntegerField(source="student_class_id", read_only=True)
+
+    class Meta:
+        model = ClassTermResult
+        fields = [
+            "class_id",
+            "session",
+            "term",
+            "student_count",
+            "class_average",
+            "highest_average",
+            "lowest_average",
+            "subject_stats",
+            "computed_at",
+        ]
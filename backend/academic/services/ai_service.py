@@ -1,8 +1,9 @@
 """AI Services for academic tasks."""
 
 import logging
-from ..models import AttendanceRecord, ConductEntry
+from ..models import AttendanceSummary, ConductEntry
 from ..ai_utils import AcademicAI
+from .remarks import early_years_remark, fallback_remark
 
 logger = logging.getLogger(__name__)
 
@@ -19,37 +20,19 @@ class ReportCardAIService:
         scores = report_card.scores.all()
         observations = report_card.early_years_observations or []
 
+        summary = AttendanceSummary.objects.filter(
+            student=report_card.student,
+            school=report_card.school,
+            session=report_card.session,
+            term=report_card.term,
+        ).first()
         attendance_data = {
-            "present": AttendanceRecord.objects.filter(
-                student=report_card.student,
-                school=report_card.school,
-                attendance_session__session=report_card.session,
-                attendance_session__term=report_card.term,
-                status="present",
-            ).count(),
-            "absent": AttendanceRecord.objects.filter(
-                student=report_card.student,
-                school=report_card.school,
-                attendance_session__session=report_card.session,
-                attendance_session__term=report_card.term,
-                status="absent",
-            ).count(),
+            "present": summary.present if summary else 0,
+            "absent": summary.absent if summary else 0,
         }
 
         if not scores.exists() and observations:
-            status_counts = {"Secure": 0, "Developing": 0, "Emerging": 0}
-            for item in observations:
-                status = str(item.get("status", "")).strip().title()
-                if status in status_counts:
-                    status_counts[status] += 1
-
-            strongest = max(status_counts, key=status_counts.get)
-            remark = (
-                f"{report_card.student.names} is making encouraging early-years progress. "
-                f"Current profile: {status_counts['Secure']} secure, "
-                f"{status_counts['Developing']} developing, {status_counts['Emerging']} emerging areas. "
-                f"Most evidence is in {strongest.lower()} development bands."
-            )
+            remark, status_counts = early_years_remark(report_card.student.names, observations)
             performance_data = {
                 "name": report_card.student.names,
                 "scores": [],
@@ -93,7 +76,7 @@ class ReportCardAIService:
         }
 
         try:
-            ai = AcademicAI()
+            ai = AcademicAI(school=report_card.school_id)
             remark = ai.generate_student_remark(performance_data)
         except Exception as e:
             logger.error(f"AI generation failed: {e}")
@@ -101,15 +84,7 @@ class ReportCardAIService:
 
         if not remark:
             # Fallback heuristic remark
-            excellent_count = scores.filter(total__gte=80).count()
-            poor_count = scores.filter(total__lt=50).count()
-
-            if excellent_count > (scores.count() / 2):
-                remark = f"{report_card.student.names} has shown exceptional performance this term. Keep up the excellent work!"
-            elif poor_count > 0:
-                remark = f"{report_card.student.names} needs to focus more on certain subjects where performance was below average."
-            else:
-                remark = f"A good performance overall by {report_card.student.names}. Consistent effort will lead to even better results."
+            remark = fallback_remark(report_card.student.names, [s.total for s in scores])
 
         # Save to the report card
         report_card.ai_performance_remark = remark
@@ -135,7 +110,7 @@ class ReportCardAIService:
         }
 
         try:
-            ai = AcademicAI()
+            ai = AcademicAI(school=report_card.school_id)
             intro = ai.generate_student_intro(performance_data)
             return intro
         except Exception as e:
@@ -0,0 +1,205 @@
+"""Class registers and per-term attendance summaries.
+
+AttendanceSummary holds each student's present/absent/late/total counts for a
+term, so report cards, analytics and parent views read one row instead of
+counting AttendanceRecords. Every record write is reduced to "marks" -
+(student, session, term, status) - and the difference between the marks
+before and after the write is applied with F() increments (one UPDATE per
+distinct change), the same way bursary.ledger maintains its rollup. The
+affected report cards get their attendance_present/attendance_total copied
+from the summary.
+
+save_class_register() marks a whole class for a day in one request: one
+read of the day's records, one bulk insert, one bulk update and one summary
+update. Single records written through the API go through the signals in
+academic/signals.py. rebuild_attendance_summaries() re-derives the summaries
+from the raw records (backfill, and attendance sessions moved to another
+term).
+"""
+
+import logging
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.cache_utils import invalidate_model_cache
+
+from ..models import AttendanceRecord, AttendanceSession, AttendanceSummary, ReportCard
+from .report_pdf import invalidate_report_pdfs
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("present", "absent", "late")
+
+
+def stored_marks(record):
+    """Marks of a record as currently stored (before an in-flight save or delete)."""
+    if record._state.adding or record.pk is None:
+        return []
+    return list(
+        AttendanceRecord._base_manager.filter(pk=record.pk).values_list(
+            "student_id", "attendance_session__session", "attendance_session__term", "status"
+        )
+    )
+
+
+def record_marks(record):
+    session = record.attendance_session
+    return [(record.student_id, session.session, session.term, record.status)]
+
+
+def apply_attendance_change(school_id, before, after):
+    """Apply the difference between two lists of marks to the summaries and report cards."""
+    deltas = defaultdict(Counter)
+    for student_id, session, term, status in before:
+        deltas[(student_id, session, term)][status] -= 1
+        deltas[(student_id, session, term)]["total"] -= 1
+    for student_id, session, term, status in after:
+        deltas[(student_id, session, term)][status] += 1
+        deltas[(student_id, session, term)]["total"] += 1
+
+    groups = defaultdict(list)
+    created = []
+    for (student_id, session, term), delta in deltas.items():
+        change = tuple(delta[field] for field in (*STATUSES, "total"))
+        if not any(change):
+            continue
+        groups[(session, term, change)].append(student_id)
+        if delta["total"] > 0:
+            # Only a mark being added needs a row; removals may run while the student is being deleted
+            created.append(AttendanceSummary(school_id=school_id, student_id=student_id, session=session, term=term))
+    if not groups:
+        return
+
+    AttendanceSummary.objects.bulk_create(created, ignore_conflicts=True, batch_size=500)
+    now = timezone.now()
+    periods = defaultdict(set)
+    for (session, term, change), student_ids in groups.items():
+        AttendanceSummary.objects.filter(
+            school_id=school_id, session=session, term=term, student_id__in=student_ids
+        ).update(
+            **{field: F(field) + amount for field, amount in zip((*STATUSES, "total"), change) if amount},
+            updated_at=now,
+        )
+        periods[(session, term)].update(student_ids)
+    sync_report_cards(school_id, periods)
+
+
+def sync_report_cards(school_id, periods):
+    """Copy attendance from the summaries onto report cards; `periods` is {(session, term): student_ids}."""
+    for (session, term), student_ids in periods.items():
+        summary = AttendanceSummary.objects.filter(
+            school_id=school_id, session=session, term=term, student_id=OuterRef("student_id")
+        )
+        updated = ReportCard.objects.filter(
+            school_id=school_id, session=session, term=term, student_id__in=student_ids
+        ).update(
+            attendance_present=Coalesce(Subquery(summary.values("present")[:1]), Value(0)),
+            attendance_total=Coalesce(Subquery(summary.values("total")[:1]), Value(0)),
+        )
+        if updated:
+            invalidate_report_pdfs(school_id, student_ids)
+
+
+def rebuild_attendance_summaries(school_id, session=None, term=None, student_ids=None):
+    """
+    Recompute summaries from the raw records (for one term and/or some
+    students, if given) and sync report cards. Returns the number of rows written.
+    """
+    records = AttendanceRecord.objects.filter(school_id=school_id)
+    summaries = AttendanceSummary.objects.filter(school_id=school_id)
+    if session:
+        records = records.filter(attendance_session__session=session)
+        summaries = summaries.filter(session=session)
+    if term:
+        records = records.filter(attendance_session__term=term)
+        summaries = summaries.filter(term=term)
+    if student_ids is not None:
+        records = records.filter(student_id__in=student_ids)
+        summaries = summaries.filter(student_id__in=student_ids)
+
+    counts = records.values(
+        "student_id", session=F("attendance_session__session"), term=F("attendance_session__term")
+    ).annotate(total=Count("id"), **{status: Count("id", filter=Q(status=status)) for status in STATUSES})
+    now = timezone.now()
+    rows = [AttendanceSummary(school_id=school_id, updated_at=now, **row) for row in counts]
+    periods = defaultdict(set)
+    for summary in summaries.values_list("session", "term", "student_id"):
+        periods[summary[:2]].add(summary[2])
+    for row in rows:
+        periods[(row.session, row.term)].add(row.student_id)
+
+    with transaction.atomic():
+        summaries.delete()
+        AttendanceSummary.objects.bulk_create(rows, batch_size=500)
+        sync_report_cards(school_id, periods)
+    return len(rows)
+
+
+def attendance_summaries(school_id, session, term, student_ids=None):
+    """{student_id: AttendanceSummary} for a term."""
+    summaries = AttendanceSummary.objects.filter(school_id=school_id, session=session, term=term)
+    if student_ids is not None:
+        summaries = summaries.filter(student_id__in=student_ids)
+    return {summary.student_id: summary for summary in summaries}
+
+
+def save_class_register(school, student_class, date, session, term, entries):
+    """
+    Upsert the AttendanceRecords of a class for one day. `entries` is
+    {student_id: (status, remark)}. Returns {"session_id", "created", "updated", "unchanged"}.
+    """
+    with transaction.atomic():
+        attendance_session = (
+            AttendanceSession.objects.select_for_update()
+            .filter(school=school, student_class=student_class, date=date)
+            .order_by("id")
+            .first()
+        )
+        if attendance_session is None:
+            attendance_session = AttendanceSession.objects.create(
+                school=school, student_class=student_class, date=date, session=session, term=term
+            )
+        session, term = attendance_session.session, attendance_session.term
+
+        existing = {
+            record.student_id: record
+            for record in AttendanceRecord.objects.filter(
+                attendance_session=attendance_session, student_id__in=entries
+            ).only("id", "student_id", "status", "remark")
+        }
+        created, updated, before, after = [], [], [], []
+        for student_id, (status, remark) in entries.items():
+            record = existing.get(student_id)
+            if record is None:
+                created.append(
+                    AttendanceRecord(
+                        school=school,
+                        attendance_session=attendance_session,
+                        student_id=student_id,
+                        status=status,
+                        remark=remark,
+                    )
+                )
+                after.append((student_id, session, term, status))
+            elif (record.status, record.remark) != (status, remark):
+                before.append((student_id, session, term, record.status))
+                after.append((student_id, session, term, status))
+                record.status, record.remark, record.updated_at = status, remark, timezone.now()
+                updated.append(record)
+
+        AttendanceRecord.objects.bulk_create(created, batch_size=500)
+        AttendanceRecord.objects.bulk_update(updated, ["status", "remark", "updated_at"], batch_size=500)
+        apply_attendance_change(school.id, before, after)
+
+    if created or updated:
+        invalidate_model_cache("AttendanceRecord", school.id)
+    return {
+        "session_id": attendance_session.id,
+        "created": len(created),
+        "updated": len(updated),
+        "unchanged": len(entries) - len(created) - len(updated),
+    }
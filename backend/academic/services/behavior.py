@@ -0,0 +1,161 @@
+"""Term-wide behaviour analytics.
+
+BehaviorAnalytics rows for a whole term are computed with one grouped query
+per source (conduct averages, trait scores, commendations, warnings) and
+written with one bulk upsert, instead of half a dozen queries per student.
+The same code refreshes a handful of students when a single conduct record
+changes (see academic/signals.py and academic.tasks.refresh_behavior_analytics).
+
+ConductEntry has no session/term of its own: entries are attributed to a term
+by date, using the term's AcademicTerm window. Schools that have not set up
+term dates get all of a student's entries counted, as the AI remarks do.
+"""
+
+import logging
+
+from django.db.models import Avg, Case, Count, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from ..models import AcademicTerm, BehaviorAnalytics, Commendation, ConductEntry, ConductWarning, Student
+
+logger = logging.getLogger(__name__)
+
+WARNING_WEIGHTS = {"minor": 1, "moderate": 3, "serious": 5}
+SEVERE_WARNING_WEIGHT = 10
+ANALYTICS_FIELDS = [
+    "avg_conduct_score",
+    "total_commendations",
+    "total_warnings",
+    "trait_scores",
+    "commendation_points",
+    "warning_points",
+    "overall_rating",
+    "parent_meetings",
+    "parent_complaints",
+    "updated_at",
+]
+
+
+def behavior_rating(net_points):
+    if net_points >= 10:
+        return "excellent"
+    if net_points >= 5:
+        return "good"
+    if net_points >= 0:
+        return "average"
+    if net_points >= -5:
+        return "needs_improvement"
+    return "poor"
+
+
+def term_window(school_id, session, term):
+    """(start_date, end_date) of the term, or None when the school has not defined it."""
+    return (
+        AcademicTerm.objects.filter(school_id=school_id, session=session, name=term)
+        .values_list("start_date", "end_date")
+        .first()
+    )
+
+
+def compute_behavior_analytics(school_id, session, term, student_ids=None):
+    """
+    {student_id: {field: value}} for every active student of the school (or
+    just `student_ids`, whatever their status) for one term.
+    """
+    students = Student.objects.filter(school_id=school_id)
+    if student_ids is None:
+        students = students.filter(status="active")
+    else:
+        students = students.filter(id__in=student_ids)
+    ids = list(students.values_list("id", flat=True))
+    if not ids:
+        return {}
+
+    entries = ConductEntry.objects.filter(school_id=school_id, student_id__in=ids)
+    window = term_window(school_id, session, term)
+    if window:
+        entries = entries.filter(date__range=window)
+
+    conduct = dict(entries.values("student_id").annotate(avg=Avg("score")).values_list("student_id", "avg"))
+
+    traits = {}
+    # Latest entry per trait wins
+    for student_id, trait, score in entries.order_by("date", "id").values_list("student_id", "trait", "score"):
+        traits.setdefault(student_id, {})[trait] = score
+
+    commendations = {
+        row["student_id"]: row
+        for row in Commendation.objects.filter(school_id=school_id, student_id__in=ids, session=session, term=term)
+        .values("student_id")
+        .annotate(total=Count("id"), points=Sum("points"))
+    }
+
+    severity_weight = Case(
+        *[When(severity=severity, then=Value(weight)) for severity, weight in WARNING_WEIGHTS.items()],
+        default=Value(SEVERE_WARNING_WEIGHT),
+        output_field=IntegerField(),
+    )
+    warnings = {
+        row["student_id"]: row
+        for row in ConductWarning.objects.filter(school_id=school_id, student_id__in=ids, session=session, term=term)
+        .values("student_id")
+        .annotate(
+            total=Count("id"),
+            points=Sum(severity_weight),
+            meetings=Count("id", filter=Q(parent_notification_method="meeting")),
+        )
+    }
+
+    analytics = {}
+    for student_id in ids:
+        commended = commendations.get(student_id, {})
+        warned = warnings.get(student_id, {})
+        commendation_points = commended.get("points") or 0
+        warning_points = warned.get("points") or 0
+        analytics[student_id] = {
+            "avg_conduct_score": conduct.get(student_id) or 0,
+            "total_commendations": commended.get("total", 0),
+            "total_warnings": warned.get("total", 0),
+            "trait_scores": traits.get(student_id, {}),
+            "commendation_points": commendation_points,
+            "warning_points": warning_points,
+            "overall_rating": behavior_rating(commendation_points - warning_points),
+            "parent_meetings": warned.get("meetings", 0),
+            "parent_complaints": 0,  # Could add a field for this
+        }
+    return analytics
+
+
+def refresh_behavior_analytics(school_id, session, term, student_ids=None, batch_size=1000):
+    """Recompute and upsert BehaviorAnalytics for a term. Returns the number of rows written."""
+    analytics = compute_behavior_analytics(school_id, session, term, student_ids)
+    now = timezone.now()
+    rows = [
+        BehaviorAnalytics(school_id=school_id, student_id=student_id, session=session, term=term, updated_at=now, **values)
+        for student_id, values in analytics.items()
+    ]
+    BehaviorAnalytics.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["student", "session", "term"],
+        update_fields=ANALYTICS_FIELDS,
+        batch_size=batch_size,
+    )
+    return len(rows)
+
+
+def conduct_entry_periods(school_id, student_id, entry_date):
+    """
+    (session, term) pairs a conduct entry can affect: the student's existing
+    analytics terms, plus the defined term its date falls in.
+    """
+    periods = set(
+        BehaviorAnalytics.objects.filter(school_id=school_id, student_id=student_id).values_list("session", "term")
+    )
+    if entry_date:
+        periods.update(
+            AcademicTerm.objects.filter(
+                school_id=school_id, start_date__lte=entry_date, end_date__gte=entry_date
+            ).values_list("session", "name")
+        )
+    return periods
@@ -0,0 +1,145 @@
+"""Materialized broadsheet store.
+
+A broadsheet is pivoted once per (class, session, term) and persisted on
+BroadsheetSnapshot. Score/report writes only bump the snapshot's version
+(a single UPDATE); the next read rebuilds it, so repeated refreshes during
+results week cost one SELECT each.
+"""
+
+import hashlib
+import json
+import logging
+
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import BroadsheetSnapshot, Class, SubjectScore
+
+logger = logging.getLogger(__name__)
+
+
+def build_broadsheet_data(school, class_id, session, term):
+    """
+    Pivot every SubjectScore of a class/session/term into the broadsheet payload.
+    Returns {"subjects": [...], "students": [...]} with positions already assigned.
+    """
+    scores = (
+        SubjectScore.objects.filter(
+            school=school,
+            report_card__student__current_class_id=class_id,
+            report_card__session=session,
+            report_card__term=term,
+        )
+        .values_list(
+            "report_card__student_id",
+            "report_card__student__names",
+            "report_card__student__student_no",
+            "subject__name",
+            "ca1",
+            "ca2",
+            "exam",
+            "total",
+            "grade",
+        )
+        .order_by("report_card__student__names", "subject__name")
+    )
+
+    # Pivot: { student_id: { name, subjects: { subject_name: { ca, exam, total } }, grand_total } }
+    broadsheet = {}
+    all_subjects = set()
+
+    for student_id, names, student_no, subject_name, ca1, ca2, exam, total, grade in scores:
+        sid = str(student_id)
+        all_subjects.add(subject_name)
+
+        if sid not in broadsheet:
+            broadsheet[sid] = {
+                "student_id": sid,
+                "student_name": names,
+                "student_no": student_no or "",
+                "subjects": {},
+                "grand_total": 0,
+            }
+
+        total = float(total or 0)
+        broadsheet[sid]["subjects"][subject_name] = {
+            "ca": float((ca1 or 0) + (ca2 or 0)),
+            "exam": float(exam or 0),
+            "total": total,
+            "grade": grade or "",
+        }
+        broadsheet[sid]["grand_total"] += total
+
+    # Sort students by name and subjects alphabetically
+    rows = sorted(broadsheet.values(), key=lambda x: x["student_name"])
+
+    # Calculate position (rank by grand_total descending)
+    sorted_by_total = sorted(rows, key=lambda x: x["grand_total"], reverse=True)
+    for idx, row in enumerate(sorted_by_total, 1):
+        row["position"] = idx
+
+    return {"subjects": sorted(all_subjects), "students": rows}
+
+
+def compute_etag(data):
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def get_broadsheet(school, class_id, session, term):
+    """
+    Return an up-to-date BroadsheetSnapshot, rebuilding it only when a write
+    has bumped its version since the last build. Returns None if the class
+    does not belong to the school.
+    """
+    snapshot = BroadsheetSnapshot.objects.filter(
+        school=school, student_class_id=class_id, session=session, term=term
+    ).first()
+    if snapshot is None:
+        if not Class.objects.filter(id=class_id, school=school).exists():
+            return None
+        snapshot, _ = BroadsheetSnapshot.objects.get_or_create(
+            school=school, student_class_id=class_id, session=session, term=term
+        )
+    if snapshot.is_stale:
+        rebuild_snapshot(snapshot)
+    return snapshot
+
+
+def rebuild_snapshot(snapshot):
+    """
+    Rebuild a snapshot in place. The write is conditional on the version read
+    before pivoting, so a score saved mid-rebuild leaves the snapshot stale
+    instead of being silently overwritten.
+    """
+    version = snapshot.version
+    data = build_broadsheet_data(snapshot.school_id, snapshot.student_class_id, snapshot.session, snapshot.term)
+    etag = compute_etag(data)
+    built_at = timezone.now()
+
+    BroadsheetSnapshot.objects.filter(pk=snapshot.pk, version=version).update(
+        data=data, etag=etag, built_version=version, built_at=built_at
+    )
+    snapshot.data = data
+    snapshot.etag = etag
+    snapshot.built_version = version
+    snapshot.built_at = built_at
+    return snapshot
+
+
+def invalidate_broadsheets(school_id, class_ids=None, session=None, term=None):
+    """Mark broadsheets stale for the given classes (every class when None), optionally one session/term."""
+    if not school_id:
+        return 0
+
+    qs = BroadsheetSnapshot.objects.filter(school_id=school_id)
+    if class_ids is not None:
+        class_ids = {cid for cid in class_ids if cid}
+        if not class_ids:
+            return 0
+        qs = qs.filter(student_class_id__in=class_ids)
+    if session is not None:
+        qs = qs.filter(session=session)
+    if term is not None:
+        qs = qs.filter(term=term)
+    return qs.update(version=F("version") + 1)
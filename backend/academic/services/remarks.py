@@ -0,0 +1,222 @@
+"""Class-wide AI report card remarks.
+
+A RemarkJob writes ai_performance_remark for every report card of a class in
+one background run instead of one blocking suggest-remark request per
+student. Each student is reduced to a compact summary (average, position,
+best/weakest subjects, attendance, conduct) built from a handful of grouped
+queries for the whole class; summaries are packed several to a model request
+(within the gateway's prompt budget), the requests run on a small thread pool
+bounded by the tenant's AI concurrency limit, and each answered batch is
+written with one bulk_update and reported as job progress. Students the model
+does not answer get the same heuristic remark suggest_remark falls back to.
+
+A job running for longer than REMARK_JOB_TIME_LIMIT since a worker claimed it
+lost its worker (the task was killed at its hard limit, or the worker
+crashed), and a job still queued that long after it was created was never
+picked up (the broker lost the message); expire_stale_remark_jobs() marks
+either failed so the class can be queued again.
+"""
+
+import collections
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.db.models import Avg, F, Q
+from django.utils import timezone
+
+from ..ai_utils import AI_TENANT_CONCURRENCY, AcademicAI
+from ..models import AttendanceSummary, ConductEntry, RemarkJob, ReportCard, SubjectScore
+from .behavior import term_window
+from .report_pdf import invalidate_report_pdfs
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 8
+# Hard time limit of generate_class_remarks_job
+REMARK_JOB_TIME_LIMIT = 60 * 30
+# sanitize_ai_prompt truncates prompts at 2000 characters; this leaves room for the instructions
+BATCH_CHARS = 1000
+
+
+def early_years_remark(name, observations):
+    status_counts = {"Secure": 0, "Developing": 0, "Emerging": 0}
+    for item in observations:
+        status = str(item.get("status", "")).strip().title()
+        if status in status_counts:
+            status_counts[status] += 1
+
+    strongest = max(status_counts, key=status_counts.get)
+    remark = (
+        f"{name} is making encouraging early-years progress. "
+        f"Current profile: {status_counts['Secure']} secure, "
+        f"{status_counts['Developing']} developing, {status_counts['Emerging']} emerging areas. "
+        f"Most evidence is in {strongest.lower()} development bands."
+    )
+    return remark, status_counts
+
+
+def fallback_remark(name, totals):
+    """Heuristic remark from a student's subject totals, used when the model gives none."""
+    excellent_count = sum(1 for total in totals if total >= 80)
+    poor_count = sum(1 for total in totals if total < 50)
+
+    if excellent_count > (len(totals) / 2):
+        return f"{name} has shown exceptional performance this term. Keep up the excellent work!"
+    if poor_count > 0:
+        return f"{name} needs to focus more on certain subjects where performance was below average."
+    return f"A good performance overall by {name}. Consistent effort will lead to even better results."
+
+
+def remark_summaries(school_id, reports):
+    """
+    ({report_id: summary}, {report_id: [subject totals]}) for report cards of
+    one session/term, from a few grouped queries for the whole list.
+    """
+    if not reports:
+        return {}, {}
+    session, term = reports[0].session, reports[0].term
+    student_ids = [report.student_id for report in reports]
+
+    scores = collections.defaultdict(list)
+    for report_id, subject, total in (
+        SubjectScore.objects.filter(report_card__in=reports)
+        .order_by("-total")
+        .values_list("report_card_id", "subject__name", "total")
+    ):
+        scores[report_id].append((subject, total))
+
+    attendance = {
+        row["student_id"]: row
+        for row in AttendanceSummary.objects.filter(
+            school_id=school_id, student_id__in=student_ids, session=session, term=term, total__gt=0
+        ).values("student_id", "present", "total")
+    }
+    conduct_entries = ConductEntry.objects.filter(school_id=school_id, student_id__in=student_ids)
+    window = term_window(school_id, session, term)
+    if window:
+        conduct_entries = conduct_entries.filter(date__range=window)
+    conduct = dict(
+        conduct_entries.values("student_id")
+        .annotate(avg=Avg("score"))
+        .values_list("student_id", "avg")
+    )
+
+    summaries = {}
+    for report in reports:
+        subject_scores = scores.get(report.id, [])
+        attended = attendance.get(report.student_id)
+        summary = {
+            "id": str(report.id),
+            "name": report.student.names,
+            "avg": round(report.average or 0, 1),
+            "pos": report.position,
+            "best": [[subject, round(total)] for subject, total in subject_scores[:2]],
+            "weak": [[subject, round(total)] for subject, total in subject_scores[2:] if total < 50][-2:],
+        }
+        if attended:
+            summary["att"] = f"{attended['present']}/{attended['total']}"
+        if conduct.get(report.student_id) is not None:
+            summary["conduct"] = round(conduct[report.student_id], 1)
+        summaries[report.id] = summary
+    return summaries, {report_id: [total for _, total in rows] for report_id, rows in scores.items()}
+
+
+def prompt_batches(summaries, batch_size=BATCH_SIZE, batch_chars=BATCH_CHARS):
+    """Split summaries into model requests of at most `batch_size` students and about `batch_chars` of data."""
+    batch, size = [], 0
+    for summary in summaries:
+        length = len(str(summary))
+        if batch and (len(batch) == batch_size or size + length > batch_chars):
+            yield batch
+            batch, size = [], 0
+        batch.append(summary)
+        size += length
+    if batch:
+        yield batch
+
+
+def _write(reports, remarks):
+    now = timezone.now()
+    for report in reports:
+        report.ai_performance_remark = remarks[report.id]
+        report.updated_at = now
+    ReportCard.objects.bulk_update(reports, ["ai_performance_remark", "updated_at"])
+
+
+def expire_stale_remark_jobs(jobs):
+    """
+    Mark jobs running for more than REMARK_JOB_TIME_LIMIT since they were
+    claimed, or queued for that long since they were created, as failed.
+    Returns the count.
+    """
+    cutoff = timezone.now() - timedelta(seconds=REMARK_JOB_TIME_LIMIT)
+    return jobs.filter(
+        Q(status="queued", created_at__lt=cutoff)
+        | Q(status="running", started_at__lt=cutoff)
+        # Claimed before started_at was recorded
+        | Q(status="running", started_at__isnull=True, created_at__lt=cutoff)
+    ).update(status="failed", error="Job did not finish within its time limit", completed_at=timezone.now())
+
+
+def generate_class_remarks(job, batch_size=BATCH_SIZE, workers=None):
+    """Write AI remarks for the job's class and term. Returns the number of report cards updated."""
+    reports = (
+        ReportCard.objects.filter(
+            school_id=job.school_id, student_class_id=job.student_class_id, session=job.session, term=job.term
+        )
+        .select_related("student")
+        .order_by("id")
+    )
+    if not job.overwrite:
+        reports = reports.filter(ai_performance_remark="")
+    reports = list(reports)
+    RemarkJob.objects.filter(pk=job.pk).update(total=len(reports), processed=0, ai_generated=0)
+
+    summaries, totals = remark_summaries(job.school_id, reports)
+    by_id = {report.id: report for report in reports}
+
+    # Reports without scores never need the model
+    local = {}
+    for report in reports:
+        if report.id in totals:
+            continue
+        if report.early_years_observations:
+            local[report.id] = early_years_remark(report.student.names, report.early_years_observations)[0]
+        else:
+            local[report.id] = "No academic data available for this term."
+    if local:
+        _write([by_id[report_id] for report_id in local], local)
+        RemarkJob.objects.filter(pk=job.pk).update(processed=F("processed") + len(local))
+
+    batches = list(prompt_batches([summaries[report.id] for report in reports if report.id in totals], batch_size))
+    ai_generated = 0
+    if batches:
+        ai = AcademicAI(school=job.school_id)
+        # Model calls run in threads; every database write stays on this one
+        with ThreadPoolExecutor(max_workers=workers or AI_TENANT_CONCURRENCY) as pool:
+            futures = {pool.submit(ai.generate_class_remarks, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    answers = future.result() or {}
+                except Exception as e:
+                    logger.error(f"AI remark batch failed for job {job.pk}: {e}")
+                    answers = {}
+                remarks = {}
+                for summary in batch:
+                    report = by_id[int(summary["id"])]
+                    remark = answers.get(summary["id"])
+                    if remark:
+                        ai_generated += 1
+                    remarks[report.id] = remark or fallback_remark(report.student.names, totals[report.id])
+                _write([by_id[report_id] for report_id in remarks], remarks)
+                RemarkJob.objects.filter(pk=job.pk).update(
+                    processed=F("processed") + len(batch), ai_generated=ai_generated
+                )
+
+    invalidate_report_pdfs(job.school_id, [report.student_id for report in reports])
+    RemarkJob.objects.filter(pk=job.pk).update(
+        status="completed", processed=len(reports), ai_generated=ai_generated, error="", completed_at=timezone.now()
+    )
+    return len(reports)
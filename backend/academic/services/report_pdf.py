@@ -0,0 +1,280 @@
+"""Report card PDF rendering pipeline.
+
+Rendered PDFs are content addressed: the file name carries a digest of
+everything the page shows (report, scores, term history, student, class
+teacher signature, school branding, including the size and modified time of
+a logo or signature kept in storage) plus TEMPLATE_VERSION. A batch run lists
+the period's folder once and skips every report whose current digest is
+already stored, so re-running end-of-term generation only renders what
+changed. One ReportCardPDFGenerator serves the whole batch, sharing styles
+and images, and scores/history for the class are loaded in two queries.
+
+Single downloads (ReportCardViewSet.export_pdf) cache each report's digest,
+so a repeat download is a cache hit plus one storage read. Writes that change
+what a report shows call invalidate_report_pdfs (see academic/signals.py);
+that only drops cached digests, a PDF is re-rendered only if its digest
+actually changed.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import re
+import time
+import zipfile
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from ..models import ReportCard
+from ..utils import ReportCardPDFGenerator, image_storage_path, load_report_history, load_report_scores
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever ReportCardPDFGenerator's layout changes so stored PDFs are re-rendered
+TEMPLATE_VERSION = "1"
+DIGEST_TIMEOUT = 60 * 60
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(value or "")).strip("-") or "none"
+
+
+def period_folder(school_id, session, term):
+    return f"report_cards/{school_id}/{_slug(session)}_{_slug(term)}"
+
+
+def report_pdf_path(report, digest):
+    return f"{period_folder(report.school_id, report.session, report.term)}/rc_{report.id}_{digest}.pdf"
+
+
+def _fingerprint(value):
+    return hashlib.sha256(str(value or "").encode()).hexdigest()
+
+
+def _image_fingerprint(source):
+    """
+    Fingerprint of an image field. A storage path can be overwritten in place,
+    so the stored file's size and modified time are part of it.
+    """
+    stat = None
+    path = image_storage_path(source)
+    if path:
+        try:
+            stat = [default_storage.size(path), default_storage.get_modified_time(path).isoformat()]
+        except Exception:
+            stat = None
+    return _fingerprint(json.dumps([str(source or ""), stat]))
+
+
+def branding_fingerprint(generator):
+    """Digest of the school-level inputs shared by every report of a school."""
+    school, school_settings = generator.school, generator.settings
+    return _fingerprint(
+        json.dumps(
+            [
+                school.name,
+                school.address,
+                _image_fingerprint(school.logo),
+                school_settings.school_tagline if school_settings else None,
+                _image_fingerprint(school_settings.head_of_school_signature) if school_settings else None,
+                school_settings.promotion_threshold if school_settings else None,
+            ],
+            default=str,
+        )
+    )
+
+
+def report_digest(report, scores, history, branding):
+    """Content digest of one rendered report card (24 hex chars)."""
+    student = report.student
+    student_class = report.student_class
+    class_teacher = student_class.class_teacher if student_class else None
+    payload = [
+        TEMPLATE_VERSION,
+        branding,
+        [
+            report.session,
+            report.term,
+            report.total_score,
+            report.average,
+            report.attendance_present,
+            report.attendance_total,
+            report.teacher_remark,
+            report.head_teacher_remark,
+            report.ai_performance_remark,
+            report.early_years_observations,
+            report.verification_hash,
+        ],
+        [student.names, student.gender, student.student_no, student.passport_url],
+        [
+            student_class.name if student_class else None,
+            getattr(student_class, "report_mode", None),
+            _fingerprint(class_teacher.signature_url) if class_teacher else None,
+        ],
+        [list(row) for row in scores],
+        [
+            [h.session, h.term, h.average, h.position, h.attendance_present, h.attendance_total, h.is_passed]
+            for h in history
+        ],
+    ]
+    return hashlib.sha256(json.dumps(payload, default=str).encode()).hexdigest()[:24]
+
+
+def _stored_files(folder):
+    try:
+        return set(default_storage.listdir(folder)[1])
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+
+
+def report_queryset(school):
+    return ReportCard.objects.filter(school=school).select_related(
+        "school", "student", "student_class__class_teacher"
+    )
+
+
+def render_reports(school, reports, force=False, generator=None):
+    """
+    Render the given report cards (all of one session/term) to storage,
+    skipping those whose stored PDF is current. Returns a list of
+    {"report_id", "path", "digest", "rendered"} in report order.
+    """
+    reports = list(reports)
+    if not reports:
+        return []
+
+    generator = generator or ReportCardPDFGenerator(school)
+    branding = branding_fingerprint(generator)
+    scores = load_report_scores([report.id for report in reports])
+    history = load_report_history(school, {report.student_id for report in reports})
+
+    folders = {period_folder(school.id, r.session, r.term) for r in reports}
+    stored = {folder: _stored_files(folder) for folder in folders}
+
+    results = []
+    for report in reports:
+        report_scores = scores.get(report.id, [])
+        report_history = history.get(report.student_id, [])
+        digest = report_digest(report, report_scores, report_history, branding)
+        path = report_pdf_path(report, digest)
+        folder, name = path.rsplit("/", 1)
+
+        rendered = force or name not in stored[folder]
+        if rendered:
+            pdf = generator.generate_single(report, scores=report_scores, history=report_history)
+            if name in stored[folder]:
+                default_storage.delete(path)
+            default_storage.save(path, ContentFile(pdf.getvalue()))
+            # Drop renders of this report's older content
+            for stale in stored[folder]:
+                if stale.startswith(f"rc_{report.id}_") and stale != name:
+                    default_storage.delete(f"{folder}/{stale}")
+        results.append({"report_id": report.id, "path": path, "digest": digest, "rendered": rendered})
+    return results
+
+
+def render_report_card(report, force=False, generator=None):
+    """Render (or reuse) one report card's stored PDF. Returns the render_reports result entry."""
+    return render_reports(report.school, [report], force=force, generator=generator)[0]
+
+
+def render_class_report_cards(school, class_id, session, term, merge=False, bundle=False, force=False):
+    """
+    Render every report card of a class for a term. With `merge`, also store
+    one PDF holding the whole class; with `bundle`, a ZIP of the individual
+    PDFs. Both are content addressed by the class's report digests as well.
+    """
+    reports = list(report_queryset(school).filter(student_class_id=class_id, session=session, term=term))
+    generator = ReportCardPDFGenerator(school)
+    results = render_reports(school, reports, force=force, generator=generator)
+    summary = {
+        "generated": sum(1 for r in results if r["rendered"]),
+        "skipped": sum(1 for r in results if not r["rendered"]),
+        "urls": [{"report_id": r["report_id"], "url": default_storage.url(r["path"])} for r in results],
+    }
+    if not results or not (merge or bundle):
+        return summary
+
+    folder = period_folder(school.id, session, term)
+    class_digest = hashlib.sha256("".join(r["digest"] for r in results).encode()).hexdigest()[:24]
+    stored = _stored_files(folder)
+
+    if merge:
+        path = f"{folder}/class_{class_id}_{class_digest}.pdf"
+        if force or path.rsplit("/", 1)[1] not in stored:
+            # No PDF merging library is a dependency, so the class document is laid out in one build
+            pdf = generator.generate_bulk(None, session, term, reports=reports)
+            _replace_class_file(folder, stored, f"class_{class_id}_", path, pdf.getvalue())
+        summary["merged_url"] = default_storage.url(path)
+
+    if bundle:
+        path = f"{folder}/class_{class_id}_{class_digest}.zip"
+        if force or path.rsplit("/", 1)[1] not in stored:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                for report, result in zip(reports, results):
+                    with default_storage.open(result["path"], "rb") as f:
+                        archive.writestr(f"{_slug(report.student.names)}_{report.student.student_no}.pdf", f.read())
+            _replace_class_file(folder, stored, f"class_{class_id}_", path, buffer.getvalue())
+        summary["bundle_url"] = default_storage.url(path)
+
+    return summary
+
+
+def _replace_class_file(folder, stored, prefix, path, content):
+    extension = path.rsplit(".", 1)[1]
+    name = path.rsplit("/", 1)[1]
+    if name in stored:
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(content))
+    for stale in stored:
+        if stale.startswith(prefix) and stale.endswith(f".{extension}") and stale != name:
+            default_storage.delete(f"{folder}/{stale}")
+
+
+def _generation(school_id):
+    """
+    Per-school component of the digest cache keys. A missing value starts a new
+    generation, so an evicted counter can never bring old digests back.
+    """
+    key = f"academic:report-pdf-gen:{school_id}"
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _digest_key(school_id, student_id):
+    return f"academic:report-pdf:{school_id}:{_generation(school_id)}:{student_id}"
+
+
+def invalidate_report_pdfs(school_id, student_ids=None):
+    """
+    Forget cached digests for the given students' report cards (a report also
+    shows the student's other terms), or for the whole school when
+    `student_ids` is None (branding, class or teacher changes).
+    """
+    if student_ids is None:
+        cache.set(f"academic:report-pdf-gen:{school_id}", time.time_ns(), None)
+        return
+    cache.delete_many([_digest_key(school_id, student_id) for student_id in set(student_ids) if student_id])
+
+
+def report_pdf_file(report, force=False):
+    """
+    (storage path, digest) of the report's current PDF. Cached digests are
+    only stored once their PDF exists, so a hit needs no render.
+    """
+    key = _digest_key(report.school_id, report.student_id)
+    digests = cache.get(key) or {}
+    digest = None if force else digests.get(report.id)
+    if digest is None:
+        result = render_report_card(report, force=force)
+        digest = result["digest"]
+        digests[report.id] = digest
+        cache.set(key, digests, DIGEST_TIMEOUT)
+    return report_pdf_path(report, digest), digest
@@ -0,0 +1,230 @@
+"""Term results engine.
+
+compute_term_results works out, for a class or a whole school in one term,
+every report card's total, average, trend and class position, every score's
+subject position, and per-class statistics (highest/lowest/mean per subject),
+from a handful of queries for the whole set. Report cards and scores are
+written with bulk_update (only rows that changed), class statistics with one
+ClassTermResult upsert.
+
+Each ClassTermResult keeps a signature of the rows it was computed from
+(report card count/ids/totals, score count/totals/latest update), read with
+two grouped queries; classes whose signature still matches are skipped, so a
+school-wide run after a few score edits only recomputes those classes.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from ..models import ClassTermResult, ReportCard, SubjectScore
+from ..utils import compute_performance_trend
+from .broadsheet import invalidate_broadsheets
+from .report_pdf import invalidate_report_pdfs
+
+logger = logging.getLogger(__name__)
+
+RESULT_FIELDS = [
+    "student_count",
+    "class_average",
+    "highest_average",
+    "lowest_average",
+    "subject_stats",
+    "source_signature",
+    "computed_at",
+    "updated_at",
+]
+
+
+def competition_ranks(values):
+    """Standard competition ranks (1, 2, 2, 4) for values already sorted best first."""
+    ranks = []
+    for index, value in enumerate(values):
+        ranks.append(ranks[-1] if index and value == values[index - 1] else index + 1)
+    return ranks
+
+
+def _reports(school_id, session, term, class_ids=None):
+    reports = ReportCard.objects.filter(school_id=school_id, session=session, term=term, student_class__isnull=False)
+    if class_ids is not None:
+        reports = reports.filter(student_class_id__in=class_ids)
+    return reports
+
+
+def source_signatures(school_id, session, term, class_ids=None):
+    """{class_id: signature} of the report cards and scores a class's results depend on."""
+    reports = _reports(school_id, session, term, class_ids)
+    signatures = {
+        row["student_class_id"]: [row["count"], row["ids"], round(row["totals"] or 0, 4)]
+        for row in reports.values("student_class_id").annotate(
+            count=Count("id"), ids=Sum("id"), totals=Sum("total_score")
+        )
+    }
+    for row in (
+        SubjectScore.objects.filter(report_card__in=reports)
+        .values("report_card__student_class_id")
+        .annotate(count=Count("id"), totals=Sum("total"), changed=Max("updated_at"))
+    ):
+        signatures[row["report_card__student_class_id"]] += [
+            row["count"],
+            round(row["totals"] or 0, 4),
+            row["changed"].isoformat() if row["changed"] else "",
+        ]
+    return {class_id: ":".join(str(part) for part in parts) for class_id, parts in signatures.items()}
+
+
+def _subject_stats(scores):
+    """{subject_id: {...}} for one class; `scores` is a list of (subject_id, subject name, total)."""
+    by_subject = defaultdict(list)
+    names = {}
+    for subject_id, name, total in scores:
+        by_subject[subject_id].append(total)
+        names[subject_id] = name
+    return {
+        str(subject_id): {
+            "name": names[subject_id],
+            "highest": max(totals),
+            "lowest": min(totals),
+            "mean": round(sum(totals) / len(totals), 2),
+            "count": len(totals),
+        }
+        for subject_id, totals in sorted(by_subject.items())
+    }
+
+
+def _compute(school_id, session, term, class_ids, now):
+    """Recompute and persist the given classes. Returns ({class_id: ClassTermResult}, changed student ids)."""
+    reports = list(
+        _reports(school_id, session, term, class_ids).only(
+            "id",
+            "school_id",
+            "student_id",
+            "student_class_id",
+            "total_score",
+            "average",
+            "performance_trend",
+            "position",
+        )
+    )
+    report_ids = [report.id for report in reports]
+
+    scores = defaultdict(list)  # report id -> [(score id, subject id, subject name, total, position)]
+    for row in SubjectScore.objects.filter(report_card_id__in=report_ids).values_list(
+        "id", "report_card_id", "subject_id", "subject__name", "total", "position"
+    ):
+        scores[row[1]].append((row[0], *row[2:]))
+
+    # Historical averages per student, ordered like ReportCard.calculate_trend()
+    history = defaultdict(list)
+    for report_id, student_id, average in (
+        ReportCard.objects.filter(school_id=school_id, student_id__in={report.student_id for report in reports})
+        .order_by("created_at")
+        .values_list("id", "student_id", "average")
+    ):
+        history[student_id].append((report_id, average))
+
+    by_class = defaultdict(list)
+    dirty = set()
+    for report in reports:
+        before = (report.total_score, report.average, report.performance_trend)
+        totals = [total for _, _, _, total, _ in scores.get(report.id, [])]
+        report.total_score = sum(totals)
+        report.average = report.total_score / len(totals) if totals else 0
+        averages = [average for report_id, average in history.get(report.student_id, []) if report_id != report.id]
+        report.performance_trend = compute_performance_trend(averages + [report.average])
+        if before != (report.total_score, report.average, report.performance_trend):
+            dirty.add(report.id)
+        by_class[report.student_class_id].append(report)
+
+    changed_reports, changed_scores = [], []
+    results = {}
+    for class_id, class_reports in by_class.items():
+        # Positions follow ReportCard.calculate_positions: total first, average breaks ordering only
+        class_reports.sort(key=lambda report: (-report.total_score, -report.average))
+        for report, rank in zip(class_reports, competition_ranks([r.total_score for r in class_reports])):
+            if report.position != rank:
+                report.position = rank
+                dirty.add(report.id)
+            if report.id in dirty:
+                report.updated_at = now
+                changed_reports.append(report)
+
+        subject_scores = defaultdict(list)
+        for report in class_reports:
+            for score in scores.get(report.id, []):
+                subject_scores[score[1]].append(score)
+        for subject_rows in subject_scores.values():
+            subject_rows.sort(key=lambda score: -score[3])
+            for score, rank in zip(subject_rows, competition_ranks([score[3] for score in subject_rows])):
+                if score[4] != rank:
+                    changed_scores.append(SubjectScore(id=score[0], position=rank))
+
+        averages = [report.average for report in class_reports]
+        results[class_id] = ClassTermResult(
+            school_id=school_id,
+            student_class_id=class_id,
+            session=session,
+            term=term,
+            student_count=len(class_reports),
+            class_average=round(sum(averages) / len(averages), 2),
+            highest_average=max(averages),
+            lowest_average=min(averages),
+            subject_stats=_subject_stats(
+                [score[1:4] for report in class_reports for score in scores.get(report.id, [])]
+            ),
+            computed_at=now,
+            updated_at=now,
+        )
+
+    if changed_reports:
+        ReportCard.objects.bulk_update(
+            changed_reports, ["total_score", "average", "performance_trend", "position", "updated_at"], batch_size=500
+        )
+    if changed_scores:
+        SubjectScore.objects.bulk_update(changed_scores, ["position"], batch_size=500)
+    return results, {report.student_id for report in changed_reports}
+
+
+def compute_term_results(school, session, term, class_ids=None, force=False):
+    """
+    Bring term results up to date for the given classes (default: every class
+    with report cards that term). Classes whose source signature is unchanged
+    are skipped unless `force`. Returns {"computed": [class ids], "skipped": n}.
+    """
+    school_id = getattr(school, "pk", school)
+    signatures = source_signatures(school_id, session, term, class_ids)
+    existing = ClassTermResult.objects.filter(school_id=school_id, session=session, term=term)
+    if class_ids is not None:
+        existing = existing.filter(student_class_id__in=class_ids)
+    stored = dict(existing.values_list("student_class_id", "source_signature"))
+
+    stale = sorted(class_id for class_id, signature in signatures.items() if force or stored.get(class_id) != signature)
+    gone = set(stored) - set(signatures)
+    if not stale and not gone:
+        return {"computed": [], "skipped": len(signatures)}
+
+    now = timezone.now()
+    with transaction.atomic():
+        if gone:
+            existing.filter(student_class_id__in=gone).delete()
+        results, changed_students = {}, set()
+        if stale:
+            results, changed_students = _compute(school_id, session, term, stale, now)
+            # Signatures are read back after the writes, since report totals are part of them
+            for class_id, signature in source_signatures(school_id, session, term, stale).items():
+                results[class_id].source_signature = signature
+        ClassTermResult.objects.bulk_create(
+            list(results.values()),
+            update_conflicts=True,
+            unique_fields=["school", "student_class", "session", "term"],
+            update_fields=RESULT_FIELDS,
+        )
+
+    if stale:
+        invalidate_broadsheets(school_id, set(stale), session=session, term=term)
+    if changed_students:
+        invalidate_report_pdfs(school_id, changed_students)
+    return {"computed": stale, "skipped": len(signatures) - len(stale)}
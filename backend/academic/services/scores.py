@@ -0,0 +1,266 @@
+"""Batched score ingestion.
+
+`SubjectScore.save()` grades against the database, audits field by field and
+re-totals its report card on every call, so a class score sheet turns into
+thousands of queries. `ingest_scores` does the same work set-wise: grades are
+looked up in memory, scores are written with bulk_create/bulk_update, audit
+rows go out in one INSERT, and totals, trends and positions are recomputed
+once per affected report card/class.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from core.models import log_field_changes_bulk
+
+from ..models import GradeRange, ReportCard, Subject, SubjectScore, default_grade_for
+from ..utils import compute_performance_trend
+from .broadsheet import invalidate_broadsheets
+from .report_pdf import invalidate_report_pdfs
+
+logger = logging.getLogger(__name__)
+
+SCORE_FIELDS = ("ca1", "ca2", "exam")
+TRACKED_SCORE_FIELDS = ("ca1", "ca2", "exam", "total", "grade", "comment")
+TRACKED_REPORT_FIELDS = ("total_score", "average", "performance_trend")
+
+
+class GradeLookup:
+    """In-memory GradeRange lookup for one or more grading schemes."""
+
+    def __init__(self, scheme_ids):
+        self._ranges = defaultdict(list)
+        scheme_ids = {sid for sid in scheme_ids if sid}
+        if scheme_ids:
+            ranges = GradeRange.objects.filter(scheme_id__in=scheme_ids).values_list(
+                "scheme_id", "min_score", "max_score", "grade", "remark"
+            )
+            for scheme_id, min_score, max_score, grade, remark in ranges:
+                self._ranges[scheme_id].append((min_score, max_score, grade, remark))
+
+    def grade(self, scheme_id, total):
+        """Return (grade, remark); remark is None when the legacy bands were used."""
+        # Ranges keep GradeRange's "-min_score" ordering, matching `.first()` in SubjectScore.save()
+        for min_score, max_score, grade, remark in self._ranges.get(scheme_id, ()):
+            if min_score <= total <= max_score:
+                return grade, remark
+        return default_grade_for(total), None
+
+
+def _to_float(value):
+    if value in (None, ""):
+        return 0.0
+    return float(value)
+
+
+def _subject_name(value):
+    if isinstance(value, Subject):
+        return value.name
+    if isinstance(value, dict):
+        value = value.get("name")
+    return str(value).strip() if value else ""
+
+
+def ingest_scores(school, entries, user=None, replace=False, update_positions=True, request=None):
+    """
+    Create or update many SubjectScores in one pass.
+
+    Each entry is a dict with `report_card` (ReportCard or id), `subject`
+    (Subject or name) and any of `ca1`, `ca2`, `exam`, `grade`, `comment`.
+    A non-empty `grade` is kept as given; otherwise the grade is derived from
+    the report card's grading scheme, falling back to the legacy bands.
+
+    With `replace=True`, scores on the touched report cards whose subject is
+    not in `entries` are deleted (score-sheet semantics used by the serializer).
+
+    Returns a dict with counts, per-entry errors and `scores`, a list aligned
+    with `entries` holding the saved SubjectScore (or None for a failed entry).
+    """
+    entries = list(entries)
+    errors = []
+    result_scores = [None] * len(entries)
+
+    # 1. Resolve report cards (instances passed in are reused and updated in place)
+    report_cards = {}
+    wanted_ids = set()
+    for entry in entries:
+        rc = entry.get("report_card")
+        if isinstance(rc, ReportCard):
+            report_cards[str(rc.pk)] = rc
+        elif str(rc).isdigit():
+            wanted_ids.add(str(rc))
+    missing_ids = wanted_ids - report_cards.keys()
+    if missing_ids:
+        for rc in ReportCard.objects.filter(school=school, id__in=missing_ids):
+            report_cards[str(rc.pk)] = rc
+
+    # 2. Resolve subjects by name, creating the missing ones in bulk
+    names = {_subject_name(entry.get("subject")) for entry in entries} - {""}
+    subjects = {}
+    for subject in Subject.objects.filter(school=school, name__in=names).order_by("id"):
+        subjects.setdefault(subject.name, subject)
+    new_subjects = [Subject(school=school, name=name) for name in sorted(names - subjects.keys())]
+    if new_subjects:
+        for subject in Subject.objects.bulk_create(new_subjects):
+            subjects[subject.name] = subject
+
+    # 3. Validate entries
+    resolved = []
+    for index, entry in enumerate(entries):
+        rc = entry.get("report_card")
+        report_card = report_cards.get(str(rc.pk if isinstance(rc, ReportCard) else rc))
+        subject = subjects.get(_subject_name(entry.get("subject")))
+        if report_card is None:
+            errors.append({"index": index, "error": f"Report card not found: {rc}"})
+            continue
+        if subject is None:
+            errors.append({"index": index, "error": "Missing subject"})
+            continue
+        try:
+            values = {field: _to_float(entry[field]) for field in SCORE_FIELDS if field in entry}
+        except (TypeError, ValueError):
+            errors.append({"index": index, "error": "Scores must be numeric"})
+            continue
+        resolved.append((index, report_card, subject, values, entry))
+
+    touched = list({report_card.pk: report_card for _, report_card, _, _, _ in resolved}.values())
+    touched_ids = [rc.pk for rc in touched]
+    grades = GradeLookup(rc.grading_scheme_id for rc in touched)
+    now = timezone.now()
+
+    with transaction.atomic():
+        existing = {
+            (score.report_card_id, score.subject_id): score
+            for score in SubjectScore.objects.filter(report_card_id__in=touched_ids)
+        }
+
+        # 4. Build creates/updates in memory
+        to_create, to_update, changes = {}, {}, []
+        seen = set()
+        for index, report_card, subject, values, entry in resolved:
+            key = (report_card.pk, subject.pk)
+            seen.add(key)
+            score = existing.get(key)
+            if score is None:
+                score = SubjectScore(school=school, report_card=report_card, subject=subject)
+                existing[key] = score
+                to_create[key] = score
+            before = {field: getattr(score, field) for field in TRACKED_SCORE_FIELDS}
+
+            for field, value in values.items():
+                setattr(score, field, value)
+            score.total = score.ca1 + score.ca2 + score.exam
+
+            grade = (entry.get("grade") or "").strip()
+            if grade:
+                score.grade = grade
+                if "comment" in entry:
+                    score.comment = entry.get("comment") or ""
+            else:
+                score.grade, remark = grades.grade(report_card.grading_scheme_id, score.total)
+                if "comment" in entry and entry.get("comment"):
+                    score.comment = entry["comment"]
+                elif remark is not None:
+                    score.comment = remark
+
+            if key not in to_create:
+                diff = [
+                    (score, field, before[field], getattr(score, field))
+                    for field in TRACKED_SCORE_FIELDS
+                    if before[field] != getattr(score, field)
+                ]
+                if diff:
+                    score.updated_at = now
+                    to_update[key] = score
+                changes.extend(diff)
+            result_scores[index] = score
+
+        if to_create:
+            SubjectScore.objects.bulk_create(list(to_create.values()), batch_size=500)
+        if to_update:
+            SubjectScore.objects.bulk_update(
+                list(to_update.values()), list(TRACKED_SCORE_FIELDS) + ["updated_at"], batch_size=500
+            )
+
+        deleted = 0
+        if replace:
+            stale_ids = [score.pk for key, score in existing.items() if key not in seen and score.pk]
+            if stale_ids:
+                deleted, _ = SubjectScore.objects.filter(id__in=stale_ids).delete()
+
+        # 5. Totals, trends and positions once per report card / class
+        changes.extend(recalculate_report_totals(touched))
+        log_field_changes_bulk(changes, user=user, request=request)
+
+        groups = {(rc.student_class_id, rc.session, rc.term) for rc in touched}
+        if update_positions:
+            for class_id, session, term in groups:
+                if class_id:
+                    ReportCard.calculate_positions(school, class_id, session, term)
+
+    for class_id, session, term in groups:
+        invalidate_broadsheets(school.pk, {class_id}, session=session, term=term)
+    invalidate_report_pdfs(school.pk, {rc.student_id for rc in touched})
+
+    return {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "deleted": deleted,
+        "report_cards": len(touched),
+        "errors": errors,
+        "scores": result_scores,
+    }
+
+
+def recalculate_report_totals(report_cards):
+    """
+    Recompute total_score, average and performance_trend for many report cards
+    with two queries, persisting them with one bulk_update.
+    Returns the (instance, field, old, new) changes for audit logging.
+    """
+    report_cards = [rc for rc in report_cards if rc.pk]
+    if not report_cards:
+        return []
+
+    ids = [rc.pk for rc in report_cards]
+    sums = {
+        row["report_card_id"]: (row["total"] or 0, row["count"])
+        for row in SubjectScore.objects.filter(report_card_id__in=ids)
+        .values("report_card_id")
+        .annotate(total=Sum("total"), count=Count("id"))
+    }
+
+    # Historical averages per student, ordered like ReportCard.calculate_trend()
+    history = defaultdict(list)
+    for rc_id, student_id, average in (
+        ReportCard.objects.filter(student_id__in={rc.student_id for rc in report_cards})
+        .order_by("created_at")
+        .values_list("id", "student_id", "average")
+    ):
+        history[student_id].append((rc_id, average))
+
+    now = timezone.now()
+    changes = []
+    for rc in report_cards:
+        rc.updated_at = now
+        before = {field: getattr(rc, field) for field in TRACKED_REPORT_FIELDS}
+        total, count = sums.get(rc.pk, (0, 0))
+        rc.total_score = total
+        rc.average = total / count if count > 0 else 0
+
+        averages = [avg for rc_id, avg in history.get(rc.student_id, []) if rc_id != rc.pk]
+        averages.append(rc.average)
+        rc.performance_trend = compute_performance_trend(averages)
+
+        changes.extend(
+            (rc, field, before[field], getattr(rc, field))
+            for field in TRACKED_REPORT_FIELDS
+            if before[field] != getattr(rc, field)
+        )
+
+    ReportCard.objects.bulk_update(report_cards, list(TRACKED_REPORT_FIELDS) + ["updated_at"], batch_size=500)
+    return changes
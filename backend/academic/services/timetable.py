@@ -0,0 +1,476 @@
+"""Local timetable solver.
+
+Builds a school's weekly timetable from Class.subjects, SubjectTeacher and the
+Regular periods, without a round trip to the AI gateway. Hard constraints: a
+class holds one lesson per slot, a teacher teaches one class per slot (slots
+already used by timetables the solver does not manage count as taken), and
+every class/subject gets its periods per week. Soft constraints: a subject is
+spread across the week before it repeats on a day, the same subject is not
+taught in back-to-back periods, and a teacher's lessons are spread over days.
+
+The solver is greedy and deterministic: lessons are placed one per
+class/subject in turn, the busiest teachers' first, each in its cheapest
+feasible slot; a lesson with no feasible slot gets one repair step (moving the
+lesson that blocks it), and a final pass swaps lessons within a class where
+that spreads subjects better. The same input always gives the same timetable,
+and a 40-class school solves in well under a second (see the
+benchmark_timetable management command).
+
+Re-solving for one teacher keeps every current entry that still matches the
+demand and re-places only that teacher's lessons (plus any unmet demand), so
+one staffing change rewrites a handful of entries instead of the whole
+school's timetable.
+"""
+
+import collections
+import logging
+import time
+
+from django.db import transaction
+
+from schools.models import SchoolSettings
+
+from ..models import Class, Period, SubjectTeacher, Timetable, TimetableEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+DEFAULT_PERIODS_PER_WEEK = 4
+SPREAD_WEIGHT = 10
+ADJACENT_WEIGHT = 3
+HELD = None  # teacher slot used by a timetable the solver does not manage
+
+
+class TimetableProblem:
+    """
+    Solver input. Slots are numbered day by day: slot = day_index * len(periods) + period_index.
+
+    lessons: [(class_id, subject_id, teacher_id or None, periods_per_week)]
+    pinned:  {(class_id, slot): (subject_id, teacher_id)} placements to start from (they may still be moved)
+    busy:    {(teacher_id, slot)} teacher slots taken elsewhere
+    """
+
+    def __init__(self, days, periods, lessons, pinned=None, busy=None):
+        self.days = list(days)
+        self.periods = list(periods)
+        self.lessons = list(lessons)
+        self.pinned = dict(pinned or {})
+        self.busy = set(busy or ())
+
+    @property
+    def slot_count(self):
+        return len(self.days) * len(self.periods)
+
+    def slot(self, day_index, period_index):
+        return day_index * len(self.periods) + period_index
+
+
+class TimetableSolution:
+    def __init__(self, placements, unplaced, penalty):
+        self.placements = placements  # {(class_id, slot): (subject_id, teacher_id)}
+        self.unplaced = unplaced  # [{"class_id", "subject_id", "teacher_id", "missing"}]
+        self.penalty = penalty
+
+
+class TimetableSolver:
+    def __init__(self, problem):
+        self.problem = problem
+        self.width = len(problem.periods)
+        self.size = problem.slot_count
+        self.grid = {}
+        self.teacher_slots = collections.defaultdict(dict)  # teacher_id -> {slot: class_id or HELD}
+        self.subject_days = collections.Counter()  # (class_id, subject_id, day)
+        self.teacher_days = collections.Counter()  # (teacher_id, day)
+        for teacher_id, slot in problem.busy:
+            self.teacher_slots[teacher_id][slot] = HELD
+
+        class_ids = sorted({lesson[0] for lesson in problem.lessons} | {key[0] for key in problem.pinned})
+        # Classes start their search at different slots, so equal-cost choices don't all pile onto Monday morning
+        self.order = {}
+        for index, class_id in enumerate(class_ids):
+            self.grid[class_id] = [None] * self.size
+            offset = (index * (self.width + 1)) % self.size if self.size else 0
+            self.order[class_id] = [(slot + offset) % self.size for slot in range(self.size)]
+
+    def _place(self, class_id, slot, lesson):
+        subject_id, teacher_id = lesson
+        day = slot // self.width
+        self.grid[class_id][slot] = lesson
+        self.subject_days[(class_id, subject_id, day)] += 1
+        if teacher_id is not None:
+            self.teacher_slots[teacher_id][slot] = class_id
+            self.teacher_days[(teacher_id, day)] += 1
+
+    def _remove(self, class_id, slot):
+        subject_id, teacher_id = lesson = self.grid[class_id][slot]
+        day = slot // self.width
+        self.grid[class_id][slot] = None
+        self.subject_days[(class_id, subject_id, day)] -= 1
+        if teacher_id is not None:
+            del self.teacher_slots[teacher_id][slot]
+            self.teacher_days[(teacher_id, day)] -= 1
+        return lesson
+
+    def _cost(self, class_id, slot, lesson):
+        subject_id, teacher_id = lesson
+        day, period = divmod(slot, self.width)
+        row = self.grid[class_id]
+        cost = SPREAD_WEIGHT * self.subject_days[(class_id, subject_id, day)]
+        if period > 0 and row[slot - 1] and row[slot - 1][0] == subject_id:
+            cost += ADJACENT_WEIGHT
+        if period < self.width - 1 and row[slot + 1] and row[slot + 1][0] == subject_id:
+            cost += ADJACENT_WEIGHT
+        if teacher_id is not None:
+            cost += self.teacher_days[(teacher_id, day)]
+        return cost
+
+    def _best_slot(self, class_id, lesson, exclude=None):
+        teacher_slots = self.teacher_slots[lesson[1]] if lesson[1] is not None else {}
+        row = self.grid[class_id]
+        best, best_cost = None, None
+        for slot in self.order[class_id]:
+            if row[slot] is not None or slot in teacher_slots or slot == exclude:
+                continue
+            cost = self._cost(class_id, slot, lesson)
+            if best is None or cost < best_cost:
+                best, best_cost = slot, cost
+                if cost == 0:
+                    break
+        return best
+
+    def _relocate(self, class_id, slot):
+        """Move the lesson at (class_id, slot) to another feasible slot of its class."""
+        lesson = self._remove(class_id, slot)
+        target = self._best_slot(class_id, lesson, exclude=slot)
+        self._place(class_id, slot if target is None else target, lesson)
+        return target is not None
+
+    def _repair(self, class_id, lesson):
+        """Free a slot for `lesson` by moving the one lesson that blocks it."""
+        teacher_slots = self.teacher_slots[lesson[1]] if lesson[1] is not None else {}
+        row = self.grid[class_id]
+        for slot in self.order[class_id]:
+            if row[slot] is None:
+                # The class is free, the teacher is teaching another class
+                other_class = teacher_slots.get(slot, HELD)
+                if other_class is not HELD and self._relocate(other_class, slot):
+                    return slot
+            elif slot not in teacher_slots and self._relocate(class_id, slot):
+                # The teacher is free, the class has another lesson
+                return slot
+        return None
+
+    def solve(self):
+        pinned_counts = collections.Counter()
+        for (class_id, slot), lesson in sorted(self.problem.pinned.items()):
+            self._place(class_id, slot, lesson)
+            pinned_counts[(class_id,) + tuple(lesson)] += 1
+
+        teacher_load = collections.Counter()
+        for class_id, subject_id, teacher_id, count in self.problem.lessons:
+            if teacher_id is not None:
+                teacher_load[teacher_id] += count
+
+        # Most constrained first: lessons of the busiest teachers, then the biggest loads
+        lessons = sorted(
+            self.problem.lessons,
+            key=lambda lesson: (
+                -teacher_load[lesson[2]] if lesson[2] is not None else 0, -lesson[3], lesson[0], lesson[1]
+            ),
+        )
+        todo = [
+            [(subject_id, teacher_id), class_id, count - pinned_counts[(class_id, subject_id, teacher_id)], 0]
+            for class_id, subject_id, teacher_id, count in lessons
+        ]
+        # One lesson of each in turn, so no class/subject is left with only the leftover slots
+        while any(item[2] for item in todo):
+            for item in todo:
+                if not item[2]:
+                    continue
+                lesson, class_id = item[0], item[1]
+                item[2] -= 1
+                slot = self._best_slot(class_id, lesson)
+                if slot is None:
+                    slot = self._repair(class_id, lesson)
+                if slot is None:
+                    item[3] += 1
+                else:
+                    self._place(class_id, slot, lesson)
+        unplaced = [
+            {"class_id": class_id, "subject_id": lesson[0], "teacher_id": lesson[1], "missing": missing}
+            for lesson, class_id, _, missing in todo
+            if missing
+        ]
+
+        self._improve()
+
+        placements = {
+            (class_id, slot): lesson
+            for class_id, row in self.grid.items()
+            for slot, lesson in enumerate(row)
+            if lesson is not None
+        }
+        return TimetableSolution(placements, unplaced, self.penalty())
+
+    def _class_penalty(self, class_id):
+        row = self.grid[class_id]
+        per_day = collections.Counter((slot // self.width, lesson[0]) for slot, lesson in enumerate(row) if lesson)
+        total = sum(SPREAD_WEIGHT * (n - 1) for n in per_day.values() if n > 1)
+        for slot in range(self.size - 1):
+            if (slot + 1) % self.width and row[slot] and row[slot + 1] and row[slot][0] == row[slot + 1][0]:
+                total += ADJACENT_WEIGHT
+        return total
+
+    def _swappable(self, class_id, a, b):
+        row = self.grid[class_id]
+        teacher_a = row[a][1]
+        teacher_b = row[b][1] if row[b] else None
+        if teacher_a is not None and teacher_a != teacher_b and b in self.teacher_slots[teacher_a]:
+            return False
+        if teacher_b is not None and teacher_b != teacher_a and a in self.teacher_slots[teacher_b]:
+            return False
+        return True
+
+    def _swap(self, class_id, a, b):
+        first = self._remove(class_id, a)
+        second = self._remove(class_id, b) if self.grid[class_id][b] else None
+        self._place(class_id, b, first)
+        if second:
+            self._place(class_id, a, second)
+
+    def _improve(self):
+        """
+        Swap a lesson repeated on its day with another slot of the class when
+        that lowers the class's cost. Pinned lessons still in place stay put.
+        """
+        locked = {key for key, lesson in self.problem.pinned.items() if self.grid[key[0]][key[1]] == lesson}
+        for class_id, row in self.grid.items():
+            current = self._class_penalty(class_id)
+            for a in range(self.size):
+                if not current:
+                    break
+                if (
+                    row[a] is None
+                    or (class_id, a) in locked
+                    or self.subject_days[(class_id, row[a][0], a // self.width)] < 2
+                ):
+                    continue
+                for b in range(self.size):
+                    if b == a or (class_id, b) in locked or not self._swappable(class_id, a, b):
+                        continue
+                    self._swap(class_id, a, b)
+                    cost = self._class_penalty(class_id)
+                    if cost < current:
+                        current = cost
+                        break
+                    # Undo (the lesson now at b goes back to a)
+                    self._swap(class_id, b, a)
+
+    def penalty(self):
+        """Soft-constraint cost of the current grid (0 is a perfectly spread timetable)."""
+        return sum(self._class_penalty(class_id) for class_id in self.grid)
+
+
+def solve(problem):
+    return TimetableSolver(problem).solve()
+
+
+def _lesson_counts(periods_per_week, subject_names):
+    """{subject name: count} from an int default or a {subject name: count} mapping."""
+    if isinstance(periods_per_week, dict):
+        overrides = {str(name).strip().lower(): value for name, value in periods_per_week.items()}
+        default = overrides.pop("*", DEFAULT_PERIODS_PER_WEEK)
+    else:
+        overrides = {}
+        default = DEFAULT_PERIODS_PER_WEEK if periods_per_week is None else periods_per_week
+
+    counts = {}
+    for name in subject_names:
+        value = overrides.get(name.strip().lower(), default)
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid periods_per_week {value!r} for {name}")
+        if value < 0:
+            raise ValueError(f"Invalid periods_per_week {value!r} for {name}")
+        counts[name] = value
+    return counts
+
+
+def managed_timetables(school):
+    """{class_id: Timetable} the solver writes to: each class's first active timetable."""
+    timetables = {}
+    for timetable in Timetable.objects.filter(school=school, is_active=True).order_by("id"):
+        timetables.setdefault(timetable.student_class_id, timetable)
+    return timetables
+
+
+def load_problem(school, session=None, days=None, periods_per_week=None, keep_existing=False, release_teacher=None):
+    """
+    TimetableProblem for a whole school, plus the lookups needed to write it back.
+
+    With `keep_existing`, current entries of the managed timetables that still
+    match the demand are pinned, except those of `release_teacher`.
+    """
+    days = list(days or DEFAULT_DAYS)
+    unknown = set(days) - {value for value, _ in TimetableEntry.DAYS}
+    if unknown:
+        raise ValueError(f"Unknown days: {', '.join(sorted(unknown))}")
+    if session is None:
+        school_settings = SchoolSettings.objects.filter(school=school).only("current_session").first()
+        session = school_settings.current_session if school_settings else ""
+
+    periods = list(
+        Period.objects.filter(school=school, category="Regular")
+        .order_by("start_time", "id")
+        .values_list("id", flat=True)
+    )
+    class_subjects = list(
+        Class.subjects.through.objects.filter(class__school=school)
+        .order_by("class_id", "subject_id")
+        .values_list("class_id", "subject_id", "subject__name")
+    )
+    teachers = {}
+    for class_id, subject_name, teacher_id in (
+        SubjectTeacher.objects.filter(school=school, session=session)
+        .order_by("id")
+        .values_list("student_class_id", "subject", "teacher_id")
+    ):
+        teachers.setdefault((class_id, subject_name.strip().lower()), teacher_id)
+
+    counts = _lesson_counts(periods_per_week, {name for _, _, name in class_subjects})
+    lessons = [
+        (class_id, subject_id, teachers.get((class_id, name.strip().lower())), counts[name])
+        for class_id, subject_id, name in class_subjects
+        if counts[name]
+    ]
+    problem = TimetableProblem(days, periods, lessons)
+
+    timetables = managed_timetables(school)
+    timetable_classes = {timetable.id: class_id for class_id, timetable in timetables.items()}
+    day_index = {day: index for index, day in enumerate(days)}
+    period_index = {period_id: index for index, period_id in enumerate(periods)}
+
+    remaining = collections.Counter({(c, s, t): n for c, s, t, n in lessons})
+    taken = set()
+    for timetable_id, day, period_id, subject_id, teacher_id in (
+        TimetableEntry.objects.filter(school=school)
+        .order_by("id")
+        .values_list("timetable_id", "day_of_week", "period_id", "subject_id", "teacher_id")
+    ):
+        if day not in day_index or period_id not in period_index:
+            continue
+        slot = problem.slot(day_index[day], period_index[period_id])
+        class_id = timetable_classes.get(timetable_id)
+        if class_id is None:
+            if teacher_id is not None:
+                problem.busy.add((teacher_id, slot))
+            continue
+        key = (class_id, subject_id, teacher_id)
+        if (
+            keep_existing
+            and teacher_id != release_teacher
+            and remaining[key] > 0
+            and (teacher_id is None or (teacher_id, slot) not in taken)
+        ):
+            remaining[key] -= 1
+            problem.pinned[(class_id, slot)] = (subject_id, teacher_id)
+            if teacher_id is not None:
+                taken.add((teacher_id, slot))
+    # A teacher slot pinned in a managed timetable can't also be held by an unmanaged one
+    problem.pinned = {
+        key: lesson for key, lesson in problem.pinned.items() if (lesson[1], key[1]) not in problem.busy
+    }
+    return problem, timetables
+
+
+def apply_solution(school, problem, solution, timetables):
+    """
+    Write a solution to the managed timetables of the solved classes, touching
+    only the entries that differ. Entries outside the problem's days and
+    Regular periods (breaks, assemblies, other days) are left alone.
+    Returns (created, deleted).
+    """
+    solved = {lesson[0] for lesson in problem.lessons}
+    timetables = {class_id: timetable for class_id, timetable in timetables.items() if class_id in solved}
+    class_names = dict(Class.objects.filter(school=school).values_list("id", "name"))
+    missing = [class_id for class_id in solved if class_id not in timetables]
+    for timetable in Timetable.objects.bulk_create(
+        [
+            Timetable(school=school, student_class_id=class_id, title=f"{class_names[class_id]} Weekly Schedule")
+            for class_id in sorted(missing)
+        ]
+    ):
+        timetables[timetable.student_class_id] = timetable
+
+    desired = {}
+    for (class_id, slot), (subject_id, teacher_id) in solution.placements.items():
+        day_index, period_index = divmod(slot, len(problem.periods))
+        key = (timetables[class_id].id, problem.days[day_index], problem.periods[period_index])
+        desired[key] = (subject_id, teacher_id)
+
+    stale = []
+    for entry_id, timetable_id, day, period_id, subject_id, teacher_id in TimetableEntry.objects.filter(
+        timetable_id__in=[timetable.id for timetable in timetables.values()],
+        day_of_week__in=problem.days,
+        period_id__in=problem.periods,
+    ).values_list("id", "timetable_id", "day_of_week", "period_id", "subject_id", "teacher_id"):
+        key = (timetable_id, day, period_id)
+        if desired.get(key) == (subject_id, teacher_id):
+            del desired[key]
+        else:
+            stale.append(entry_id)
+
+    # Deletes go first so moved teachers never collide with their old slots
+    deleted = TimetableEntry.objects.filter(id__in=stale).delete()[0] if stale else 0
+    TimetableEntry.objects.bulk_create(
+        [
+            TimetableEntry(
+                school=school,
+                timetable_id=timetable_id,
+                day_of_week=day,
+                period_id=period_id,
+                subject_id=subject_id,
+                teacher_id=teacher_id,
+            )
+            for (timetable_id, day, period_id), (subject_id, teacher_id) in sorted(desired.items())
+        ]
+    )
+    return len(desired), deleted
+
+
+def solve_school_timetable(
+    school, session=None, days=None, periods_per_week=None, teacher_id=None, keep_existing=False, dry_run=False
+):
+    """
+    Solve and save the school's timetable. Passing `teacher_id` re-solves
+    incrementally around that teacher (implies `keep_existing`).
+    """
+    started = time.perf_counter()
+    problem, timetables = load_problem(
+        school,
+        session=session,
+        days=days,
+        periods_per_week=periods_per_week,
+        keep_existing=keep_existing or teacher_id is not None,
+        release_teacher=teacher_id,
+    )
+    solution = solve(problem)
+    solved = time.perf_counter()
+
+    created = deleted = 0
+    if not dry_run:
+        with transaction.atomic():
+            created, deleted = apply_solution(school, problem, solution, timetables)
+
+    result = {
+        "placed": len(solution.placements),
+        "pinned": len(problem.pinned),
+        "unplaced": solution.unplaced,
+        "penalty": solution.penalty,
+        "created": created,
+        "deleted": deleted,
+        "solve_seconds": round(solved - started, 3),
+    }
+    logger.info("Timetable solved for school %s: %s", school.id, {k: v for k, v in result.items() if k != "unplaced"})
+    return result
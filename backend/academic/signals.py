@@ -0,0 +1,234 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from schools.models import PlatformSettings, School, SchoolSettings
+
+from .ai_utils import invalidate_ai_config
+from .models import (
+    AttendanceRecord,
+    AttendanceSession,
+    AttendanceSummary,
+    Class,
+    Commendation,
+    ConductEntry,
+    ConductWarning,
+    ReportCard,
+    Student,
+    Subject,
+    SubjectScore,
+    Teacher,
+)
+from .services.attendance import apply_attendance_change, rebuild_attendance_summaries, record_marks, stored_marks
+from .services.behavior import conduct_entry_periods
+from .services.broadsheet import invalidate_broadsheets
+from .services.report_pdf import invalidate_report_pdfs
+
+logger = logging.getLogger(__name__)
+
+BROADSHEET_STUDENT_FIELDS = ("names", "student_no", "current_class_id")
+
+
+def _report_class_ids(report_card):
+    """
+    Classes whose broadsheet can contain this report card: the class it was issued
+    for, plus the student's current class (which is what the broadsheet filters on).
+    """
+    class_ids = {report_card.student_class_id}
+    if ReportCard.student.is_cached(report_card):
+        class_ids.add(report_card.student.current_class_id)
+    else:
+        class_ids.update(
+            Student.objects.filter(pk=report_card.student_id).values_list("current_class_id", flat=True)
+        )
+    return class_ids
+
+
+@receiver(post_save, sender=SubjectScore)
+@receiver(post_delete, sender=SubjectScore)
+def invalidate_broadsheet_on_score_change(sender, instance, **kwargs):
+    try:
+        report_card = instance.report_card
+    except ReportCard.DoesNotExist:
+        return
+    invalidate_broadsheets(
+        instance.school_id, _report_class_ids(report_card), session=report_card.session, term=report_card.term
+    )
+
+
+@receiver(post_save, sender=ReportCard)
+@receiver(post_delete, sender=ReportCard)
+def invalidate_broadsheet_on_report_change(sender, instance, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    # Trend/position-only saves don't change anything the broadsheet shows.
+    if update_fields and set(update_fields) <= {"performance_trend", "position"}:
+        return
+    invalidate_broadsheets(instance.school_id, _report_class_ids(instance), session=instance.session, term=instance.term)
+
+
+@receiver(post_save, sender=Student)
+def invalidate_broadsheet_on_student_change(sender, instance, created, **kwargs):
+    if created:
+        return
+    original = instance._original_values or {}
+    changed = [
+        name
+        for name in BROADSHEET_STUDENT_FIELDS
+        if name not in original or original[name] != getattr(instance, name, None)
+    ]
+    if not changed:
+        return
+    invalidate_broadsheets(instance.school_id, {instance.current_class_id, original.get("current_class_id")})
+
+
+@receiver(post_save, sender=Subject)
+def invalidate_broadsheet_on_subject_change(sender, instance, created, **kwargs):
+    # Snapshots store subject names; renames are rare, so drop every broadsheet of the school
+    if not created:
+        invalidate_broadsheets(instance.school_id)
+
+
+# --- Report card PDF digests -------------------------------------------------
+# Stored PDFs are content addressed; these only drop the cached digests that
+# let export_pdf skip recomputing them.
+
+
+@receiver(post_save, sender=SubjectScore)
+@receiver(post_delete, sender=SubjectScore)
+def invalidate_report_pdf_on_score_change(sender, instance, **kwargs):
+    student_id = (
+        instance.report_card.student_id
+        if SubjectScore.report_card.is_cached(instance)
+        else ReportCard.objects.filter(pk=instance.report_card_id).values_list("student_id", flat=True).first()
+    )
+    invalidate_report_pdfs(instance.school_id, [student_id])
+
+
+@receiver(post_save, sender=ReportCard)
+@receiver(post_delete, sender=ReportCard)
+def invalidate_report_pdf_on_report_change(sender, instance, **kwargs):
+    invalidate_report_pdfs(instance.school_id, [instance.student_id])
+
+
+@receiver(post_save, sender=Student)
+def invalidate_report_pdf_on_student_change(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_report_pdfs(instance.school_id, [instance.pk])
+
+
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=SchoolSettings)
+def invalidate_school_report_pdfs(sender, instance, **kwargs):
+    invalidate_report_pdfs(instance.school_id)
+
+
+@receiver(post_save, sender=School)
+def invalidate_report_pdfs_on_school_change(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_report_pdfs(instance.pk)
+
+
+# --- Behaviour analytics -----------------------------------------------------
+# A conduct record only changes its student's analytics, so those rows are
+# refreshed in the background instead of regenerating the whole term.
+
+
+def _queue_behavior_refresh(school_id, student_id, periods):
+    from .tasks import generate_behavior_analytics
+
+    for session, term in periods:
+        if session and term:
+            transaction.on_commit(
+                lambda s=session, t=term: generate_behavior_analytics.delay(school_id, s, t, student_ids=[student_id])
+            )
+
+
+@receiver(post_save, sender=ConductEntry)
+@receiver(post_delete, sender=ConductEntry)
+def refresh_behavior_on_conduct_entry(sender, instance, **kwargs):
+    periods = conduct_entry_periods(instance.school_id, instance.student_id, instance.date)
+    _queue_behavior_refresh(instance.school_id, instance.student_id, periods)
+
+
+@receiver(post_save, sender=Commendation)
+@receiver(post_delete, sender=Commendation)
+@receiver(post_save, sender=ConductWarning)
+@receiver(post_delete, sender=ConductWarning)
+def refresh_behavior_on_conduct_record(sender, instance, **kwargs):
+    # Existing terms as well, in case the record was moved to another term
+    periods = conduct_entry_periods(instance.school_id, instance.student_id, None)
+    periods.add((instance.session, instance.term))
+    _queue_behavior_refresh(instance.school_id, instance.student_id, periods)
+
+
+# --- Attendance summaries ---------------------------------------------------
+# Each record write moves its marks between AttendanceSummary counters (see
+# academic.services.attendance); class registers apply theirs in bulk.
+
+
+@receiver(pre_save, sender=AttendanceRecord)
+def capture_attendance_before_save(sender, instance, raw=False, **kwargs):
+    instance._attendance_before = [] if raw else stored_marks(instance)
+
+
+@receiver(post_save, sender=AttendanceRecord)
+def apply_attendance_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        apply_attendance_change(instance.school_id, getattr(instance, "_attendance_before", []), record_marks(instance))
+
+
+@receiver(pre_delete, sender=AttendanceRecord)
+def capture_attendance_before_delete(sender, instance, **kwargs):
+    instance._attendance_before = stored_marks(instance)
+
+
+@receiver(post_delete, sender=AttendanceRecord)
+def apply_attendance_on_delete(sender, instance, **kwargs):
+    apply_attendance_change(instance.school_id, getattr(instance, "_attendance_before", []), [])
+
+
+@receiver(pre_save, sender=AttendanceSession)
+def capture_attendance_session_period(sender, instance, raw=False, **kwargs):
+    instance._period_before = (
+        None
+        if raw or instance._state.adding
+        else AttendanceSession.objects.filter(pk=instance.pk).values_list("session", "term").first()
+    )
+
+
+@receiver(post_save, sender=AttendanceSession)
+def move_attendance_between_terms(sender, instance, created, **kwargs):
+    before = getattr(instance, "_period_before", None)
+    if created or not before or before == (instance.session, instance.term):
+        return
+    student_ids = list(instance.records.values_list("student_id", flat=True))
+    if student_ids:
+        for session, term in (before, (instance.session, instance.term)):
+            rebuild_attendance_summaries(instance.school_id, session, term, student_ids)
+
+
+@receiver(pre_save, sender=ReportCard)
+def fill_report_card_attendance(sender, instance, raw=False, **kwargs):
+    if raw or not instance._state.adding or instance.attendance_total:
+        return
+    summary = (
+        AttendanceSummary.objects.filter(student_id=instance.student_id, session=instance.session, term=instance.term)
+        .values_list("present", "total")
+        .first()
+    )
+    if summary:
+        instance.attendance_present, instance.attendance_total = summary
+
+
+# --- AI gateway -----------------------------------------------------------------
+# Provider keys and model choice are cached per process by the AI gateway.
+
+
+@receiver(post_save, sender=PlatformSettings)
+def reload_ai_config(sender, instance, **kwargs):
+    invalidate_ai_config()
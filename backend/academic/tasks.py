@@ -1,16 +1,15 @@
 import logging
-import os
-from io import BytesIO
 
 from celery import shared_task
 
+from django.core.files.storage import default_storage
 from django.db import transaction
-from django.conf import settings
-from django.template.loader import render_to_string
+from django.utils import timezone
 
 from schools.models import School, SchoolSettings
 
 from .models import Class, ReportCard, Student
+from .services.remarks import REMARK_JOB_TIME_LIMIT
 
 logger = logging.getLogger(__name__)
 
@@ -18,47 +17,19 @@ logger = logging.getLogger(__name__)
 @shared_task(bind=True)
 def generate_report_card_pdf(self, report_card_id: int, school_id: int):
     """
-    Generate PDF report card server-side.
-    Returns presigned URL for download.
+    Generate PDF report card server-side (reused if its content is unchanged).
+    Returns the storage URL for download.
     """
-    try:
-        from weasyprint import HTML
-
-        report_card = ReportCard.objects.select_related(
-            'student', 'student_class', 'school'
-        ).get(id=report_card_id, school_id=school_id)
-
-        # Render HTML template
-        html_content = render_to_string(
-            'academic/report_card.html',
-            {
-                'report_card': report_card,
-                'student': report_card.student,
-                'class': report_card.student_class,
-                'school': report_card.school,
-                'MEDIA_URL': settings.MEDIA_URL,
-                'STATIC_URL': settings.STATIC_URL,
-            }
-        )
-
-        # Generate PDF
-        pdf_file = HTML(string=html_content).write_pdf()
-
-        # Save to media
-        filename = f"report_cards/{school_id}/rc_{report_card_id}.pdf"
-        media_path = os.path.join(settings.MEDIA_ROOT, filename)
-
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(media_path), exist_ok=True)
+    from .services.report_pdf import render_report_card, report_queryset
 
-        with open(media_path, 'wb') as f:
-            f.write(pdf_file)
-
-        # Return URL
-        url = f"{settings.MEDIA_URL}{filename}"
+    try:
+        school = School.objects.get(id=school_id)
+        report_card = report_queryset(school).get(id=report_card_id)
+        result = render_report_card(report_card)
+        url = default_storage.url(result["path"])
 
         logger.info(f"Generated PDF for report card {report_card_id}: {url}")
-        return {'url': url, 'filename': filename}
+        return {'url': url, 'filename': result["path"], 'rendered': result["rendered"]}
 
     except Exception as e:
         logger.error(f"PDF generation failed for {report_card_id}: {e}")
@@ -66,54 +37,23 @@ def generate_report_card_pdf(self, report_card_id: int, school_id: int):
 
 
 @shared_task(bind=True)
-def generate_class_report_cards(self, class_id: int, session: str, term: str, school_id: int):
+def generate_class_report_cards(
+    self, class_id: int, session: str, term: str, school_id: int, merge: bool = False, bundle: bool = False
+):
     """
-    Batch generate report card PDFs for an entire class.
-    Returns list of URLs.
+    Batch generate report card PDFs for an entire class, skipping reports whose
+    stored PDF is current. Optionally also stores a merged class PDF and/or a
+    ZIP bundle. Returns the list of URLs.
     """
-    try:
-        from weasyprint import HTML
-
-        reports = ReportCard.objects.filter(
-            student_class_id=class_id,
-            session=session,
-            term=term,
-            school_id=school_id
-        ).select_related('student', 'student_class', 'school')
-
-        urls = []
-        for report in reports:
-            try:
-                html_content = render_to_string(
-                    'academic/report_card.html',
-                    {
-                        'report_card': report,
-                        'student': report.student,
-                        'class': report.student_class,
-                        'school': report.school,
-                        'MEDIA_URL': settings.MEDIA_URL,
-                        'STATIC_URL': settings.STATIC_URL,
-                    }
-                )
-
-                pdf_file = HTML(string=html_content).write_pdf()
-                filename = f"report_cards/{school_id}/rc_{report.id}.pdf"
-                media_path = os.path.join(settings.MEDIA_ROOT, filename)
-
-                os.makedirs(os.path.dirname(media_path), exist_ok=True)
-                with open(media_path, 'wb') as f:
-                    f.write(pdf_file)
-
-                urls.append({
-                    'report_id': report.id,
-                    'url': f"{settings.MEDIA_URL}{filename}"
-                })
-
-            except Exception as e:
-                logger.warning(f"Failed to generate PDF for report {report.id}: {e}")
+    from .services.report_pdf import render_class_report_cards
 
-        logger.info(f"Generated {len(urls)} PDFs for class {class_id}")
-        return {'generated': len(urls), 'urls': urls}
+    try:
+        school = School.objects.get(id=school_id)
+        result = render_class_report_cards(school, class_id, session, term, merge=merge, bundle=bundle)
+        logger.info(
+            f"Generated {result['generated']} PDFs for class {class_id} ({result['skipped']} unchanged)"
+        )
+        return result
 
     except Exception as e:
         logger.error(f"Batch PDF generation failed: {e}")
@@ -184,9 +124,10 @@ def promote_students_task(self, school_id, session, term):
 
 
 @shared_task(bind=True)
-def generate_school_report_cards(self, school_id, session, term):
+def generate_school_report_cards(self, school_id, session, term, merge=False, bundle=False):
     """
     Triggers report card PDF generation for all classes in a school.
+    Each class is its own task, so classes render in parallel across workers.
     """
     try:
         classes = Class.objects.filter(school_id=school_id)
@@ -195,9 +136,48 @@ def generate_school_report_cards(self, school_id, session, term):
                 class_id=cls.id,
                 session=session,
                 term=term,
-                school_id=school_id
+                school_id=school_id,
+                merge=merge,
+                bundle=bundle,
             )
         return {"status": "triggered", "classes_count": classes.count()}
     except Exception as e:
         logger.error(f"School report generation failed for {school_id}: {e}")
         return {"error": str(e)}
+
+
+@shared_task
+def generate_behavior_analytics(school_id, session, term, student_ids=None):
+    """
+    Recompute BehaviorAnalytics for a term: every active student, or only
+    `student_ids` (incremental refresh after a conduct record changes).
+    """
+    from .services.behavior import refresh_behavior_analytics
+
+    written = refresh_behavior_analytics(school_id, session, term, student_ids=student_ids)
+    logger.info(f"Behaviour analytics refreshed for school {school_id} {session} {term}: {written} student(s)")
+    return written
+
+
+@shared_task(bind=True, time_limit=REMARK_JOB_TIME_LIMIT, soft_time_limit=REMARK_JOB_TIME_LIMIT - 60)
+def generate_class_remarks_job(self, job_id):
+    """
+    Write AI remarks for a queued RemarkJob's class (see academic/services/remarks.py).
+    The soft time limit raises SoftTimeLimitExceeded, which marks the job failed below.
+    """
+    from .models import RemarkJob
+    from .services.remarks import generate_class_remarks
+
+    claimed = RemarkJob.objects.filter(id=job_id, status="queued").update(
+        status="running", error="", started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+
+    job = RemarkJob.objects.get(id=job_id)
+    try:
+        return generate_class_remarks(job)
+    except Exception as e:
+        logger.error(f"Remark job {job_id} failed: {e}")
+        RemarkJob.objects.filter(pk=job_id).update(status="failed", error=str(e))
+        return None
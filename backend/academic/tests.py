@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework import status
@@ -6,14 +8,17 @@ from rest_framework.test import APITestCase
 from academic.models import (
     AttendanceRecord,
     AttendanceSession,
+    AttendanceSummary,
     Class,
     ConductEntry,
+    GradeRange,
+    GradingScheme,
     ReportCard,
     Student,
     Subject,
     SubjectScore,
 )
-from schools.models import School
+from schools.models import School, SchoolSettings
 
 
 class AcademicRegressionTests(APITestCase):
@@ -105,3 +110,1059 @@ class AcademicRegressionTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("suggestion", response.data)
         self.assertEqual(response.data["data"]["attendance"]["present"], 1)
+
+
+class BroadsheetSnapshotTests(APITestCase):
+    def setUp(self):
+        self.school = School.objects.create(name="Snapshot School", domain="demo-snapshot")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@demo-snapshot",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+
+        self.student_class = Class.objects.create(name="JSS 2", school=self.school)
+        self.subject = Subject.objects.create(name="English", school=self.school)
+        self.students = [
+            Student.objects.create(
+                school=self.school,
+                student_no=f"SN00{i}",
+                names=name,
+                gender="Female",
+                current_class=self.student_class,
+            )
+            for i, name in enumerate(["Ada Obi", "Bola Ade"], start=1)
+        ]
+        self.scores = []
+        for student, exam in zip(self.students, [40, 60]):
+            report = ReportCard.objects.create(
+                school=self.school,
+                student=student,
+                student_class=self.student_class,
+                session="2025/2026",
+                term="First Term",
+            )
+            self.scores.append(
+                SubjectScore.objects.create(
+                    school=self.school, report_card=report, subject=self.subject, ca1=10, ca2=10, exam=exam
+                )
+            )
+        self.params = {"class_id": self.student_class.id, "session": "2025/2026", "term": "First Term"}
+
+    def _get(self, **extra):
+        return self.client.get("/api/academic/broadsheet/", self.params, HTTP_X_TENANT_ID=self.school.domain, **extra)
+
+    def test_snapshot_is_reused_and_supports_etag(self):
+        first = self._get()
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        positions = {row["student_name"]: row["position"] for row in first.data["students"]}
+        self.assertEqual(positions, {"Bola Ade": 1, "Ada Obi": 2})
+
+        with self.assertNumQueries(1):
+            from academic.services.broadsheet import get_broadsheet
+
+            get_broadsheet(self.school, self.student_class.id, "2025/2026", "First Term")
+
+        cached = self._get(HTTP_IF_NONE_MATCH=f'"other", W/{first["ETag"]}')
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        # A tag that merely contains the ETag is not a match
+        longer = self._get(HTTP_IF_NONE_MATCH=f'"x{first["ETag"].strip(chr(34))}x"')
+        self.assertEqual(longer.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH="*").status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_score_write_invalidates_snapshot(self):
+        first = self._get()
+
+        score = self.scores[0]
+        score.exam = 70
+        score.save()
+
+        second = self._get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        top = next(row for row in second.data["students"] if row["position"] == 1)
+        self.assertEqual(top["student_name"], "Ada Obi")
+
+    def test_subject_rename_invalidates_snapshot(self):
+        first = self._get()
+
+        self.subject.name = "English Language"
+        self.subject.save()
+
+        second = self._get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data["subjects"], ["English Language"])
+
+
+class ScoreIngestTests(APITestCase):
+    def setUp(self):
+        self.school = School.objects.create(name="Ingest School", domain="demo-ingest")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@demo-ingest",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.student_class = Class.objects.create(name="SS 1", school=self.school)
+        scheme = GradingScheme.objects.create(school=self.school, name="WAEC")
+        GradeRange.objects.create(school=self.school, scheme=scheme, grade="A1", min_score=75, max_score=100, remark="Excellent")
+        GradeRange.objects.create(school=self.school, scheme=scheme, grade="C4", min_score=0, max_score=74.99, remark="Credit")
+        self.reports = []
+        for i in range(3):
+            student = Student.objects.create(
+                school=self.school,
+                student_no=f"IN00{i}",
+                names=f"Student {i}",
+                gender="Male",
+                current_class=self.student_class,
+            )
+            self.reports.append(
+                ReportCard.objects.create(
+                    school=self.school,
+                    student=student,
+                    student_class=self.student_class,
+                    session="2025/2026",
+                    term="First Term",
+                    grading_scheme=scheme,
+                )
+            )
+
+    def test_bulk_ingest_grades_totals_and_ranks_in_few_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        entries = [
+            {"report_card": report.id, "subject": subject, "ca1": 10, "ca2": 10, "exam": 20 + 20 * i}
+            for i, report in enumerate(self.reports)
+            for subject in ("Mathematics", "English", "Biology")
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                "/api/academic/scores/bulk-ingest/",
+                {"scores": entries},
+                format="json",
+                HTTP_X_TENANT_ID=self.school.domain,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 9)
+        score_writes = [q for q in ctx.captured_queries if "academic_subjectscore" in q["sql"]]
+        self.assertLessEqual(len(score_writes), 3)  # existing lookup, bulk insert, totals aggregate
+
+        top = ReportCard.objects.get(pk=self.reports[2].pk)
+        self.assertEqual(top.total_score, 240)
+        self.assertEqual(top.average, 80)
+        self.assertEqual(top.position, 1)
+        self.assertEqual(set(top.scores.values_list("grade", flat=True)), {"A1"})
+        self.assertEqual(ReportCard.objects.get(pk=self.reports[0].pk).position, 3)
+
+    def test_bulk_ingest_updates_existing_scores_and_regrades(self):
+        from academic.services.scores import ingest_scores
+        from core.models import FieldChangeLog
+
+        ingest_scores(self.school, [{"report_card": self.reports[0].id, "subject": "Mathematics", "exam": 30}])
+        result = ingest_scores(
+            self.school, [{"report_card": self.reports[0].id, "subject": "Mathematics", "exam": 80}], user=self.admin
+        )
+
+        self.assertEqual(result["updated"], 1)
+        score = SubjectScore.objects.get(report_card=self.reports[0])
+        self.assertEqual((score.total, score.grade, score.comment), (80, "A1", "Excellent"))
+        self.assertTrue(FieldChangeLog.objects.filter(object_id=str(score.id), field_name="exam").exists())
+
+
+class ReportCardRenderingTests(APITestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from django.core.cache import cache
+        from django.test import override_settings
+
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.school = School.objects.create(name="Render School", domain="demo-render", address="1 School Road")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@demo-render", password="password123", role="SCHOOL_ADMIN", school=self.school
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.student_class = Class.objects.create(name="JSS 2", school=self.school)
+        self.reports = []
+        for i in range(3):
+            student = Student.objects.create(
+                school=self.school,
+                student_no=f"RN00{i}",
+                names=f"Pupil {i}",
+                gender="Female",
+                current_class=self.student_class,
+            )
+            report = ReportCard.objects.create(
+                school=self.school,
+                student=student,
+                student_class=self.student_class,
+                session="2025/2026",
+                term="First Term",
+            )
+            SubjectScore.objects.create(
+                school=self.school, report_card=report, subject=Subject.objects.get_or_create(
+                    school=self.school, name="Mathematics"
+                )[0], ca1=10, ca2=10, exam=40 + i,
+            )
+            self.reports.append(report)
+
+    def _render(self, **kwargs):
+        from academic.services.report_pdf import render_class_report_cards
+
+        return render_class_report_cards(self.school, self.student_class.id, "2025/2026", "First Term", **kwargs)
+
+    def test_unchanged_reports_are_not_rendered_again(self):
+        from django.core.files.storage import default_storage
+
+        from academic.services.report_pdf import period_folder
+
+        first = self._render()
+        self.assertEqual((first["generated"], first["skipped"]), (3, 0))
+
+        report = ReportCard.objects.get(pk=self.reports[1].pk)
+        report.teacher_remark = "A much improved term."
+        report.save()
+
+        second = self._render()
+        self.assertEqual((second["generated"], second["skipped"]), (1, 2))
+
+        # The superseded render of the edited report is removed
+        files = default_storage.listdir(period_folder(self.school.id, "2025/2026", "First Term"))[1]
+        self.assertEqual(len([f for f in files if f.startswith(f"rc_{report.id}_")]), 1)
+
+    def test_replacing_the_stored_logo_re_renders(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        path = default_storage.save("logos/render-school.png", ContentFile(b"old logo"))
+        self.school.logo = path
+        self.school.save()
+        self.assertEqual(self._render()["generated"], 3)
+        self.assertEqual(self._render()["skipped"], 3)
+
+        # Same path, new image: the School row does not change, the stored file does
+        default_storage.delete(path)
+        default_storage.save(path, ContentFile(b"the new school logo"))
+        self.assertEqual(self._render()["generated"], 3)
+
+    def test_merged_pdf_and_zip_bundle(self):
+        import zipfile
+
+        from django.core.files.storage import default_storage
+
+        result = self._render(merge=True, bundle=True)
+        folder = f"report_cards/{self.school.id}"
+        merged_path = result["merged_url"].split(f"/{folder}/", 1)[1]
+        bundle_path = result["bundle_url"].split(f"/{folder}/", 1)[1]
+
+        with default_storage.open(f"{folder}/{merged_path}", "rb") as f:
+            self.assertTrue(f.read(5).startswith(b"%PDF"))
+        with default_storage.open(f"{folder}/{bundle_path}", "rb") as f:
+            self.assertEqual(len(zipfile.ZipFile(f).namelist()), 3)
+
+        # Unchanged class: the merged file is reused
+        self.assertEqual(self._render(merge=True)["merged_url"], result["merged_url"])
+
+    def _export(self, report, **headers):
+        return self.client.get(
+            f"/api/academic/reports/{report.id}/export-pdf/", HTTP_X_TENANT_ID=self.school.domain, **headers
+        )
+
+    def test_export_pdf_is_rendered_once_and_revalidated(self):
+        from unittest import mock
+
+        from academic.utils import ReportCardPDFGenerator
+
+        report = self.reports[0]
+        with mock.patch.object(
+            ReportCardPDFGenerator, "generate_single", autospec=True, side_effect=ReportCardPDFGenerator.generate_single
+        ) as render:
+            first = self._export(report)
+            second = self._export(report)
+        self.assertEqual(render.call_count, 1)
+
+        self.assertEqual(first.status_code, 200)
+        body = b"".join(first.streaming_content)
+        self.assertTrue(body.startswith(b"%PDF"))
+        self.assertEqual(first["ETag"], second["ETag"])
+
+        self.assertEqual(self._export(report, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        partial = self._export(report, HTTP_RANGE="bytes=0-3")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.content, b"%PDF")
+        self.assertEqual(partial["Content-Range"], f"bytes 0-3/{len(body)}")
+        self.assertEqual(self._export(report, HTTP_RANGE=f"bytes={len(body)}-").status_code, 416)
+
+    def test_score_change_invalidates_export(self):
+        report = self.reports[0]
+        etag = self._export(report)["ETag"]
+
+        score = SubjectScore.objects.get(report_card=report)
+        score.exam = 55
+        score.save()
+
+        response = self._export(report, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class BehaviorAnalyticsTests(APITestCase):
+    def setUp(self):
+        from datetime import date
+
+        from academic.models import AcademicTerm
+
+        self.school = School.objects.create(name="Conduct School", domain="demo-conduct")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@demo-conduct", password="password123", role="SCHOOL_ADMIN", school=self.school
+        )
+        self.client.force_authenticate(user=self.admin)
+        AcademicTerm.objects.create(
+            school=self.school, session="2025/2026", name="First Term",
+            start_date=date(2000, 1, 1), end_date=date(2100, 1, 1),
+        )
+        self.students = [
+            Student.objects.create(school=self.school, student_no=f"CD00{i}", names=f"Pupil {i}", gender="Male")
+            for i in range(4)
+        ]
+
+    def _generate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(
+                "/api/academic/behavior-analytics/generate_all/",
+                {"session": "2025/2026", "term": "First Term"},
+                HTTP_X_TENANT_ID=self.school.domain,
+            )
+
+    def test_generate_all_uses_grouped_queries(self):
+        from academic.models import BehaviorAnalytics, Commendation, ConductEntry, ConductWarning
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        first = self.students[0]
+        ConductEntry.objects.create(school=self.school, student=first, trait="Neatness", score=2)
+        ConductEntry.objects.create(school=self.school, student=first, trait="Neatness", score=4)
+        ConductEntry.objects.create(school=self.school, student=first, trait="Punctuality", score=3)
+        Commendation.objects.create(
+            school=self.school, student=first, title="Prefect", points=8, session="2025/2026", term="First Term"
+        )
+        for severity in ("minor", "severe"):
+            ConductWarning.objects.create(
+                school=self.school, student=first, incident_type="other", severity=severity, description="-",
+                incident_date="2025-10-01", session="2025/2026", term="First Term",
+                parent_notification_method="meeting",
+            )
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._generate()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertLess(len(ctx.captured_queries), 20)
+
+        self.assertEqual(BehaviorAnalytics.objects.filter(school=self.school).count(), 4)
+        analytics = BehaviorAnalytics.objects.get(student=first, term="First Term")
+        self.assertEqual(analytics.avg_conduct_score, 3)
+        self.assertEqual(analytics.trait_scores, {"Neatness": 4, "Punctuality": 3})
+        self.assertEqual((analytics.commendation_points, analytics.warning_points), (8, 11))
+        self.assertEqual((analytics.total_warnings, analytics.parent_meetings), (2, 2))
+        self.assertEqual(analytics.overall_rating, "needs_improvement")
+        self.assertEqual(BehaviorAnalytics.objects.get(student=self.students[1]).overall_rating, "average")
+
+    def test_single_record_refreshes_its_student(self):
+        from academic.models import BehaviorAnalytics, Commendation
+
+        self._generate()
+        with self.captureOnCommitCallbacks(execute=True):
+            Commendation.objects.create(
+                school=self.school, student=self.students[2], title="Helper", points=6,
+                session="2025/2026", term="First Term",
+            )
+
+        analytics = BehaviorAnalytics.objects.get(student=self.students[2])
+        self.assertEqual((analytics.total_commendations, analytics.overall_rating), (1, "good"))
+
+
+class TimetableSolverTests(APITestCase):
+    def setUp(self):
+        from academic.models import Period, SubjectTeacher, Teacher
+
+        self.school = School.objects.create(name="Timetable School", domain="demo-timetable")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@demo-timetable", password="password123", role="SCHOOL_ADMIN", school=self.school
+        )
+        self.client.force_authenticate(user=self.admin)
+
+        self.assembly = Period.objects.create(
+            school=self.school, name="Assembly", start_time="08:00", end_time="08:15", category="Assembly"
+        )
+        for index in range(4):
+            Period.objects.create(
+                school=self.school,
+                name=f"Period {index + 1}",
+                start_time=f"{index + 8:02d}:15",
+                end_time=f"{index + 8:02d}:55",
+            )
+        self.subjects = {
+            name: Subject.objects.create(school=self.school, name=name)
+            for name in ("Mathematics", "English", "Science")
+        }
+        self.teachers = {
+            name: Teacher.objects.create(school=self.school, name=name) for name in ("Ada", "Bola", "Chidi", "Dayo")
+        }
+        self.classes = []
+        for name in ("JSS 1", "JSS 2"):
+            student_class = Class.objects.create(school=self.school, name=name)
+            student_class.subjects.set(self.subjects.values())
+            self.classes.append(student_class)
+            for subject, teacher in (("Mathematics", "Ada"), ("English", "Bola"), ("Science", "Chidi")):
+                SubjectTeacher.objects.create(
+                    school=self.school,
+                    teacher=self.teachers[teacher],
+                    student_class=student_class,
+                    subject=subject,
+                    session="2025/2026",
+                )
+
+    def _solve(self, **payload):
+        return self.client.post(
+            "/api/academic/timetables/solve/",
+            {"session": "2025/2026", "periods_per_week": {"Mathematics": 3, "*": 2}, **payload},
+            format="json",
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+
+    def _entries(self):
+        from academic.models import TimetableEntry
+
+        return TimetableEntry.objects.filter(school=self.school)
+
+    def test_solve_meets_hard_constraints_and_spreads_subjects(self):
+        response = self._solve()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["placed"], response.data["unplaced"]), (14, []))
+        self.assertEqual(response.data["penalty"], 0)
+
+        entries = list(
+            self._entries().values_list(
+                "timetable__student_class", "subject__name", "teacher__name", "day_of_week", "period"
+            )
+        )
+        self.assertEqual(len(entries), 14)
+        self.assertFalse([e for e in entries if e[4] == self.assembly.id])
+        teacher_slots = [(e[2], e[3], e[4]) for e in entries]
+        self.assertEqual(len(teacher_slots), len(set(teacher_slots)))
+        maths_days = [(e[0], e[3]) for e in entries if e[1] == "Mathematics"]
+        self.assertEqual(len(maths_days), 6)
+        self.assertEqual(len(set(maths_days)), 6)
+        expected_teachers = {"Mathematics": "Ada", "English": "Bola", "Science": "Chidi"}
+        self.assertTrue(all(e[2] == expected_teachers[e[1]] for e in entries))
+
+        # Solving again with nothing changed rewrites nothing
+        response = self._solve(keep_existing=True)
+        self.assertEqual((response.data["created"], response.data["deleted"]), (0, 0))
+
+    def test_teacher_resolve_only_moves_that_teachers_lessons(self):
+        from academic.models import SubjectTeacher
+
+        self._solve()
+        before = {entry.id: entry for entry in self._entries()}
+        SubjectTeacher.objects.filter(student_class=self.classes[1], subject="Science").update(
+            teacher=self.teachers["Dayo"]
+        )
+
+        response = self._solve(teacher_id=self.teachers["Dayo"].id)
+        self.assertEqual((response.data["created"], response.data["deleted"]), (2, 2))
+        after = {entry.id: entry for entry in self._entries()}
+        kept = set(before) & set(after)
+        self.assertEqual(len(kept), 12)
+        self.assertTrue(all(before[i].period_id == after[i].period_id for i in kept))
+        science = self._entries().filter(timetable__student_class=self.classes[1], subject=self.subjects["Science"])
+        self.assertEqual({e.teacher_id for e in science}, {self.teachers["Dayo"].id})
+
+    def test_entries_outside_the_grid_are_kept(self):
+        from academic.models import Period, Timetable, TimetableEntry
+
+        timetable = Timetable.objects.create(school=self.school, student_class=self.classes[0], title="JSS 1")
+        regular = Period.objects.filter(school=self.school, category="Regular").first()
+        assembly = TimetableEntry.objects.create(
+            school=self.school, timetable=timetable, day_of_week="Monday", period=self.assembly,
+            subject=self.subjects["English"],
+        )
+        saturday = TimetableEntry.objects.create(
+            school=self.school, timetable=timetable, day_of_week="Saturday", period=regular,
+            subject=self.subjects["English"],
+        )
+        friday = TimetableEntry.objects.create(
+            school=self.school, timetable=timetable, day_of_week="Friday", period=regular,
+            subject=self.subjects["Science"],
+        )
+
+        response = self._solve(days=["Monday", "Tuesday", "Wednesday", "Thursday"], periods_per_week={"*": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["deleted"], 0)
+        self.assertEqual(
+            set(self._entries().filter(id__in=[assembly.id, saturday.id, friday.id]).values_list("id", flat=True)),
+            {assembly.id, saturday.id, friday.id},
+        )
+
+    def test_unplaceable_demand_is_reported(self):
+        response = self._solve(periods_per_week={"*": 8}, dry_run=True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(item["missing"] for item in response.data["unplaced"]), 8)
+        self.assertFalse(self._entries().exists())
+
+        self.assertEqual(self._solve(days=["Funday"]).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_forty_class_school_is_conflict_free_and_deterministic(self):
+        from academic.management.commands.benchmark_timetable import synthetic_problem
+        from academic.services.timetable import solve
+
+        problem = synthetic_problem(40, 9, 8, 4, 5)
+        solution = solve(problem)
+        self.assertEqual(solution.unplaced, [])
+        self.assertEqual(len(solution.placements), 40 * 9 * 4)
+        teacher_slots = [(teacher, slot) for (_, slot), (_, teacher) in solution.placements.items()]
+        self.assertEqual(len(teacher_slots), len(set(teacher_slots)))
+        self.assertEqual(solve(problem).placements, solution.placements)
+
+
+class AIGatewayTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from academic import ai_utils
+        from schools.models import PlatformSettings
+
+        cache.clear()
+        ai_utils.invalidate_ai_config()
+        self.ai_utils = ai_utils
+        self.settings = PlatformSettings.objects.create(
+            id=1, ai_provider="openrouter", openrouter_api_key="test-key", openrouter_model="stub/model"
+        )
+        self.calls = []
+
+    def _stub(self, result="Stub answer", delay=0):
+        import time
+
+        def call(ai, prompt, model_override=None):
+            self.calls.append(prompt)
+            time.sleep(delay)
+            return result
+
+        return call
+
+    def test_config_is_cached_until_platform_settings_change(self):
+        self.ai_utils.AcademicAI()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ai_utils.AcademicAI().openrouter_model, "stub/model")
+
+        self.settings.openrouter_model = "stub/other"
+        self.settings.save()
+        self.assertEqual(self.ai_utils.AcademicAI().openrouter_model, "stub/other")
+
+    def test_identical_prompts_are_answered_from_cache(self):
+        from unittest import mock
+
+        student = {"name": "Ada", "scores": [], "conduct": [], "attendance": {}}
+        with mock.patch.object(self.ai_utils.AcademicAI, "_call_provider", self._stub()):
+            first = self.ai_utils.AcademicAI(school=1).generate_student_remark(student)
+            second = self.ai_utils.AcademicAI(school=2).generate_student_remark(student)
+            self.ai_utils.AcademicAI(use_cache=False).generate_student_remark(student)
+
+        self.assertEqual((first, second), ("Stub answer", "Stub answer"))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_concurrent_identical_prompts_share_one_call(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        gateway = self.ai_utils.AIGateway()
+        call = self._stub(delay=0.3)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(
+                pool.map(lambda _: gateway.generate("same prompt", lambda: call(None, "same prompt")), range(4))
+            )
+
+        self.assertEqual(results, ["Stub answer"] * 4)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_tenant_concurrency_is_limited(self):
+        from unittest import mock
+
+        gateway = self.ai_utils.AIGateway()
+        call = self._stub()
+        with mock.patch.multiple(self.ai_utils, AI_TENANT_CONCURRENCY=1, AI_TENANT_WAIT=0):
+            with gateway.tenant_slot(7):
+                self.assertIsNone(gateway.generate("busy", lambda: call(None, "busy"), tenant=7))
+                self.assertEqual(gateway.generate("other", lambda: call(None, "other"), tenant=8), "Stub answer")
+            self.assertEqual(gateway.generate("busy", lambda: call(None, "busy"), tenant=7), "Stub answer")
+        self.assertEqual(self.calls, ["other", "busy"])
+
+    def test_cache_outage_means_no_answer(self):
+        from unittest import mock
+
+        with mock.patch.object(self.ai_utils.AcademicAI, "_call_provider", self._stub()), mock.patch.object(
+            self.ai_utils.cache, "add", side_effect=ConnectionError("cache down")
+        ):
+            self.assertIsNone(self.ai_utils.AcademicAI(school=1, use_cache=False)._generate("Hello"))
+        self.assertEqual(self.calls, [])
+
+
+class ClassRemarkJobTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from academic import ai_utils
+        from schools.models import PlatformSettings
+
+        cache.clear()
+        ai_utils.invalidate_ai_config()
+        PlatformSettings.objects.create(id=1, ai_provider="openrouter", openrouter_api_key="test-key")
+
+        self.school = School.objects.create(name="Remark School", domain="demo-remarks")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@demo-remarks", password="password123", role="SCHOOL_ADMIN", school=self.school
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.jss1 = Class.objects.create(school=self.school, name="JSS 1")
+        maths = Subject.objects.create(school=self.school, name="Mathematics")
+        english = Subject.objects.create(school=self.school, name="English")
+
+        self.reports = {}
+        for number, (name, totals) in enumerate(
+            [("Ada Obi", (85, 90)), ("Bola Ade", (40, 60)), ("Chidi Eze", (70, 65)), ("Dayo Early", None)]
+        ):
+            student = Student.objects.create(
+                school=self.school, student_no=f"RM{number}", names=name, gender="Male", current_class=self.jss1
+            )
+            report = ReportCard.objects.create(
+                school=self.school, student=student, student_class=self.jss1, session="2025/2026", term="First Term"
+            )
+            if totals:
+                for subject, total in zip((maths, english), totals):
+                    SubjectScore.objects.create(school=self.school, report_card=report, subject=subject, exam=total)
+            else:
+                report.early_years_observations = [{"area": "Language", "status": "secure"}]
+                report.save()
+            self.reports[name] = report
+        self.prompts = []
+
+    def _provider(self):
+        import json
+        import re
+
+        def call(ai, prompt, model_override=None):
+            self.prompts.append(prompt)
+            students = json.loads(re.search(r"(\[\{.*\}\])", prompt).group(1))
+            # The model skips one student; the job falls back to the heuristic remark for them
+            return json.dumps({s["id"]: f"Model remark for {s['name']}." for s in students if s["name"] != "Bola Ade"})
+
+        return call
+
+    def _generate(self, **payload):
+        from unittest import mock
+
+        from academic.ai_utils import AcademicAI
+
+        with mock.patch.object(AcademicAI, "_call_provider", self._provider()):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/api/academic/reports/generate-remarks/",
+                    {"class_id": self.jss1.id, "session": "2025/2026", "term": "First Term", **payload},
+                    format="json",
+                    HTTP_X_TENANT_ID=self.school.domain,
+                )
+        return response
+
+    def _job(self, job_id):
+        return self.client.get(f"/api/academic/reports/remark-jobs/{job_id}/", HTTP_X_TENANT_ID=self.school.domain)
+
+    def test_class_remarks_are_written_in_one_job(self):
+        response = self._generate()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        job = self._job(response.data["id"]).data
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual((job["total"], job["processed"], job["ai_generated"]), (4, 4, 2))
+        # Three students with scores fit in one model request, within the prompt size limit
+        self.assertEqual(len(self.prompts), 1)
+        self.assertNotIn("[Truncated", self.prompts[0])
+
+        remarks = dict(
+            ReportCard.objects.filter(school=self.school).values_list("student__names", "ai_performance_remark")
+        )
+        self.assertEqual(remarks["Ada Obi"], "Model remark for Ada Obi.")
+        self.assertIn("below average", remarks["Bola Ade"])
+        self.assertIn("early-years progress", remarks["Dayo Early"])
+
+    def test_existing_remarks_are_kept_unless_overwriting(self):
+        ReportCard.objects.filter(pk=self.reports["Ada Obi"].pk).update(ai_performance_remark="Written by hand.")
+
+        job = self._job(self._generate().data["id"]).data
+        self.assertEqual(job["total"], 3)
+        self.assertEqual(
+            ReportCard.objects.get(pk=self.reports["Ada Obi"].pk).ai_performance_remark, "Written by hand."
+        )
+
+        job = self._job(self._generate(overwrite=True).data["id"]).data
+        self.assertEqual(job["total"], 4)
+        self.assertEqual(
+            ReportCard.objects.get(pk=self.reports["Ada Obi"].pk).ai_performance_remark, "Model remark for Ada Obi."
+        )
+
+    def test_one_job_per_class_at_a_time(self):
+        from academic.models import RemarkJob
+
+        job = RemarkJob.objects.create(
+            school=self.school, student_class=self.jss1, session="2025/2026", term="First Term"
+        )
+        response = self._generate()
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        # A job that waited in the queue is timed from its claim, not from its creation
+        RemarkJob.objects.filter(pk=job.pk).update(
+            status="running", created_at=timezone.now() - timedelta(hours=1), started_at=timezone.now()
+        )
+        self.assertEqual(self._generate().status_code, status.HTTP_409_CONFLICT)
+
+        # A job whose worker died is failed once it outlives the task's time limit
+        RemarkJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self._generate().status_code, status.HTTP_202_ACCEPTED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+
+        # So is a job the broker never delivered
+        lost = RemarkJob.objects.create(
+            school=self.school, student_class=self.jss1, session="2025/2026", term="First Term"
+        )
+        RemarkJob.objects.filter(pk=lost.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self._generate().status_code, status.HTTP_202_ACCEPTED)
+        lost.refresh_from_db()
+        self.assertEqual(lost.status, "failed")
+
+    def test_conduct_is_averaged_over_the_term(self):
+        from datetime import date
+
+        from academic.models import AcademicTerm, ConductEntry
+        from academic.services.remarks import remark_summaries
+
+        AcademicTerm.objects.create(
+            school=self.school, session="2025/2026", name="First Term",
+            start_date=date(2025, 9, 8), end_date=date(2025, 12, 12),
+        )
+        report = self.reports["Ada Obi"]
+        for score, day in ((4, date(2025, 10, 1)), (2, date(2025, 11, 1)), (5, date(2025, 6, 1))):
+            entry = ConductEntry.objects.create(
+                school=self.school, student=report.student, trait="Punctuality", score=score
+            )
+            ConductEntry.objects.filter(pk=entry.pk).update(date=day)
+
+        summaries, _ = remark_summaries(self.school.id, [report])
+        self.assertEqual(summaries[report.id]["conduct"], 3.0)
+
+
+class FieldChangeAuditTests(APITestCase):
+    def setUp(self):
+        self.school = School.objects.create(name="Audit School", domain="audit-school")
+        self.student_class = Class.objects.create(name="JSS 1", school=self.school)
+        self.other_class = Class.objects.create(name="JSS 2", school=self.school)
+        self.students = [
+            Student.objects.create(
+                school=self.school,
+                student_no=f"AU{index:03d}",
+                names=f"Student {index}",
+                gender="Female",
+                current_class=self.student_class,
+            )
+            for index in range(3)
+        ]
+
+    def _logs(self):
+        from core.models import FieldChangeLog
+
+        return FieldChangeLog.objects.filter(school=self.school, content_type="academic.student")
+
+    def test_loading_audited_instances_does_not_fetch_relations(self):
+        with self.assertNumQueries(1):
+            students = list(Student.objects.filter(school=self.school))
+        with self.assertNumQueries(1):
+            students[0].names = "Renamed"
+            self.assertEqual(students[0].audit_changes(), [(students[0], "names", "Student 0", "Renamed")])
+            # Deferred fields are not tracked, so touching them costs nothing extra
+            deferred = Student.objects.only("id", "names").get(pk=self.students[1].pk)
+            self.assertEqual(deferred.audit_changes(), [])
+
+    def test_saves_in_a_transaction_are_logged_with_one_insert_on_commit(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for student in Student.objects.filter(school=self.school):
+                    student.names = f"{student.names} Jr"
+                    student.current_class = self.other_class
+                    student.save()
+                self.assertFalse(self._logs().exists())
+
+        inserts = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "core_fieldchangelog"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self._logs().count(), 6)
+        log = self._logs().get(object_id=str(self.students[0].pk), field_name="current_class")
+        self.assertEqual((log.old_value, log.new_value), (str(self.student_class.pk), str(self.other_class.pk)))
+
+    def test_rolled_back_changes_are_not_logged(self):
+        from django.db import transaction
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    student = Student.objects.get(pk=self.students[0].pk)
+                    student.names = "Never saved"
+                    student.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            with transaction.atomic():
+                student = Student.objects.get(pk=self.students[1].pk)
+                student.names = "Saved"
+                student.save()
+
+        self.assertEqual(list(self._logs().values_list("object_id", "new_value")), [(str(student.pk), "Saved")])
+
+    def test_audited_update_and_bulk_update_log_changed_rows(self):
+        from core.audit import audit_batch, audited_bulk_update, audited_update
+
+        with audit_batch():
+            # Committed changes join the open batch rather than being written straight away
+            with self.captureOnCommitCallbacks(execute=True):
+                updated = audited_update(Student.objects.filter(school=self.school), current_class=self.other_class)
+                students = list(Student.objects.filter(school=self.school).order_by("id"))
+                students[0].names = "Bulk renamed"
+                audited_bulk_update(students, ["names"])
+            self.assertFalse(self._logs().exists())
+
+        self.assertEqual(updated, 3)
+        self.assertEqual(self._logs().filter(field_name="current_class").count(), 3)
+        self.assertEqual(
+            list(self._logs().filter(field_name="names").values_list("new_value", flat=True)), ["Bulk renamed"]
+        )
+        self.assertEqual(students[0].audit_changes(), [])
+
+
+class TermResultsEngineTests(APITestCase):
+    def setUp(self):
+        self.school = School.objects.create(name="Results School", domain="demo-results")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@demo-results",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.maths = Subject.objects.create(name="Mathematics", school=self.school)
+        self.english = Subject.objects.create(name="English", school=self.school)
+        self.classes = [Class.objects.create(name=name, school=self.school) for name in ("JSS 1", "JSS 2")]
+        # (maths, english) per student; the first two students of JSS 1 tie on total
+        self.reports = {}
+        marks = {self.classes[0]: [(70, 50), (50, 70), (40, 30)], self.classes[1]: [(90, 80)]}
+        for student_class, rows in marks.items():
+            for index, (maths, english) in enumerate(rows):
+                student = Student.objects.create(
+                    school=self.school,
+                    student_no=f"{student_class.name}-{index}",
+                    names=f"{student_class.name} Student {index}",
+                    gender="Female",
+                    current_class=student_class,
+                )
+                report = ReportCard.objects.create(
+                    school=self.school,
+                    student=student,
+                    student_class=student_class,
+                    session="2025/2026",
+                    term="First Term",
+                )
+                SubjectScore.objects.bulk_create(
+                    [
+                        SubjectScore(
+                            school=self.school, report_card=report, subject=subject, exam=total, total=total
+                        )
+                        for subject, total in ((self.maths, maths), (self.english, english))
+                    ]
+                )
+                self.reports[(student_class.id, index)] = report
+
+    def test_results_are_computed_and_unchanged_classes_skipped(self):
+        from academic.services.results import compute_term_results
+
+        result = compute_term_results(self.school, "2025/2026", "First Term")
+        self.assertEqual(result, {"computed": sorted(c.id for c in self.classes), "skipped": 0})
+
+        jss1 = self.classes[0].id
+        reports = {key: ReportCard.objects.get(pk=report.pk) for key, report in self.reports.items()}
+        self.assertEqual(
+            [(reports[(jss1, i)].total_score, reports[(jss1, i)].position) for i in range(3)],
+            [(120, 1), (120, 1), (70, 3)],
+        )
+        self.assertEqual(
+            list(
+                SubjectScore.objects.filter(report_card__student_class_id=jss1, subject=self.maths)
+                .order_by("-total")
+                .values_list("position", flat=True)
+            ),
+            [1, 2, 3],
+        )
+
+        response = self.client.get(
+            "/api/academic/reports/class-results/",
+            {"class_id": jss1, "session": "2025/2026", "term": "First Term"},
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["student_count"], 3)
+        self.assertEqual(
+            response.data["subject_stats"][str(self.maths.id)],
+            {"name": "Mathematics", "highest": 70, "lowest": 40, "mean": 53.33, "count": 3},
+        )
+
+        with self.assertNumQueries(3):
+            self.assertEqual(compute_term_results(self.school, "2025/2026", "First Term")["computed"], [])
+
+    def test_only_classes_with_changed_scores_are_recomputed(self):
+        from academic.services.results import compute_term_results
+
+        compute_term_results(self.school, "2025/2026", "First Term")
+        jss1 = self.classes[0].id
+        score = SubjectScore.objects.get(report_card=self.reports[(jss1, 2)], subject=self.english)
+        score.exam = 95
+        score.save()
+
+        response = self.client.post(
+            "/api/academic/reports/recalculate-positions/",
+            {"session": "2025/2026", "term": "First Term"},
+            format="json",
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["computed_classes"], response.data["skipped_classes"]), ([jss1], 1))
+        report = ReportCard.objects.get(pk=self.reports[(jss1, 2)].pk)
+        self.assertEqual((report.total_score, report.position), (135, 1))
+        self.assertEqual(SubjectScore.objects.get(pk=score.pk).position, 1)
+
+
+class AttendanceRegisterTests(APITestCase):
+    def setUp(self):
+        self.school = School.objects.create(name="Register School", domain="demo-register")
+        SchoolSettings.objects.create(school=self.school, current_session="2025/2026", current_term="First Term")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@demo-register",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.student_class = Class.objects.create(name="JSS 1", school=self.school)
+        self.students = [
+            Student.objects.create(
+                school=self.school,
+                student_no=f"REG{index}",
+                names=f"Register Student {index}",
+                gender="Female",
+                current_class=self.student_class,
+            )
+            for index in range(3)
+        ]
+        self.report = ReportCard.objects.create(
+            school=self.school,
+            student=self.students[0],
+            student_class=self.student_class,
+            session="2025/2026",
+            term="First Term",
+        )
+
+    def _register(self, day, statuses, **extra):
+        return self.client.post(
+            "/api/academic/attendance-sessions/register/",
+            {
+                "class_id": self.student_class.id,
+                "date": day,
+                "records": [{"student": s.id, "status": mark} for s, mark in zip(self.students, statuses)],
+                **extra,
+            },
+            format="json",
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+
+    def _counts(self, student):
+        summary = AttendanceSummary.objects.get(student=student, session="2025/2026", term="First Term")
+        return summary.present, summary.absent, summary.late, summary.total
+
+    def test_register_upserts_records_and_maintains_summaries(self):
+        response = self._register("2026-01-12", ["present", "absent", "late"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["created"], response.data["updated"]), (3, 0))
+        self._register("2026-01-13", ["present", "present", "present"])
+
+        # Resubmitting a day corrects it in place
+        response = self._register("2026-01-12", ["absent", "absent", "late"])
+        self.assertEqual((response.data["created"], response.data["updated"], response.data["unchanged"]), (0, 1, 2))
+
+        self.assertEqual(AttendanceSession.objects.filter(school=self.school).count(), 2)
+        self.assertEqual(AttendanceRecord.objects.filter(school=self.school).count(), 6)
+        self.assertEqual(self._counts(self.students[0]), (1, 1, 0, 2))
+        self.assertEqual(self._counts(self.students[2]), (1, 0, 1, 2))
+        self.report.refresh_from_db()
+        self.assertEqual((self.report.attendance_present, self.report.attendance_total), (1, 2))
+
+        response = self.client.get(
+            "/api/academic/attendance-records/summary/",
+            {"class_id": self.student_class.id},
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+        rows = {row["student"]: row for row in response.data["results"]}
+        self.assertEqual(rows[self.students[1].id]["rate"], 50.0)
+
+    def test_single_record_writes_update_summary(self):
+        self._register("2026-01-12", ["present", "present", "present"])
+        record = AttendanceRecord.objects.get(student=self.students[0])
+
+        record.status = "absent"
+        record.save()
+        self.assertEqual(self._counts(self.students[0]), (0, 1, 0, 1))
+
+        record.delete()
+        self.assertEqual(self._counts(self.students[0]), (0, 0, 0, 0))
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.attendance_total, 0)
+
+        # Moving a session to another term moves its marks with it
+        attendance_session = AttendanceSession.objects.get(school=self.school)
+        attendance_session.term = "Second Term"
+        attendance_session.save()
+        self.assertFalse(AttendanceSummary.objects.filter(student=self.students[1], term="First Term").exists())
+        moved = AttendanceSummary.objects.get(student=self.students[1], term="Second Term")
+        self.assertEqual((moved.present, moved.total), (1, 1))
+
+    def test_register_rejects_students_from_other_schools(self):
+        other = School.objects.create(name="Other School", domain="other-register")
+        stranger = Student.objects.create(school=other, student_no="X1", names="Stranger", gender="Male")
+        response = self.client.post(
+            "/api/academic/attendance-sessions/register/",
+            {
+                "class_id": self.student_class.id,
+                "date": "2026-01-12",
+                "records": [{"student": stranger.id, "status": "present"}],
+            },
+            format="json",
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(AttendanceRecord.objects.exists())
@@ -1,12 +1,18 @@
+import base64
 import io
+import logging
 import os
+from types import SimpleNamespace
 
 from django.conf import settings as django_settings
 from django.core.files.storage import default_storage
+from django.utils.functional import cached_property
 
 from schools.models import SchoolSettings
 
-from .models import GradingScheme, ReportCard, Student, Subject
+from .models import GradingScheme, ReportCard, Student, Subject, SubjectScore
+
+logger = logging.getLogger(__name__)
 
 
 def compute_performance_trend(averages: list[float]) -> str:
@@ -144,15 +150,132 @@ class BroadsheetPDFGenerator:
         return buffer
 
 
+def image_storage_path(source):
+    """Storage path of an image stored as a path (or media URL path), or None for data URIs and http(s) URLs."""
+    source = str(source or "")
+    if not source or source.startswith(("data:", "http://", "https://")):
+        return None
+    path = source.lstrip("/")
+    media_prefix = django_settings.MEDIA_URL.lstrip("/")
+    if media_prefix and path.startswith(media_prefix):
+        path = path[len(media_prefix):]
+    return path
+
+
+def load_image_bytes(source):
+    """
+    Raw bytes of an image stored as a data URI, an http(s) URL or a storage
+    path (the forms logos, passports and signatures are saved in). None if it
+    cannot be read.
+    """
+    if not source:
+        return None
+    try:
+        if hasattr(source, "path") and os.path.exists(source.path):
+            with open(source.path, "rb") as f:
+                return f.read()
+        source = str(source)
+        if source.startswith("data:"):
+            return base64.b64decode(source.split(",", 1)[1])
+        if source.startswith(("http://", "https://")):
+            import requests
+
+            response = requests.get(source, timeout=10)
+            response.raise_for_status()
+            return response.content
+        with default_storage.open(image_storage_path(source), "rb") as f:
+            return f.read()
+    except Exception as e:
+        logger.debug(f"Could not load report image {source[:80]!r}: {e}")
+        return None
+
+
+def load_report_history(school, student_ids):
+    """{student_id: [row, ...]} of every report card's progression fields, one query for all students."""
+    history = {}
+    for row in ReportCard.objects.filter(school=school, student_id__in=student_ids).values(
+        "student_id",
+        "session",
+        "term",
+        "average",
+        "position",
+        "attendance_present",
+        "attendance_total",
+        "is_passed",
+    ):
+        history.setdefault(row["student_id"], []).append(SimpleNamespace(**row))
+    return history
+
+
+def load_report_scores(report_ids):
+    """{report_card_id: [(subject, ca1, ca2, exam, total, grade, comment), ...]} in one query."""
+    scores = {}
+    for row in (
+        SubjectScore.objects.filter(report_card_id__in=report_ids)
+        .order_by("id")
+        .values_list("report_card_id", "subject__name", "ca1", "ca2", "exam", "total", "grade", "comment")
+    ):
+        scores.setdefault(row[0], []).append(row[1:])
+    return scores
+
+
 class ReportCardPDFGenerator:
+    """
+    ReportLab report cards. One generator is meant to serve a whole batch:
+    styles are built once and every image (logo, signatures, passports) is
+    fetched once and reused from memory for each report that shows it.
+    """
+
     def __init__(self, school):
         self.school = school
         self.settings = SchoolSettings.objects.filter(school=school).first()
+        self._images = {}
 
-    def _get_styles(self):
-        from reportlab.lib.styles import getSampleStyleSheet
+    @cached_property
+    def styles(self):
+        from reportlab.lib import colors
+        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+
+        styles = getSampleStyleSheet()
+        styles.add(
+            ParagraphStyle(
+                "AIIntro",
+                parent=styles["Normal"],
+                fontSize=9,
+                textColor=colors.HexColor("#334155"),
+                backColor=colors.HexColor("#f8fafc"),
+                borderPadding=8,
+                borderWidth=1,
+                borderColor=colors.HexColor("#e2e8f0"),
+                borderRadius=4
+            )
+        )
+        styles.add(
+            ParagraphStyle(
+                "ProgressionTitle",
+                parent=styles["Heading4"],
+                textColor=colors.HexColor("#1e3a8a"),
+                spaceAfter=6,
+                fontName="Helvetica-Bold",
+            )
+        )
+        styles.add(
+            ParagraphStyle(
+                "RemarkBox",
+                parent=styles["Normal"],
+                fontSize=9,
+                backColor=colors.HexColor("#f1f5f9"),
+                borderPadding=10,
+                borderWidth=0.5,
+                borderColor=colors.HexColor("#cbd5e1"),
+                borderRadius=5,
+                spaceAfter=15
+            )
+        )
+        return styles
 
-        return getSampleStyleSheet()
+    def _get_styles(self):
+        return self.styles
 
     def _get_image(self, field, width=None):
         from reportlab.lib.units import inch
@@ -163,56 +286,69 @@ class ReportCardPDFGenerator:
 
         if not field:
             return None
+        key = field if isinstance(field, str) else getattr(field, "name", str(field))
+        if key not in self._images:
+            self._images[key] = load_image_bytes(field)
+        data = self._images[key]
+        if not data:
+            return None
         try:
-            # Handle local vs S3 storage
-            if hasattr(field, "path") and os.path.exists(field.path):
-                img_path = field.path
-            else:
-                # Fallback for S3 or other storages
-                img_path = field.url
-            return Image(img_path, width=width, preserveAspectRatio=True)
+            return Image(io.BytesIO(data), width=width, preserveAspectRatio=True)
         except Exception:
             return None
 
-    def generate_single(self, report_card):
+    def generate_single(self, report_card, scores=None, history=None):
         from reportlab.lib.pagesizes import A4
         from reportlab.platypus import SimpleDocTemplate
 
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=40, leftMargin=40, topMargin=40, bottomMargin=40)
-        elements = self._create_report_content(report_card)
+        elements = self._create_report_content(report_card, scores=scores, history=history)
         doc.build(elements)
         buffer.seek(0)
         return buffer
 
-    def generate_bulk(self, student_class, session, term):
+    def generate_bulk(self, student_class, session, term, reports=None):
         from reportlab.lib.pagesizes import A4
         from reportlab.platypus import PageBreak, SimpleDocTemplate
 
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=40, leftMargin=40, topMargin=40, bottomMargin=40)
 
-        reports = ReportCard.objects.filter(
-            school=self.school, student_class=student_class, session=session, term=term
-        ).select_related("student")
+        if reports is None:
+            reports = list(
+                ReportCard.objects.filter(
+                    school=self.school, student_class=student_class, session=session, term=term
+                ).select_related("school", "student", "student_class__class_teacher")
+            )
+        scores = load_report_scores([report.id for report in reports])
+        history = load_report_history(self.school, {report.student_id for report in reports})
 
         all_elements = []
         for i, report in enumerate(reports):
             if i > 0:
                 all_elements.append(PageBreak())
-            all_elements.extend(self._create_report_content(report))
+            all_elements.extend(
+                self._create_report_content(
+                    report, scores=scores.get(report.id, []), history=history.get(report.student_id, [])
+                )
+            )
 
         doc.build(all_elements)
         buffer.seek(0)
         return buffer
 
-    def _create_report_content(self, report):
+    def _create_report_content(self, report, scores=None, history=None):
+        """
+        Flowables for one report card. `scores` ([(subject, ca1, ca2, exam, total,
+        grade, comment)]) and `history` (load_report_history rows) are loaded
+        here when the caller has not preloaded them for a batch.
+        """
         from reportlab.lib import colors
-        from reportlab.lib.styles import ParagraphStyle
         from reportlab.lib.units import inch
         from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
 
-        styles = self._get_styles()
+        styles = self.styles
         elements = []
         student = report.student
         is_early_years = (
@@ -221,13 +357,13 @@ class ReportCardPDFGenerator:
         )
 
         # 1. Header Section
-        logo = self._get_image(self.settings.logo_media, width=1.2 * inch) if self.settings else None
+        logo = self._get_image(self.school.logo, width=1.2 * inch)
 
         header_data = []
         school_info = [
             Paragraph(self.school.name.upper(), styles["Heading1"]),
-            Paragraph(self.settings.school_tagline if self.settings else "", styles["Normal"]),
-            Paragraph(self.settings.school_address if self.settings else "", styles["Normal"]),
+            Paragraph((self.settings.school_tagline or "") if self.settings else "", styles["Normal"]),
+            Paragraph(self.school.address or "", styles["Normal"]),
         ]
 
         if logo:
@@ -287,18 +423,9 @@ class ReportCardPDFGenerator:
         ai_intro = report.ai_performance_remark  # We'll use this as the outlook if available
         # Actually, let's call a specific service or just use the field if populated
         if ai_intro:
-            intro_style = ParagraphStyle(
-                "AIIntro",
-                parent=styles["Normal"],
-                fontSize=9,
-                textColor=colors.HexColor("#334155"),
-                backColor=colors.HexColor("#f8fafc"),
-                borderPadding=8,
-                borderWidth=1,
-                borderColor=colors.HexColor("#e2e8f0"),
-                borderRadius=4
+            elements.append(
+                Paragraph(f"<b>ACADEMIC PERFORMANCE OUTLOOK (AI ANALYSIS):</b><br/>{ai_intro}", styles["AIIntro"])
             )
-            elements.append(Paragraph(f"<b>ACADEMIC PERFORMANCE OUTLOOK (AI ANALYSIS):</b><br/>{ai_intro}", intro_style))
             elements.append(Spacer(1, 0.2 * inch))
 
         # 3. Academic/Learning Table
@@ -356,9 +483,10 @@ class ReportCardPDFGenerator:
             score_header = ["Subject", "CA1", "CA2", "Exam", "Total", "Grade", "Remark"]
             score_data = [score_header]
 
-            scores = report.scores.all().select_related("subject")
-            for s in scores:
-                score_data.append([s.subject.name, s.ca1, s.ca2, s.exam, s.total, s.grade, s.comment])
+            if scores is None:
+                scores = load_report_scores([report.id]).get(report.id, [])
+            for row in scores:
+                score_data.append(list(row))
 
             score_table = Table(
                 score_data, colWidths=[2 * inch, 0.6 * inch, 0.6 * inch, 0.6 * inch, 0.6 * inch, 0.6 * inch, 1.4 * inch]
@@ -426,31 +554,14 @@ class ReportCardPDFGenerator:
             except Exception:
                 return 0
 
-        history = list(
-            ReportCard.objects.filter(school=self.school, student=student).only(
-                "id",
-                "session",
-                "term",
-                "average",
-                "position",
-                "attendance_present",
-                "attendance_total",
-                "is_passed",
-                "early_years_observations",
-            )
-        )
+        if history is None:
+            history = load_report_history(self.school, [student.id]).get(student.id, [])
+        history = list(history)
         history.sort(key=lambda rc: (_session_start(rc.session), _term_order(rc.term)))
         history = history[-6:]
 
         if history:
-            progression_title = ParagraphStyle(
-                "ProgressionTitle",
-                parent=styles["Heading4"],
-                textColor=colors.HexColor("#1e3a8a"),
-                spaceAfter=6,
-                fontName="Helvetica-Bold",
-            )
-            elements.append(Paragraph("TERM PROGRESSION", progression_title))
+            elements.append(Paragraph("TERM PROGRESSION", styles["ProgressionTitle"]))
 
             progression_data = [["Session", "Term", "Average", "Position", "Attendance", "Growth", "Status"]]
             for idx, row in enumerate(history):
@@ -512,18 +623,8 @@ class ReportCardPDFGenerator:
             elements.append(Spacer(1, 0.2 * inch))
 
         # 5. Remarks & Signatures
-        remark_box_style = ParagraphStyle(
-            "RemarkBox",
-            parent=styles["Normal"],
-            fontSize=9,
-            backColor=colors.HexColor("#f1f5f9"),
-            borderPadding=10,
-            borderWidth=0.5,
-            borderColor=colors.HexColor("#cbd5e1"),
-            borderRadius=5,
-            spaceAfter=15
-        )
-        
+        remark_box_style = styles["RemarkBox"]
+
         elements.append(Paragraph(f"<b>Class Teacher's Remark:</b><br/>{report.teacher_remark or 'Consult class teacher for detailed feedback.'}", remark_box_style))
         elements.append(Paragraph(f"<b>Head Teacher's Remark:</b><br/>{report.head_teacher_remark or 'Satisfactory performance.'}", remark_box_style))
 
@@ -566,6 +667,7 @@ class ReportCardPDFGenerator:
     def _generate_qr_code(self, report):
         """Generates a QR code for report card verification."""
         import qrcode
+        from reportlab.lib.units import inch
         from reportlab.platypus import Image
         
         # Build verification URL
@@ -13,8 +13,8 @@ from core.tenant_utils import get_request_school
 
 from ..ai_utils import AcademicAI
 from ..models import (
-    AttendanceRecord,
     AttendanceSession,
+    AttendanceSummary,
     Class,
     ConductEntry,
     Period,
@@ -57,12 +57,11 @@ class AIInsightsView(APIView):
         at_risk_count = report_cards.filter(average__lt=50).count()
 
         # Simple attendance average
-        attendance_records = AttendanceRecord.objects.filter(
-            school=school, attendance_session__session=session, attendance_session__term=term
+        attendance = AttendanceSummary.objects.filter(school=school, session=session, term=term).aggregate(
+            present=models.Sum("present"), total=models.Sum("total")
         )
-        total_att = attendance_records.count()
-        present_att = attendance_records.filter(status__iexact="present").count()
-        avg_attendance = (present_att / total_att * 100) if total_att > 0 else 0
+        total_att = attendance["total"] or 0
+        avg_attendance = (attendance["present"] / total_att * 100) if total_att > 0 else 0
 
         summary_data = {
             "at_risk_count": at_risk_count,
@@ -71,7 +70,7 @@ class AIInsightsView(APIView):
             "trends": {"average_score": report_cards.aggregate(models.Avg("average"))["average__avg"] or 0},
         }
 
-        ai = AcademicAI()
+        ai = AcademicAI(school=school)
         insights = ai.generate_executive_insights(summary_data)
 
         return Response(
@@ -114,15 +113,19 @@ class AITimetableGenerateView(APIView):
                 class_subjects.append({"id": str(s.id), "name": s.name, "periods_per_week": 4})
             school_data["classes"].append({"id": str(c.id), "name": c.name, "subjects": class_subjects})
 
+        # Expertise is inferred from SubjectTeacher if available
+        expertise = collections.defaultdict(list)
+        for teacher_id, subject in (
+            SubjectTeacher.objects.filter(teacher__in=teachers_qs).values_list("teacher_id", "subject").distinct()
+        ):
+            expertise[teacher_id].append(subject)
         for t in teachers_qs:
-            # Expertise is inferred from SubjectTeacher if available
-            expertise = list(SubjectTeacher.objects.filter(teacher=t).values_list("subject", flat=True).distinct())
-            school_data["teachers"].append({"id": str(t.id), "name": t.name, "expertise": expertise})
+            school_data["teachers"].append({"id": str(t.id), "name": t.name, "expertise": expertise[t.id]})
 
         for p in periods_qs:
             school_data["periods"].append({"id": str(p.id), "name": p.name, "category": p.category})
 
-        ai = AcademicAI()
+        ai = AcademicAI(school=school)
         try:
             entries = ai.generate_timetable(school_data)
         except Exception as e:
@@ -149,6 +152,7 @@ class AITimetableGenerateView(APIView):
         }
 
         entries_to_create = []
+        slots_to_clear = set()
 
         with transaction.atomic():
             for entry_data in entries:
@@ -170,10 +174,8 @@ class AITimetableGenerateView(APIView):
                         )
                         timetables_map[class_id] = timetable
 
-                    # Delete selective slot
-                    TimetableEntry.objects.filter(
-                        timetable=timetable, day_of_week=entry_data["day"], period_id=entry_data["period_id"]
-                    ).delete()
+                    # Slot is cleared below, in one delete for the whole run
+                    slots_to_clear.add((timetable.id, entry_data["day"], str(entry_data["period_id"])))
 
                     teacher_id = entry_data.get("teacher_id")
 
@@ -193,6 +195,16 @@ class AITimetableGenerateView(APIView):
 
             # Bulk Create all entries
             if entries_to_create:
+                existing = TimetableEntry.objects.filter(
+                    timetable_id__in={timetable_id for timetable_id, _, _ in slots_to_clear}
+                ).values_list("id", "timetable_id", "day_of_week", "period_id")
+                TimetableEntry.objects.filter(
+                    id__in=[
+                        entry_id
+                        for entry_id, timetable_id, day, period_id in existing
+                        if (timetable_id, day, str(period_id)) in slots_to_clear
+                    ]
+                ).delete()
                 TimetableEntry.objects.bulk_create(entries_to_create)
 
         return Response({"success": True, "message": "Timetable generated successfully"})
@@ -293,19 +305,11 @@ class AIPredictiveInsightsView(APIView):
             student_class=student_class, school=school, session=session, term=term
         ).count()
 
-        attendance_counts = {
-            r["student"]: r["count"]
-            for r in AttendanceRecord.objects.filter(
-                attendance_session__student_class=student_class,
-                attendance_session__school=school,
-                attendance_session__session=session,
-                attendance_session__term=term,
-                student_id__in=student_ids,
-                status="present",
-            )
-            .values("student")
-            .annotate(count=models.Count("id"))
-        }
+        attendance_counts = dict(
+            AttendanceSummary.objects.filter(
+                school=school, session=session, term=term, student_id__in=student_ids
+            ).values_list("student_id", "present")
+        )
 
         # 3. Bulk fetch conduct scores (latest 10 per student)
         conduct_map = collections.defaultdict(list)
@@ -327,7 +331,7 @@ class AIPredictiveInsightsView(APIView):
         for r in all_past_reports:
             historical_reports[r["student_id"]].append(r["average"])
 
-        ai = AcademicAI()
+        ai = AcademicAI(school=school)
         predictions = []
 
         for student in students:
@@ -434,7 +438,7 @@ class AILessonPlanView(APIView):
         if not all([subject, class_name, topic]):
             return Response({"error": "subject, class_name, and topic are required."}, status=400)
 
-        ai = AcademicAI()
+        ai = AcademicAI(school=get_request_school(request))
         plan = ai.generate_lesson_plan(
             {
                 "subject": subject,
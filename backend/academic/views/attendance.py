@@ -1,11 +1,16 @@
 """Attendance ViewSets."""
 
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.response import Response
+
 from core.pagination import LargePagination, StandardPagination
-from core.tenant_utils import get_request_school
-from schools.models import SchoolSettings
+from core.tenant_utils import get_current_period, get_request_school
 
-from ..models import AttendanceRecord, AttendanceSession
-from ..serializers import AttendanceRecordSerializer, AttendanceSessionSerializer
+from ..models import AttendanceRecord, AttendanceSession, AttendanceSummary, Class, Student
+from ..serializers import AttendanceRecordSerializer, AttendanceSessionSerializer, AttendanceSummarySerializer
+from ..services.attendance import STATUSES, save_class_register
 from .base import TenantViewSet
 
 
@@ -37,12 +42,9 @@ class AttendanceSessionViewSet(TenantViewSet):
         include_all_periods = _is_truthy(self.request.query_params.get("include_all_periods"))
 
         if not include_all_periods:
-            school = get_request_school(self.request)
-            if school:
-                settings_obj = SchoolSettings.objects.filter(school=school).only("current_session", "current_term").first()
-                if settings_obj:
-                    session = session or settings_obj.current_session
-                    term = term or settings_obj.current_term
+            current_session, current_term = get_current_period(get_request_school(self.request))
+            session = session or current_session
+            term = term or current_term
 
         if class_id:
             qs = qs.filter(student_class_id=class_id)
@@ -54,6 +56,53 @@ class AttendanceSessionViewSet(TenantViewSet):
             qs = qs.filter(term=term)
         return qs
 
+    @action(detail=False, methods=["post"], url_path="register")
+    def register(self, request):
+        """
+        Mark a whole class for one day: {"class_id", "date", "session"?, "term"?,
+        "records": [{"student", "status", "remark"?}]}. Records are upserted, so
+        the register can be resubmitted with corrections.
+        """
+        school = get_request_school(request)
+        if not school:
+            raise PermissionDenied("School context not found.")
+
+        try:
+            date = parse_date(str(request.data.get("date") or ""))
+        except ValueError:
+            date = None
+        if date is None:
+            return Response({"error": "date (YYYY-MM-DD) is required"}, status=400)
+        student_class = Class.objects.filter(school=school, id=request.data.get("class_id")).first()
+        if student_class is None:
+            return Response({"error": "Class not found"}, status=404)
+
+        records = request.data.get("records")
+        if not isinstance(records, list) or not records:
+            return Response({"error": "records must be a non-empty list"}, status=400)
+        entries = {}
+        for index, record in enumerate(records):
+            status = record.get("status") if isinstance(record, dict) else None
+            if status not in STATUSES:
+                return Response({"error": f"records[{index}].status must be one of {', '.join(STATUSES)}"}, status=400)
+            try:
+                student_id = int(record.get("student"))
+            except (TypeError, ValueError):
+                return Response({"error": f"records[{index}].student must be a student id"}, status=400)
+            entries[student_id] = (status, str(record.get("remark") or "")[:255])
+
+        unknown = set(entries) - set(Student.objects.filter(school=school, id__in=entries).values_list("id", flat=True))
+        if unknown:
+            return Response({"error": "Students not found in this school", "students": sorted(unknown)}, status=400)
+
+        current_session, current_term = get_current_period(school)
+        session = request.data.get("session") or current_session
+        term = request.data.get("term") or current_term
+        if not session or not term:
+            return Response({"error": "session and term are required"}, status=400)
+
+        return Response(save_class_register(school, student_class, date, session, term, entries))
+
 
 class AttendanceRecordViewSet(TenantViewSet):
     queryset = AttendanceRecord.objects.select_related("attendance_session", "student", "school").all()
@@ -73,15 +122,39 @@ class AttendanceRecordViewSet(TenantViewSet):
             qs = qs.filter(student__parent_email=user.email)
 
         if not include_all_periods:
-            school = get_request_school(self.request)
-            if school:
-                settings_obj = SchoolSettings.objects.filter(school=school).only("current_session", "current_term").first()
-                if settings_obj:
-                    session = session or settings_obj.current_session
-                    term = term or settings_obj.current_term
+            current_session, current_term = get_current_period(get_request_school(self.request))
+            session = session or current_session
+            term = term or current_term
 
         if session:
             qs = qs.filter(attendance_session__session=session)
         if term:
             qs = qs.filter(attendance_session__term=term)
         return qs
+
+    @action(detail=False, methods=["get"], url_path="summary")
+    def summary(self, request):
+        """
+        Per-student attendance totals for a term (default: the current one),
+        from the maintained summaries. Parents and students see their own.
+        """
+        school = get_request_school(request)
+        user = request.user
+        current_session, current_term = get_current_period(school)
+        summaries = AttendanceSummary.objects.filter(
+            school=school,
+            session=request.query_params.get("session") or current_session,
+            term=request.query_params.get("term") or current_term,
+        ).select_related("student")
+
+        if user.role == "STUDENT" and hasattr(user, "student_profile"):
+            summaries = summaries.filter(student=user.student_profile)
+        elif user.role == "PARENT":
+            summaries = summaries.filter(student__parent_email=user.email)
+        if request.query_params.get("class_id"):
+            summaries = summaries.filter(student__current_class_id=request.query_params["class_id"])
+        if request.query_params.get("student"):
+            summaries = summaries.filter(student_id=request.query_params["student"])
+
+        page = self.paginate_queryset(summaries.order_by("student__names", "id"))
+        return self.get_paginated_response(AttendanceSummarySerializer(page, many=True).data)
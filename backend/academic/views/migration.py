@@ -150,44 +150,8 @@ class AcademicDataMigrationViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["get"], url_path="export-students")
     def export_students(self, request):
         """
-        Export all students for the current tenant to CSV.
+        Export all students for the current tenant to CSV, streamed in chunks.
         """
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = 'attachment; filename="student_data_export.csv"'
-
-        writer = csv.writer(response)
-        headers = [
-            "student_no",
-            "names",
-            "gender",
-            "date_of_birth",
-            "class_name",
-            "parent_name",
-            "parent_email",
-            "parent_phone",
-            "address",
-            "status",
-        ]
-        writer.writerow(headers)
-
-        from ..models import Student
-
-        students = Student.objects.filter(school=request.user.school).select_related("current_class")
-
-        for s in students:
-            writer.writerow(
-                [
-                    s.student_no,
-                    s.names,
-                    s.gender,
-                    s.dob,
-                    s.current_class.name if s.current_class else "",
-                    s.parent_name,
-                    s.parent_email,
-                    s.parent_phone,
-                    s.address,
-                    s.status,
-                ]
-            )
+        from data_import.exporters import stream_export
 
-        return response
+        return stream_export("students", "csv", request.user.school, filename="student_data_export.csv")
@@ -1,29 +1,94 @@
 """ReportCard, SubjectScore, and BroadsheetView."""
 
 import logging
+import re
 
-from django.http import FileResponse
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 
 from core.pagination import StandardPagination
-from core.tenant_utils import get_request_school
-from schools.models import SchoolSettings
+from core.tenant_utils import get_current_period, get_request_school
 
 from ..models import (
     Class,
+    ClassTermResult,
+    RemarkJob,
     ReportCard,
     SubjectScore,
 )
-from ..serializers import ReportCardSerializer, SubjectScoreSerializer
-from ..utils import ReportCardPDFGenerator
+from ..serializers import (
+    ClassTermResultSerializer,
+    RemarkJobSerializer,
+    ReportCardSerializer,
+    SubjectScoreSerializer,
+)
+from ..services.broadsheet import get_broadsheet
+from ..services.report_pdf import report_pdf_file
 from .base import TenantViewSet
 
 logger = logging.getLogger(__name__)
 
 
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _etag_matches(request, etag):
+    """
+    True if the request's If-None-Match is "*" (RFC 9110: any current
+    representation) or lists the quoted `etag`, weak or strong.
+    """
+    tags = {tag.strip().removeprefix("W/") for tag in request.headers.get("If-None-Match", "").split(",")}
+    return "*" in tags or etag in tags
+
+
+def _stored_file_response(request, path, etag, filename, content_type):
+    """
+    Serve a stored file with ETag/If-None-Match revalidation and single
+    byte-range (Range/If-Range) support.
+    """
+    etag = f'"{etag}"'
+    if _etag_matches(request, etag):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    file = default_storage.open(path, "rb")
+    size = file.size
+    byte_range = request.headers.get("Range", "")
+    if_range = request.headers.get("If-Range")
+    match = _RANGE_RE.match(byte_range.strip()) if byte_range and (not if_range or if_range == etag) else None
+
+    if match and (match.group(1) or match.group(2)):
+        start, end = match.group(1), match.group(2)
+        if start:
+            start, end = int(start), min(int(end) if end else size - 1, size - 1)
+        else:  # suffix range: the last N bytes
+            start, end = max(size - int(end), 0), size - 1
+        if start > end or start >= size:
+            file.close()
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        file.seek(start)
+        response = HttpResponse(file.read(end - start + 1), status=206, content_type=content_type)
+        file.close()
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    else:
+        response = FileResponse(file, as_attachment=True, filename=filename, content_type=content_type)
+        response["Content-Length"] = size
+
+    response["ETag"] = etag
+    response["Accept-Ranges"] = "bytes"
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
 def _is_truthy(value):
     if value is None:
         return False
@@ -45,18 +110,22 @@ class ReportCardViewSet(TenantViewSet):
         Export a single student report card as a PDF.
         """
         instance = self.get_object()
-        school = get_request_school(request)
         user = request.user
 
         # Students/parents can only download published report cards.
         if user.role in ("STUDENT", "PARENT") and not instance.is_passed:
             raise PermissionDenied("This report card has not been published yet.")
 
-        generator = ReportCardPDFGenerator(school)
-        pdf_buffer = generator.generate_single(instance)
-
         filename = f"Report_{instance.student.names.replace(' ', '_')}_{instance.session.replace('/', '-')}.pdf"
-        return FileResponse(pdf_buffer, as_attachment=True, filename=filename, content_type="application/pdf")
+
+        # Rendered once per content change; repeat downloads are served from storage
+        path, digest = report_pdf_file(instance)
+        try:
+            return _stored_file_response(request, path, digest, filename, content_type="application/pdf")
+        except FileNotFoundError:
+            # The stored render was removed behind the cache's back
+            path, digest = report_pdf_file(instance, force=True)
+            return _stored_file_response(request, path, digest, filename, content_type="application/pdf")
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -77,12 +146,9 @@ class ReportCardViewSet(TenantViewSet):
         include_all_periods = _is_truthy(self.request.query_params.get("include_all_periods"))
 
         if not include_all_periods:
-            school = get_request_school(self.request)
-            if school:
-                settings_obj = SchoolSettings.objects.filter(school=school).only("current_session", "current_term").first()
-                if settings_obj:
-                    session = session or settings_obj.current_session
-                    term = term or settings_obj.current_term
+            current_session, current_term = get_current_period(get_request_school(self.request))
+            session = session or current_session
+            term = term or current_term
 
         if session:
             qs = qs.filter(session=session)
@@ -106,6 +172,59 @@ class ReportCardViewSet(TenantViewSet):
 
         return Response({"suggestion": remark, "data": performance_data})
 
+    @action(detail=False, methods=["post"], url_path="generate-remarks")
+    def generate_remarks(self, request):
+        """
+        Queue AI remarks for every report card of a class in one background job.
+        Body: { "class_id": "...", "session": "...", "term": "...", "overwrite": false }
+        Poll remark-jobs/<id>/ for progress.
+        """
+        from ..services.remarks import expire_stale_remark_jobs
+        from ..tasks import generate_class_remarks_job
+
+        class_id = request.data.get("class_id")
+        session = request.data.get("session")
+        term = request.data.get("term")
+        school = get_request_school(request)
+
+        if not all([class_id, session, term, school]):
+            return Response({"error": "class_id, session, and term are required"}, status=400)
+
+        student_class = Class.objects.filter(id=class_id, school=school).first()
+        if not student_class:
+            return Response({"error": "Class not found"}, status=404)
+
+        jobs = RemarkJob.objects.filter(school=school, student_class=student_class, session=session, term=term)
+        expire_stale_remark_jobs(jobs)
+        active = jobs.filter(status__in=("queued", "running")).first()
+        if active:
+            return Response(
+                {
+                    "error": "Remarks for this class are already being generated",
+                    "job": RemarkJobSerializer(active).data,
+                },
+                status=409,
+            )
+
+        job = RemarkJob.objects.create(
+            school=school,
+            student_class=student_class,
+            session=session,
+            term=term,
+            overwrite=str(request.data.get("overwrite", "")).lower() in ("true", "1"),
+        )
+        transaction.on_commit(lambda: generate_class_remarks_job.delay(job.id))
+        job.refresh_from_db()
+        return Response(RemarkJobSerializer(job).data, status=202 if job.status != "completed" else 200)
+
+    @action(detail=False, methods=["get"], url_path=r"remark-jobs/(?P<job_id>\d+)")
+    def remark_job(self, request, job_id=None):
+        """Progress of a class remark job."""
+        job = RemarkJob.objects.filter(id=job_id, school=get_request_school(request)).first()
+        if not job:
+            return Response({"error": "Job not found"}, status=404)
+        return Response(RemarkJobSerializer(job).data)
+
     @action(detail=True, methods=["post"], url_path="compute-trend")
     def compute_trend(self, request, pk=None):
         """
@@ -118,27 +237,66 @@ class ReportCardViewSet(TenantViewSet):
     @action(detail=False, methods=["post"], url_path="recalculate-positions")
     def recalculate_positions(self, request):
         """
-        Recalculate class positions for all students in a given class/session/term.
-        Body: { "class_id": "...", "session": "...", "term": "..." }
+        Recompute term results: totals, trends, class and subject positions and class statistics.
+        Body: { "session": "...", "term": "...", "class_id": "..." (optional), "force": false }
+        Without class_id every class of the school is covered. Classes whose scores have not
+        changed since the last run are skipped unless force is set.
         """
+        from ..services.results import compute_term_results
+
         class_id = request.data.get("class_id")
         session = request.data.get("session")
         term = request.data.get("term")
+        force = str(request.data.get("force", "")).lower() in ("true", "1")
+        school = get_request_school(request)
+
+        if not all([session, term, school]):
+            return Response({"error": "session and term are required"}, status=400)
+
+        class_ids = None
+        if class_id:
+            if not Class.objects.filter(id=class_id, school=school).exists():
+                return Response({"error": "Class not found"}, status=404)
+            class_ids = [int(class_id)]
+
+        result = compute_term_results(school, session, term, class_ids=class_ids, force=force)
+        count = ReportCard.objects.filter(school=school, session=session, term=term)
+        if class_ids:
+            count = count.filter(student_class_id__in=class_ids)
+        return Response(
+            {
+                "success": True,
+                "message": f"Positions recalculated for {count.count()} students",
+                "computed_classes": result["computed"],
+                "skipped_classes": result["skipped"],
+            }
+        )
+
+    @action(detail=False, methods=["get"], url_path="class-results")
+    def class_results(self, request):
+        """
+        Class statistics for a term (highest/lowest/mean per subject), brought up to date first.
+        Query: ?class_id=...&session=...&term=...
+        """
+        from ..services.results import compute_term_results
+
+        class_id = request.query_params.get("class_id")
+        session = request.query_params.get("session")
+        term = request.query_params.get("term")
         school = get_request_school(request)
 
         if not all([class_id, session, term, school]):
             return Response({"error": "class_id, session, and term are required"}, status=400)
-
-        try:
-            student_class = Class.objects.get(id=class_id, school=school)
-        except Class.DoesNotExist:
+        if not Class.objects.filter(id=class_id, school=school).exists():
             return Response({"error": "Class not found"}, status=404)
 
-        ReportCard.calculate_positions(school, student_class, session, term)
-        count = ReportCard.objects.filter(
-            school=school, student_class=student_class, session=session, term=term
-        ).count()
-        return Response({"success": True, "message": f"Positions recalculated for {count} students"})
+        compute_term_results(school, session, term, class_ids=[int(class_id)])
+        result = ClassTermResult.objects.filter(
+            school=school, student_class_id=class_id, session=session, term=term
+        ).first()
+        if not result:
+            return Response({"error": "No report cards for this class and term"}, status=404)
+        return Response(ClassTermResultSerializer(result).data)
 
     @action(detail=False, methods=["get"], url_path="verify/(?P<hash>[^/.]+)", permission_classes=[permissions.AllowAny])
     def verify(self, request, hash=None):
@@ -178,11 +336,46 @@ class SubjectScoreViewSet(TenantViewSet):
             qs = qs.filter(report_card__student=user.student_profile)
         return qs
 
+    @action(detail=False, methods=["post"], url_path="bulk-ingest")
+    def bulk_ingest(self, request):
+        """
+        Create or update a whole score sheet in one request.
+        Body: { "scores": [{ "report_card": 1, "subject": "Mathematics", "ca1": 10, "ca2": 15, "exam": 50 }, ...] }
+        Totals, trends and class positions are recomputed once per affected report card/class.
+        """
+        from ..services.scores import ingest_scores
+
+        school = get_request_school(request)
+        if not school:
+            return Response({"error": "School context not found"}, status=400)
+
+        entries = request.data.get("scores")
+        if not isinstance(entries, list) or not entries:
+            return Response({"error": "scores must be a non-empty list"}, status=400)
+        if not all(isinstance(entry, dict) for entry in entries):
+            return Response({"error": "Each score must be an object"}, status=400)
+
+        result = ingest_scores(school, entries, user=request.user, request=request)
+        self.invalidate_cache()
+
+        return Response(
+            {
+                "created": result["created"],
+                "updated": result["updated"],
+                "report_cards": result["report_cards"],
+                "errors": result["errors"],
+            },
+            status=400 if result["errors"] and not (result["created"] or result["updated"]) else 200,
+        )
+
 
 class BroadsheetView(viewsets.ViewSet):
     """
     Broadsheet / Master Result Sheet — aggregates SubjectScores across all subjects
     for a class in a given session and term. Returns a pivoted table.
+
+    Served from the materialized BroadsheetSnapshot store, so a refresh is a single
+    lookup unless scores changed since the last read. Supports If-None-Match.
     """
 
     permission_classes = [permissions.IsAuthenticated]
@@ -199,60 +392,23 @@ class BroadsheetView(viewsets.ViewSet):
         if not all([class_id, session, term]):
             return Response({"error": "class_id, session, and term are required"}, status=400)
 
-        scores = (
-            SubjectScore.objects.filter(
-                school=school,
-                report_card__student__current_class_id=class_id,
-                report_card__session=session,
-                report_card__term=term,
-            )
-            .select_related("report_card__student", "subject")
-            .order_by("report_card__student__names", "subject__name")
-        )
-
-        # Pivot: { student_id: { name, subjects: { subject_name: { ca, exam, total } }, grand_total } }
-        broadsheet = {}
-        all_subjects = set()
-
-        for score in scores:
-            student = score.report_card.student
-            sid = str(student.id)
-            subject_name = score.subject.name
-            all_subjects.add(subject_name)
-
-            if sid not in broadsheet:
-                broadsheet[sid] = {
-                    "student_id": sid,
-                    "student_name": student.names if hasattr(student, "names") else str(student),
-                    "student_no": getattr(student, "student_no", ""),
-                    "subjects": {},
-                    "grand_total": 0,
-                }
-
-            total = float(score.total or 0)
-            broadsheet[sid]["subjects"][subject_name] = {
-                "ca": float((score.ca1 or 0) + (score.ca2 or 0)),
-                "exam": float(score.exam or 0),
-                "total": total,
-                "grade": getattr(score, "grade", ""),
-            }
-            broadsheet[sid]["grand_total"] += total
-
-        # Sort students by name and subjects alphabetically
-        rows = sorted(broadsheet.values(), key=lambda x: x["student_name"])
-        subjects = sorted(all_subjects)
+        snapshot = get_broadsheet(school, class_id, session, term)
+        if snapshot is None:
+            return Response({"error": "Class not found"}, status=404)
 
-        # Calculate position (rank by grand_total descending)
-        sorted_by_total = sorted(rows, key=lambda x: x["grand_total"], reverse=True)
-        for idx, row in enumerate(sorted_by_total, 1):
-            row["position"] = idx
+        etag = f'"{snapshot.etag}"'
+        if _etag_matches(request, etag):
+            response = Response(status=304)
+            response["ETag"] = etag
+            return response
 
         return Response(
             {
-                "subjects": subjects,
-                "students": rows,
+                "subjects": snapshot.data.get("subjects", []),
+                "students": snapshot.data.get("students", []),
                 "class_id": class_id,
                 "session": session,
                 "term": term,
-            }
+            },
+            headers={"ETag": etag},
         )
@@ -1,56 +1,82 @@
 """Global Search View."""
 
-from django.db import models
 from rest_framework import permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.search import MIN_QUERY_LENGTH, search
 from core.tenant_utils import get_request_school
 
-from ..models import Class, Student, Teacher
+from ..models import Class
+
+EMPTY_RESULTS = {"students": [], "staff": [], "classes": [], "books": [], "assets": [], "admissions": []}
 
 
 class GlobalSearchView(APIView):
     """
-    Search across Students, Staff, and Classes for the current school.
+    Search across Students, Staff, Classes, Books, Assets and Admissions for the
+    current school, from the school's search index (prefix and typo-tolerant).
     """
 
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         query = request.query_params.get("q", "")
-        if len(query) < 2:
-            return Response({"students": [], "staff": [], "classes": []})
+        if len(query.strip()) < MIN_QUERY_LENGTH:
+            return Response(EMPTY_RESULTS)
 
         school = get_request_school(request)
         if not school:
             return Response({"error": "No school context found"}, status=400)
 
-        # 1. Search Students
-        students = Student.objects.filter(
-            models.Q(names__icontains=query) | models.Q(student_no__icontains=query), school=school
-        )[:10]
-
-        # 2. Search Staff (Teachers)
-        staff = Teacher.objects.filter(
-            models.Q(name__icontains=query) | models.Q(email__icontains=query), school=school
-        )[:10]
-
-        # 3. Search Classes
-        classes = Class.objects.filter(name__icontains=query, school=school)[:10]
+        results = search(query, school_id=school.id)
+        class_ids = {s["current_class_id"] for s in results["student"] if s.get("current_class_id")}
+        class_names = dict(Class.objects.filter(id__in=class_ids).values_list("id", "name")) if class_ids else {}
 
         return Response(
             {
                 "students": [
                     {
-                        "id": s.id,
-                        "names": s.names,
-                        "student_no": s.student_no,
-                        "current_class": s.current_class.name if s.current_class else "N/A",
+                        "id": s["id"],
+                        "names": s["title"],
+                        "student_no": s["subtitle"],
+                        "current_class": class_names.get(s.get("current_class_id"), "N/A"),
+                    }
+                    for s in results["student"]
+                ],
+                "staff": [
+                    {"id": s["id"], "name": s["title"], "staff_type": s.get("staff_type")} for s in results["staff"]
+                ],
+                "classes": [{"id": c["id"], "name": c["title"]} for c in results["class"]],
+                "books": [
+                    {
+                        "id": b["id"],
+                        "title": b["title"],
+                        "author": b["subtitle"],
+                        "isbn": b.get("isbn"),
+                        "status": b.get("status"),
+                    }
+                    for b in results["book"]
+                ],
+                "assets": [
+                    {
+                        "id": a["id"],
+                        "name": a["title"],
+                        "asset_code": a["subtitle"],
+                        "status": a.get("status"),
+                        "location": a.get("location"),
+                    }
+                    for a in results["asset"]
+                ],
+                "admissions": [
+                    {
+                        "id": a["id"],
+                        "child_name": a["title"],
+                        "class_applied": a["subtitle"],
+                        "parent_name": a.get("parent_name"),
+                        "status": a.get("status"),
                     }
-                    for s in students
+                    for a in results["admission"]
                 ],
-                "staff": [{"id": s.id, "name": s.name, "staff_type": s.staff_type} for s in staff],
-                "classes": [{"id": c.id, "name": c.name} for c in classes],
             }
         )
@@ -5,6 +5,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from core.pagination import LargePagination, StandardPagination
+from core.search import index_objects
 from core.tenant_utils import get_request_school
 
 from ..models import Class, Student, StudentAchievement, StudentHistory
@@ -77,6 +78,7 @@ class StudentViewSet(TenantViewSet):
         if updated_students:
             with transaction.atomic():
                 Student.objects.bulk_update(updated_students, ["current_class"])
+                index_objects(updated_students, "student")
 
         return Response({"success": True, "updated": len(updated_students)})
 
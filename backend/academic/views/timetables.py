@@ -2,13 +2,16 @@
 
 from django.db import transaction
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 
+from core.cache_utils import invalidate_model_cache
 from core.pagination import LargePagination, StandardPagination
 from core.tenant_utils import get_request_school
 
-from ..models import Period, Timetable, TimetableEntry
+from ..models import Period, Teacher, Timetable, TimetableEntry
 from ..serializers import PeriodSerializer, TimetableEntrySerializer, TimetableSerializer
+from ..services.timetable import solve_school_timetable
 from .base import TenantViewSet
 
 
@@ -74,6 +77,44 @@ class TimetableViewSet(TenantViewSet):
             qs = qs.filter(student_class=user.student_profile.current_class)
         return qs
 
+    @action(detail=False, methods=["post"])
+    def solve(self, request):
+        """
+        Build the school's timetable with the local solver (see
+        academic.services.timetable). Pass `teacher_id` to re-solve around one
+        teacher while keeping everyone else's lessons where they are.
+        """
+        if request.user.role not in ("SCHOOL_ADMIN", "SUPER_ADMIN"):
+            raise PermissionDenied("Only administrators can generate timetables.")
+
+        school = get_request_school(request)
+        if not school:
+            return Response({"error": "School context not found"}, status=400)
+
+        teacher_id = request.data.get("teacher_id") or None
+        if teacher_id is not None:
+            if not str(teacher_id).isdigit() or not Teacher.objects.filter(school=school, id=teacher_id).exists():
+                return Response({"error": "Teacher not found"}, status=404)
+            teacher_id = int(teacher_id)
+
+        try:
+            result = solve_school_timetable(
+                school,
+                session=request.data.get("session") or None,
+                days=request.data.get("days") or None,
+                periods_per_week=request.data.get("periods_per_week"),
+                teacher_id=teacher_id,
+                keep_existing=str(request.data.get("keep_existing", "")).lower() in ("true", "1"),
+                dry_run=str(request.data.get("dry_run", "")).lower() in ("true", "1"),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        if result["created"] or result["deleted"]:
+            self.invalidate_cache()
+            invalidate_model_cache("TimetableEntry", school.id)
+        return Response(result)
+
 
 class TimetableEntryViewSet(TenantViewSet):
     queryset = TimetableEntry.objects.select_related("timetable", "period", "subject", "teacher", "school").all()
@@ -2,12 +2,12 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Avg, Sum, Count
-
 from academic.views.base import TenantViewSet
 from academic.models import (
     Commendation, ConductWarning, BehaviorAnalytics, ConductEntry, Student
 )
+from academic.services.behavior import refresh_behavior_analytics
+from academic.tasks import generate_behavior_analytics
 from academic.serializers_conduct import (
     CommendationSerializer, CommendationCreateSerializer,
     ConductWarningSerializer, ConductWarningCreateSerializer,
@@ -118,90 +118,25 @@ class BehaviorAnalyticsViewSet(TenantViewSet):
     
     @action(detail=False, methods=["get"])
     def generate_all(self, request):
-        """Generate analytics for all students in a term."""
+        """Generate analytics for all students in a term (in the background)."""
         session = request.query_params.get("session")
         term = request.query_params.get("term")
         
         if not session or not term:
             return Response({"error": "session and term required"}, status=400)
         
-        students = Student.objects.filter(school=request.tenant, status="active")
-        
-        for student in students:
-            self.generate_student_analytics(student, session, term)
+        students = Student.objects.filter(school=request.tenant, status="active").count()
+        job = generate_behavior_analytics.delay(request.tenant.id, session, term)
         
-        return Response({"message": f"Generated analytics for {students.count()} students"})
+        return Response(
+            {"message": f"Generating analytics for {students} students", "task_id": job.id},
+            status=status.HTTP_202_ACCEPTED,
+        )
     
     def generate_student_analytics(self, student, session, term):
         """Generate analytics for a single student."""
-        from django.db.models import Avg
-        
-        # Get conduct entries
-        conduct_avg = ConductEntry.objects.filter(
-            student=student, session=session, term=term
-        ).aggregate(avg=Avg("score"))["avg"] or 0
-        
-        # Get commendations
-        comms = Commendation.objects.filter(student=student, session=session, term=term)
-        total_comms = comms.count()
-        comm_points = sum(c.points for c in comms)
-        
-        # Get warnings
-        warnings = ConductWarning.objects.filter(student=student, session=session, term=term)
-        total_warnings = warnings.count()
-        
-        # Calculate warning points (weighted by severity)
-        warning_points = 0
-        for w in warnings:
-            if w.severity == "minor":
-                warning_points += 1
-            elif w.severity == "moderate":
-                warning_points += 3
-            elif w.severity == "serious":
-                warning_points += 5
-            else:  # severe
-                warning_points += 10
-        
-        # Determine overall rating
-        net_points = comm_points - warning_points
-        if net_points >= 10:
-            rating = "excellent"
-        elif net_points >= 5:
-            rating = "good"
-        elif net_points >= 0:
-            rating = "average"
-        elif net_points >= -5:
-            rating = "needs_improvement"
-        else:
-            rating = "poor"
-        
-        # Get trait scores
-        trait_scores = {}
-        for entry in ConductEntry.objects.filter(student=student, session=session, term=term):
-            trait_scores[entry.trait] = entry.score
-        
-        # Calculate parent engagement
-        parent_meetings = warnings.filter(parent_notification_method="meeting").count()
-        parent_complaints = 0  # Could add a field for this
-        
-        analytics, _ = BehaviorAnalytics.objects.update_or_create(
-            student=student,
-            session=session,
-            term=term,
-            defaults={
-                "avg_conduct_score": conduct_avg,
-                "total_commendations": total_comms,
-                "total_warnings": total_warnings,
-                "trait_scores": trait_scores,
-                "commendation_points": comm_points,
-                "warning_points": warning_points,
-                "overall_rating": rating,
-                "parent_meetings": parent_meetings,
-                "parent_complaints": parent_complaints,
-            }
-        )
-        
-        return analytics
+        refresh_behavior_analytics(student.school_id, session, term, student_ids=[student.id])
+        return BehaviorAnalytics.objects.filter(student=student, session=session, term=term).first()
     
     @action(detail=False, methods=["get"])
     def summary(self, request):
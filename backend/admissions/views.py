@@ -116,6 +116,14 @@ class AdmissionViewSet(TenantViewSet):
                     ]
                     if fees_to_create:
                         StudentFee.objects.bulk_create(fees_to_create, ignore_conflicts=True)
+                        # bulk_create skips the ledger signals
+                        from bursary.ledger import refresh_ledger
+
+                        refresh_ledger(
+                            student.school_id,
+                            "expected",
+                            {(fee.fee_item.session, fee.fee_item.term) for fee in fees_to_create},
+                        )
                 except (ImportError, AdmissionPackage.DoesNotExist):
                     pass
 
@@ -0,0 +1,286 @@
+"""
+Incrementally maintained financial ledger rollup.
+
+Every write to a ledger source (Payment, Expense, StudentFee, paid Payroll)
+is reduced to "lines" - (session, term, kind, category, amount) - and the
+difference between the lines before and after the write is applied to
+LedgerRollup with F() increments inside the write's transaction. Writes that
+change many rows at once (FeeItem amount, Scholarship value) re-derive the
+affected term buckets from the raw tables instead. `reconcile_ledger` compares
+the rollup with the raw tables and repairs any drift; it runs nightly and also
+backfills schools that have no rollup yet.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Expense, LedgerRollup, Payment, StudentFee
+
+logger = logging.getLogger(__name__)
+
+LEDGER_KINDS = ("expected", "collected", "expense", "payroll")
+CENT = Decimal("0.01")
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def net_due(amount, discount_amount, benefit_type=None, scholarship_value=None):
+    """Net amount a student owes for one fee: amount - discount - scholarship."""
+    amount = Decimal(str(amount or 0))
+    scholarship_discount = Decimal(0)
+    if benefit_type == "percentage":
+        scholarship_discount = amount * Decimal(str(scholarship_value or 0)) / Decimal(100)
+    elif benefit_type == "fixed":
+        scholarship_discount = Decimal(str(scholarship_value or 0))
+    return _money(amount - Decimal(str(discount_amount or 0)) - scholarship_discount)
+
+
+# ---------------------------------------------------------------------------
+# Lines per source record
+# ---------------------------------------------------------------------------
+
+
+def _payment_lines(payment):
+    return [((payment.session, payment.term, "collected", str(payment.category_id or "")), _money(payment.amount))]
+
+
+def _expense_lines(expense):
+    return [((expense.session, expense.term, "expense", expense.category), _money(expense.amount))]
+
+
+def _student_fee_lines(student_fee):
+    fee_item = student_fee.fee_item
+    scholarship = student_fee.scholarship
+    amount = net_due(
+        fee_item.amount,
+        student_fee.discount_amount,
+        scholarship.benefit_type if scholarship else None,
+        scholarship.value if scholarship else None,
+    )
+    return [((fee_item.session, fee_item.term, "expected", str(fee_item.category_id)), amount)]
+
+
+def _payroll_lines(payroll):
+    if payroll.status != "paid":
+        return []
+    return [(("", "", "payroll", payroll.month.isoformat()), _money(payroll.total_wage_bill))]
+
+
+# model label -> (lines function, select_related used when re-reading the stored row)
+LEDGER_SOURCES = {
+    "bursary.Payment": (_payment_lines, ()),
+    "bursary.Expense": (_expense_lines, ()),
+    "bursary.StudentFee": (_student_fee_lines, ("fee_item", "scholarship")),
+    "hr.Payroll": (_payroll_lines, ()),
+}
+
+
+def ledger_lines(instance):
+    lines_for, _ = LEDGER_SOURCES[instance._meta.label]
+    return lines_for(instance)
+
+
+def stored_ledger_lines(instance):
+    """Lines for the row as currently stored (before an in-flight save)."""
+    if instance._state.adding or instance.pk is None:
+        return []
+    _, related = LEDGER_SOURCES[instance._meta.label]
+    stored = type(instance)._base_manager.select_related(*related).filter(pk=instance.pk).first()
+    return ledger_lines(stored) if stored else []
+
+
+# ---------------------------------------------------------------------------
+# Incremental updates
+# ---------------------------------------------------------------------------
+
+
+def _bump(school_id, key, amount, entries):
+    session, term, kind, category = key
+    bucket = LedgerRollup.objects.filter(school_id=school_id, session=session, term=term, kind=kind, category=category)
+    changes = {"amount": F("amount") + amount, "entries": F("entries") + entries, "updated_at": timezone.now()}
+    if bucket.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            LedgerRollup.objects.create(
+                school_id=school_id, session=session, term=term, kind=kind, category=category,
+                amount=amount, entries=entries,
+            )
+    except IntegrityError:
+        # Created concurrently by another writer
+        bucket.update(**changes)
+
+
+def apply_ledger_change(school_id, before, after):
+    """Apply the difference between two sets of lines to the rollup."""
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for key, amount in before:
+        deltas[key][0] -= amount
+        deltas[key][1] -= 1
+    for key, amount in after:
+        deltas[key][0] += amount
+        deltas[key][1] += 1
+
+    for key, (amount, entries) in sorted(deltas.items()):
+        if amount or entries:
+            _bump(school_id, key, amount, entries)
+
+
+# ---------------------------------------------------------------------------
+# Raw aggregation, refresh and reconciliation
+# ---------------------------------------------------------------------------
+
+
+def _period_filter(periods, session_field="session", term_field="term"):
+    condition = Q()
+    for session, term in periods:
+        condition |= Q(**{session_field: session, term_field: term})
+    return condition
+
+
+def raw_ledger_totals(school_id, kinds=LEDGER_KINDS, periods=None):
+    """
+    {key: (amount, entries)} computed from the raw tables, optionally limited to
+    some (session, term) periods. Payroll has no period and ignores `periods`.
+    """
+    from hr.models import Payroll
+
+    totals = {}
+
+    if "expected" in kinds:
+        fees = StudentFee.objects.filter(school_id=school_id)
+        if periods is not None:
+            fees = fees.filter(_period_filter(periods, "fee_item__session", "fee_item__term"))
+        expected = defaultdict(lambda: [Decimal(0), 0])
+        for session, term, category_id, amount, discount, benefit_type, value in fees.values_list(
+            "fee_item__session", "fee_item__term", "fee_item__category_id", "fee_item__amount",
+            "discount_amount", "scholarship__benefit_type", "scholarship__value",
+        ).iterator(chunk_size=2000):
+            bucket = expected[(session, term, "expected", str(category_id))]
+            bucket[0] += net_due(amount, discount, benefit_type, value)
+            bucket[1] += 1
+        totals.update({key: tuple(value) for key, value in expected.items()})
+
+    grouped = []
+    if "collected" in kinds:
+        grouped.append(("collected", Payment.objects.filter(school_id=school_id), "category_id"))
+    if "expense" in kinds:
+        grouped.append(("expense", Expense.objects.filter(school_id=school_id), "category"))
+    for kind, queryset, category_field in grouped:
+        if periods is not None:
+            queryset = queryset.filter(_period_filter(periods))
+        for row in queryset.values("session", "term", category_field).annotate(
+            total=Sum("amount"), count=Count("id")
+        ).order_by():
+            key = (row["session"], row["term"], kind, str(row[category_field] or ""))
+            totals[key] = (_money(row["total"]), row["count"])
+
+    if "payroll" in kinds:
+        for row in Payroll.objects.filter(school_id=school_id, status="paid").values("month").annotate(
+            total=Sum("total_wage_bill"), count=Count("id")
+        ).order_by():
+            totals[("", "", "payroll", row["month"].isoformat())] = (_money(row["total"]), row["count"])
+
+    return totals
+
+
+def refresh_ledger(school_id, kind, periods):
+    """Re-derive one kind's buckets for the given (session, term) periods from the raw tables."""
+    periods = {period for period in periods if all(period)}
+    if not periods:
+        return
+    fresh = raw_ledger_totals(school_id, kinds=(kind,), periods=periods)
+    with transaction.atomic():
+        LedgerRollup.objects.filter(school_id=school_id, kind=kind).filter(_period_filter(periods)).delete()
+        LedgerRollup.objects.bulk_create(
+            [
+                LedgerRollup(
+                    school_id=school_id, session=session, term=term, kind=kind, category=category,
+                    amount=amount, entries=entries,
+                )
+                for (session, term, _, category), (amount, entries) in fresh.items()
+            ]
+        )
+
+
+def reconcile_ledger(school_id, fix=True):
+    """
+    Compare the rollup with the raw tables. Returns the drifted buckets as
+    dicts (key, expected, stored) and, with `fix=True`, repairs them.
+    """
+    raw = raw_ledger_totals(school_id)
+    stored = {
+        (row.session, row.term, row.kind, row.category): row
+        for row in LedgerRollup.objects.filter(school_id=school_id)
+    }
+
+    drift = []
+    for key in raw.keys() | stored.keys():
+        expected = raw.get(key, (Decimal(0), 0))
+        row = stored.get(key)
+        actual = (row.amount, row.entries) if row else (Decimal(0), 0)
+        if expected != actual:
+            drift.append({"key": key, "expected": expected, "stored": actual})
+
+    if drift and fix:
+        with transaction.atomic():
+            for item in drift:
+                session, term, kind, category = item["key"]
+                amount, entries = item["expected"]
+                row = stored.get(item["key"])
+                if not entries:
+                    if row:
+                        row.delete()
+                elif row:
+                    row.amount, row.entries = amount, entries
+                    row.save(update_fields=["amount", "entries", "updated_at"])
+                else:
+                    LedgerRollup.objects.create(
+                        school_id=school_id, session=session, term=term, kind=kind, category=category,
+                        amount=amount, entries=entries,
+                    )
+    return drift
+
+
+# ---------------------------------------------------------------------------
+# Reads
+# ---------------------------------------------------------------------------
+
+
+def ledger_totals(school, session=None, term=None):
+    """
+    Dashboard totals from the rollup: expected/collected/expense for the period
+    (all periods when not given) and paid payroll across all months.
+    """
+    period = Q(kind__in=("expected", "collected", "expense"))
+    if session:
+        period &= Q(session=session)
+    if term:
+        period &= Q(term=term)
+
+    totals = {kind: Decimal(0) for kind in LEDGER_KINDS}
+    rows = (
+        LedgerRollup.objects.filter(school=school)
+        .filter(period | Q(kind="payroll"))
+        .values("kind")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    for row in rows:
+        totals[row["kind"]] = row["total"] or Decimal(0)
+    return totals
+
+
+def scholarship_periods(scholarship_id):
+    return set(
+        StudentFee.objects.filter(scholarship_id=scholarship_id)
+        .values_list("fee_item__session", "fee_item__term")
+        .distinct()
+    )
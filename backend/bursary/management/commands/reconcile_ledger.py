@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from bursary.ledger import reconcile_ledger
+from schools.models import School
+
+
+class Command(BaseCommand):
+    help = "Verify the bursary ledger rollup against the raw tables (also backfills it)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--school", type=int, help="Only reconcile this school id")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without repairing it")
+
+    def handle(self, *args, **options):
+        schools = School.objects.order_by("id")
+        if options["school"]:
+            schools = schools.filter(id=options["school"])
+
+        for school in schools:
+            drift = reconcile_ledger(school.id, fix=not options["dry_run"])
+            for item in drift:
+                self.stdout.write(
+                    f"{school.name}: {' / '.join(item['key'])} expected {item['expected']} stored {item['stored']}"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Ledger reconciliation complete."))
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bursary.models import PaymentEvent
+from bursary.webhook_queue import replay_payment_events
+
+
+class Command(BaseCommand):
+    help = "Re-process the payment webhook events received in a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", required=True, help="First day (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="end", help="Last day (YYYY-MM-DD), defaults to --from")
+        parser.add_argument("--school", type=int, help="Only replay this school id's events")
+        parser.add_argument(
+            "--status",
+            action="append",
+            choices=[choice for choice, _ in PaymentEvent.STATUS_CHOICES],
+            help="Only replay events in this status (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"])
+            end = date.fromisoformat(options["end"]) if options["end"] else start
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        requeued = replay_payment_events(start, end, school_id=options["school"], statuses=options["status"])
+        self.stdout.write(self.style.SUCCESS(f"Re-queued {requeued} payment event(s)."))
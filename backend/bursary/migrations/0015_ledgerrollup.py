@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bursary', '0014_alter_admissionpackage_intake'),
+        ('schools', '0023_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.CharField(blank=True, max_length=50)),
+                ('term', models.CharField(blank=True, max_length=50)),
+                ('kind', models.CharField(choices=[('expected', 'Expected Fees'), ('collected', 'Payments'), ('expense', 'Expenses'), ('payroll', 'Paid Payroll')], max_length=20)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('entries', models.IntegerField(default=0)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_related', to='schools.school')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'session', 'term'], name='bursary_led_school__71ada2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('school', 'session', 'term', 'kind', 'category'), name='unique_ledger_rollup_bucket')],
+            },
+        ),
+    ]
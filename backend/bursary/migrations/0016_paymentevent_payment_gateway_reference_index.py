@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0036_classtermresult_subjectscore_position'),
+        ('bursary', '0015_ledgerrollup'),
+        ('schools', '0023_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(default='paystack', max_length=20)),
+                ('event', models.CharField(max_length=50)),
+                ('reference', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('unmatched', 'No Matching Payment'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['gateway_reference'], name='bursary_pay_gateway_b7b755_idx'),
+        ),
+        migrations.AddField(
+            model_name='paymentevent',
+            name='school',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payment_events', to='schools.school'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentevent',
+            index=models.Index(fields=['status', 'id'], name='bursary_pay_status_71ac3a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentevent',
+            constraint=models.UniqueConstraint(fields=('provider', 'event', 'reference'), name='unique_payment_event'),
+        ),
+    ]
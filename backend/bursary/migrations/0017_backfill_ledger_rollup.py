@@ -0,0 +1,87 @@
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+CENT = Decimal("0.01")
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _net_due(amount, discount_amount, benefit_type, scholarship_value):
+    # Frozen copy of bursary.ledger.net_due, so the migration does not follow later changes
+    amount = Decimal(str(amount or 0))
+    scholarship_discount = Decimal(0)
+    if benefit_type == "percentage":
+        scholarship_discount = amount * Decimal(str(scholarship_value or 0)) / Decimal(100)
+    elif benefit_type == "fixed":
+        scholarship_discount = Decimal(str(scholarship_value or 0))
+    return _money(amount - Decimal(str(discount_amount or 0)) - scholarship_discount)
+
+
+def backfill_ledger_rollup(apps, schema_editor):
+    # The dashboards read only LedgerRollup, so fill it for existing schools now
+    # instead of waiting for the nightly reconcile task. Historical models only:
+    # bursary.ledger works on the current models and must not be imported here.
+    School = apps.get_model("schools", "School")
+    StudentFee = apps.get_model("bursary", "StudentFee")
+    Payment = apps.get_model("bursary", "Payment")
+    Expense = apps.get_model("bursary", "Expense")
+    LedgerRollup = apps.get_model("bursary", "LedgerRollup")
+    Payroll = apps.get_model("hr", "Payroll")
+
+    for school_id in School.objects.values_list("id", flat=True).iterator():
+        if LedgerRollup.objects.filter(school_id=school_id).exists():
+            continue
+
+        totals = defaultdict(lambda: [Decimal(0), 0])
+        for session, term, category_id, amount, discount, benefit_type, value in (
+            StudentFee.objects.filter(school_id=school_id)
+            .values_list(
+                "fee_item__session", "fee_item__term", "fee_item__category_id", "fee_item__amount",
+                "discount_amount", "scholarship__benefit_type", "scholarship__value",
+            )
+            .iterator(chunk_size=2000)
+        ):
+            bucket = totals[(session, term, "expected", str(category_id))]
+            bucket[0] += _net_due(amount, discount, benefit_type, value)
+            bucket[1] += 1
+
+        for kind, model, category_field in (("collected", Payment, "category_id"), ("expense", Expense, "category")):
+            for row in model.objects.filter(school_id=school_id).values("session", "term", category_field).annotate(
+                total=Sum("amount"), count=Count("id")
+            ).order_by():
+                totals[(row["session"], row["term"], kind, str(row[category_field] or ""))] = [
+                    _money(row["total"]), row["count"]
+                ]
+
+        for row in Payroll.objects.filter(school_id=school_id, status="paid").values("month").annotate(
+            total=Sum("total_wage_bill"), count=Count("id")
+        ).order_by():
+            totals[("", "", "payroll", row["month"].isoformat())] = [_money(row["total"]), row["count"]]
+
+        LedgerRollup.objects.bulk_create(
+            [
+                LedgerRollup(
+                    school_id=school_id, session=session, term=term, kind=kind, category=category,
+                    amount=amount, entries=entries,
+                )
+                for (session, term, kind, category), (amount, entries) in totals.items()
+                if entries
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bursary', '0016_paymentevent_payment_gateway_reference_index'),
+        ('hr', '0003_payroll_generation_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ledger_rollup, migrations.RunPython.noop, elidable=True),
+    ]
@@ -1,6 +1,6 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 from academic.models import Class, Student, Teacher, TenantModel
@@ -8,6 +8,17 @@ from schools.models import School
 from core.security_utils import AuditTrailMixin
 
 
+class LedgerSourceMixin:
+    """
+    Runs save() in a transaction so the LedgerRollup update made by the save
+    signals (bursary/signals.py) commits or rolls back together with the row.
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
 class FeeCategory(TenantModel):
     """
     Categories like Tuition, Uniform, Transport, Books etc.
@@ -22,7 +33,7 @@ class FeeCategory(TenantModel):
         return f"{self.name} ({self.school.name})"
 
 
-class Scholarship(TenantModel):
+class Scholarship(LedgerSourceMixin, TenantModel):
     """
     Standard scholarship types (e.g. Full Scholarship, Sports Waiver)
     """
@@ -38,7 +49,7 @@ class Scholarship(TenantModel):
         return f"{self.name} ({self.school.name})"
 
 
-class FeeItem(AuditTrailMixin, TenantModel):
+class FeeItem(LedgerSourceMixin, AuditTrailMixin, TenantModel):
     """
     Specific fee amount for a session/term/class.
     E.g. Year 1 Tuition for 2025/2026 First Term = 50,000
@@ -63,7 +74,7 @@ class FeeItem(AuditTrailMixin, TenantModel):
         return f"{self.category.name} - {target} - {self.amount}"
 
 
-class StudentFee(TenantModel):
+class StudentFee(LedgerSourceMixin, TenantModel):
     """
     Linking a fee to a student. Most fees are automatic via Class,
     but this handles:
@@ -83,7 +94,7 @@ class StudentFee(TenantModel):
         return f"{self.student.names} -> {self.fee_item}"
 
 
-class Payment(AuditTrailMixin, TenantModel):
+class Payment(LedgerSourceMixin, AuditTrailMixin, TenantModel):
     PAYMENT_METHODS = (("cash", "Cash"), ("transfer", "Bank Transfer"), ("pos", "POS"), ("online", "Online Payment"))
 
     STATUS_CHOICES = (
@@ -115,6 +126,7 @@ class Payment(AuditTrailMixin, TenantModel):
         ordering = ["-date", "-created_at"]
         indexes = [
             models.Index(fields=["student", "session", "term"]),
+            models.Index(fields=["gateway_reference"]),
         ]
 
     def save(self, *args, **kwargs):
@@ -134,7 +146,7 @@ class PaymentLineItem(TenantModel):
         return f"{self.purpose}: {self.amount}"
 
 
-class Expense(TenantModel):
+class Expense(LedgerSourceMixin, TenantModel):
     """
     Track money going OUT of the school
     """
@@ -198,3 +210,81 @@ class FeeDiscount(TenantModel):
 
     def __str__(self):
         return f"{self.get_discount_type_display()} - {self.student.names} ({self.value})"
+
+
+class LedgerRollup(TenantModel):
+    """
+    Running financial totals per school/session/term, maintained incrementally
+    from Payment, Expense, StudentFee and Payroll writes (see bursary/ledger.py)
+    so dashboards read a handful of rows instead of the raw fee history.
+    Payroll is monthly, so its rows have no session/term and are keyed by month.
+    """
+
+    KIND_CHOICES = (
+        ("expected", "Expected Fees"),
+        ("collected", "Payments"),
+        ("expense", "Expenses"),
+        ("payroll", "Paid Payroll"),
+    )
+
+    session = models.CharField(max_length=50, blank=True)
+    term = models.CharField(max_length=50, blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Fee category id (expected/collected), expense category, or payroll month
+    category = models.CharField(max_length=100, blank=True)
+    amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    entries = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["school", "session", "term", "kind", "category"], name="unique_ledger_rollup_bucket"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["school", "session", "term"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.session} {self.term} {self.category}: {self.amount}"
+
+
+class PaymentEvent(models.Model):
+    """
+    A verified payment gateway webhook event, stored as received and applied to
+    Payment records later in batches (see bursary/webhook_queue.py). One row per
+    provider/event/reference, so gateway retries are absorbed by the constraint.
+    """
+
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("processed", "Processed"),
+        ("unmatched", "No Matching Payment"),
+        ("ignored", "Ignored"),
+        ("failed", "Failed"),
+    )
+
+    # Null for the platform-wide webhook, which is not addressed to one school
+    school = models.ForeignKey(
+        School, on_delete=models.CASCADE, null=True, blank=True, related_name="payment_events"
+    )
+    provider = models.CharField(max_length=20, default="paystack")
+    event = models.CharField(max_length=50)
+    reference = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(default=timezone.now, db_index=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "event", "reference"], name="unique_payment_event"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event} {self.reference} ({self.status})"
@@ -0,0 +1,188 @@
+"""
+Revenue time-series engine for the bursar dashboard.
+
+Collected totals for a term come from a single grouped Payment query (one row per
+payment date) which is bucketed into days, term-relative weeks or calendar months
+in Python. The expensive, date-independent part (expected revenue + per-day
+collections) is cached per (school, term) as Decimal strings and dropped
+whenever a Payment, FeeItem, StudentFee, FeeDiscount or Scholarship touching
+that term is written.
+"""
+
+import logging
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.utils import timezone
+
+from academic.models import Student
+
+from .models import FeeItem, Payment, StudentFee
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("day", "week", "month")
+REVENUE_CACHE_TIMEOUT = 600  # expected revenue also depends on enrolment, so don't keep it forever
+
+
+def expected_term_revenue(school, session, term_name):
+    """
+    Net expected revenue for a term: class-targeted items x active students in the class,
+    plus global items x all active students, minus individual discounts.
+    """
+    total_active_students = Student.objects.filter(school=school, status="active").count()
+
+    # A. Items targeting specific classes
+    target_items_expected = FeeItem.objects.filter(
+        school=school, session=session, term=term_name, active=True, target_class__isnull=False
+    ).annotate(
+        student_count=Count(
+            "target_class__students",
+            filter=Q(target_class__students__status="active", target_class__students__school=school),
+        )
+    ).aggregate(
+        total=Sum(F("amount") * F("student_count"), output_field=DecimalField())
+    )["total"] or 0
+
+    # B. Items applicable to all students (no target class)
+    global_items_sum = FeeItem.objects.filter(
+        school=school, session=session, term=term_name, active=True, target_class__isnull=True
+    ).aggregate(total=Sum("amount"))["total"] or 0
+
+    total_expected = target_items_expected + global_items_sum * total_active_students
+
+    # Subtract individual discounts
+    total_discounts = StudentFee.objects.filter(
+        school=school, fee_item__session=session, fee_item__term=term_name
+    ).aggregate(Sum("discount_amount"))["discount_amount__sum"] or 0
+
+    return total_expected - total_discounts
+
+
+def daily_collections(school, session, term_name):
+    """Completed payments for the term grouped by date, in one query: {date: Decimal}."""
+    rows = (
+        Payment.objects.filter(school=school, session=session, term=term_name, status="completed")
+        .values("date")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    return {row["date"]: row["total"] or Decimal(0) for row in rows}
+
+
+def _cache_key(school_id, session, term_name):
+    # v2: amounts are cached as Decimal strings
+    return f"bursary:revenue:v2:{school_id}:{session}:{term_name}"
+
+
+def get_term_revenue_data(school, term):
+    """Cached {"expected": str, "daily": {iso_date: str}} for an AcademicTerm; amounts are Decimal strings."""
+    key = _cache_key(school.id, term.session, term.name)
+    data = cache.get(key)
+    if data is None:
+        data = {
+            "expected": str(expected_term_revenue(school, term.session, term.name)),
+            "daily": {
+                d.isoformat(): str(amount) for d, amount in daily_collections(school, term.session, term.name).items()
+            },
+        }
+        cache.set(key, data, REVENUE_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_term_revenue(school_id, session, term_name):
+    if not (school_id and session and term_name):
+        return
+    try:
+        cache.delete(_cache_key(school_id, session, term_name))
+    except Exception as e:
+        logger.warning("Revenue cache invalidation error: %s", e)
+
+
+def _buckets(start, end, granularity):
+    """Yield (label, bucket_start, bucket_end_exclusive) covering [start, end]."""
+    if granularity == "day":
+        current = start
+        while current <= end:
+            yield current.isoformat(), current, current + timedelta(days=1)
+            current += timedelta(days=1)
+    elif granularity == "month":
+        current = start
+        while current <= end:
+            first_of_next = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+            yield current.strftime("%b %Y"), current, min(first_of_next, end + timedelta(days=1))
+            current = first_of_next
+    else:
+        current = start
+        week_num = 1
+        while current <= end:
+            yield f"Week {week_num}", current, current + timedelta(days=7)
+            current += timedelta(days=7)
+            week_num += 1
+
+
+def build_revenue_series(school, term, granularity="week", today=None):
+    """
+    Build the chart series for a term: static expected baseline, cumulative collected
+    (None for future buckets) and a linear forecast from the current collection pace.
+    """
+    if granularity not in GRANULARITIES:
+        granularity = "week"
+    today = today or timezone.now().date()
+
+    data = get_term_revenue_data(school, term)
+    net_expected = float(data["expected"])
+    daily = {date.fromisoformat(d): float(amount) for d, amount in data["daily"].items()}
+
+    buckets = list(_buckets(term.start_date, term.end_date, granularity))
+    labels, expected_points, collected_points = [], [], []
+    cumulative_collected = 0
+
+    for label, bucket_start, bucket_end in buckets:
+        labels.append(label)
+        expected_points.append(net_expected)
+
+        if bucket_start <= today:
+            cumulative_collected += sum(
+                amount for d, amount in daily.items() if bucket_start <= d < bucket_end
+            )
+            collected_points.append(cumulative_collected)
+        else:
+            # Future buckets don't have actual collections yet
+            collected_points.append(None)
+
+    # Forecast Projection (Starts from current cumulative collected)
+    days_elapsed = (today - term.start_date).days
+    days_total = (term.end_date - term.start_date).days
+
+    current_idx = 0
+    for idx, (_, bucket_start, _) in enumerate(buckets):
+        if bucket_start <= today:
+            current_idx = idx
+    current_collected = collected_points[current_idx] if days_elapsed >= 0 and buckets else 0
+
+    # Use simple linear pace, fallback to static baseline if term just started
+    if days_elapsed >= 7 and current_collected > 0:
+        pace_per_day = current_collected / days_elapsed
+    else:
+        pace_per_day = net_expected / days_total if days_total > 0 else 0
+
+    forecast_points = []
+    current_start = buckets[current_idx][1] if buckets else term.start_date
+    for idx, (_, bucket_start, _) in enumerate(buckets):
+        if (bucket_start - term.start_date).days < days_elapsed and idx <= current_idx:
+            forecast_points.append(collected_points[idx])
+        else:
+            projected = current_collected + pace_per_day * (bucket_start - current_start).days
+            # Clamp forecast to not exceed 120% of expected revenue (realistic buffer)
+            forecast_points.append(min(round(projected, 2), float(net_expected * 1.2)))
+
+    return {
+        "granularity": granularity,
+        "labels": labels,
+        "expected": expected_points,
+        "collected": collected_points,
+        "forecast": forecast_points,
+    }
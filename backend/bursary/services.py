@@ -1,9 +1,32 @@
+"""
+Bulk discount engine.
+
+A discount applies to one fee item, so its value is the same for every
+student in scope and is computed once. apply_bulk_discount resolves the scope
+to student ids once and works on the whole set: missing StudentFees are
+bulk-created, existing discounts are found with one query (and dropped with
+one DELETE when overriding), FeeDiscounts are bulk-inserted and
+`discount_amount` is set with one UPDATE. Bulk writes skip the ledger and
+revenue cache signals, so the fee item's term is re-derived once at the end
+and its cached revenue dropped once the transaction commits.
+"""
+
 from decimal import Decimal
+
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
 from academic.models import Student
-from core.models import GlobalActivityLog
-from .models import FeeDiscount, StudentFee, FeeItem
+from core.activity_buffer import record_activity
+from core.cache_utils import invalidate_model_cache
+
+from .ledger import refresh_ledger
+from .models import FeeDiscount, FeeItem, StudentFee
+from .revenue import invalidate_term_revenue
+
+PREVIEW_LIMIT = 100
+
 
 def resolve_scope(school, scope):
     """
@@ -11,7 +34,7 @@ def resolve_scope(school, scope):
     """
     scope_type = scope.get("type")
     ids = scope.get("ids", [])
-    
+
     if scope_type == "student":
         return Student.objects.filter(school=school, id__in=ids, status="active")
     elif scope_type == "class":
@@ -22,115 +45,127 @@ def resolve_scope(school, scope):
         return Student.objects.filter(school=school, groups__id__in=ids, status="active").distinct()
     return Student.objects.none()
 
+
+def discount_value(fee_amount, discount_type, value):
+    """Discount for one fee of `fee_amount`, never more than the fee itself."""
+    discount_val = Decimal("0")
+    if discount_type == "percent":
+        discount_val = (fee_amount * Decimal(str(value))) / Decimal("100")
+    elif discount_type == "fixed":
+        discount_val = Decimal(str(value))
+    elif discount_type == "full_waiver":
+        discount_val = fee_amount
+    elif discount_type == "scholarship":
+        # Assuming scholarship value is a fixed deduction for now
+        discount_val = Decimal(str(value))
+    return min(discount_val, fee_amount)
+
+
 def apply_bulk_discount(school, scope, fee_item_id, discount_type, value, reason, applied_by, override=False):
-    students = resolve_scope(school, scope)
-    count = 0
-    
     try:
-        fee_item = FeeItem.objects.get(id=fee_item_id, school=school)
+        fee_item = FeeItem.objects.select_related("category").get(id=fee_item_id, school=school)
     except FeeItem.DoesNotExist:
         return 0
 
+    student_ids = list(resolve_scope(school, scope).values_list("id", flat=True))
+    if not student_ids:
+        return 0
+    discount_val = discount_value(fee_item.amount, discount_type, value)
+
     with transaction.atomic():
-        for student in students:
-            # Get or create StudentFee for this student and fee item
-            student_fee, created = StudentFee.objects.get_or_create(
-                school=school,
-                student=student,
-                fee_item=fee_item
-            )
-            
-            # Check for existing discount if not overriding
-            if not override and FeeDiscount.objects.filter(student_fee=student_fee).exists():
-                continue
-                
-            # Calculate discount value
-            discount_val = Decimal("0")
-            if discount_type == "percent":
-                discount_val = (fee_item.amount * Decimal(str(value))) / Decimal("100")
-            elif discount_type == "fixed":
-                discount_val = Decimal(str(value))
-            elif discount_type == "full_waiver":
-                discount_val = fee_item.amount
-            elif discount_type == "scholarship":
-                # Assuming scholarship value is a fixed deduction for now
-                discount_val = Decimal(str(value))
-            
-            # Ensure discount doesn't exceed fee amount
-            discount_val = min(discount_val, fee_item.amount)
-
-            # Create or Update FeeDiscount record
-            # If override is True, delete previous ones for this specific fee
-            if override:
-                FeeDiscount.objects.filter(student_fee=student_fee).delete()
-
-            FeeDiscount.objects.create(
-                school=school,
-                student=student,
-                student_fee=student_fee,
-                discount_type=discount_type,
-                value=discount_val,
-                reason=reason,
-                applied_by=applied_by
-            )
-            
-            # Sync to StudentFee for balance calculations
-            student_fee.discount_amount = discount_val
-            student_fee.save()
-            count += 1
-            
-        if count > 0:
-            GlobalActivityLog.objects.create(
-                action="RECORDS_MUTATED",
-                school=school,
-                user=applied_by,
-                description=f"Applied bulk {discount_type} discount to {count} students",
-                metadata={
-                    "count": count, 
-                    "type": discount_type, 
-                    "value": str(value),
-                    "fee_item": fee_item.category.name,
-                    "reason": reason
-                }
-            )
-            
+        fees = StudentFee.objects.filter(fee_item=fee_item, student_id__in=student_ids)
+        existing = dict(fees.values_list("student_id", "id"))
+        missing = [
+            StudentFee(school=school, student_id=student_id, fee_item=fee_item)
+            for student_id in student_ids
+            if student_id not in existing
+        ]
+        if missing:
+            # ignore_conflicts: a fee allocated concurrently is picked up by the re-read below
+            StudentFee.objects.bulk_create(missing, batch_size=500, ignore_conflicts=True)
+            existing = dict(fees.values_list("student_id", "id"))
+
+        discounted = FeeDiscount.objects.filter(student_fee_id__in=existing.values())
+        if override:
+            targets = existing
+            # Nothing references FeeDiscount, so skip the collector and its per-row post_delete signals
+            discounted._raw_delete(discounted.db)
+        else:
+            skip = set(discounted.values_list("student_fee_id", flat=True))
+            targets = {student_id: fee_id for student_id, fee_id in existing.items() if fee_id not in skip}
+
+        FeeDiscount.objects.bulk_create(
+            [
+                FeeDiscount(
+                    school=school,
+                    student_id=student_id,
+                    student_fee_id=fee_id,
+                    discount_type=discount_type,
+                    value=discount_val,
+                    reason=reason,
+                    applied_by=applied_by,
+                )
+                for student_id, fee_id in targets.items()
+            ],
+            batch_size=500,
+        )
+        # Sync to StudentFee for balance calculations
+        StudentFee.objects.filter(id__in=targets.values()).update(
+            discount_amount=discount_val, updated_at=timezone.now()
+        )
+
+        if missing or targets:
+            refresh_ledger(school.id, "expected", {(fee_item.session, fee_item.term)})
+            # After commit, so no reader re-caches the term from rows that are not visible yet
+            transaction.on_commit(lambda: invalidate_term_revenue(school.id, fee_item.session, fee_item.term))
+
+    count = len(targets)
+    if count > 0:
+        transaction.on_commit(lambda: invalidate_model_cache("StudentFee", school.id))
+        record_activity(
+            "RECORDS_MUTATED",
+            school_id=school.id,
+            user_id=getattr(applied_by, "pk", None),
+            description=f"Applied bulk {discount_type} discount to {count} students",
+            metadata={
+                "count": count,
+                "type": discount_type,
+                "value": str(value),
+                "fee_item": fee_item.category.name if fee_item.category else str(fee_item),
+                "reason": reason,
+            },
+        )
+
     return count
 
+
 def preview_bulk_discount(school, scope, fee_item_id, discount_type, value):
-    students = resolve_scope(school, scope)
-    
     try:
         fee_item = FeeItem.objects.get(id=fee_item_id, school=school)
     except FeeItem.DoesNotExist:
-        return {"count": 0, "total_impact": 0, "students": []}
-
-    total_impact = Decimal("0")
-    affected_students = []
-
-    for student in students:
-        # Calculate discount value
-        discount_val = Decimal("0")
-        if discount_type == "percent":
-            discount_val = (fee_item.amount * Decimal(str(value))) / Decimal("100")
-        elif discount_type == "fixed":
-            discount_val = Decimal(str(value))
-        elif discount_type == "full_waiver":
-            discount_val = fee_item.amount
-        elif discount_type == "scholarship":
-            discount_val = Decimal(str(value))
-        
-        discount_val = min(discount_val, fee_item.amount)
-        total_impact += discount_val
-        affected_students.append({
-            "id": student.id,
-            "names": student.names,
-            "student_no": student.student_no,
-            "class": student.current_class.name if student.current_class else "N/A",
-            "potential_discount": float(discount_val)
-        })
+        return {"count": 0, "total_impact": 0, "already_discounted": 0, "students": []}
+
+    discount_val = discount_value(fee_item.amount, discount_type, value)
+    students = resolve_scope(school, scope)
+    totals = students.annotate(
+        has_discount=Exists(FeeDiscount.objects.filter(student_id=OuterRef("pk"), student_fee__fee_item=fee_item))
+    ).aggregate(count=Count("id"), already_discounted=Count("id", filter=Q(has_discount=True)))
 
     return {
-        "count": len(affected_students),
-        "total_impact": float(total_impact),
-        "students": affected_students[:100]  # Limit preview list
+        "count": totals["count"],
+        "total_impact": float(discount_val * totals["count"]),
+        # Skipped by apply_bulk_discount unless it overrides
+        "already_discounted": totals["already_discounted"],
+        "students": [
+            {
+                "id": student["id"],
+                "names": student["names"],
+                "student_no": student["student_no"],
+                "class": student["current_class__name"] or "N/A",
+                "potential_discount": float(discount_val),
+            }
+            for student in students.order_by("names", "id").values(
+                "id", "names", "student_no", "current_class__name"
+            )[:PREVIEW_LIMIT]
+        ],
     }
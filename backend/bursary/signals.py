@@ -0,0 +1,121 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .ledger import apply_ledger_change, ledger_lines, refresh_ledger, scholarship_periods, stored_ledger_lines
+from .models import Expense, FeeDiscount, FeeItem, Payment, Scholarship, StudentFee
+from .revenue import invalidate_term_revenue
+
+logger = logging.getLogger(__name__)
+
+LEDGER_SENDERS = (Payment, Expense, StudentFee, "hr.Payroll")
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=FeeItem)
+@receiver(post_delete, sender=FeeItem)
+def invalidate_revenue_on_write(sender, instance, **kwargs):
+    invalidate_term_revenue(instance.school_id, instance.session, instance.term)
+
+    # A record moved to another term also changes the term it left
+    original = instance._original_values or {}
+    old_session, old_term = original.get("session"), original.get("term")
+    if (old_session, old_term) != (instance.session, instance.term):
+        invalidate_term_revenue(instance.school_id, old_session, old_term)
+
+
+@receiver(post_save, sender=StudentFee)
+@receiver(post_delete, sender=StudentFee)
+def invalidate_revenue_on_student_fee_write(sender, instance, **kwargs):
+    # Expected revenue subtracts discount_amount; the ledger lines captured before the write hold the term it left
+    periods = {key[:2] for key, _ in getattr(instance, "_ledger_before", [])}
+    periods.add((instance.fee_item.session, instance.fee_item.term))
+    for session, term in periods:
+        invalidate_term_revenue(instance.school_id, session, term)
+
+
+@receiver(post_save, sender=FeeDiscount)
+@receiver(post_delete, sender=FeeDiscount)
+def invalidate_revenue_on_discount_write(sender, instance, **kwargs):
+    period = (
+        StudentFee.objects.filter(pk=instance.student_fee_id).values_list("fee_item__session", "fee_item__term").first()
+    )
+    if period:
+        invalidate_term_revenue(instance.school_id, *period)
+
+
+# --- Ledger rollup -----------------------------------------------------------
+# Source saves run in a transaction (LedgerSourceMixin) and deletes run inside
+# the deletion collector's transaction, so the rollup commits with the row.
+
+
+def capture_ledger_before_save(sender, instance, raw=False, **kwargs):
+    instance._ledger_before = [] if raw else stored_ledger_lines(instance)
+
+
+def apply_ledger_after_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    apply_ledger_change(instance.school_id, getattr(instance, "_ledger_before", []), ledger_lines(instance))
+
+
+def capture_ledger_before_delete(sender, instance, **kwargs):
+    instance._ledger_before = ledger_lines(instance)
+
+
+def apply_ledger_after_delete(sender, instance, **kwargs):
+    apply_ledger_change(instance.school_id, getattr(instance, "_ledger_before", []), [])
+
+
+for ledger_sender in LEDGER_SENDERS:
+    pre_save.connect(capture_ledger_before_save, sender=ledger_sender, dispatch_uid=f"ledger_pre_save_{ledger_sender}")
+    post_save.connect(apply_ledger_after_save, sender=ledger_sender, dispatch_uid=f"ledger_post_save_{ledger_sender}")
+    pre_delete.connect(
+        capture_ledger_before_delete, sender=ledger_sender, dispatch_uid=f"ledger_pre_delete_{ledger_sender}"
+    )
+    post_delete.connect(
+        apply_ledger_after_delete, sender=ledger_sender, dispatch_uid=f"ledger_post_delete_{ledger_sender}"
+    )
+
+
+@receiver(post_save, sender=FeeItem)
+def refresh_ledger_on_fee_item_change(sender, instance, created, **kwargs):
+    # New items have no allocations yet; deletes cascade through StudentFee signals.
+    if created:
+        return
+    original = instance._original_values or {}
+    old_state = (original.get("amount"), original.get("session"), original.get("term"), original.get("category_id"))
+    if old_state == (instance.amount, instance.session, instance.term, instance.category_id):
+        return
+    refresh_ledger(
+        instance.school_id,
+        "expected",
+        {(instance.session, instance.term), (original.get("session"), original.get("term"))},
+    )
+
+
+@receiver(pre_save, sender=Scholarship)
+def capture_scholarship_periods_before_save(sender, instance, raw=False, **kwargs):
+    instance._ledger_periods = set()
+    if raw or not instance.pk:
+        return
+    stored = Scholarship.objects.filter(pk=instance.pk).values("benefit_type", "value").first()
+    if stored and (stored["benefit_type"], stored["value"]) != (instance.benefit_type, instance.value):
+        instance._ledger_periods = scholarship_periods(instance.pk)
+
+
+@receiver(pre_delete, sender=Scholarship)
+def capture_scholarship_periods_before_delete(sender, instance, **kwargs):
+    # Deleting sets StudentFee.scholarship to NULL with a plain UPDATE (no signals)
+    instance._ledger_periods = scholarship_periods(instance.pk)
+
+
+@receiver(post_save, sender=Scholarship)
+@receiver(post_delete, sender=Scholarship)
+def refresh_ledger_on_scholarship_change(sender, instance, **kwargs):
+    periods = getattr(instance, "_ledger_periods", ())
+    refresh_ledger(instance.school_id, "expected", periods)
+    for session, term in periods:
+        invalidate_term_revenue(instance.school_id, session, term)
@@ -0,0 +1,45 @@
+import logging
+
+from celery import shared_task
+
+from .ledger import reconcile_ledger
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_ledgers(school_id=None):
+    """
+    Nightly check of the LedgerRollup against the raw Payment/Expense/StudentFee/
+    Payroll tables. Drifted buckets are logged and repaired.
+    """
+    from schools.models import School
+
+    schools = School.objects.all()
+    if school_id:
+        schools = schools.filter(id=school_id)
+
+    drifted = 0
+    for school_id in schools.values_list("id", flat=True).iterator():
+        try:
+            drift = reconcile_ledger(school_id)
+        except Exception as e:
+            logger.error(f"Ledger reconciliation failed for school {school_id}: {e}")
+            continue
+        if drift:
+            drifted += 1
+            logger.warning(f"Ledger drift repaired for school {school_id}: {len(drift)} bucket(s)")
+
+    logger.info(f"Ledger reconciliation finished, {drifted} school(s) repaired.")
+    return drifted
+
+
+@shared_task(ignore_result=True)
+def process_payment_events():
+    """Apply queued payment webhook events. Queued after each new event and run by Celery Beat as a fallback."""
+    from .webhook_queue import process_payment_events as process
+
+    handled = process()
+    if handled:
+        logger.info(f"Processed {handled} payment webhook event(s).")
+    return handled
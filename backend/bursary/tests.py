@@ -2,21 +2,37 @@
 Tests for Bursary Module - Payments, Fees, Expenses
 """
 
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
 from academic.models import Class, Student
-from schools.models import School
+from core import activity_buffer
+from schools.models import School, SchoolPaymentConfig
 
+from .ledger import ledger_totals, reconcile_ledger
 from .models import (
     Expense,
     FeeCategory,
+    FeeDiscount,
     FeeItem,
+    LedgerRollup,
     Payment,
+    PaymentEvent,
+    Scholarship,
     StudentFee,
 )
+from .webhook_queue import process_payment_events, replay_payment_events
 
 
 class FeeCategoryAPITests(APITestCase):
@@ -319,4 +335,384 @@ class TenantIsolationTests(APITestCase):
         # School B admin should not see School A's payment
         self.client.force_authenticate(user=self.admin_b)
         response = self.client.get(f"/api/payments/{payment_a.id}/", HTTP_X_TENANT_ID=self.school_b.domain)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RevenueSeriesTests(APITestCase):
+    def setUp(self):
+        from datetime import date
+
+        from academic.models import AcademicTerm
+
+        self.client = APIClient()
+        self.school = School.objects.create(name="Test School", domain="test-revenue")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@test-revenue",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.term = AcademicTerm.objects.create(
+            school=self.school,
+            session="2025/2026",
+            name="First Term",
+            start_date=date(2025, 9, 1),
+            end_date=date(2025, 10, 12),
+            is_current=True,
+        )
+        self.student_class = Class.objects.create(name="JSS 1", school=self.school)
+        self.student = Student.objects.create(
+            school=self.school, student_no="RV001", names="Rev Student", gender="Male", current_class=self.student_class
+        )
+        self.category = FeeCategory.objects.create(school=self.school, name="Tuition", is_optional=False)
+        FeeItem.objects.create(
+            school=self.school, category=self.category, amount=100000, session="2025/2026", term="First Term"
+        )
+        for ref, day, amount in [("RV-1", date(2025, 9, 2), 10000), ("RV-2", date(2025, 9, 3), 5000), ("RV-3", date(2025, 9, 10), 20000)]:
+            self._pay(ref, day, amount)
+
+    def _pay(self, reference, day, amount):
+        return Payment.objects.create(
+            school=self.school,
+            student=self.student,
+            amount=amount,
+            date=day,
+            reference=reference,
+            status="completed",
+            session="2025/2026",
+            term="First Term",
+        )
+
+    def test_weekly_series_uses_one_grouped_query_and_is_cached(self):
+        from datetime import date
+
+        from django.core.cache import cache
+
+        from .revenue import build_revenue_series
+
+        cache.clear()
+        series = build_revenue_series(self.school, self.term, "week", today=date(2025, 9, 20))
+        self.assertEqual(series["labels"][:3], ["Week 1", "Week 2", "Week 3"])
+        self.assertEqual(series["collected"][:3], [15000.0, 35000.0, 35000.0])
+        self.assertIsNone(series["collected"][-1])
+        self.assertEqual(series["expected"][0], 100000.0)
+
+        with self.assertNumQueries(0):
+            build_revenue_series(self.school, self.term, "month", today=date(2025, 9, 20))
+
+    def test_payment_write_invalidates_cached_series(self):
+        from datetime import date
+
+        from .revenue import build_revenue_series
+
+        build_revenue_series(self.school, self.term, "day", today=date(2025, 9, 20))
+        self._pay("RV-4", date(2025, 9, 2), 1000)
+
+        series = build_revenue_series(self.school, self.term, "day", today=date(2025, 9, 20))
+        self.assertEqual(series["labels"][1], "2025-09-02")
+        self.assertEqual(series["collected"][1], 11000.0)
+
+    def test_discount_write_invalidates_cached_revenue(self):
+        from .revenue import get_term_revenue_data
+
+        fee = StudentFee.objects.create(school=self.school, student=self.student, fee_item=FeeItem.objects.get())
+        self.assertEqual(Decimal(get_term_revenue_data(self.school, self.term)["expected"]), Decimal("100000"))
+
+        fee.discount_amount = 2500
+        fee.save()
+        self.assertEqual(Decimal(get_term_revenue_data(self.school, self.term)["expected"]), Decimal("97500"))
+
+        response = self.client.get("/api/bursary/dashboard/revenue-summary/", HTTP_X_TENANT_ID=self.school.domain)
+        self.assertEqual((response.data["expected"], response.data["collected"]), (97500.0, 35000.0))
+
+    def test_revenue_chart_endpoint_validates_granularity(self):
+        response = self.client.get(
+            "/api/bursary/dashboard/revenue-chart/", {"granularity": "hour"}, HTTP_X_TENANT_ID=self.school.domain
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            "/api/bursary/dashboard/revenue-chart/", {"granularity": "month"}, HTTP_X_TENANT_ID=self.school.domain
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["labels"], ["Sep 2025", "Oct 2025"])
+
+
+class LedgerRollupTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.school = School.objects.create(name="Test School", domain="test-ledger")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@test-ledger",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.student_class = Class.objects.create(name="JSS 1", school=self.school)
+        self.students = [
+            Student.objects.create(
+                school=self.school,
+                student_no=f"LG00{i}",
+                names=f"Ledger Student {i}",
+                gender="Female",
+                current_class=self.student_class,
+            )
+            for i in range(3)
+        ]
+        self.category = FeeCategory.objects.create(school=self.school, name="Tuition")
+        self.fee_item = FeeItem.objects.create(
+            school=self.school, category=self.category, amount=50000, session="2025/2026", term="First Term"
+        )
+        self.scholarship = Scholarship.objects.create(
+            school=self.school, name="Half", benefit_type="percentage", value=50
+        )
+        StudentFee.objects.create(school=self.school, student=self.students[0], fee_item=self.fee_item)
+        StudentFee.objects.create(
+            school=self.school, student=self.students[1], fee_item=self.fee_item, discount_amount=5000
+        )
+        StudentFee.objects.create(
+            school=self.school, student=self.students[2], fee_item=self.fee_item, scholarship=self.scholarship
+        )
+        self.payment = self._pay("LG-1", 20000)
+        self._pay("LG-2", 10000, term="Second Term")
+        Expense.objects.create(
+            school=self.school, title="Chalk", amount=3000, category="supplies",
+            recorded_by="admin", session="2025/2026", term="First Term",
+        )
+
+    def _pay(self, reference, amount, term="First Term"):
+        return Payment.objects.create(
+            school=self.school,
+            student=self.students[0],
+            amount=amount,
+            reference=reference,
+            recorded_by="admin",
+            session="2025/2026",
+            term=term,
+        )
+
+    def test_rollup_tracks_writes_and_matches_raw_tables(self):
+        totals = ledger_totals(self.school, session="2025/2026", term="First Term")
+        self.assertEqual(totals["expected"], Decimal("120000"))  # 50000 + 45000 + 25000
+        self.assertEqual(totals["collected"], Decimal("20000"))
+        self.assertEqual(totals["expense"], Decimal("3000"))
+
+        # Edits move money between buckets, deletes remove it
+        self.payment.amount = 25000
+        self.payment.term = "Second Term"
+        self.payment.save()
+        self.assertEqual(ledger_totals(self.school, "2025/2026", "First Term")["collected"], 0)
+        self.assertEqual(ledger_totals(self.school, "2025/2026", "Second Term")["collected"], Decimal("35000"))
+
+        self.fee_item.amount = 60000
+        self.fee_item.save()
+        self.scholarship.value = 100
+        self.scholarship.save()
+        StudentFee.objects.filter(student=self.students[1]).first().delete()
+        self.assertEqual(ledger_totals(self.school, "2025/2026", "First Term")["expected"], Decimal("60000"))
+
+        from datetime import date
+
+        from hr.models import Payroll
+
+        payroll = Payroll.objects.create(school=self.school, month=date(2025, 9, 1), total_wage_bill=7000)
+        self.assertEqual(ledger_totals(self.school)["payroll"], 0)
+        payroll.status = "paid"
+        payroll.save()
+        self.assertEqual(ledger_totals(self.school, "2025/2026", "First Term")["payroll"], Decimal("7000"))
+
+        self.assertEqual(reconcile_ledger(self.school.id), [])
+
+    def test_reconcile_repairs_writes_that_bypass_signals(self):
+        Payment.objects.filter(pk=self.payment.pk).update(amount=1)
+
+        drift = reconcile_ledger(self.school.id)
+        self.assertEqual(len(drift), 1)
+        self.assertEqual(drift[0]["key"], ("2025/2026", "First Term", "collected", ""))
+        self.assertEqual(ledger_totals(self.school, "2025/2026", "First Term")["collected"], Decimal("1"))
+        self.assertEqual(reconcile_ledger(self.school.id), [])
+
+    def test_migration_backfill_matches_the_raw_tables(self):
+        import importlib
+        from datetime import date
+
+        from django.apps import apps
+
+        from hr.models import Payroll
+
+        Payroll.objects.create(school=self.school, month=date(2025, 9, 1), total_wage_bill=7000, status="paid")
+        LedgerRollup.objects.filter(school=self.school).delete()
+
+        migration = importlib.import_module("bursary.migrations.0017_backfill_ledger_rollup")
+        migration.backfill_ledger_rollup(apps, None)
+        self.assertEqual(reconcile_ledger(self.school.id), [])
+
+    def test_financial_stats_reads_rollup(self):
+        with self.assertNumQueries(1):
+            ledger_totals(self.school, "2025/2026", "First Term")
+        self.assertLessEqual(LedgerRollup.objects.filter(school=self.school).count(), 5)
+
+        response = self.client.get(
+            "/api/bursary/dashboard/financial-stats/",
+            {"session": "2025/2026", "term": "First Term"},
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["expected_revenue"], 120000.0)
+        self.assertEqual(response.data["total_collected"], 20000.0)
+        self.assertEqual(response.data["total_outstanding"], 100000.0)
+        self.assertEqual(response.data["net_balance"], 17000.0)
+
+
+class PaymentWebhookQueueTests(APITestCase):
+    def setUp(self):
+        # Confirmations go through the activity buffer; start from an empty one
+        patcher = patch.object(activity_buffer, "_buffer", activity_buffer.LocalActivityBuffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.school = School.objects.create(name="Webhook School", domain="webhook-school")
+        SchoolPaymentConfig.objects.create(school=self.school, paystack_webhook_secret="whsec")
+        student = Student.objects.create(school=self.school, student_no="ST001", names="Ada Obi", gender="Female")
+        self.payment = Payment.objects.create(
+            school=self.school,
+            student=student,
+            amount=15000,
+            method="online",
+            status="pending",
+            gateway_reference="PSK-1",
+            session="2025/2026",
+            term="First Term",
+        )
+
+    def _deliver(self, reference, event="charge.success"):
+        payload = {"event": event, "data": {"reference": reference, "status": "success"}}
+        body = json.dumps(payload).encode()
+        return self.client.post(
+            f"/api/bursary/webhooks/paystack/{self.school.domain}/",
+            body,
+            content_type="application/json",
+            HTTP_X_PAYSTACK_SIGNATURE=hmac.new(b"whsec", body, hashlib.sha512).hexdigest(),
+        )
+
+    def test_events_are_queued_once_and_applied_in_batches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._deliver("PSK-1").status_code, 200)
+            self.assertEqual(self._deliver("PSK-1").status_code, 200)
+            self._deliver("PSK-unknown")
+            self._deliver("PSK-1", event="transfer.success")
+
+        self.assertEqual(PaymentEvent.objects.count(), 3)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "completed")
+        self.assertEqual(self.payment.verification_data["reference"], "PSK-1")
+        self.assertEqual(
+            dict(PaymentEvent.objects.values_list("reference", "status").filter(event="charge.success")),
+            {"PSK-1": "processed", "PSK-unknown": "unmatched"},
+        )
+        self.assertEqual(PaymentEvent.objects.get(event="transfer.success").status, "ignored")
+
+    def test_replay_reprocesses_a_date_range(self):
+        self._deliver("PSK-2")
+        self.assertEqual(process_payment_events(), 1)
+        self.assertEqual(PaymentEvent.objects.get().status, "unmatched")
+
+        Payment.objects.filter(pk=self.payment.pk).update(gateway_reference="PSK-2")
+        today = timezone.localdate()
+        self.assertEqual(replay_payment_events(today - timedelta(days=1), today - timedelta(days=1)), 0)
+        self.assertEqual(replay_payment_events(today, today, statuses=["unmatched"]), 1)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "completed")
+        self.assertEqual(PaymentEvent.objects.get().attempts, 2)
+
+    def test_only_pending_payments_are_confirmed(self):
+        self._deliver("PSK-1")
+        self.assertEqual(process_payment_events(), 1)
+        Payment.objects.filter(pk=self.payment.pk).update(status="refunded")
+
+        today = timezone.localdate()
+        self.assertEqual(replay_payment_events(today, today), 1)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "refunded")
+        self.assertEqual(PaymentEvent.objects.get().status, "ignored")
+
+
+class BulkDiscountTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.school = School.objects.create(name="Discount School", domain="discount-school")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@discount-school",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.student_class = Class.objects.create(name="JSS 1", school=self.school)
+        self.students = [
+            Student.objects.create(
+                school=self.school,
+                student_no=f"DS{i:03}",
+                names=f"Discount Student {i}",
+                gender="Male",
+                current_class=self.student_class,
+            )
+            for i in range(20)
+        ]
+        category = FeeCategory.objects.create(school=self.school, name="Tuition")
+        self.fee_item = FeeItem.objects.create(
+            school=self.school, category=category, amount=40000, session="2025/2026", term="First Term"
+        )
+        fee = StudentFee.objects.create(school=self.school, student=self.students[0], fee_item=self.fee_item)
+        FeeDiscount.objects.create(
+            school=self.school, student=self.students[0], student_fee=fee, discount_type="fixed", value=1000
+        )
+        fee.discount_amount = 1000
+        fee.save()
+
+    def _post(self, path, **data):
+        payload = {"scope": {"type": "class", "ids": [self.student_class.id]}, "fee_item": self.fee_item.id, **data}
+        return self.client.post(
+            f"/api/bursary/discounts/{path}/", payload, format="json", HTTP_X_TENANT_ID=self.school.domain
+        )
+
+    def test_preview_totals_the_scope(self):
+        response = self._post("preview", discount_type="percent", value=25)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 20)
+        self.assertEqual(response.data["already_discounted"], 1)
+        self.assertEqual(response.data["total_impact"], 200000.0)
+        self.assertEqual(response.data["students"][0]["class"], "JSS 1")
+
+    def test_apply_is_set_based_and_keeps_the_ledger_in_step(self):
+        from types import SimpleNamespace
+
+        from .revenue import get_term_revenue_data
+
+        term = SimpleNamespace(session="2025/2026", name="First Term")
+        self.assertEqual(Decimal(get_term_revenue_data(self.school, term)["expected"]), Decimal("799000"))
+
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self._post("bulk", discount_type="percent", value=25, reason="Siblings")
+        self.assertEqual(response.data["count"], 19)
+        self.assertLess(len(ctx.captured_queries), 30)
+
+        fees = StudentFee.objects.filter(fee_item=self.fee_item)
+        self.assertEqual(fees.count(), 20)
+        self.assertEqual(fees.filter(discount_amount=10000).count(), 19)
+        self.assertEqual(FeeDiscount.objects.filter(student_fee__fee_item=self.fee_item).count(), 20)
+        self.assertEqual(ledger_totals(self.school, "2025/2026", "First Term")["expected"], Decimal("609000"))
+        self.assertEqual(reconcile_ledger(self.school.id), [])
+
+        # Overriding drops the old discounts with one DELETE, not one query (and signal) per row
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self._post("bulk", discount_type="full_waiver", override=True)
+        self.assertEqual(response.data["count"], 20)
+        self.assertLess(len(ctx.captured_queries), 30)
+        self.assertEqual(Decimal(get_term_revenue_data(self.school, term)["expected"]), Decimal("0"))
+        self.assertEqual(FeeDiscount.objects.filter(student_fee__fee_item=self.fee_item).count(), 20)
+        self.assertEqual(ledger_totals(self.school, "2025/2026", "First Term")["expected"], Decimal("0"))
@@ -1,9 +1,9 @@
 import json
+import logging
+from decimal import Decimal
 
 from django.conf import settings
 from django.db import transaction
-from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When
-from django.db.models.functions import Coalesce
 from django.utils import timezone
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
@@ -12,10 +12,8 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-import logging
-logger = logging.getLogger(__name__)
-
-from academic.models import AcademicTerm, Student, Teacher
+from academic.models import AcademicTerm, Teacher
+from core.cache_utils import cache_list_endpoint
 from core.pagination import LargePagination, StandardPagination
 from core.tenant_utils import get_request_school
 from schools.models import SchoolSettings
@@ -32,7 +30,10 @@ from .models import (
     Scholarship,
     FeeDiscount,
 )
+from .ledger import ledger_totals
+from .revenue import GRANULARITIES, build_revenue_series, get_term_revenue_data
 from .services import apply_bulk_discount, preview_bulk_discount
+from .webhook_queue import enqueue_event
 from .serializers import (
     AdmissionPackageSerializer,
     ExpenseSerializer,
@@ -44,36 +45,7 @@ from .serializers import (
     FeeDiscountSerializer,
 )
 
-
-def calculate_expected_revenue(school, session=None, term=None):
-    """
-    Calculate net expected revenue from assigned fees, accounting for discounts
-    and scholarships.
-    """
-    filters = {"school": school}
-    if session:
-        filters["fee_item__session"] = session
-    if term:
-        filters["fee_item__term"] = term
-
-    money_field = DecimalField(max_digits=12, decimal_places=2)
-    scholarship_discount = Case(
-        When(
-            scholarship__benefit_type="percentage",
-            then=ExpressionWrapper(F("fee_item__amount") * F("scholarship__value") / Value(100), output_field=money_field),
-        ),
-        When(scholarship__benefit_type="fixed", then=F("scholarship__value")),
-        default=Value(0),
-        output_field=money_field,
-    )
-    net_due = ExpressionWrapper(F("fee_item__amount") - F("discount_amount") - scholarship_discount, output_field=money_field)
-
-    return (
-        StudentFee.objects.filter(**filters).aggregate(total=Coalesce(Sum(net_due), Value(0), output_field=money_field))[
-            "total"
-        ]
-        or 0
-    )
+logger = logging.getLogger(__name__)
 
 
 def _is_truthy(value):
@@ -416,27 +388,14 @@ class PaystackWebhook(APIView):
             event = json.loads(body)
         except (ValueError, json.JSONDecodeError):
             return Response({"error": "Invalid JSON"}, status=400)
+        if not isinstance(event, dict):
+            return Response({"error": "Invalid JSON"}, status=400)
         
-        event_type = event.get("event")
-        data = event.get("data", {})
-        
-        logger.info(f"Paystack webhook: {event_type}")
-        
-        if event_type == "charge.success":
-            reference = data.get("reference")
-            status = data.get("status")
-            
-            if status == "success":
-                # Update payment record
-                try:
-                    payment = Payment.objects.get(gateway_reference=reference)
-                    payment.status = "completed"
-                    payment.verification_data = data
-                    payment.save()
-                    logger.info(f"Payment confirmed: {reference}")
-                except Payment.DoesNotExist:
-                    logger.warning(f"Payment not found: {reference}")
-        
+        logger.info(f"Paystack webhook: {event.get('event')}")
+
+        # Applied to the payment by bursary.webhook_queue; retries of a stored event are acknowledged as is
+        enqueue_event(event, body)
+
         return Response({"status": "received"})
 
 
@@ -470,6 +429,8 @@ class AdmissionPackageViewSet(TenantViewSet):
 class DashboardViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
+    # Invalidated by Payment, Expense, FeeItem, StudentFee, Scholarship and Payroll writes (CACHE_POLICIES)
+    @cache_list_endpoint(model_name="BursaryDashboard")
     def list(self, request):
         school = get_request_school(request)
         if not school:
@@ -477,25 +438,18 @@ class DashboardViewSet(viewsets.ViewSet):
 
         session, term = _resolve_period_filters(request, school)
 
-        # Simple aggregated stats
-        expected_fees = calculate_expected_revenue(school, session=session, term=term)
+        # Aggregated stats come from the incrementally maintained ledger rollup
+        totals = ledger_totals(school, session=session, term=term)
         financial_filters = {"school": school}
         if session:
             financial_filters["session"] = session
         if term:
             financial_filters["term"] = term
 
-        total_collected = Payment.objects.filter(**financial_filters).aggregate(Sum("amount"))["amount__sum"] or 0
-        total_expenses = Expense.objects.filter(**financial_filters).aggregate(Sum("amount"))["amount__sum"] or 0
-
-        # Payroll stats
-        from hr.models import Payroll
-        total_payroll = (
-            Payroll.objects.filter(school=school, status="paid").aggregate(
-                total=Coalesce(Sum("total_wage_bill"), Value(0), output_field=DecimalField())
-            )["total"]
-            or 0
-        )
+        expected_fees = totals["expected"]
+        total_collected = totals["collected"]
+        total_expenses = totals["expense"]
+        total_payroll = totals["payroll"]
 
         # Outstanding
         outstanding = expected_fees - total_collected
@@ -525,26 +479,11 @@ class DashboardViewSet(viewsets.ViewSet):
 
         session, term = _resolve_period_filters(request, school)
 
-        # Filter by session/term if provided
-        filters = {"school": school}
-        if session:
-            filters["session"] = session
-        if term:
-            filters["term"] = term
-
-        expected_fees = calculate_expected_revenue(school, session=session, term=term)
-
-        total_collected = Payment.objects.filter(**filters).aggregate(Sum("amount"))["amount__sum"] or 0
-        total_expenses = Expense.objects.filter(**filters).aggregate(Sum("amount"))["amount__sum"] or 0
-
-        # Payroll stats (approximate based on session/term as payroll is monthly)
-        from hr.models import Payroll
-        total_payroll = (
-            Payroll.objects.filter(school=school, status="paid").aggregate(
-                total=Coalesce(Sum("total_wage_bill"), Value(0), output_field=DecimalField())
-            )["total"]
-            or 0
-        )
+        totals = ledger_totals(school, session=session, term=term)
+        expected_fees = totals["expected"]
+        total_collected = totals["collected"]
+        total_expenses = totals["expense"]
+        total_payroll = totals["payroll"]
 
         # Outstanding
         outstanding = expected_fees - total_collected
@@ -572,51 +511,12 @@ class DashboardViewSet(viewsets.ViewSet):
         if not term:
             return Response({"error": "Academic term not found"}, status=404)
 
-        from django.db.models import Sum, F, DecimalField, Count, Q
-        
-        # 1. EXPECTED REVENUE CALCULATION
-        # Calculate expected using optimized aggregated queries instead of an N+1 loop.
-        total_active_students = Student.objects.filter(school=school, status="active").count()
-        
-        # A. Items targeting specific classes
-        target_items_expected = FeeItem.objects.filter(
-            school=school, session=term.session, term=term.name, active=True, target_class__isnull=False
-        ).annotate(
-            student_count=Count(
-                'target_class__students',
-                filter=Q(target_class__students__status='active', target_class__students__school=school)
-            )
-        ).aggregate(
-            total=Sum(F('amount') * F('student_count'), output_field=DecimalField())
-        )['total'] or 0
-        
-        # B. Items applicable to all students (no target class)
-        global_items_sum = FeeItem.objects.filter(
-            school=school, session=term.session, term=term.name, active=True, target_class__isnull=True
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        global_expected = global_items_sum * total_active_students
-        total_expected = target_items_expected + global_expected
-
-        # Phase B: Subtract individual discounts
-        total_discounts = StudentFee.objects.filter(
-            school=school, 
-            fee_item__session=term.session, 
-            fee_item__term=term.name
-        ).aggregate(Sum("discount_amount"))["discount_amount__sum"] or 0
-        
-        net_expected = total_expected - total_discounts
-
-        # 2. COLLECTED REVENUE
-        collected = Payment.objects.filter(
-            school=school, 
-            session=term.session, 
-            term=term.name, 
-            status="completed"
-        ).aggregate(Sum("amount"))["amount__sum"] or 0
+        # 1. EXPECTED + 2. COLLECTED REVENUE (cached per school/term, dropped on Payment and fee writes)
+        revenue = get_term_revenue_data(school, term)
+        net_expected = Decimal(revenue["expected"])
+        collected = sum((Decimal(amount) for amount in revenue["daily"].values()), Decimal(0))
 
         # 3. FORECASTING logic
-        from datetime import date
         today = timezone.now().date()
         
         days_elapsed = (today - term.start_date).days
@@ -655,6 +555,10 @@ class DashboardViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=["get"], url_path="revenue-chart")
     def revenue_chart(self, request):
+        """
+        Expected / cumulative collected / forecast series for a term.
+        Query params: term_id (defaults to the current term), granularity=day|week|month (default week).
+        """
         school = get_request_school(request)
         term_id = request.query_params.get("term_id")
         
@@ -666,93 +570,11 @@ class DashboardViewSet(viewsets.ViewSet):
         if not term:
             return Response({"error": "Academic term not found"}, status=404)
 
-        # Generate labels (Weekly)
-        from datetime import timedelta
-        labels = []
-        expected_points = []
-        collected_points = []
-        forecast_points = []
-        
-        # Calculate full expected revenue (static baseline)
-        fee_items = FeeItem.objects.filter(school=school, session=term.session, term=term.name, active=True)
-        total_expected = 0
-        for item in fee_items:
-            student_query = Q(school=school, status="active")
-            if item.target_class:
-                student_query &= Q(current_class=item.target_class)
-            student_count = Student.objects.filter(student_query).count()
-            total_expected += (item.amount * student_count)
-        
-        total_discounts = StudentFee.objects.filter(
-            school=school, 
-            fee_item__session=term.session, 
-            fee_item__term=term.name
-        ).aggregate(Sum("discount_amount"))["discount_amount__sum"] or 0
-        net_expected = float(total_expected - total_discounts)
-
-        # Weekly aggregation
-        curr_date = term.start_date
-        cumulative_collected = 0
-        today = timezone.now().date()
-        
-        week_num = 1
-        while curr_date <= term.end_date:
-            next_date = curr_date + timedelta(days=7)
-            labels.append(f"Week {week_num}")
-            
-            # Static expected baseline
-            expected_points.append(net_expected)
-            
-            # Sum payments in this range
-            period_collected = Payment.objects.filter(
-                school=school,
-                session=term.session,
-                term=term.name,
-                status="completed",
-                date__gte=curr_date,
-                date__lt=next_date
-            ).aggregate(Sum("amount"))["amount__sum"] or 0
-            
-            # Update cumulative (only for past/current weeks)
-            if curr_date <= today:
-                cumulative_collected += float(period_collected)
-                collected_points.append(cumulative_collected)
-            else:
-                # Future weeks don't have actual collections yet
-                collected_points.append(None)
-
-            # Advance
-            curr_date = next_date
-            week_num += 1
-
-        # Forecast Projection (Starts from current cumulative collected)
-        days_elapsed = (today - term.start_date).days
-        days_total = (term.end_date - term.start_date).days
-        
-        current_collected = collected_points[min(len(collected_points)-1, (days_elapsed // 7))] if days_elapsed >= 0 else 0
-        
-        # Use simple linear pace, fallback to static baseline if term just started
-        if days_elapsed >= 7 and current_collected > 0:
-            pace_per_week = (current_collected / (days_elapsed / 7))
-        else:
-            # Linear projection towards net_expected
-            pace_per_week = net_expected / (days_total / 7) if days_total > 0 else 0
-        
-        for i in range(len(labels)):
-            if (i * 7) < days_elapsed:
-                forecast_points.append(collected_points[i])
-            else:
-                # Project forward
-                projected = current_collected + (pace_per_week * (i - (days_elapsed // 7)))
-                # Clamp forecast to not exceed 120% of expected revenue (realistic buffer)
-                forecast_points.append(min(round(projected, 2), float(net_expected * 1.2)))
+        granularity = request.query_params.get("granularity", "week")
+        if granularity not in GRANULARITIES:
+            return Response({"error": f"granularity must be one of: {', '.join(GRANULARITIES)}"}, status=400)
 
-        return Response({
-            "labels": labels,
-            "expected": expected_points,
-            "collected": collected_points,
-            "forecast": forecast_points
-        })
+        return Response(build_revenue_series(school, term, granularity=granularity))
 
 
 class DiscountViewSet(TenantViewSet):
@@ -8,8 +8,7 @@ from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
-from bursary.models import Payment
-from core.models import GlobalActivityLog
+from bursary.webhook_queue import enqueue_event
 from schools.models import School, SchoolPaymentConfig
 
 logger = logging.getLogger(__name__)
@@ -19,7 +18,8 @@ logger = logging.getLogger(__name__)
 class PaystackWebhookView(View):
     """
     Receives Paystack event payloads, validates the signature against the
-    school's own webhook secret, and records the payment automatically.
+    school's own webhook secret, and queues the event; the payment is recorded
+    by bursary.webhook_queue.
 
     URL pattern: POST /api/webhooks/paystack/<school_domain>/
     """
@@ -60,54 +60,11 @@ class PaystackWebhookView(View):
             payload = json.loads(body)
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid JSON"}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
 
-        event = payload.get("event", "")
-        data = payload.get("data", {})
-
-        if event == "charge.success":
-            self._handle_charge_success(school, data)
-        else:
-            logger.info(f"Ignoring Paystack event '{event}' for {school_domain}")
+        # 5. Queue it; a retry of an event already received is acknowledged as is
+        enqueue_event(payload, body, school=school)
 
         # Always return 200 to Paystack to prevent retries
         return JsonResponse({"status": "ok"})
-
-    def _handle_charge_success(self, school, data):
-        """Mark a pending payment as completed based on the gateway reference."""
-        gateway_ref = data.get("reference", "")
-        if not gateway_ref:
-            logger.warning("charge.success event missing reference")
-            return
-
-        try:
-            payment = Payment.objects.get(
-                school=school,
-                gateway_reference=gateway_ref,
-                status="pending",
-            )
-        except Payment.DoesNotExist:
-            logger.info(f"No pending payment found for reference: {gateway_ref}")
-            return
-
-        payment.status = "completed"
-        payment.verification_data = data
-        payment.save(update_fields=["status", "verification_data", "updated_at"])
-
-        # Log the activity
-        try:
-            GlobalActivityLog.objects.create(
-                action="PAYMENT_CONFIRMED",
-                school=school,
-                user=None,
-                description=f"Paystack webhook confirmed payment {payment.reference} of {payment.amount}",
-                metadata={
-                    "payment_id": payment.id,
-                    "gateway_reference": gateway_ref,
-                    "amount": str(payment.amount),
-                    "student": payment.student.names if payment.student else "N/A",
-                },
-            )
-        except Exception as e:
-            logger.error(f"Failed to log webhook activity: {e}")
-
-        logger.info(f"Payment {payment.reference} marked as completed via webhook")
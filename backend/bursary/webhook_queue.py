@@ -0,0 +1,196 @@
+"""
+Queued ingestion of payment gateway webhooks.
+
+The webhook views only verify the signature and store the raw event as a
+PaymentEvent, keyed by (provider, event, reference): a gateway retry for the
+same reference finds the existing row and is acknowledged without touching
+Payment again. A processing task is queued after the insert commits (at most
+one at a time) and Celery beat runs one every PAYMENT_EVENT_POLL_INTERVAL
+seconds for anything left behind.
+
+process_payment_events() claims pending events in batches and reconciles each
+batch with one Payment lookup, one bulk update of the payments it confirms and
+one bulk update of the events. Events for references without a payment are
+kept as "unmatched"; replay_payment_events() puts the events of a date range
+back in the queue. Only pending payments are confirmed, so re-applying an
+event never touches a payment that is already completed, failed or refunded.
+"""
+
+import hashlib
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.activity_buffer import record_activity
+from core.audit import audited_bulk_update
+from core.cache_utils import invalidate_model_cache
+
+from .models import Payment, PaymentEvent
+from .revenue import invalidate_term_revenue
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_EVENT_BATCH = getattr(settings, "PAYMENT_EVENT_BATCH", 200)
+PAYMENT_EVENT_POLL_INTERVAL = getattr(settings, "PAYMENT_EVENT_POLL_INTERVAL", 30)
+PROCESS_LOCK_TIMEOUT = 120
+
+PROCESS_QUEUED_KEY = "payments:events-process-queued"
+PROCESS_LOCK_KEY = "payments:events-process-lock"
+
+
+def enqueue_event(payload, body, school=None, provider="paystack"):
+    """
+    Store a verified webhook event once. Returns (event, created); a retried
+    delivery returns the stored event with created=False.
+    """
+    data = payload.get("data") or {}
+    # Every Paystack charge event carries a reference; anything else is keyed by its body
+    reference = str(data.get("reference") or "") or hashlib.sha256(body).hexdigest()
+    event, created = PaymentEvent.objects.get_or_create(
+        provider=provider,
+        event=str(payload.get("event") or "")[:50],
+        reference=reference[:100],
+        defaults={"school": school, "payload": payload},
+    )
+    if created and cache.add(PROCESS_QUEUED_KEY, 1, PAYMENT_EVENT_POLL_INTERVAL):
+        from .tasks import process_payment_events as process_task
+
+        transaction.on_commit(process_task.delay)
+    return event, created
+
+
+def reconcile_events(events):
+    """Apply a batch of events to their payments and record each event's outcome (not saved)."""
+    charges = []
+    for event in events:
+        data = event.payload.get("data") or {}
+        if event.event == "charge.success" and data.get("status", "success") == "success":
+            charges.append(event)
+        else:
+            event.status = "ignored"
+
+    payments = defaultdict(list)
+    for payment in Payment.objects.filter(gateway_reference__in={event.reference for event in charges}).select_related(
+        "student"
+    ):
+        payments[payment.gateway_reference].append(payment)
+
+    now = timezone.now()
+    confirmed = []
+    for event in charges:
+        # School webhooks only touch that school's payments
+        matches = [p for p in payments.get(event.reference, []) if event.school_id in (None, p.school_id)]
+        if not matches:
+            event.status = "unmatched"
+            continue
+        for payment in matches:
+            if payment.status == "pending":
+                payment.status = "completed"
+                payment.verification_data = event.payload.get("data") or {}
+                payment.updated_at = now
+                confirmed.append((payment, event))
+        # A failed or refunded payment is not brought back by a late or replayed charge event
+        event.status = "processed" if any(payment.status == "completed" for payment in matches) else "ignored"
+
+    # Payment status is not part of the ledger rollup, so a bulk update needs no ledger refresh;
+    # bulk_update sends no signals, so cached responses are invalidated below
+    audited_bulk_update([payment for payment, _ in confirmed], ["status", "verification_data", "updated_at"])
+    for school_id, session, term in {(p.school_id, p.session, p.term) for p, _ in confirmed}:
+        invalidate_term_revenue(school_id, session, term)
+    for school_id in {payment.school_id for payment, _ in confirmed}:
+        invalidate_model_cache("Payment", school_id)
+    transaction.on_commit(lambda: _log_confirmed(confirmed))
+    return confirmed
+
+
+def _log_confirmed(confirmed):
+    for payment, event in confirmed:
+        record_activity(
+            "PAYMENT_CONFIRMED",
+            school_id=payment.school_id,
+            description=f"Paystack webhook confirmed payment {payment.reference} of {payment.amount}",
+            metadata={
+                "payment_id": payment.id,
+                "gateway_reference": event.reference,
+                "amount": str(payment.amount),
+                "student": payment.student.names if payment.student else "N/A",
+            },
+        )
+
+
+def _claim(batch_size):
+    return list(
+        PaymentEvent.objects.select_for_update(skip_locked=True).filter(status="pending").order_by("id")[:batch_size]
+    )
+
+
+def process_payment_events(batch_size=PAYMENT_EVENT_BATCH):
+    """
+    Reconcile pending events, a batch per transaction. Returns the number of
+    events handled (0 if another run holds the lock).
+    """
+    if not cache.add(PROCESS_LOCK_KEY, 1, PROCESS_LOCK_TIMEOUT):
+        return 0
+    handled = 0
+    deadline = time.monotonic() + PROCESS_LOCK_TIMEOUT / 2
+    try:
+        while time.monotonic() < deadline:
+            with transaction.atomic():
+                events = _claim(batch_size)
+                if not events:
+                    break
+                try:
+                    with transaction.atomic():
+                        _finish(events)
+                except Exception as e:
+                    logger.error(f"Payment event batch failed, retrying its events one by one: {e}")
+                    for event in events:
+                        _finish_one(event)
+            handled += len(events)
+    finally:
+        cache.delete(PROCESS_LOCK_KEY)
+        cache.delete(PROCESS_QUEUED_KEY)
+    return handled
+
+
+def _finish(events):
+    reconcile_events(events)
+    now = timezone.now()
+    for event in events:
+        event.attempts += 1
+        event.error = ""
+        event.processed_at = now
+    PaymentEvent.objects.bulk_update(events, ["status", "attempts", "error", "processed_at"])
+
+
+def _finish_one(event):
+    try:
+        with transaction.atomic():
+            _finish([event])
+    except Exception as e:
+        logger.error(f"Payment event {event.reference} failed: {e}")
+        PaymentEvent.objects.filter(pk=event.pk).update(
+            status="failed", attempts=F("attempts") + 1, error=str(e)[:1000], processed_at=timezone.now()
+        )
+
+
+def replay_payment_events(start, end, school_id=None, statuses=None):
+    """
+    Queue the events received between two dates (inclusive) again and process
+    them. Returns the number of events re-queued.
+    """
+    events = PaymentEvent.objects.filter(received_at__date__gte=start, received_at__date__lte=end)
+    if school_id:
+        events = events.filter(school_id=school_id)
+    if statuses:
+        events = events.filter(status__in=statuses)
+    requeued = events.update(status="pending", error="")
+    if requeued:
+        process_payment_events()
+    return requeued
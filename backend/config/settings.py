@@ -623,10 +623,30 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'schools.tasks.auto_report_generation',
         'schedule': crontab(day_of_month=28, hour=0, minute=0), 
     },
+    'reconcile-bursary-ledger-nightly': {
+        'task': 'bursary.tasks.reconcile_ledgers',
+        'schedule': crontab(hour=2, minute=0),  # Run daily at 2 AM
+    },
+    'flush-cbt-answer-buffers': {
+        'task': 'learning.tasks.flush_answer_buffers',
+        'schedule': 15.0,  # Every 15 seconds
+    },
+    'flush-activity-log-buffer': {
+        'task': 'core.tasks.flush_activity_logs',
+        'schedule': 10.0,  # Every 10 seconds, matching ACTIVITY_LOG_FLUSH_INTERVAL
+    },
+    'process-payment-webhook-events': {
+        'task': 'bursary.tasks.process_payment_events',
+        'schedule': 30.0,  # Every 30 seconds, matching PAYMENT_EVENT_POLL_INTERVAL
+    },
     'monitor-pgbouncer-pools': {
         'task': 'core.tasks.monitor_pgbouncer_pools',
         'schedule': crontab(minute='*/5'),  # Every 5 minutes
     },
+    'resume-stalled-email-campaigns': {
+        'task': 'emails.tasks.resume_stalled_campaigns',
+        'schedule': crontab(minute='*/5'),  # Every 5 minutes
+    },
 }
 
 
@@ -656,3 +676,4 @@ if not EMAIL_HOST_USER or not EMAIL_HOST_PASSWORD:
 CBT_MAX_VIOLATIONS = 3          # auto-submit threshold
 CBT_VIOLATION_WARN = True       # show warning overlay
 CBT_LOCK_ON_EXCEED = False      # lock vs auto-submit
+CBT_QUEUED_SUBMISSIONS = os.environ.get("CBT_QUEUED_SUBMISSIONS", "False").lower() == "true"  # grade submissions in Celery
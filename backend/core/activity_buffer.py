@@ -0,0 +1,254 @@
+"""
+Write-behind buffer for GlobalActivityLog entries.
+
+AuditLogMiddleware used to send one Celery message per mutating request, each
+inserting one row. Entries now go onto a Redis list (one RPUSH per request);
+`flush_activity_logs` moves up to a batch of them onto a "flushing" list with
+one atomic script, bulk inserts them and only then deletes that list. A
+worker that dies mid-flush leaves the flushing list behind and the next flush
+inserts it again, so entries are never lost (at worst a batch is written
+twice).
+
+A flush is queued as soon as the buffer reaches ACTIVITY_LOG_FLUSH_SIZE
+entries or its oldest entry is ACTIVITY_LOG_FLUSH_INTERVAL seconds old;
+Celery beat runs one on the same interval to drain quiet periods.
+`buffer_stats` reports depth and lag for health checks.
+
+Redis is used when REDIS_URL is configured; otherwise a process-local stand-in
+with the same interface keeps development and tests working. While a
+configured Redis cannot be reached, entries are written straight to the
+database (nothing is held in a process that no flush would ever drain) and
+the connection is retried every REDIS_RETRY_INTERVAL seconds.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_LOG_FLUSH_SIZE = getattr(settings, "ACTIVITY_LOG_FLUSH_SIZE", 200)
+ACTIVITY_LOG_FLUSH_INTERVAL = getattr(settings, "ACTIVITY_LOG_FLUSH_INTERVAL", 10)
+FLUSH_BATCH = 500
+FLUSH_LOCK_TIMEOUT = 60
+REDIS_RETRY_INTERVAL = 30
+
+QUEUE_KEY = "activity:buffer"
+FLUSHING_KEY = "activity:buffer:flushing"
+FLUSH_QUEUED_KEY = "activity:flush-queued"
+FLUSH_LOCK_KEY = "activity:flush-lock"
+
+# KEYS: queue list, flushing list; ARGV: batch size. An unacknowledged batch is handed out again first.
+CLAIM_SCRIPT = """
+if redis.call('LLEN', KEYS[2]) == 0 then
+    local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+    if #items > 0 then
+        redis.call('RPUSH', KEYS[2], unpack(items))
+        redis.call('LTRIM', KEYS[1], #items, -1)
+    end
+end
+return redis.call('LRANGE', KEYS[2], 0, -1)
+"""
+
+
+def _oldest(value):
+    return json.loads(value)["at"] if value else None
+
+
+class RedisActivityBuffer:
+    def __init__(self, client):
+        self.client = client
+        self._claim = client.register_script(CLAIM_SCRIPT)
+
+    def push(self, entry):
+        """Append an entry. Returns (buffer depth, enqueue time of the oldest entry)."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.rpush(QUEUE_KEY, json.dumps(entry))
+        pipe.lindex(QUEUE_KEY, 0)
+        depth, oldest = pipe.execute()
+        return depth, _oldest(oldest)
+
+    def claim(self, limit):
+        return [json.loads(value) for value in self._claim(keys=[QUEUE_KEY, FLUSHING_KEY], args=[limit])]
+
+    def ack(self):
+        self.client.delete(FLUSHING_KEY)
+
+    def stats(self):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.llen(QUEUE_KEY)
+        pipe.llen(FLUSHING_KEY)
+        pipe.lindex(FLUSHING_KEY, 0)
+        pipe.lindex(QUEUE_KEY, 0)
+        queued, flushing, oldest_flushing, oldest_queued = pipe.execute()
+        return queued + flushing, _oldest(oldest_flushing or oldest_queued)
+
+
+class LocalActivityBuffer:
+    """In-process stand-in for RedisActivityBuffer (single process, not durable)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._flushing = []
+
+    def push(self, entry):
+        with self._lock:
+            self._queue.append(entry)
+            return len(self._queue), self._queue[0]["at"]
+
+    def claim(self, limit):
+        with self._lock:
+            if not self._flushing:
+                while self._queue and len(self._flushing) < limit:
+                    self._flushing.append(self._queue.popleft())
+            return list(self._flushing)
+
+    def ack(self):
+        with self._lock:
+            self._flushing = []
+
+    def stats(self):
+        with self._lock:
+            oldest = self._flushing[0] if self._flushing else (self._queue[0] if self._queue else None)
+            return len(self._queue) + len(self._flushing), oldest["at"] if oldest else None
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_retry_at = 0
+
+
+def get_activity_buffer():
+    """
+    Redis-backed buffer when REDIS_URL is set, the local stand-in when it is
+    not, and None while a configured Redis is unreachable.
+    """
+    global _buffer, _retry_at
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None and time.monotonic() >= _retry_at:
+                _buffer = _connect()
+                if _buffer is None:
+                    _retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+    return _buffer
+
+
+def _connect():
+    redis_url = getattr(settings, "REDIS_URL", None)
+    if not redis_url:
+        return LocalActivityBuffer()
+    try:
+        import redis
+
+        client = redis.from_url(redis_url)
+        client.ping()
+        return RedisActivityBuffer(client)
+    except Exception as e:
+        logger.warning(f"Activity log buffer unavailable, writing entries directly until Redis is back: {e}")
+        return None
+
+
+def record_activity(action, school_id=None, user_id=None, description="", metadata=None):
+    """Buffer one GlobalActivityLog entry, queueing a flush when a size or age threshold is reached."""
+    entry = {
+        "action": action,
+        "school_id": school_id,
+        "user_id": user_id,
+        "description": description,
+        "metadata": metadata or {},
+        "at": time.time(),
+    }
+    buffer = get_activity_buffer()
+    if buffer is None:
+        _insert([entry])
+        return
+    try:
+        depth, oldest = buffer.push(entry)
+    except Exception as e:
+        logger.warning(f"Activity log buffer push failed, writing the entry directly: {e}")
+        _insert([entry])
+        return
+    stale = oldest is not None and entry["at"] - oldest >= ACTIVITY_LOG_FLUSH_INTERVAL
+    due = depth >= ACTIVITY_LOG_FLUSH_SIZE or stale
+    # One queued flush per interval is enough; it drains everything buffered so far
+    if due and cache.add(FLUSH_QUEUED_KEY, 1, ACTIVITY_LOG_FLUSH_INTERVAL):
+        from .tasks import flush_activity_logs
+
+        transaction.on_commit(flush_activity_logs.delay)
+
+
+def _rows(entries):
+    from .models import GlobalActivityLog
+
+    return [
+        GlobalActivityLog(
+            action=entry["action"],
+            school_id=entry["school_id"],
+            user_id=entry["user_id"],
+            description=entry["description"],
+            metadata=entry["metadata"],
+            created_at=datetime.fromtimestamp(entry["at"], tz=dt_timezone.utc),
+        )
+        for entry in entries
+    ]
+
+
+def _insert(entries):
+    from .models import GlobalActivityLog
+
+    try:
+        with transaction.atomic():
+            GlobalActivityLog.objects.bulk_create(_rows(entries))
+        return len(entries)
+    except IntegrityError:
+        # A school or user deleted since the request; keep every other entry of the batch
+        written = 0
+        for row in _rows(entries):
+            try:
+                with transaction.atomic():
+                    row.save()
+                written += 1
+            except IntegrityError as e:
+                logger.error(f"Dropping activity log entry {row.action} ({row.description}): {e}")
+        return written
+
+
+def flush_activity_logs(batch_size=FLUSH_BATCH):
+    """
+    Move buffered entries into GlobalActivityLog, one INSERT per batch.
+    Returns the number of rows written (0 if another flush is running or Redis is down).
+    """
+    buffer = get_activity_buffer()
+    if buffer is None or not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return 0
+    written = 0
+    # Stay well inside the lock so no second flusher can claim the same batch
+    deadline = time.monotonic() + FLUSH_LOCK_TIMEOUT / 2
+    try:
+        while time.monotonic() < deadline:
+            entries = buffer.claim(batch_size)
+            if not entries:
+                break
+            written += _insert(entries)
+            buffer.ack()
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+        cache.delete(FLUSH_QUEUED_KEY)
+    return written
+
+
+def buffer_stats():
+    """{"depth": entries not yet written, "lag_seconds": age of the oldest one}."""
+    buffer = get_activity_buffer()
+    if buffer is None:
+        return {"depth": 0, "lag_seconds": 0, "buffer": "unavailable"}
+    depth, oldest = buffer.stats()
+    return {"depth": depth, "lag_seconds": round(time.time() - oldest, 3) if oldest is not None else 0}
@@ -0,0 +1,137 @@
+"""
+Write-behind FieldChangeLog pipeline.
+
+AuditTrailMixin.track_changes() and the audited_* helpers below hand their
+field diffs to queue_field_changes(), which turns them into unsaved log rows
+and holds them until there is a natural point to write them all at once:
+
+- inside a transaction, until it commits (rows of a rolled-back transaction
+  are discarded with it);
+- inside audit_batch() (AuditLogMiddleware opens one per request), until the
+  batch ends;
+- otherwise they are written immediately, still as one INSERT per call.
+
+A save therefore no longer costs an extra INSERT per changed field.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _write(logs):
+    from .models import FieldChangeLog
+
+    if not logs:
+        return
+    try:
+        FieldChangeLog.objects.bulk_create(logs, batch_size=500)
+    except Exception as e:
+        logger.error(f"Failed to log field changes: {e}")
+
+
+def _emit(logs):
+    """Hand rows to the open audit batch, or write them now."""
+    batch = getattr(_local, "batch", None)
+    if batch is not None:
+        batch.extend(logs)
+    else:
+        _write(logs)
+
+
+class _TransactionBuffer:
+    def __init__(self):
+        self.logs = []
+
+    def flush(self):
+        logs, self.logs = self.logs, []
+        _emit(logs)
+
+
+def _transaction_buffer(connection):
+    buffer = getattr(connection, "_audit_buffer", None)
+    # The flush callback is dropped when the transaction rolls back; start a new buffer then
+    if buffer is None or not any(entry[1] == buffer.flush for entry in connection.run_on_commit):
+        buffer = connection._audit_buffer = _TransactionBuffer()
+        transaction.on_commit(buffer.flush)
+    return buffer
+
+
+def queue_field_changes(changes, user=None, action="UPDATE", request=None):
+    """Queue FieldChangeLog rows for (instance, field_name, old_value, new_value) tuples."""
+    from .models import build_field_change_logs
+
+    logs = build_field_change_logs(changes, user=user, action=action, request=request)
+    if not logs:
+        return 0
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        _transaction_buffer(connection).logs.extend(logs)
+    else:
+        _emit(logs)
+    return len(logs)
+
+
+@contextmanager
+def audit_batch():
+    """Collect field changes queued in the block and write them with one INSERT when it ends."""
+    if getattr(_local, "batch", None) is not None:
+        # Nested batches join the outer one
+        yield
+        return
+    _local.batch = []
+    try:
+        yield
+    finally:
+        logs, _local.batch = _local.batch, None
+        _write(logs)
+
+
+def audited_update(queryset, user=None, request=None, **values):
+    """queryset.update(**values) that logs every changed field of every row. Returns the row count."""
+    model = queryset.model
+    fields = [model._meta.get_field(name) for name in values]
+    has_school = any(f.attname == "school_id" for f in model._meta.concrete_fields)
+    extra = ["school_id"] if has_school else []
+    columns = ["pk", *extra, *[f.attname for f in fields]]
+
+    with transaction.atomic(using=queryset.db):
+        before = {row[0]: row for row in queryset.values_list(*columns)}
+        updated = queryset.update(**values)
+        if before:
+            after = model._default_manager.using(queryset.db).filter(pk__in=list(before)).values_list(*columns)
+            changes = []
+            offset = 1 + len(extra)
+            for row in after:
+                old = before[row[0]]
+                instance = SimpleNamespace(_meta=model._meta, pk=row[0], school_id=row[1] if has_school else None)
+                for index, field in enumerate(fields, start=offset):
+                    if old[index] != row[index]:
+                        changes.append((instance, field.name, old[index], row[index]))
+            queue_field_changes(changes, user=user, request=request)
+    return updated
+
+
+def audited_bulk_update(objs, fields, user=None, request=None, batch_size=None):
+    """
+    bulk_update() for AuditTrailMixin instances, logging what changed since
+    each instance was loaded. Returns the number of rows updated.
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+    model = type(objs[0])
+    changes = [change for obj in objs for change in obj.audit_changes(fields)]
+    with transaction.atomic(using=model._default_manager.db):
+        updated = model._default_manager.bulk_update(objs, fields, batch_size=batch_size)
+        queue_field_changes(changes, user=user, request=request)
+    for obj in objs:
+        obj._snapshot(fields)
+    return updated
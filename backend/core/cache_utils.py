@@ -1,75 +1,216 @@
 """
 Caching utilities for improving API performance
+
+Cached responses are tagged with the models they are built from. Every
+(school, tag) pair has a generation counter in the cache and every response
+key embeds the current generations of its tags, so invalidating a tag is a
+single counter increment that works on any cache backend: keys built on an
+older generation are simply never read again and expire on their timeout.
+
+CACHE_POLICIES sets the timeout per model and the other tags a write to it
+invalidates (a Payment write also drops the bursary dashboard). Writes through
+CachingMixin invalidate their model, and models whose policy sets
+invalidate_on_write are also invalidated from post_save/post_delete (see
+core.signals), so writes made outside the API are covered as well.
+cache_stats() reports hits and misses per cached endpoint.
 """
 
 import hashlib
 import logging
+import time
 from functools import wraps
 
 from django.core.cache import cache
-from django.utils.decorators import method_decorator
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
-from rest_framework.decorators import action
 
 logger = logging.getLogger(__name__)
 
+GLOBAL_SCOPE = "global"
+DEFAULT_TIMEOUT = 300  # 5 minutes
+STATS_ENDPOINTS_KEY = "api:stats:endpoints"
+
+# Cache policies for different data types
+CACHE_POLICIES = {
+    # Frequently accessed, rarely updated
+    "Subject": {"timeout": 3600, "invalidate_on_write": True},  # 1 hour
+    "Teacher": {"timeout": 1800, "invalidate_on_write": True},  # 30 minutes
+    "Class": {"timeout": 1800, "invalidate_on_write": True},
+    "FeeCategory": {"timeout": 3600, "invalidate_on_write": True},
+    # Medium frequency access
+    "Student": {"timeout": 600, "invalidate_on_write": True},  # 10 minutes
+    "ReportCard": {"timeout": 600, "invalidate_on_write": False},
+    # Frequently updated, shorter cache
+    "AttendanceRecord": {"timeout": 300, "invalidate_on_write": True},  # 5 minutes
+    "Payment": {"timeout": 300, "invalidate_on_write": True, "invalidates": ("BursaryDashboard",)},
+    "Expense": {"timeout": 300, "invalidate_on_write": True, "invalidates": ("BursaryDashboard",)},
+    "FeeItem": {"timeout": 1800, "invalidate_on_write": True, "invalidates": ("BursaryDashboard",)},
+    "StudentFee": {"timeout": 600, "invalidate_on_write": True, "invalidates": ("BursaryDashboard",)},
+    "Scholarship": {"timeout": 1800, "invalidate_on_write": True, "invalidates": ("BursaryDashboard",)},
+    "Payroll": {"timeout": 600, "invalidate_on_write": True, "invalidates": ("BursaryDashboard",)},
+    # Aggregated views, invalidated through the models above
+    "BursaryDashboard": {"timeout": 120, "invalidate_on_write": False},
+    # Real-time data, minimal caching
+    "SchoolMessage": {"timeout": 60, "invalidate_on_write": True},  # 1 minute
+    "SchoolEvent": {"timeout": 600, "invalidate_on_write": True},
+}
+
+
+def get_cache_timeout(model_name):
+    """Get cache timeout for a specific model"""
+    policy = CACHE_POLICIES.get(model_name, {})
+    return policy.get("timeout", DEFAULT_TIMEOUT)
+
+
+def related_tags(model_name):
+    """The model's own tag plus the tags its policy invalidates with it"""
+    return (model_name, *CACHE_POLICIES.get(model_name, {}).get("invalidates", ()))
+
+
+def _generation_key(school_id, tag):
+    return f"api:gen:{school_id or GLOBAL_SCOPE}:{tag}"
+
+
+def get_generations(school_id, tags):
+    """Current generation of each tag for a school, in the order given"""
+    keys = [_generation_key(school_id, tag) for tag in tags]
+    stored = cache.get_many(keys)
+    missing = [key for key in keys if key not in stored]
+    if missing:
+        # Seeded from the clock so a counter lost to eviction never repeats an old generation
+        seed = time.time_ns()
+        for key in missing:
+            cache.add(key, seed, None)
+        stored.update(cache.get_many(missing))
+    return [stored.get(key) for key in keys]
+
+
+def invalidate_model_cache(model_name, school_id=None):
+    """
+    Invalidate all cache entries for a specific model (and the tags its policy
+    invalidates with it) for one school, or the platform-wide entries.
+
+    Usage:
+        invalidate_model_cache('Payment', school.id)
+    """
+    for tag in related_tags(model_name):
+        key = _generation_key(school_id, tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # No generation yet, so nothing is cached under this tag
+            cache.add(key, time.time_ns(), None)
+        except Exception as e:
+            logger.warning("Cache invalidation error: %s", e)
+
 
 class CacheKeyBuilder:
     """Build cache keys for different endpoints and filters"""
 
     @staticmethod
-    def build_list_key(model_name, school_id=None, **kwargs):
-        """Build cache key for list endpoints"""
+    def build_list_key(model_name, school_id=None, tags=None, **kwargs):
+        """Build cache key for list endpoints, versioned by the generations of `tags` (default: the model)"""
+        tags = tuple(tags or (model_name,))
         key_parts = [f"list:{model_name}"]
-
-        if school_id:
-            key_parts.append(f"school:{school_id}")
+        key_parts += [f"{tag}@{generation}" for tag, generation in zip(tags, get_generations(school_id, tags))]
 
         # Add filter parameters to key
         for k, v in sorted(kwargs.items()):
             key_parts.append(f"{k}:{v}")
 
         key_str = ":".join(key_parts)
-        return f"api:{hashlib.md5(key_str.encode()).hexdigest()}"
+        return f"api:{school_id or GLOBAL_SCOPE}:{model_name}:{hashlib.md5(key_str.encode()).hexdigest()}"
 
     @staticmethod
-    def build_detail_key(model_name, pk):
+    def build_detail_key(model_name, pk, school_id=None):
         """Build cache key for detail endpoints"""
-        return f"api:{model_name}:{pk}"
+        (generation,) = get_generations(school_id, (model_name,))
+        return f"api:{school_id or GLOBAL_SCOPE}:{model_name}:{generation}:{pk}"
 
-    @staticmethod
-    def get_model_cache_prefix(model_name):
-        """Get prefix for invalidating all caches for a model"""
-        return f"api:{model_name}:*"
+
+# --- Hit/miss statistics -------------------------------------------------------------
+
+_known_endpoints = set()
+
+
+def _stats_key(endpoint, outcome):
+    return f"api:stats:{endpoint}:{outcome}"
+
+
+def record_cache_access(endpoint, hit):
+    """Count a hit or miss for an endpoint"""
+    if endpoint not in _known_endpoints:
+        endpoints = set(cache.get(STATS_ENDPOINTS_KEY) or ())
+        if endpoint not in endpoints:
+            cache.set(STATS_ENDPOINTS_KEY, sorted(endpoints | {endpoint}), None)
+        _known_endpoints.add(endpoint)
+    key = _stats_key(endpoint, "hits" if hit else "misses")
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+    except Exception as e:
+        logger.warning("Cache statistics error: %s", e)
+
+
+def cache_stats():
+    """{endpoint: {"hits", "misses", "hit_ratio"}} for every cached endpoint"""
+    endpoints = cache.get(STATS_ENDPOINTS_KEY) or []
+    counts = cache.get_many([_stats_key(e, outcome) for e in endpoints for outcome in ("hits", "misses")])
+    stats = {}
+    for endpoint in endpoints:
+        hits = counts.get(_stats_key(endpoint, "hits"), 0)
+        misses = counts.get(_stats_key(endpoint, "misses"), 0)
+        total = hits + misses
+        stats[endpoint] = {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 3) if total else None}
+    return stats
+
+
+# --- Views ---------------------------------------------------------------------------
 
 
-def cache_list_endpoint(timeout=300):
+def _request_school_id(request):
+    from core.tenant_utils import get_request_school
+
+    return getattr(get_request_school(request), "pk", None)
+
+
+def cache_list_endpoint(timeout=None, tags=None, model_name=None):
     """
     Decorator to cache list endpoint responses
 
     Usage:
-        @cache_list_endpoint(timeout=600)
+        @cache_list_endpoint(model_name="BursaryDashboard")
         def list(self, request, *args, **kwargs):
             # endpoint logic
             pass
 
     Args:
-        timeout: Cache timeout in seconds (default: 5 minutes)
+        timeout: Cache timeout in seconds (default: the model's CACHE_POLICIES timeout)
+        tags: Tags the response depends on (default: the model)
+        model_name: Name used for the key and policy (default: the view's queryset model)
     """
 
     def decorator(func):
         @wraps(func)
         def wrapper(self, request, *args, **kwargs):
-            # Build cache key based on query params
-            school_id = getattr(request.user, "school_id", None)
-            query_params = {k: v for k, v in request.query_params.items() if k not in ["page"]}  # Exclude pagination
-
+            name = model_name or self.queryset.model.__name__
+            endpoint = f"{type(self).__name__}.{func.__name__}"
+            try:
+                school_id = _request_school_id(request)
+            except PermissionDenied:
+                # Let the endpoint produce its own error, uncached
+                return func(self, request, *args, **kwargs)
+            # Build cache key based on query params (including the page)
+            params = {f"param:{k}": v for k, v in request.query_params.lists()}
             cache_key = CacheKeyBuilder.build_list_key(
-                self.queryset.model.__name__, school_id=school_id, **query_params
+                name, school_id=school_id, tags=tags, endpoint=endpoint, **params
             )
 
             # Try to get from cache
             cached_response = cache.get(cache_key)
+            record_cache_access(endpoint, cached_response is not None)
             if cached_response is not None:
                 return Response(cached_response)
 
@@ -78,7 +219,8 @@ def cache_list_endpoint(timeout=300):
 
             # Cache the result if it's a successful list response
             if response.status_code == 200 and hasattr(response, "data"):
-                cache.set(cache_key, response.data, timeout)
+                ttl = timeout or getattr(self, "cache_timeout", None) or get_cache_timeout(name)
+                cache.set(cache_key, response.data, ttl)
 
             return response
 
@@ -87,30 +229,6 @@ def cache_list_endpoint(timeout=300):
     return decorator
 
 
-def invalidate_model_cache(model_name):
-    """
-    Invalidate all cache entries for a specific model
-
-    Usage:
-        invalidate_model_cache('Payment')
-
-    Args:
-        model_name: Name of the model to invalidate cache for
-    """
-    cache_prefix = CacheKeyBuilder.get_model_cache_prefix(model_name)
-    try:
-        # django-redis provides delete_pattern
-        if hasattr(cache, "delete_pattern"):
-            cache.delete_pattern(cache_prefix)
-        else:
-            # Fallback (Aggressive: clear all if we can't do pattern delete)
-            # Better to be safe than stale in multi-tenant contexts
-            # But in LocMem, this is only for this process
-            pass
-    except Exception as e:
-        logger.warning("Cache invalidation error: %s", e)
-
-
 class CachingMixin:
     """
     Mixin to add caching capabilities to ViewSets
@@ -118,26 +236,19 @@ class CachingMixin:
     Automatically invalidates cache on create, update, delete
     """
 
-    cache_timeout = 300  # 5 minutes default
+    cache_timeout = None  # seconds; None uses the model's CACHE_POLICIES timeout
 
-    def get_cache_key_prefix(self):
-        """Get cache key prefix for this ViewSet's model"""
-        model_name = (
-            self.queryset.model.__name__ if hasattr(self, "queryset") and self.queryset is not None else "generic"
-        )
-        return f"api:{model_name}"
+    def get_cache_model_name(self):
+        """Name of this ViewSet's model, as used for cache tags and policies"""
+        return self.queryset.model.__name__ if getattr(self, "queryset", None) is not None else "generic"
 
     def invalidate_cache(self):
-        """Invalidate cache for this model"""
-        prefix = self.get_cache_key_prefix()
+        """Invalidate cache for this model (and related tags) in the request's school"""
         try:
-            if hasattr(cache, "delete_pattern"):
-                cache.delete_pattern(f"{prefix}:*")
-                # If financial data is updated, also invalidate dashboard
-                if prefix in ["api:Payment", "api:Expense", "api:FeeItem", "api:StudentFee"]:
-                    cache.delete_pattern("api:bursary:dashboard:*")
-        except Exception:
-            pass
+            school_id = _request_school_id(self.request)
+        except PermissionDenied:
+            school_id = None
+        invalidate_model_cache(self.get_cache_model_name(), school_id)
 
     def perform_create(self, serializer):
         """Override to invalidate cache after create"""
@@ -156,28 +267,3 @@ class CachingMixin:
         response = super().perform_destroy(instance)
         self.invalidate_cache()
         return response
-
-
-# Cache policies for different data types
-CACHE_POLICIES = {
-    # Frequently accessed, rarely updated
-    "Subject": {"timeout": 3600, "invalidate_on_write": True},  # 1 hour
-    "Teacher": {"timeout": 1800, "invalidate_on_write": True},  # 30 minutes
-    "Class": {"timeout": 1800, "invalidate_on_write": True},
-    "FeeCategory": {"timeout": 3600, "invalidate_on_write": True},
-    # Medium frequency access
-    "Student": {"timeout": 600, "invalidate_on_write": True},  # 10 minutes
-    "ReportCard": {"timeout": 600, "invalidate_on_write": False},
-    # Frequently updated, shorter cache
-    "AttendanceRecord": {"timeout": 300, "invalidate_on_write": True},  # 5 minutes
-    "Payment": {"timeout": 300, "invalidate_on_write": True},
-    # Real-time data, minimal caching
-    "SchoolMessage": {"timeout": 60, "invalidate_on_write": True},  # 1 minute
-    "SchoolEvent": {"timeout": 600, "invalidate_on_write": True},
-}
-
-
-def get_cache_timeout(model_name):
-    """Get cache timeout for a specific model"""
-    policy = CACHE_POLICIES.get(model_name, {})
-    return policy.get("timeout", 300)  # Default 5 minutes
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.search import SOURCES, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the global search index from its source tables (also backfills it)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--school", type=int, help="Only rebuild this school id")
+        parser.add_argument("--kind", action="append", choices=list(SOURCES), help="Only rebuild these kinds")
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index(school_id=options["school"], kinds=options["kind"])
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt ({indexed} entries)."))
@@ -4,8 +4,9 @@ import os
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 
-from schools.models import School
+from core.audit import audit_batch
 from core.security_utils import sanitize_log_data
+from core.tenant_registry import get_tenant_record, tenant_school
 
 logger = logging.getLogger(__name__)
 
@@ -14,9 +15,20 @@ SENSITIVE_HEADERS = ['authorization', 'x-api-key', 'x-auth-token']
 
 
 class TenantMiddleware(MiddlewareMixin):
+    """
+    Sets request.tenant from the X-Tenant-ID header or the host.
+
+    request.tenant is built from a core.tenant_registry record: only id, name,
+    domain and custom_domain are loaded, and every other School field costs a
+    query on first access. Views that read more of the school (logo, contact
+    details, settings) should load it themselves, as the public settings and
+    invoice views do.
+    """
+
     def process_request(self, request):
         request.tenant = None
         request.tenant_id = None
+        request.tenant_record = None
         
         # 1. Get tenant identifier from header (set by Next.js middleware)
         tenant_domain = request.headers.get("X-Tenant-ID")
@@ -42,20 +54,13 @@ class TenantMiddleware(MiddlewareMixin):
 
         if tenant_domain and tenant_domain != "www" and tenant_domain != root_host:
             try:
-                from django.db.models import Q
-                from django.core.cache import cache
-                
-                cache_key = f"tenant_domain_lookup:{tenant_domain}"
-                school = cache.get(cache_key)
-
-                if school is None:
-                    school = School.objects.filter(Q(domain=tenant_domain) | Q(custom_domain=tenant_domain)).first()
-                    # Cache the result for 5 minutes (300 seconds), even if None (to cache negative lookups)
-                    cache.set(cache_key, school, timeout=300)
+                record = get_tenant_record(tenant_domain)
+                school = tenant_school(record) if record else None
+                request.tenant_record = record
 
                 request.tenant = school
                 if request.tenant:
-                    logger.info(f"[TenantMW] Resolved tenant: {request.tenant.domain} (cached)")
+                    logger.info(f"[TenantMW] Resolved tenant: {request.tenant.domain} (registry)")
                     request.subdomain = tenant_domain
                 else:
                     logger.warning(f"[TenantMW] No tenant found for domain: {tenant_domain}")
@@ -78,7 +83,9 @@ class AuditLogMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        response = self.get_response(request)
+        # Field change logs queued outside a transaction are written once, after the view
+        with audit_batch():
+            response = self.get_response(request)
 
         # Only log mutations (POST, PUT, PATCH, DELETE)
         if request.user.is_authenticated and request.method in ["POST", "PUT", "PATCH", "DELETE"]:
@@ -103,7 +110,7 @@ class AuditLogMiddleware:
 
     def _log_activity(self, request, response, force_anonymous=False):
         try:
-            from core.tasks import log_activity_async
+            from core.activity_buffer import record_activity
 
             user = request.user if request.user.is_authenticated and not force_anonymous else None
             school = getattr(request, "tenant", None)
@@ -125,8 +132,8 @@ class AuditLogMiddleware:
             user_id = user.id if user else None
             description = f"{request.method} request to {request.path}"
 
-            # Dispatch asynchronously via Celery
-            log_activity_async.delay(
+            # Buffered and bulk inserted by core.tasks.flush_activity_logs
+            record_activity(
                 action=action,
                 school_id=school_id,
                 user_id=user_id,
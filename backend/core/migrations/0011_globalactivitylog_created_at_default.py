@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_fieldchangelog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='globalactivitylog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:24
+
+import logging
+
+import django.db.models.deletion
+from django.db import DatabaseError, migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm is PostgreSQL only; elsewhere (or without the extension) core.search uses its in-memory index
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            schema_editor.execute(
+                "CREATE INDEX IF NOT EXISTS core_searchentry_text_trgm "
+                "ON core_searchentry USING gin (search_text gin_trgm_ops)"
+            )
+    except DatabaseError as e:
+        logger.warning(f"Search trigram index not created, searches will not use it: {e}")
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS core_searchentry_text_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_globalactivitylog_created_at_default'),
+        ('schools', '0023_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('subtitle', models.CharField(blank=True, max_length=255)),
+                ('search_text', models.TextField()),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='schools.school')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'kind'], name='core_search_school__5c47ef_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_entry')],
+            },
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
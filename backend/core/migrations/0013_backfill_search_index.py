@@ -0,0 +1,66 @@
+import unicodedata
+
+from django.db import migrations
+
+# Frozen copy of core.search.SOURCES: kind -> (model, searchable fields, title, subtitle, data, school field).
+# core.search works on the current models and must not be imported here.
+SOURCES = {
+    "student": ("academic.Student", ("names", "student_no"), "names", "student_no", ("student_no", "current_class_id"), "school_id"),
+    "staff": ("academic.Teacher", ("name", "email"), "name", "email", ("staff_type",), "school_id"),
+    "class": ("academic.Class", ("name",), "name", "", (), "school_id"),
+    "book": ("library.Book", ("title", "author", "isbn"), "title", "author", ("isbn", "status"), "school_id"),
+    "asset": ("inventory.Asset", ("name", "asset_code", "serial_number"), "name", "asset_code", ("status", "location"), "school_id"),
+    "admission": ("admissions.Admission", ("child_name", "parent_name", "parent_email"), "child_name", "class_applied", ("parent_name", "status"), "school_id"),
+    "school": ("schools.School", ("name", "domain", "email"), "name", "domain", (), "id"),
+}
+CHUNK_SIZE = 1000
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+def backfill_search_index(apps, schema_editor):
+    # Global and platform search read only SearchEntry, so index the existing rows now
+    SearchEntry = apps.get_model("core", "SearchEntry")
+
+    for kind, (label, fields, title, subtitle, data, school_field) in SOURCES.items():
+        model = apps.get_model(label)
+        batch = []
+        for obj in model._default_manager.order_by("pk").iterator(chunk_size=CHUNK_SIZE):
+            school_id = getattr(obj, school_field, None)
+            if not school_id:
+                continue
+            batch.append(
+                SearchEntry(
+                    school_id=school_id,
+                    kind=kind,
+                    object_id=obj.pk,
+                    title=str(getattr(obj, title, "") or "")[:255],
+                    subtitle=str(getattr(obj, subtitle, "") or "")[:255] if subtitle else "",
+                    search_text=_normalize(" ".join(str(getattr(obj, name, "") or "") for name in fields)),
+                    data={name: getattr(obj, name, None) for name in data},
+                )
+            )
+            if len(batch) == CHUNK_SIZE:
+                SearchEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        SearchEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_searchentry'),
+        ('academic', '0037_attendancesummary'),
+        ('admissions', '0001_initial'),
+        ('inventory', '0001_initial'),
+        ('library', '0001_initial'),
+        ('schools', '0023_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop, elidable=True),
+    ]
@@ -2,6 +2,7 @@ import uuid
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from schools.models import School
 
@@ -95,6 +96,51 @@ def log_field_change(
         logging.getLogger(__name__).error(f"Failed to log field change: {e}")
 
 
+def build_field_change_logs(changes, user=None, action="UPDATE", request=None):
+    """
+    Unsaved FieldChangeLog rows for an iterable of (instance, field_name,
+    old_value, new_value) tuples. `instance` only needs _meta, pk and school_id.
+    """
+    ip = None
+    ua = None
+    if request:
+        ip = request.META.get("REMOTE_ADDR")
+        ua = request.META.get("HTTP_USER_AGENT", "")[:500]
+
+    return [
+        FieldChangeLog(
+            school_id=getattr(instance, "school_id", None),
+            user=user,
+            content_type=f"{instance._meta.app_label}.{instance._meta.model_name}",
+            object_id=str(instance.pk),
+            action=action,
+            field_name=field_name,
+            old_value=str(old_value) if old_value is not None else None,
+            new_value=str(new_value) if new_value is not None else None,
+            ip_address=ip,
+            user_agent=ua,
+        )
+        for instance, field_name, old_value, new_value in changes
+    ]
+
+
+def log_field_changes_bulk(changes, user=None, action="UPDATE", request=None):
+    """
+    Log many field changes with a single INSERT.
+    `changes` is an iterable of (instance, field_name, old_value, new_value) tuples.
+    """
+    logs = build_field_change_logs(changes, user=user, action=action, request=request)
+    if not logs:
+        return 0
+    try:
+        FieldChangeLog.objects.bulk_create(logs, batch_size=500)
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).error(f"Failed to log field changes: {e}")
+        return 0
+    return len(logs)
+
+
 class GlobalActivityLog(models.Model):
     ACTION_CHOICES = (
         ("SCHOOL_SIGNUP", "School Signup"),
@@ -124,7 +170,8 @@ class GlobalActivityLog(models.Model):
     )
     description = models.TextField()
     metadata = models.JSONField(default=dict, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered entries keep the time of the request, not of the flush
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ["-created_at"]
@@ -137,6 +184,31 @@ class GlobalActivityLog(models.Model):
         return f"{self.action} - {self.description[:50]}"
 
 
+class SearchEntry(models.Model):
+    """
+    One searchable record (student, staff member, class, book, asset,
+    admission or school) in the per-tenant search index. Kept up to date by
+    core.search on save/delete of the source rows.
+    """
+
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name="search_entries")
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=255)
+    subtitle = models.CharField(max_length=255, blank=True)
+    # Lowercased, accent-free text of every searchable field; trigram-indexed on PostgreSQL
+    search_text = models.TextField()
+    data = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["kind", "object_id"], name="unique_search_entry")]
+        indexes = [models.Index(fields=["school", "kind"])]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
+
+
 class PlatformAnnouncement(models.Model):
     PRIORITY_CHOICES = (
         ("low", "Low"),
@@ -0,0 +1,355 @@
+"""
+Per-tenant search index.
+
+Students, staff, classes, books, assets and admissions (and, for the
+platform search, schools) are mirrored into SearchEntry rows holding a
+title, a subtitle, a small payload and one normalised `search_text`. Rows are
+kept current by post_save/post_delete signals (see core.signals) and bulk
+paths call index_objects(); `manage.py rebuild_search_index` backfills.
+
+search() ranks matches at the start of the text first, then at the start of
+a later word, then other substrings, then fuzzy (trigram) matches, and
+returns at most `limit` results per kind:
+
+- on PostgreSQL with pg_trgm, in one query over the trigram-indexed table;
+- elsewhere, from an in-memory trigram index per tenant, built from the
+  tenant's SearchEntry rows and rebuilt when its version (bumped on every
+  index write) changes.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+
+MIN_QUERY_LENGTH = 2
+SIMILARITY_THRESHOLD = 0.6  # pg_trgm's default word_similarity_threshold
+MEMORY_INDEX_TENANTS = 32
+PLATFORM = "platform"
+
+
+@dataclass(frozen=True)
+class SearchSource:
+    model: str
+    fields: tuple
+    title: str
+    subtitle: str = ""
+    data: tuple = ()
+    # Attribute holding the owning school's id
+    school_field: str = "school_id"
+
+
+SOURCES = {
+    "student": SearchSource(
+        "academic.Student", ("names", "student_no"), "names", "student_no", ("student_no", "current_class_id")
+    ),
+    "staff": SearchSource("academic.Teacher", ("name", "email"), "name", "email", ("staff_type",)),
+    "class": SearchSource("academic.Class", ("name",), "name"),
+    "book": SearchSource("library.Book", ("title", "author", "isbn"), "title", "author", ("isbn", "status")),
+    "asset": SearchSource(
+        "inventory.Asset", ("name", "asset_code", "serial_number"), "name", "asset_code", ("status", "location")
+    ),
+    "admission": SearchSource(
+        "admissions.Admission",
+        ("child_name", "parent_name", "parent_email"),
+        "child_name",
+        "class_applied",
+        ("parent_name", "status"),
+    ),
+    "school": SearchSource("schools.School", ("name", "domain", "email"), "name", "domain", (), school_field="id"),
+}
+TENANT_KINDS = tuple(kind for kind in SOURCES if kind != "school")
+
+
+def normalize(text):
+    """Lowercase, accent-free, whitespace-collapsed text."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _words(text):
+    return _WORD_RE.findall(text)
+
+
+def _trigrams(word):
+    """pg_trgm-style trigrams of one word."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def source_model(kind):
+    try:
+        return apps.get_model(SOURCES[kind].model)
+    except LookupError:
+        return None
+
+
+def kind_for(model):
+    label = model._meta.label
+    return next((kind for kind, source in SOURCES.items() if source.model == label), None)
+
+
+def build_entry(kind, obj):
+    """Unsaved SearchEntry for a source instance, or None when it has no school."""
+    from .models import SearchEntry
+
+    source = SOURCES[kind]
+    school_id = getattr(obj, source.school_field, None)
+    if not school_id:
+        return None
+    return SearchEntry(
+        school_id=school_id,
+        kind=kind,
+        object_id=obj.pk,
+        title=str(getattr(obj, source.title, "") or "")[:255],
+        subtitle=str(getattr(obj, source.subtitle, "") or "")[:255] if source.subtitle else "",
+        search_text=normalize(" ".join(str(getattr(obj, name, "") or "") for name in source.fields)),
+        data={name: getattr(obj, name, None) for name in source.data},
+    )
+
+
+def _version_key(scope):
+    return f"search:version:{scope}"
+
+
+def _bump(scopes):
+    # After commit, so no process rebuilds its in-memory index from rows that are not visible yet
+    if scopes:
+        transaction.on_commit(lambda: cache.set_many({_version_key(scope): time.time_ns() for scope in scopes}, None))
+
+
+def _scope(kind, school_id):
+    return PLATFORM if kind == "school" else school_id
+
+
+def index_objects(objs, kind=None):
+    """Add or refresh the entries of source instances (all of one model). Returns the number written."""
+    from .models import SearchEntry
+
+    objs = [obj for obj in objs if obj.pk]
+    if not objs:
+        return 0
+    kind = kind or kind_for(type(objs[0]))
+    entries = [entry for entry in (build_entry(kind, obj) for obj in objs) if entry]
+    SearchEntry.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=["kind", "object_id"],
+        update_fields=["school", "title", "subtitle", "search_text", "data", "updated_at"],
+        batch_size=500,
+    )
+    _bump({_scope(kind, entry.school_id) for entry in entries})
+    return len(entries)
+
+
+def remove_objects(kind, object_ids, school_ids):
+    from .models import SearchEntry
+
+    SearchEntry.objects.filter(kind=kind, object_id__in=object_ids).delete()
+    _bump({_scope(kind, school_id) for school_id in school_ids if school_id})
+
+
+def rebuild_index(school_id=None, kinds=None, chunk_size=1000):
+    """Re-index every source row (of one school, if given), dropping orphaned entries. Returns rows indexed."""
+    from .models import SearchEntry
+
+    indexed = 0
+    for kind in kinds or SOURCES:
+        model = source_model(kind)
+        if model is None:
+            continue
+        source = SOURCES[kind]
+        rows = model._default_manager.order_by("pk")
+        entries = SearchEntry.objects.filter(kind=kind)
+        if school_id:
+            rows = rows.filter(**{source.school_field: school_id})
+            entries = entries.filter(school_id=school_id)
+        names = {"pk", source.school_field, source.title, *source.fields, *source.data}
+        if source.subtitle:
+            names.add(source.subtitle)
+        rows = rows.only(*(name for name in names if name != "pk"))
+
+        seen = []
+        batch = []
+        for obj in rows.iterator(chunk_size=chunk_size):
+            batch.append(obj)
+            seen.append(obj.pk)
+            if len(batch) == chunk_size:
+                indexed += index_objects(batch, kind)
+                batch = []
+        indexed += index_objects(batch, kind)
+        stale = entries.exclude(object_id__in=seen)
+        stale_schools = set(stale.values_list("school_id", flat=True))
+        if stale_schools:
+            stale.delete()
+            _bump({_scope(kind, sid) for sid in stale_schools})
+    return indexed
+
+
+# --- Query backends --------------------------------------------------------------
+
+
+_pg_trgm = None
+
+
+def _use_postgres():
+    """True on PostgreSQL with pg_trgm installed (checked once per process)."""
+    global _pg_trgm
+    if connection.vendor != "postgresql":
+        return False
+    if _pg_trgm is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _pg_trgm = cursor.fetchone() is not None
+    return _pg_trgm
+
+
+def _postgres_search(query, scope, kinds, limit):
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    from .models import SearchEntry
+
+    entries = SearchEntry.objects.filter(kind__in=kinds)
+    if scope != PLATFORM:
+        entries = entries.filter(school_id=scope)
+    entries = (
+        entries.annotate(
+            similarity=TrigramWordSimilarity(Value(query), "search_text"),
+            match=Case(
+                When(search_text__startswith=query, then=Value(3)),
+                When(search_text__contains=f" {query}", then=Value(2)),
+                When(search_text__contains=query, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+        .filter(Q(match__gt=0) | Q(similarity__gte=SIMILARITY_THRESHOLD))
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=[F("kind")],
+                order_by=[F("match").desc(), F("similarity").desc(), F("title").asc()],
+            )
+        )
+        .filter(rank__lte=limit)
+        .order_by("kind", "rank")
+    )
+    return [
+        (entry.kind, entry.object_id, entry.title, entry.subtitle, entry.data, entry.match + entry.similarity)
+        for entry in entries
+    ]
+
+
+def _match(text, query):
+    """3 when the text starts with the query, 2 when a later word does, 1 for any other substring."""
+    if text.startswith(query):
+        return 3
+    if f" {query}" in text:
+        return 2
+    return 1 if query in text else 0
+
+
+class MemoryIndex:
+    """Trigram index over one tenant's entries, for databases without pg_trgm."""
+
+    def __init__(self, rows):
+        self.entries = []
+        self.postings = defaultdict(list)
+        for kind, object_id, title, subtitle, text, data in rows:
+            grams = set().union(*(_trigrams(word) for word in _words(text)))
+            position = len(self.entries)
+            self.entries.append((kind, object_id, title, subtitle, text, data, grams))
+            for gram in grams:
+                self.postings[gram].append(position)
+
+    def search(self, query, kinds, limit):
+        grams = set().union(*(_trigrams(word) for word in _words(query)))
+        if not grams:
+            return []
+        candidates = {position for gram in grams for position in self.postings.get(gram, ())}
+
+        matches = defaultdict(list)
+        for position in candidates:
+            kind, object_id, title, subtitle, text, data, text_grams = self.entries[position]
+            if kind not in kinds:
+                continue
+            match = _match(text, query)
+            # Share of the query's trigrams found in the text, close to pg_trgm's word_similarity
+            similarity = len(grams & text_grams) / len(grams)
+            if match or similarity >= SIMILARITY_THRESHOLD:
+                matches[kind].append((match + similarity, title, object_id, subtitle, data))
+
+        results = []
+        for kind, found in matches.items():
+            found.sort(key=lambda match: (-match[0], match[1]))
+            results.extend(
+                (kind, object_id, title, subtitle, data, score)
+                for score, title, object_id, subtitle, data in found[:limit]
+            )
+        return results
+
+
+_memory_lock = threading.Lock()
+_memory_indexes = OrderedDict()
+
+
+def _memory_index(scope):
+    from .models import SearchEntry
+
+    version = cache.get(_version_key(scope))
+    with _memory_lock:
+        cached = _memory_indexes.get(scope)
+        if cached and version is not None and cached[0] == version:
+            _memory_indexes.move_to_end(scope)
+            return cached[1]
+
+    if version is None:
+        cache.add(_version_key(scope), time.time_ns(), None)
+        version = cache.get(_version_key(scope))
+    entries = SearchEntry.objects.all()
+    if scope == PLATFORM:
+        entries = entries.filter(kind="school")
+    else:
+        entries = entries.filter(school_id=scope).exclude(kind="school")
+    index = MemoryIndex(entries.values_list("kind", "object_id", "title", "subtitle", "search_text", "data"))
+    with _memory_lock:
+        _memory_indexes[scope] = (version, index)
+        _memory_indexes.move_to_end(scope)
+        while len(_memory_indexes) > MEMORY_INDEX_TENANTS:
+            _memory_indexes.popitem(last=False)
+    return index
+
+
+def search(query, school_id=None, kinds=None, limit=10):
+    """
+    {kind: [{"id", "title", "subtitle", "score", **data}]} for a tenant (or,
+    with no school_id, the platform-wide school index), best matches first.
+    """
+    kinds = tuple(kinds or (TENANT_KINDS if school_id else ("school",)))
+    results = {kind: [] for kind in kinds}
+    query = normalize(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return results
+
+    scope = school_id or PLATFORM
+    if _use_postgres():
+        rows = _postgres_search(query, scope, kinds, limit)
+    else:
+        rows = _memory_index(scope).search(query, kinds, limit)
+    for kind, object_id, title, subtitle, data, score in rows:
+        results[kind].append(
+            {"id": object_id, "title": title, "subtitle": subtitle, "score": round(score, 3), **(data or {})}
+        )
+    return results
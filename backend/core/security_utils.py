@@ -76,49 +76,66 @@ class AuditTrailMixin:
     """
     Mixin for models that need automatic field-level change tracking.
     Inherit from this model and call track_changes() in save().
-    """
-    _original_values = None
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Store original values on load
-        if self.pk:
-            self._original_values = {f.name: getattr(self, f.name, None) for f in self._meta.fields}
-
-    def track_changes(self, user=None, request=None):
-        """Compare current values with original, log any changes."""
-        if not self.pk or not self._original_values:
-            return
 
-        from core.models import FieldChangeLog
-        from schools.models import School
-
-        school = getattr(self, "school", None)
+    Loading an instance only keeps the row as from_db received it (attnames,
+    so foreign keys are ids and never fetched); diffs are computed when the
+    instance is saved, and the resulting FieldChangeLog rows are queued
+    through core.audit rather than inserted one by one.
+    """
 
-        for field in self._meta.fields:
-            field_name = field.name
-            if field_name.startswith("_") or field_name == "id":
+    _loaded_values = None
+    UNTRACKED_FIELDS = ("id", "created_at", "updated_at")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    @property
+    def _original_values(self):
+        """Values as last loaded/saved, by attname. Fields deferred at load time are absent."""
+        return self._loaded_values
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        if self._loaded_values is not None:
+            fields = kwargs.get("fields") or (args[1] if len(args) > 1 else None)
+            self._snapshot(fields)
+
+    def _snapshot(self, fields=None):
+        deferred = self.get_deferred_fields()
+        values = {
+            f.attname: getattr(self, f.attname)
+            for f in self._meta.concrete_fields
+            if f.attname not in deferred and (fields is None or f.name in fields or f.attname in fields)
+        }
+        if fields is None or self._loaded_values is None:
+            self._loaded_values = values
+        else:
+            self._loaded_values.update(values)
+
+    def audit_changes(self, fields=None):
+        """[(instance, field name, old, new)] for tracked fields changed since the last load or save."""
+        if not self.pk or not self._loaded_values:
+            return []
+        changes = []
+        for field in self._meta.concrete_fields:
+            if field.name in self.UNTRACKED_FIELDS or field.attname not in self._loaded_values:
                 continue
-
-            old_value = self._original_values.get(field_name)
-            new_value = getattr(self, field_name, None)
-
-            # Skip timestamps and non-tracked fields
-            if field_name in ["created_at", "updated_at", "id"]:
+            if fields is not None and field.name not in fields and field.attname not in fields:
                 continue
-
-            # Compare values
+            old_value = self._loaded_values[field.attname]
+            new_value = getattr(self, field.attname)
             if old_value != new_value:
-                log_field_change(
-                    instance=self,
-                    field_name=field_name,
-                    old_value=old_value,
-                    new_value=new_value,
-                    user=user,
-                    action="UPDATE",
-                    school=school,
-                    request=request,
-                )
+                changes.append((self, field.name, old_value, new_value))
+        return changes
+
+    def track_changes(self, user=None, request=None):
+        """Compare current values with the loaded ones and queue a log row per changed field."""
+        from core.audit import queue_field_changes
+
+        queue_field_changes(self.audit_changes(), user=user, request=request)
 
     def save(self, *args, **kwargs):
         """Override save to track changes after the save completes."""
@@ -127,7 +144,7 @@ class AuditTrailMixin:
 
         # Update original values after save
         if not is_new:
-            self._original_values = {f.name: getattr(self, f.name, None) for f in self._meta.fields}
+            self._snapshot()
 
 
 def blacklist_token(jti: str):
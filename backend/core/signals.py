@@ -0,0 +1,52 @@
+import logging
+
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from .cache_utils import CACHE_POLICIES, invalidate_model_cache
+from .search import SOURCES, index_objects, remove_objects, source_model
+
+logger = logging.getLogger(__name__)
+
+
+def _kind(sender):
+    return next(kind for kind, source in SOURCES.items() if source_model(kind) is sender)
+
+
+def update_search_entry(sender, instance, raw=False, **kwargs):
+    """Keep the search index in step with every saved search source."""
+    if raw:
+        return
+    try:
+        index_objects([instance], _kind(sender))
+    except Exception as e:
+        logger.error(f"Failed to index {sender.__name__} {instance.pk} for search: {e}")
+
+
+def remove_search_entry(sender, instance, **kwargs):
+    kind = _kind(sender)
+    try:
+        remove_objects(kind, [instance.pk], [getattr(instance, SOURCES[kind].school_field, None)])
+    except Exception as e:
+        logger.error(f"Failed to remove {sender.__name__} {instance.pk} from search: {e}")
+
+
+for _search_kind in SOURCES:
+    _model = source_model(_search_kind)
+    if _model is not None:
+        post_save.connect(update_search_entry, sender=_model, dispatch_uid=f"search-index-{_search_kind}")
+        post_delete.connect(remove_search_entry, sender=_model, dispatch_uid=f"search-unindex-{_search_kind}")
+
+
+def invalidate_cached_responses(sender, instance, raw=False, **kwargs):
+    """Drop cached API responses built from the written model, wherever the write came from."""
+    if not raw:
+        invalidate_model_cache(sender.__name__, getattr(instance, "school_id", None))
+
+
+for _model in apps.get_models():
+    if CACHE_POLICIES.get(_model.__name__, {}).get("invalidate_on_write"):
+        post_save.connect(invalidate_cached_responses, sender=_model, dispatch_uid=f"api-cache-{_model._meta.label}")
+        post_delete.connect(
+            invalidate_cached_responses, sender=_model, dispatch_uid=f"api-cache-delete-{_model._meta.label}"
+        )
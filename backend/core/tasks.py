@@ -42,16 +42,25 @@ def cleanup_expired_sessions():
 @shared_task(ignore_result=True)
 def log_activity_async(action, school_id, user_id, description, metadata):
     """
-    Asynchronously write an audit log entry to prevent blocking API requests.
+    Buffer an audit log entry (see core.activity_buffer). Kept so messages
+    queued before the buffer existed are still written.
     """
-    from core.models import GlobalActivityLog
-    GlobalActivityLog.objects.create(
-        action=action,
-        school_id=school_id,
-        user_id=user_id,
-        description=description,
-        metadata=metadata,
-    )
+    from core.activity_buffer import record_activity
+
+    record_activity(action, school_id=school_id, user_id=user_id, description=description, metadata=metadata)
+
+
+@shared_task(ignore_result=True)
+def flush_activity_logs():
+    """Bulk insert buffered activity log entries. Runs every few seconds via Celery Beat and on size thresholds."""
+    from core.activity_buffer import buffer_stats
+    from core.activity_buffer import flush_activity_logs as flush
+
+    written = flush()
+    stats = buffer_stats()
+    if written or stats["depth"]:
+        logger.info(f"Flushed {written} activity log entries; depth {stats['depth']}, lag {stats['lag_seconds']}s.")
+    return written
 
 
 @shared_task
@@ -0,0 +1,105 @@
+"""
+Tenant lookup for TenantMiddleware.
+
+Each request resolves its school from a domain or custom domain. Instead of
+pickling School instances into the shared cache, the registry keeps a compact
+record per lookup (id, name, domain, custom domain):
+
+- a small in-process LRU answers almost every request without a network hop;
+- behind it, the shared cache holds the records as plain dicts, so other
+  processes and restarts do not hit the database;
+- School changes call invalidate_tenants(), which bumps a shared version. Every process notices
+  within TENANT_VERSION_CHECK_INTERVAL seconds and drops its LRU; the version
+  is part of the shared keys, so older records are never read again.
+
+tenant_school() turns a record into a School instance with the other fields
+deferred, so code using request.tenant keeps working without a query unless
+it reads something the record does not carry. Subscription status and modules
+are not part of the record; the views that need them read them per request.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+
+TENANT_LRU_SIZE = getattr(settings, "TENANT_LRU_SIZE", 512)
+TENANT_VERSION_CHECK_INTERVAL = getattr(settings, "TENANT_VERSION_CHECK_INTERVAL", 5)
+TENANT_RECORD_TTL = 60 * 60
+TENANT_MISS_TTL = 60
+TENANT_VERSION_KEY = "tenant:registry-version"
+
+# School fields carried by a record, in the order School.from_db expects them
+SCHOOL_FIELDS = ("id", "name", "domain", "custom_domain")
+
+_lock = threading.Lock()
+_records = OrderedDict()
+_state = {"version": None, "checked": 0.0}
+
+
+def load_tenant_record(lookup):
+    """Compact record of the school whose domain or custom domain is `lookup`, or None."""
+    from schools.models import School
+
+    return School.objects.filter(Q(domain=lookup) | Q(custom_domain=lookup)).values(*SCHOOL_FIELDS).first()
+
+
+def _current_version():
+    """Shared registry version, read at most every TENANT_VERSION_CHECK_INTERVAL seconds."""
+    now = time.monotonic()
+    with _lock:
+        version, checked = _state["version"], _state["checked"]
+    if version is not None and now - checked < TENANT_VERSION_CHECK_INTERVAL:
+        return version
+
+    current = cache.get(TENANT_VERSION_KEY)
+    if current is None:
+        cache.add(TENANT_VERSION_KEY, time.time_ns(), None)
+        current = cache.get(TENANT_VERSION_KEY)
+    with _lock:
+        if current != _state["version"]:
+            _records.clear()
+        _state.update(version=current, checked=now)
+    return current
+
+
+def get_tenant_record(lookup):
+    """Record for a domain or custom domain, or None when no school uses it."""
+    version = _current_version()
+    with _lock:
+        if lookup in _records:
+            _records.move_to_end(lookup)
+            return _records[lookup]
+
+    key = f"tenant:record:{version}:{lookup}"
+    record = cache.get(key)
+    if record is None:
+        record = load_tenant_record(lookup) or {}
+        # Unknown domains are cached briefly so probes cannot hammer the database
+        cache.set(key, record, TENANT_RECORD_TTL if record else TENANT_MISS_TTL)
+
+    with _lock:
+        _records[lookup] = record
+        _records.move_to_end(lookup)
+        while len(_records) > TENANT_LRU_SIZE:
+            _records.popitem(last=False)
+    return record or None
+
+
+def tenant_school(record):
+    """School instance for a record; fields outside the record load on first access."""
+    from schools.models import School
+
+    return School.from_db(DEFAULT_DB_ALIAS, list(SCHOOL_FIELDS), [record[name] for name in SCHOOL_FIELDS])
+
+
+def invalidate_tenants():
+    """Forget every cached tenant record, here at once and in other processes within the check interval."""
+    with _lock:
+        _records.clear()
+        _state.update(version=None, checked=0.0)
+    cache.set(TENANT_VERSION_KEY, time.time_ns(), None)
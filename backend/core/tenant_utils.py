@@ -47,3 +47,36 @@ def ensure_object_school(obj, school, label="resource"):
     obj_school = getattr(obj, "school", None)
     if obj_school and obj_school != school:
         raise PermissionDenied(f"Cross-tenant reference denied for {label}.")
+
+
+CURRENT_PERIOD_TTL = 60 * 60
+
+
+def _current_period_key(school_id):
+    return f"school:current-period:{school_id}"
+
+
+def get_current_period(school):
+    """
+    (current_session, current_term) from the school's settings, or (None, None)
+    when it has none. Cached; SchoolSettings saves drop the entry (see schools.signals).
+    """
+    if not school:
+        return None, None
+    from django.core.cache import cache
+
+    from schools.models import SchoolSettings
+
+    key = _current_period_key(school.pk)
+    period = cache.get(key)
+    if period is None:
+        stored = SchoolSettings.objects.filter(school_id=school.pk).values_list("current_session", "current_term")
+        period = tuple(stored.first() or (None, None))
+        cache.set(key, period, CURRENT_PERIOD_TTL)
+    return tuple(period)
+
+
+def invalidate_current_period(school_id):
+    from django.core.cache import cache
+
+    cache.delete(_current_period_key(school_id))
@@ -0,0 +1,78 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from core import activity_buffer
+from core.models import GlobalActivityLog
+from schools.models import School
+
+
+class ActivityLogBufferTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.school = School.objects.create(name="Activity School", domain="activity-school")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@activity-school",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+        cache.delete_many([activity_buffer.FLUSH_QUEUED_KEY, activity_buffer.FLUSH_LOCK_KEY])
+        patcher = patch.object(activity_buffer, "_buffer", activity_buffer.LocalActivityBuffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _mutate(self, count):
+        for index in range(count):
+            self.client.post(
+                "/api/academic/classes/", {"name": f"JSS {index}"}, format="json", HTTP_X_TENANT_ID=self.school.domain
+            )
+
+    def _logs(self):
+        return GlobalActivityLog.objects.filter(school=self.school, action="RECORDS_MUTATED")
+
+    def test_mutations_are_buffered_and_written_with_one_insert(self):
+        self._mutate(3)
+        self.assertFalse(self._logs().exists())
+        self.assertEqual(activity_buffer.buffer_stats()["depth"], 3)
+
+        with CaptureQueriesContext(connection) as ctx:
+            written = activity_buffer.flush_activity_logs()
+
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "core_globalactivitylog"')]
+        self.assertEqual((written, len(inserts)), (3, 1))
+        self.assertEqual(self._logs().filter(user=self.admin, metadata__method="POST").count(), 3)
+        self.assertEqual(activity_buffer.buffer_stats(), {"depth": 0, "lag_seconds": 0})
+
+    def test_reaching_the_size_threshold_queues_a_flush(self):
+        with patch.object(activity_buffer, "ACTIVITY_LOG_FLUSH_SIZE", 2):
+            self._mutate(1)
+            self.assertFalse(self._logs().exists())
+            with self.captureOnCommitCallbacks(execute=True):
+                self._mutate(1)
+
+        self.assertEqual(self._logs().count(), 2)
+        self.assertEqual(activity_buffer.buffer_stats()["depth"], 0)
+
+    def test_failed_flush_keeps_entries_for_the_next_one(self):
+        self._mutate(2)
+        with patch.object(activity_buffer, "_insert", side_effect=RuntimeError("database went away")):
+            with self.assertRaises(RuntimeError):
+                activity_buffer.flush_activity_logs()
+
+        self.assertEqual(activity_buffer.buffer_stats()["depth"], 2)
+        self.assertEqual(activity_buffer.flush_activity_logs(), 2)
+        self.assertEqual(self._logs().count(), 2)
+
+    def test_entries_are_written_directly_while_redis_is_down(self):
+        activity_buffer._buffer = None
+        with patch.object(activity_buffer, "_retry_at", 0), patch.object(activity_buffer, "_connect", return_value=None):
+            self._mutate(2)
+            self.assertEqual(self._logs().count(), 2)
+            self.assertIsNone(activity_buffer._buffer)
+            self.assertEqual(activity_buffer.flush_activity_logs(), 0)
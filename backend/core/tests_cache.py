@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient, APITestCase
+
+from academic.models import Student
+from bursary.models import Payment
+from core.cache_utils import CacheKeyBuilder, cache_stats, invalidate_model_cache
+from schools.models import School
+
+
+class VersionedCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.school = School.objects.create(name="Cache School", domain="cache-school")
+        self.other = School.objects.create(name="Other Cache School", domain="other-cache-school")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@cache-school",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.student = Student.objects.create(school=self.school, student_no="ST001", names="Ada Obi", gender="Female")
+
+    def _pay(self, reference, amount):
+        Payment.objects.create(
+            school=self.school,
+            student=self.student,
+            amount=amount,
+            reference=reference,
+            session="2025/2026",
+            term="First Term",
+        )
+
+    def _dashboard(self):
+        response = self.client.get(
+            "/api/bursary/dashboard/",
+            {"session": "2025/2026", "term": "First Term"},
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_invalidation_bumps_only_the_school_and_related_tags(self):
+        payments = CacheKeyBuilder.build_list_key("Payment", school_id=self.school.id)
+        dashboard = CacheKeyBuilder.build_list_key("BursaryDashboard", school_id=self.school.id)
+        other = CacheKeyBuilder.build_list_key("Payment", school_id=self.other.id)
+        self.assertEqual(payments, CacheKeyBuilder.build_list_key("Payment", school_id=self.school.id))
+
+        invalidate_model_cache("Payment", self.school.id)
+
+        self.assertNotEqual(payments, CacheKeyBuilder.build_list_key("Payment", school_id=self.school.id))
+        self.assertNotEqual(dashboard, CacheKeyBuilder.build_list_key("BursaryDashboard", school_id=self.school.id))
+        self.assertEqual(other, CacheKeyBuilder.build_list_key("Payment", school_id=self.other.id))
+
+    def test_dashboard_is_cached_until_a_payment_is_written(self):
+        self._pay("RCPT-1", 5000)
+        self.assertEqual(self._dashboard()["total_collected"], 5000)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._dashboard()["total_collected"], 5000)
+
+        self._pay("RCPT-2", 2500)
+        self.assertEqual(self._dashboard()["total_collected"], 7500)
+        self.assertEqual(cache_stats()["DashboardViewSet.list"], {"hits": 1, "misses": 2, "hit_ratio": 0.333})
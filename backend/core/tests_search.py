@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient, APITestCase
+
+from academic.models import Class, Student
+from core import search
+from core.models import SearchEntry
+from library.models import Book
+from schools.models import School
+
+
+class SearchIndexTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.school = School.objects.create(name="Search School", domain="search-school")
+        self.other = School.objects.create(name="Other School", domain="other-school")
+        self.admin = get_user_model().objects.create_user(
+            username="admin@search-school",
+            password="password123",
+            role="SCHOOL_ADMIN",
+            school=self.school,
+        )
+        self.client.force_authenticate(user=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jss1 = Class.objects.create(school=self.school, name="JSS 1")
+            self.ada = Student.objects.create(
+                school=self.school, names="Adaeze Okafor", student_no="ST001", gender="Female", current_class=self.jss1
+            )
+            Student.objects.create(school=self.school, names="Mohammed Adamu", student_no="ST002", gender="Male")
+            Student.objects.create(school=self.other, names="Adaeze Bello", student_no="ST001", gender="Female")
+            Book.objects.create(school=self.school, title="Things Fall Apart", author="Chinua Achebe")
+
+    def _names(self, query, kind="student"):
+        return [entry["title"] for entry in search.search(query, school_id=self.school.id, kinds=[kind])[kind]]
+
+    def test_prefix_and_typo_matches_are_ranked_within_the_tenant(self):
+        self.assertEqual(self._names("ada"), ["Adaeze Okafor", "Mohammed Adamu"])
+        self.assertEqual(self._names("okafr"), ["Adaeze Okafor"])
+        self.assertEqual(self._names("achebe", "book"), ["Things Fall Apart"])
+        self.assertEqual(self._names("zz"), [])
+
+    def test_saves_and_deletes_update_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ada.names = "Adaeze Nwosu"
+            self.ada.save()
+        self.assertEqual(self._names("nwosu"), ["Adaeze Nwosu"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ada.delete()
+        self.assertEqual(self._names("adaeze"), [])
+        self.assertFalse(SearchEntry.objects.filter(kind="student", object_id=self.ada.id).exists())
+
+    def test_rebuild_restores_missing_entries(self):
+        SearchEntry.objects.filter(school=self.school).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            search.rebuild_index(school_id=self.school.id)
+        self.assertEqual(SearchEntry.objects.filter(school=self.school, kind="student").count(), 2)
+        self.assertEqual(self._names("okafor"), ["Adaeze Okafor"])
+
+    def test_migration_backfill_matches_the_index(self):
+        import importlib
+
+        from django.apps import apps
+
+        fields = ("school_id", "kind", "object_id", "title", "subtitle", "search_text", "data")
+        indexed = sorted(SearchEntry.objects.values_list(*fields))
+        SearchEntry.objects.all().delete()
+
+        migration = importlib.import_module("core.migrations.0013_backfill_search_index")
+        migration.backfill_search_index(apps, None)
+        self.assertEqual(sorted(SearchEntry.objects.values_list(*fields)), indexed)
+
+    def test_global_search_endpoint(self):
+        response = self.client.get("/api/academic/global-search/?q=adaez", HTTP_X_TENANT_ID=self.school.domain)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["students"],
+            [{"id": self.ada.id, "names": "Adaeze Okafor", "student_no": "ST001", "current_class": "JSS 1"}],
+        )
+        self.assertEqual(response.data["classes"], [])
+        self.assertEqual(response.data["books"], [])
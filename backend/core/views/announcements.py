@@ -201,7 +201,7 @@ class NewsletterViewSet(CachingMixin, viewsets.ModelViewSet):
                 "stats": stats,
             }
 
-            ai = AcademicAI()
+            ai = AcademicAI(school=school)
             if not ai.model:
                 return Response(
                     {"error": "AI service is not configured. Please set the GEMINI_API_KEY in the server environment."},
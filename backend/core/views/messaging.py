@@ -429,7 +429,7 @@ class SchoolMessageViewSet(CachingMixin, viewsets.ModelViewSet):
         tone = request.data.get("tone", "formal")
 
         try:
-            ai = AcademicAI()
+            ai = AcademicAI(school=school)
             if not ai.model:
                 return Response(
                     {"error": "AI service is not configured. Please contact the administrator."}, status=503
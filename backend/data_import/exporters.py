@@ -0,0 +1,356 @@
+"""
+Streaming export engine.
+
+Each export is a flat column list over one model. Rows are read with
+`values_list(...).iterator(chunk_size=...)`, so no model instances are built
+and only one chunk is held at a time, then rendered as CSV, XLSX or NDJSON by a
+generator that yields bytes. stream_export() hands that generator to a
+StreamingHttpResponse; run_export() (used by ExportJob) writes it to a
+temporary file and saves that to storage. Memory use does not grow with the
+size of the export either way.
+
+XLSX is written directly as a zip of XML parts with inline strings (there is
+no shared-strings table to build up), so it streams like the text formats.
+"""
+
+import csv
+import io
+import json
+import re
+import tempfile
+import zipfile
+from dataclasses import dataclass, field
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.apps import apps
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+
+EXPORT_CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    model: str
+    # (header, values_list lookup)
+    columns: tuple
+    order_by: tuple = ("pk",)
+    # request parameter -> lookup; parameters ending in date_from/date_to are parsed as dates
+    filters: dict = field(default_factory=dict)
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+
+EXPORTS = {
+    "students": ExportSpec(
+        "academic.Student",
+        (
+            ("student_no", "student_no"),
+            ("names", "names"),
+            ("gender", "gender"),
+            ("date_of_birth", "dob"),
+            ("class_name", "current_class__name"),
+            ("parent_name", "parent_name"),
+            ("parent_email", "parent_email"),
+            ("parent_phone", "parent_phone"),
+            ("address", "address"),
+            ("status", "status"),
+        ),
+        filters={"class_id": "current_class_id", "status": "status"},
+    ),
+    "scores": ExportSpec(
+        "academic.SubjectScore",
+        (
+            ("student_no", "report_card__student__student_no"),
+            ("names", "report_card__student__names"),
+            ("class_name", "report_card__student_class__name"),
+            ("session", "report_card__session"),
+            ("term", "report_card__term"),
+            ("subject", "subject__name"),
+            ("ca1", "ca1"),
+            ("ca2", "ca2"),
+            ("exam", "exam"),
+            ("total", "total"),
+            ("grade", "grade"),
+            ("position", "position"),
+        ),
+        order_by=("report_card_id", "subject_id"),
+        filters={
+            "session": "report_card__session",
+            "term": "report_card__term",
+            "class_id": "report_card__student_class_id",
+            "subject_id": "subject_id",
+        },
+    ),
+    "payments": ExportSpec(
+        "bursary.Payment",
+        (
+            ("reference", "reference"),
+            ("date", "date"),
+            ("student_no", "student__student_no"),
+            ("names", "student__names"),
+            ("amount", "amount"),
+            ("method", "method"),
+            ("status", "status"),
+            ("category", "category__name"),
+            ("session", "session"),
+            ("term", "term"),
+            ("gateway_reference", "gateway_reference"),
+            ("recorded_by", "recorded_by"),
+        ),
+        order_by=("date", "pk"),
+        filters={
+            "session": "session",
+            "term": "term",
+            "status": "status",
+            "method": "method",
+            "date_from": "date__gte",
+            "date_to": "date__lte",
+        },
+    ),
+    "attendance": ExportSpec(
+        "academic.AttendanceRecord",
+        (
+            ("date", "attendance_session__date"),
+            ("class_name", "attendance_session__student_class__name"),
+            ("session", "attendance_session__session"),
+            ("term", "attendance_session__term"),
+            ("student_no", "student__student_no"),
+            ("names", "student__names"),
+            ("status", "status"),
+            ("remark", "remark"),
+        ),
+        order_by=("attendance_session__date", "attendance_session_id", "pk"),
+        filters={
+            "session": "attendance_session__session",
+            "term": "attendance_session__term",
+            "class_id": "attendance_session__student_class_id",
+            "date_from": "attendance_session__date__gte",
+            "date_to": "attendance_session__date__lte",
+        },
+    ),
+}
+
+
+def export_filters(kind, params):
+    """Filter kwargs for the spec's known parameters; raises ValueError on a malformed date."""
+    lookups = {}
+    for param, lookup in EXPORTS[kind].filters.items():
+        value = params.get(param)
+        if value in (None, ""):
+            continue
+        if param.startswith("date_"):
+            try:
+                value = parse_date(str(value))
+            except ValueError:
+                value = None
+            if value is None:
+                raise ValueError(f"{param} must be a date (YYYY-MM-DD)")
+        lookups[lookup] = value
+    return lookups
+
+
+def export_rows(kind, school, params=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Iterator of value tuples for an export, read from the database a chunk at a time."""
+    spec = EXPORTS[kind]
+    model = apps.get_model(spec.model)
+    rows = model.objects.filter(school=school, **export_filters(kind, params or {})).order_by(*spec.order_by)
+    return rows.values_list(*(lookup for _, lookup in spec.columns)).iterator(chunk_size=chunk_size)
+
+
+# --- Renderers -----------------------------------------------------------------------
+
+
+def render_csv(headers, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def render_ndjson(headers, rows):
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder)
+        lines.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ("\n".join(lines) + "\n").encode()
+            lines, size = [], 0
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+class _ChunkSink:
+    """Unseekable file object collecting what zipfile writes, drained by the generator."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def _xlsx_cell(value):
+    if value is None or value == "":
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f"<c><v>{value}</v></c>"
+    text = value.isoformat() if hasattr(value, "isoformat") else str(value)
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_XML_ILLEGAL.sub("", text))}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return "<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>"
+
+
+def render_xlsx(headers, rows):
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield sink.drain()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(headers).encode())
+            pending = []
+            size = 0
+            for row in rows:
+                xml = _xlsx_row(row)
+                pending.append(xml)
+                size += len(xml)
+                if size >= FLUSH_BYTES:
+                    sheet.write("".join(pending).encode())
+                    pending, size = [], 0
+                    data = sink.drain()
+                    if data:
+                        yield data
+            sheet.write("".join(pending).encode())
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+FORMATS = {
+    "csv": (render_csv, "text/csv", "csv"),
+    "xlsx": (render_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "ndjson": (render_ndjson, "application/x-ndjson", "ndjson"),
+}
+
+
+def render_export(kind, file_format, school, params=None, on_row=None):
+    """Byte chunks of a rendered export. `on_row` is called once per data row."""
+    rows = export_rows(kind, school, params)
+    if on_row is not None:
+        rows = _counted(rows, on_row)
+    renderer = FORMATS[file_format][0]
+    return renderer(EXPORTS[kind].headers, rows)
+
+
+def _counted(rows, on_row):
+    for row in rows:
+        on_row()
+        yield row
+
+
+def export_filename(kind, file_format):
+    return f"{kind}_export.{FORMATS[file_format][2]}"
+
+
+def stream_export(kind, file_format, school, params=None, filename=None):
+    """StreamingHttpResponse for an export; validates filters before the first byte is sent."""
+    export_filters(kind, params or {})
+    response = StreamingHttpResponse(
+        render_export(kind, file_format, school, params), content_type=FORMATS[file_format][1]
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename or export_filename(kind, file_format)}"'
+    # Let proxies pass chunks through instead of buffering the whole body
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def run_export(job):
+    """Render an ExportJob to a temporary file, save it to storage and return (path, row_count)."""
+    from django.core.files.storage import default_storage
+
+    count = 0
+
+    def on_row():
+        nonlocal count
+        count += 1
+
+    with tempfile.TemporaryFile() as tmp:
+        for chunk in render_export(job.export_type, job.file_format, job.school, job.params, on_row=on_row):
+            tmp.write(chunk)
+        tmp.seek(0)
+        path = default_storage.save(
+            f"exports/{job.school_id}/{job.id}/{export_filename(job.export_type, job.file_format)}", File(tmp)
+        )
+    return path, count
@@ -0,0 +1,340 @@
+"""
+Streaming CSV import pipeline.
+
+The uploaded file is read row by row from storage (never fully in memory) and
+handed to an importer in chunks. Each chunk is validated and upserted with a
+few set-based queries and its ImportRow records are written with one
+bulk_create; ImportJob progress is updated after every chunk so the client can
+poll it. With `dry_run` the rows are only validated: valid rows are recorded as
+"pending" and nothing else is written.
+"""
+
+import csv
+import io
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ImportJob, ImportRow
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+MAX_STORED_ERRORS = 1000  # ImportJob.errors is a JSON column; ImportRow keeps every failure
+
+
+def iter_csv_rows(fileobj):
+    """Yield (row_number, row) from a binary file object, decoding as it goes."""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            yield row_number, {key.strip(): (value or "") for key, value in row.items() if key}
+    finally:
+        text.detach()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class BaseImporter(ABC):
+    entity_type = ""
+
+    def __init__(self, job, school, dry_run=False):
+        self.job = job
+        self.school = school
+        self.dry_run = dry_run
+
+    @abstractmethod
+    def process_chunk(self, rows):
+        """Validate/upsert [(row_number, row)]; return {row_number: (entity_id or None, error or None)}."""
+
+    def finish(self):
+        """Hook run once after the last chunk."""
+
+
+class StudentImporter(BaseImporter):
+    entity_type = "Student"
+    fields = ("names", "gender", "current_class", "parent_name", "parent_email", "parent_phone", "address")
+
+    def __init__(self, job, school, dry_run=False):
+        from academic.models import Class
+
+        super().__init__(job, school, dry_run)
+        self.classes = {}
+        for class_id, name in Class.objects.filter(school=school).order_by("id").values_list("id", "name"):
+            self.classes.setdefault(name, class_id)
+
+    def process_chunk(self, rows):
+        from academic.models import Student
+        from academic.services.broadsheet import invalidate_broadsheets
+        from academic.services.report_pdf import invalidate_report_pdfs
+        from core.models import log_field_changes_bulk
+        from core.search import index_objects
+
+        results, students, row_numbers = {}, {}, defaultdict(list)
+        for row_number, row in rows:
+            names = row.get("names", "").strip()
+            student_no = row.get("student_no", "").strip()
+            gender = row.get("gender", "").strip()
+            if not names or not student_no:
+                results[row_number] = (None, "Missing required fields: names, student_no")
+                continue
+            if gender not in ["Male", "Female"]:
+                results[row_number] = (None, "Invalid gender")
+                continue
+            # Repeated student numbers: the last row wins, as with per-row update_or_create
+            students[student_no] = Student(
+                school=self.school,
+                student_no=student_no,
+                names=names,
+                gender=gender,
+                current_class_id=self.classes.get(row.get("class", "").strip()),
+                parent_name=row.get("parent_name", "").strip(),
+                parent_email=row.get("parent_email", "").strip(),
+                parent_phone=row.get("parent_phone", "").strip(),
+                address=row.get("address", "").strip(),
+            )
+            row_numbers[student_no].append(row_number)
+
+        if self.dry_run or not students:
+            results.update((n, (None, None)) for numbers in row_numbers.values() for n in numbers)
+            return results
+
+        existing = {
+            row["student_no"]: row
+            for row in Student.objects.filter(school=self.school, student_no__in=students).values(
+                "id", "student_no", "current_class_id", *[f for f in self.fields if f != "current_class"]
+            )
+        }
+        now = timezone.now()
+        for student in students.values():
+            student.updated_at = now
+
+        with transaction.atomic():
+            Student.objects.bulk_create(
+                list(students.values()),
+                update_conflicts=True,
+                unique_fields=["school", "student_no"],
+                update_fields=[*self.fields, "updated_at"],
+            )
+            if any(student.pk is None for student in students.values()):
+                ids = dict(
+                    Student.objects.filter(school=self.school, student_no__in=students).values_list("student_no", "id")
+                )
+                for student_no, student in students.items():
+                    student.pk = ids.get(student_no)
+
+            changes = []
+            for student_no, student in students.items():
+                before = existing.get(student_no)
+                if not before:
+                    continue
+                for field in self.fields:
+                    attname = "current_class_id" if field == "current_class" else field
+                    if before[attname] != getattr(student, attname):
+                        changes.append((student, field, before[attname], getattr(student, attname)))
+            log_field_changes_bulk(changes)
+            # bulk_create sends no post_save, so the search index is updated here
+            index_objects(list(students.values()), "student")
+
+        class_ids = {s.current_class_id for s in students.values()} | {r["current_class_id"] for r in existing.values()}
+        invalidate_broadsheets(self.school.pk, class_ids - {None})
+        invalidate_report_pdfs(self.school.pk, {students[student_no].pk for student_no in existing})
+
+        for student_no, numbers in row_numbers.items():
+            results.update((n, (students[student_no].pk, None)) for n in numbers)
+        return results
+
+
+class ScoreImporter(BaseImporter):
+    """
+    Columns: student_no, subject, ca1/ca2 (or test_score), exam (or exam_score), session, term.
+    The session/term of the first row applies to the whole file.
+    """
+
+    entity_type = "SubjectScore"
+
+    def __init__(self, job, school, dry_run=False):
+        super().__init__(job, school, dry_run)
+        self.session = None
+        self.term = None
+        self.groups = set()
+
+    def _report_cards(self, students):
+        from academic.models import ReportCard
+        from academic.services.attendance import attendance_summaries
+
+        report_cards = {
+            rc.student_id: rc
+            for rc in ReportCard.objects.filter(
+                school=self.school, session=self.session, term=self.term, student__in=students.values()
+            )
+        }
+        missing = [
+            ReportCard(
+                school=self.school, student=s, student_class_id=s.current_class_id, session=self.session, term=self.term
+            )
+            for s in students.values()
+            if s.id not in report_cards
+        ]
+        if missing:
+            # bulk_create skips the signal that copies attendance onto new report cards
+            attendance = attendance_summaries(
+                self.school.id, self.session, self.term, [rc.student_id for rc in missing]
+            )
+            for rc in missing:
+                summary = attendance.get(rc.student_id)
+                if summary:
+                    rc.attendance_present, rc.attendance_total = summary.present, summary.total
+            ReportCard.objects.bulk_create(missing)
+            report_cards.update(
+                (rc.student_id, rc)
+                for rc in ReportCard.objects.filter(
+                    school=self.school,
+                    session=self.session,
+                    term=self.term,
+                    student_id__in=[rc.student_id for rc in missing],
+                )
+            )
+        return report_cards
+
+    def process_chunk(self, rows):
+        from academic.models import Student
+        from academic.services.scores import SCORE_FIELDS, ingest_scores
+
+        if self.session is None:
+            first = rows[0][1]
+            self.session = first.get("session") or "2025/2026"
+            self.term = first.get("term") or "First Term"
+
+        student_nos = {(row.get("student_no") or "").strip() for _, row in rows} - {""}
+        students = {
+            s.student_no: s
+            for s in Student.objects.filter(school=self.school, student_no__in=student_nos).only(
+                "id", "school_id", "student_no", "current_class_id"
+            )
+        }
+
+        results, parsed = {}, []
+        for row_number, row in rows:
+            student_no = (row.get("student_no") or "").strip()
+            subject_name = (row.get("subject") or "").strip()
+            if not student_no or not subject_name:
+                results[row_number] = (None, "Missing student_no or subject")
+                continue
+            student = students.get(student_no)
+            if not student:
+                results[row_number] = (None, f"Student not found: {student_no}")
+                continue
+            scores = {
+                "ca1": row.get("ca1") or row.get("test_score") or 0,
+                "ca2": row.get("ca2") or 0,
+                "exam": row.get("exam") or row.get("exam_score") or 0,
+            }
+            try:
+                for field in SCORE_FIELDS:
+                    float(scores[field])
+            except (TypeError, ValueError):
+                results[row_number] = (None, "Scores must be numeric")
+                continue
+            parsed.append((row_number, student, subject_name, scores))
+
+        if self.dry_run or not parsed:
+            results.update((row_number, (None, None)) for row_number, *_ in parsed)
+            return results
+
+        report_cards = self._report_cards({s.student_no: s for _, s, _, _ in parsed})
+        entries = [
+            {"report_card": report_cards[student.id], "subject": subject_name, **scores}
+            for _, student, subject_name, scores in parsed
+        ]
+        # Positions are ranked once per class in finish(), not per chunk
+        result = ingest_scores(self.school, entries, update_positions=False)
+        failed = {error["index"]: error["error"] for error in result["errors"]}
+        for index, (row_number, student, _, _) in enumerate(parsed):
+            score = result["scores"][index]
+            results[row_number] = (score.id, None) if score is not None else (None, failed.get(index, "Not imported"))
+            self.groups.add((report_cards[student.id].student_class_id, self.session, self.term))
+        return results
+
+    def finish(self):
+        from academic.services.results import compute_term_results
+
+        if self.dry_run:
+            return
+        # Positions, subject positions and class statistics for every class the import touched
+        terms = {}
+        for class_id, session, term in self.groups:
+            if class_id:
+                terms.setdefault((session, term), set()).add(class_id)
+        for (session, term), class_ids in terms.items():
+            compute_term_results(self.school, session, term, class_ids=sorted(class_ids))
+
+
+IMPORTERS = {
+    "students": StudentImporter,
+    "scores": ScoreImporter,
+}
+
+
+def count_csv_rows(fileobj):
+    total = sum(1 for _ in iter_csv_rows(fileobj))
+    fileobj.seek(0)
+    return total
+
+
+def run_import(job, fileobj, chunk_size=CHUNK_SIZE):
+    """Stream `fileobj` (binary) through the job's importer, updating progress per chunk."""
+    importer = IMPORTERS[job.import_type](job, job.school, dry_run=job.dry_run)
+
+    job.status = "processing"
+    job.total_rows = count_csv_rows(fileobj)
+    job.save(update_fields=["status", "total_rows", "updated_at"])
+
+    errors = []
+    processed = success = failed = 0
+    for chunk in chunked(iter_csv_rows(fileobj), chunk_size):
+        results = importer.process_chunk(chunk)
+        import_rows = []
+        for row_number, row in chunk:
+            entity_id, error = results.get(row_number, (None, "Not processed"))
+            if error:
+                failed += 1
+                if len(errors) < MAX_STORED_ERRORS:
+                    errors.append({"row": row_number, "error": error})
+            else:
+                success += 1
+            import_rows.append(
+                ImportRow(
+                    school_id=job.school_id,
+                    job=job,
+                    row_number=row_number,
+                    data=row,
+                    status="failed" if error else ("pending" if job.dry_run else "success"),
+                    error_message=error or "",
+                    entity_id=entity_id,
+                    entity_type=importer.entity_type if entity_id else "",
+                )
+            )
+        ImportRow.objects.bulk_create(import_rows, batch_size=chunk_size)
+
+        processed += len(chunk)
+        ImportJob.objects.filter(pk=job.pk).update(
+            processed_rows=processed, success_rows=success, failed_rows=failed, updated_at=timezone.now()
+        )
+
+    importer.finish()
+
+    job.processed_rows, job.success_rows, job.failed_rows = processed, success, failed
+    job.errors = errors
+    job.status = "completed"
+    job.completed_at = timezone.now()
+    job.save()
+    return job
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_import', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='dry_run',
+            field=models.BooleanField(default=False, help_text='Validate rows only, write nothing'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_import', '0002_importjob_dry_run'),
+        ('schools', '0023_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('export_type', models.CharField(choices=[('students', 'Students'), ('scores', 'Subject Scores'), ('payments', 'Payments'), ('attendance', 'Attendance')], max_length=20)),
+                ('file_format', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel (XLSX)'), ('ndjson', 'NDJSON')], default='csv', max_length=10)),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Filters the export was requested with')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('row_count', models.IntegerField(default=0)),
+                ('file_url', models.CharField(blank=True, max_length=512)),
+                ('error', models.TextField(blank=True)),
+                ('created_by', models.CharField(max_length=100)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_related', to='schools.school')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
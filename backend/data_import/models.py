@@ -24,6 +24,7 @@ class ImportJob(TenantModel):
     import_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
     file_name = models.CharField(max_length=255)
     file_url = models.CharField(max_length=512, blank=True)
+    dry_run = models.BooleanField(default=False, help_text="Validate rows only, write nothing")
     
     # Status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
@@ -69,4 +70,40 @@ class ImportRow(TenantModel):
         ordering = ["row_number"]
     
     def __str__(self):
-        return f"Row {self.row_number}: {self.status}"
\ No newline at end of file
+        return f"Row {self.row_number}: {self.status}"
+
+
+class ExportJob(TenantModel):
+    """Track background exports written to storage (see data_import.exporters)."""
+
+    TYPE_CHOICES = (
+        ("students", "Students"),
+        ("scores", "Subject Scores"),
+        ("payments", "Payments"),
+        ("attendance", "Attendance"),
+    )
+
+    FORMAT_CHOICES = (
+        ("csv", "CSV"),
+        ("xlsx", "Excel (XLSX)"),
+        ("ndjson", "NDJSON"),
+    )
+
+    STATUS_CHOICES = ImportJob.STATUS_CHOICES
+
+    export_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default="csv")
+    params = models.JSONField(default=dict, blank=True, help_text="Filters the export was requested with")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    row_count = models.IntegerField(default=0)
+    file_url = models.CharField(max_length=512, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.CharField(max_length=100)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.export_type} export ({self.file_format}, {self.status})"
@@ -0,0 +1,58 @@
+import logging
+
+from celery import shared_task
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .exporters import run_export
+from .importers import run_import
+from .models import ExportJob, ImportJob
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, time_limit=60 * 60)
+def run_import_job(self, job_id):
+    """Stream a stored CSV upload through the importer for its ImportJob."""
+    job = ImportJob.objects.select_related("school").filter(id=job_id, status="pending").first()
+    if not job:
+        return None
+
+    try:
+        with default_storage.open(job.file_url, "rb") as fileobj:
+            run_import(job, fileobj)
+    except Exception as e:
+        logger.error(f"Import job {job_id} failed: {e}")
+        ImportJob.objects.filter(pk=job_id).update(
+            status="failed",
+            errors=[{"row": 0, "error": str(e)}],
+            completed_at=timezone.now(),
+        )
+        return None
+    finally:
+        # The rows are recorded on the job; the upload is not needed again
+        try:
+            default_storage.delete(job.file_url)
+        except Exception as e:
+            logger.warning(f"Could not delete upload {job.file_url} of import job {job_id}: {e}")
+    return job.success_rows
+
+
+@shared_task(bind=True, time_limit=60 * 60)
+def run_export_job(self, job_id):
+    """Render a pending ExportJob to storage."""
+    job = ExportJob.objects.select_related("school").filter(id=job_id, status="pending").first()
+    if not job:
+        return None
+    ExportJob.objects.filter(pk=job_id).update(status="processing")
+
+    try:
+        path, row_count = run_export(job)
+    except Exception as e:
+        logger.error(f"Export job {job_id} failed: {e}")
+        ExportJob.objects.filter(pk=job_id).update(status="failed", error=str(e)[:1000], completed_at=timezone.now())
+        return None
+    ExportJob.objects.filter(pk=job_id).update(
+        status="completed", file_url=path, row_count=row_count, completed_at=timezone.now()
+    )
+    return row_count
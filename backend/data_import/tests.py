@@ -1,3 +1,212 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from datetime import date
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from academic.models import AttendanceRecord, AttendanceSession, Class, ReportCard, Student, SubjectScore
+from bursary.models import Payment
+from schools.models import School
+
+from .models import ExportJob, ImportJob, ImportRow
+
+User = get_user_model()
+
+
+class CSVImportTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.school = School.objects.create(name="Import School", domain="import-school")
+        self.admin = User.objects.create_user(
+            username="admin@import-school", password="password123", role="SCHOOL_ADMIN", school=self.school
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.jss1 = Class.objects.create(name="JSS 1", school=self.school)
+
+    def _upload(self, import_type, content, **extra):
+        payload = {"type": import_type, "file": SimpleUploadedFile("data.csv", content.encode(), "text/csv"), **extra}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/data-import/import/", payload, format="multipart", HTTP_X_TENANT_ID=self.school.domain
+            )
+        self.assertIn(response.status_code, (200, 202))
+        return ImportJob.objects.get(pk=response.data["job_id"])
+
+    def _students_csv(self):
+        return (
+            "﻿student_no,names,gender,class,parent_email\n"
+            "IMP001,Ada Obi,Female,JSS 1,ada@example.com\n"
+            "IMP002,Tunde Bello,Male,JSS 1,\n"
+            "IMP003,No Gender,Unknown,JSS 1,\n"
+            ",Missing Number,Male,JSS 1,\n"
+        )
+
+    def test_student_import_streams_rows_into_students(self):
+        Student.objects.create(school=self.school, student_no="IMP002", names="Old Name", gender="Male")
+
+        job = self._upload("students", self._students_csv())
+
+        self.assertEqual(job.status, "completed")
+        self.assertEqual((job.total_rows, job.processed_rows), (4, 4))
+        self.assertEqual((job.success_rows, job.failed_rows), (2, 2))
+        self.assertEqual([e["row"] for e in job.errors], [3, 4])
+        self.assertFalse(default_storage.exists(job.file_url))
+
+        ada = Student.objects.get(school=self.school, student_no="IMP001")
+        self.assertEqual(ada.current_class, self.jss1)
+        self.assertEqual(ada.parent_email, "ada@example.com")
+        self.assertEqual(Student.objects.get(school=self.school, student_no="IMP002").names, "Tunde Bello")
+
+        rows = {r.row_number: r for r in ImportRow.objects.filter(job=job)}
+        self.assertEqual(rows[1].entity_id, ada.id)
+        self.assertEqual(rows[3].status, "failed")
+
+    def test_dry_run_validates_without_writing(self):
+        job = self._upload("students", self._students_csv(), dry_run="true")
+
+        self.assertTrue(job.dry_run)
+        self.assertEqual((job.success_rows, job.failed_rows), (2, 2))
+        self.assertFalse(Student.objects.filter(school=self.school).exists())
+        self.assertEqual(ImportRow.objects.filter(job=job, status="pending").count(), 2)
+
+    def test_score_import_upserts_scores_and_ranks_once(self):
+        for number, name in (("S1", "First Pupil"), ("S2", "Second Pupil")):
+            Student.objects.create(
+                school=self.school, student_no=number, names=name, gender="Male", current_class=self.jss1
+            )
+        csv = (
+            "student_no,subject,ca1,ca2,exam,session,term\n"
+            "S1,Mathematics,10,10,50,2025/2026,First Term\n"
+            "S2,Mathematics,5,5,30,2025/2026,First Term\n"
+            "S2,English,ten,5,30,2025/2026,First Term\n"
+            "S9,English,5,5,30,2025/2026,First Term\n"
+        )
+        job = self._upload("scores", csv)
+
+        self.assertEqual((job.success_rows, job.failed_rows), (2, 2))
+        self.assertEqual(SubjectScore.objects.filter(report_card__school=self.school).count(), 2)
+        first = ReportCard.objects.get(student__student_no="S1", session="2025/2026", term="First Term")
+        self.assertEqual(first.position, 1)
+
+    def test_unsupported_type_is_rejected(self):
+        response = self.client.post(
+            "/api/data-import/import/",
+            {"type": "teachers", "file": SimpleUploadedFile("data.csv", b"a,b\n")},
+            format="multipart",
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImportJob.objects.exists())
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.school = School.objects.create(name="Export School", domain="export-school")
+        self.admin = User.objects.create_user(
+            username="admin@export-school", password="password123", role="SCHOOL_ADMIN", school=self.school
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.jss1 = Class.objects.create(name="JSS 1", school=self.school)
+        self.ada = Student.objects.create(
+            school=self.school, student_no="EXP001", names="Ada, Obi", gender="Female", current_class=self.jss1
+        )
+        self.tunde = Student.objects.create(school=self.school, student_no="EXP002", names="Tunde Bello", gender="Male")
+        self.other = School.objects.create(name="Other School", domain="other-export")
+        Student.objects.create(school=self.other, student_no="OTH001", names="Someone Else", gender="Male")
+
+    def _export(self, **params):
+        response = self.client.get("/api/data-import/export/", params, HTTP_X_TENANT_ID=self.school.domain)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def test_csv_export_streams_tenant_rows(self):
+        lines = self._export(type="students").decode().splitlines()
+
+        self.assertEqual(lines[0].split(",")[:3], ["student_no", "names", "gender"])
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith('EXP001,"Ada, Obi",Female'))
+        self.assertIn("JSS 1", lines[1])
+
+    def test_ndjson_and_xlsx_exports(self):
+        session = AttendanceSession.objects.create(
+            school=self.school, date=date(2026, 1, 12), student_class=self.jss1, session="2025/2026", term="Second"
+        )
+        AttendanceRecord.objects.create(school=self.school, attendance_session=session, student=self.ada, status="late")
+        Payment.objects.create(
+            school=self.school,
+            student=self.ada,
+            amount="5000.00",
+            reference="EXP-PAY-1",
+            session="2025/2026",
+            term="Second",
+            recorded_by="bursar",
+            date=date(2026, 1, 10),
+        )
+
+        records = [json.loads(line) for line in self._export(type="attendance", file_format="ndjson").splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(
+            (records[0]["date"], records[0]["class_name"], records[0]["student_no"], records[0]["status"]),
+            ("2026-01-12", "JSS 1", "EXP001", "late"),
+        )
+        self.assertEqual(self._export(type="payments", file_format="ndjson", date_from="2026-01-11"), b"")
+
+        archive = zipfile.ZipFile(io.BytesIO(self._export(type="payments", file_format="xlsx")))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        self.assertIn("<t xml:space=\"preserve\">EXP-PAY-1</t>", sheet)
+        self.assertIn("<c><v>5000.00</v></c>", sheet)
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({"type": "grades"}, {"file_format": "pdf"}, {"type": "payments", "date_from": "yesterday"}):
+            response = self.client.get("/api/data-import/export/", params, HTTP_X_TENANT_ID=self.school.domain)
+            self.assertEqual(response.status_code, 400)
+
+    def test_exports_are_limited_to_staff_of_the_users_school(self):
+        response = self.client.get("/api/data-import/export/", {"type": "students"}, HTTP_X_TENANT_ID=self.other.domain)
+        self.assertEqual(response.status_code, 403)
+
+        student = User.objects.create_user(
+            username="student@export-school", password="password123", role="STUDENT", school=self.school
+        )
+        self.client.force_authenticate(user=student)
+        for url in ("/api/data-import/export/", "/api/data-import/exports/"):
+            response = self.client.get(url, {"type": "students"}, HTTP_X_TENANT_ID=self.school.domain)
+            self.assertEqual(response.status_code, 403)
+
+    def test_background_export_writes_file_to_storage(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/data-import/export/",
+                {"type": "students", "file_format": "csv", "class_id": self.jss1.id},
+                format="json",
+                HTTP_X_TENANT_ID=self.school.domain,
+            )
+        self.assertEqual(response.status_code, 202)
+
+        job = ExportJob.objects.get(pk=response.data["id"])
+        self.assertEqual((job.status, job.row_count), ("completed", 1))
+        with default_storage.open(job.file_url) as exported:
+            self.assertEqual(len(exported.read().decode().splitlines()), 2)
+
+        detail = self.client.get(f"/api/data-import/exports/{job.id}/", HTTP_X_TENANT_ID=self.school.domain)
+        self.assertEqual(detail.data["download_url"], default_storage.url(job.file_url))
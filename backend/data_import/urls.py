@@ -5,4 +5,7 @@ urlpatterns = [
     path("import/", views.import_data, name="import_data"),
     path("jobs/", views.import_job_list, name="import_job_list"),
     path("jobs/<int:job_id>/", views.import_job_detail, name="import_job_detail"),
+    path("export/", views.export_data, name="export_data"),
+    path("exports/", views.export_job_list, name="export_job_list"),
+    path("exports/<int:job_id>/", views.export_job_detail, name="export_job_detail"),
 ]
\ No newline at end of file
@@ -3,214 +3,74 @@ from rest_framework.routers import DefaultRouter
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import models
-import csv
-import io
-import json
+from rest_framework.exceptions import PermissionDenied
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+import base64
+import binascii
+import os
 
-from .models import ImportJob, ImportRow
+from core.tenant_utils import get_request_school
+
+from .exporters import EXPORTS, FORMATS, export_filters, stream_export
+from .importers import IMPORTERS
+from .models import ExportJob, ImportJob
+from .tasks import run_export_job, run_import_job
 
 
 @api_view(["POST"])
 def import_data(request):
-    """Generic import endpoint for various data types."""
+    """
+    Generic import endpoint for various data types.
+    Accepts a multipart `file` upload (or legacy base64 `file_content`), stores
+    it and processes it in the background; poll jobs/<id>/ for progress.
+    Pass dry_run=true to validate the file without importing anything.
+    """
     import_type = request.data.get("type", "students")
-    file_content = request.data.get("file_content")  # Base64 encoded CSV
-    
-    if not file_content:
-        return Response({"error": "file_content required (base64 encoded CSV)"}, status=400)
-    
-    import base64
-    try:
-        csv_data = base64.b64decode(file_content).decode("utf-8")
-    except Exception:
-        return Response({"error": "Invalid base64 encoding"}, status=400)
-    
+    dry_run = str(request.data.get("dry_run", "")).strip().lower() in {"1", "true", "yes", "on"}
+
+    if import_type not in IMPORTERS:
+        return Response({"error": f"Unsupported import type: {import_type}"}, status=400)
+
+    upload = request.FILES.get("file")
+    if upload is None:
+        file_content = request.data.get("file_content")  # Base64 encoded CSV
+        if not file_content:
+            return Response({"error": "file upload or file_content (base64 encoded CSV) required"}, status=400)
+        try:
+            upload = ContentFile(base64.b64decode(file_content, validate=True), name=f"import_{import_type}.csv")
+        except (binascii.Error, ValueError):
+            return Response({"error": "Invalid base64 encoding"}, status=400)
+
     # Create import job
     job = ImportJob.objects.create(
         school=request.tenant,
         import_type=import_type,
-        file_name=f"import_{import_type}.csv",
+        file_name=upload.name or f"import_{import_type}.csv",
         created_by=request.user.username,
-        status="pending"
+        status="pending",
+        dry_run=dry_run,
     )
-    
-    # Parse CSV
-    reader = csv.DictReader(io.StringIO(csv_data))
-    rows = list(reader)
-    
-    job.total_rows = len(rows)
-    job.save()
-    
-    # Process based on type
-    errors = []
-    success_count = 0
-    
-    if import_type == "students":
-        success_count, errors = process_student_import(job, rows, request.tenant)
-    elif import_type == "scores":
-        success_count, errors = process_score_import(job, rows, request.tenant)
-    else:
-        job.status = "failed"
-        job.errors = [{"row": 0, "error": f"Unsupported import type: {import_type}"}]
-        job.save()
-        return Response({"error": f"Unsupported import type: {import_type}"}, status=400)
-    
-    job.status = "completed"
-    job.success_rows = success_count
-    job.failed_rows = len(errors)
-    job.errors = errors
-    job.save()
-    
-    return Response({
-        "job_id": job.id,
-        "total_rows": job.total_rows,
-        "success_rows": success_count,
-        "failed_rows": len(errors),
-        "errors": errors[:10]  # Return first 10 errors
-    })
-
-
-def process_student_import(job, rows, school):
-    """Import students from CSV."""
-    from academic.models import Student, Class
-    
-    errors = []
-    success = 0
-    
-    for i, row in enumerate(rows):
-        try:
-            # Validate required fields
-            names = row.get("names", "").strip()
-            student_no = row.get("student_no", "").strip()
-            gender = row.get("gender", "").strip()
-            
-            if not names or not student_no:
-                errors.append({"row": i + 1, "error": "Missing required fields: names, student_no"})
-                continue
-            
-            if gender not in ["Male", "Female"]:
-                errors.append({"row": i + 1, "error": "Invalid gender"})
-                continue
-            
-            # Get class
-            class_name = row.get("class", "").strip()
-            student_class = None
-            if class_name:
-                student_class = Class.objects.filter(school=school, name=class_name).first()
-            
-            # Create student
-            student, created = Student.objects.update_or_create(
-                school=school,
-                student_no=student_no,
-                defaults={
-                    "names": names,
-                    "gender": gender,
-                    "current_class": student_class,
-                    "parent_name": row.get("parent_name", "").strip(),
-                    "parent_email": row.get("parent_email", "").strip(),
-                    "parent_phone": row.get("parent_phone", "").strip(),
-                    "address": row.get("address", "").strip(),
-                }
-            )
-            
-            ImportRow.objects.create(
-                school=school,
-                job=job,
-                row_number=i + 1,
-                data=row,
-                status="success",
-                entity_id=student.id,
-                entity_type="Student"
-            )
-            success += 1
-            
-        except Exception as e:
-            errors.append({"row": i + 1, "error": str(e)})
-            ImportRow.objects.create(
-                school=school,
-                job=job,
-                row_number=i + 1,
-                data=row,
-                status="failed",
-                error_message=str(e)
-            )
-    
-    return success, errors
+    job.file_url = default_storage.save(f"imports/{job.school_id}/{job.id}/{os.path.basename(job.file_name)}", upload)
+    job.save(update_fields=["file_url", "updated_at"])
 
+    transaction.on_commit(lambda: run_import_job.delay(job.id))
+    job.refresh_from_db()
 
-def process_score_import(job, rows, school):
-    """Import scores from CSV."""
-    from academic.models import Student, Subject, SubjectScore, GradingScheme
-    
-    errors = []
-    success = 0
-    
-    # Get current session/term from first row
-    session = rows[0].get("session", "2025/2026") if rows else "2025/2026"
-    term = rows[0].get("term", "First Term") if rows else "First Term"
-    
-    for i, row in enumerate(rows):
-        try:
-            student_no = row.get("student_no", "").strip()
-            subject_name = row.get("subject", "").strip()
-            
-            if not student_no or not subject_name:
-                errors.append({"row": i + 1, "error": "Missing student_no or subject"})
-                continue
-            
-            student = Student.objects.filter(school=school, student_no=student_no).first()
-            if not student:
-                errors.append({"row": i + 1, "error": f"Student not found: {student_no}"})
-                continue
-            
-            subject = Subject.objects.filter(school=school, name=subject_name).first()
-            if not subject:
-                # Create subject if not exists
-                subject = Subject.objects.create(school=school, name=subject_name)
-            
-            # Get scores
-            test_score = float(row.get("test_score", 0) or 0)
-            exam_score = float(row.get("exam_score", 0) or 0)
-            total = test_score + exam_score
-            
-            # Create/update score
-            score, created = SubjectScore.objects.update_or_create(
-                school=school,
-                student=student,
-                subject=subject,
-                session=session,
-                term=term,
-                defaults={
-                    "test_score": test_score,
-                    "exam_score": exam_score,
-                    "total": total,
-                }
-            )
-            
-            ImportRow.objects.create(
-                school=school,
-                job=job,
-                row_number=i + 1,
-                data=row,
-                status="success",
-                entity_id=score.id,
-                entity_type="SubjectScore"
-            )
-            success += 1
-            
-        except Exception as e:
-            errors.append({"row": i + 1, "error": str(e)})
-            ImportRow.objects.create(
-                school=school,
-                job=job,
-                row_number=i + 1,
-                data=row,
-                status="failed",
-                error_message=str(e)
-            )
-    
-    return success, errors
+    return Response(
+        {
+            "job_id": job.id,
+            "status": job.status,
+            "dry_run": job.dry_run,
+            "total_rows": job.total_rows,
+            "processed_rows": job.processed_rows,
+            "success_rows": job.success_rows,
+            "failed_rows": job.failed_rows,
+            "errors": job.errors[:10],  # Return first 10 errors
+        },
+        status=202 if job.status in ("pending", "processing") else 200,
+    )
 
 
 @api_view(["GET"])
@@ -228,7 +88,9 @@ def import_job_detail(request, job_id):
         "import_type": job.import_type,
         "file_name": job.file_name,
         "status": job.status,
+        "dry_run": job.dry_run,
         "total_rows": job.total_rows,
+        "processed_rows": job.processed_rows,
         "success_rows": job.success_rows,
         "failed_rows": job.failed_rows,
         "errors": job.errors[:20],
@@ -247,7 +109,9 @@ def import_job_list(request):
             "import_type": j.import_type,
             "file_name": j.file_name,
             "status": j.status,
+            "dry_run": j.dry_run,
             "total_rows": j.total_rows,
+            "processed_rows": j.processed_rows,
             "success_rows": j.success_rows,
             "failed_rows": j.failed_rows,
             "created_by": j.created_by,
@@ -256,8 +120,95 @@ def import_job_list(request):
     ])
 
 
+EXPORT_ROLES = ("SUPER_ADMIN", "SCHOOL_ADMIN", "STAFF")
+
+
+def _export_school(request):
+    """School an export request may read: admins and staff of the request's own school only."""
+    if not (request.user.is_superuser or request.user.role in EXPORT_ROLES):
+        raise PermissionDenied("Only admins and staff can export data.")
+    school = get_request_school(request)
+    if school is None:
+        raise PermissionDenied("No school context for this request.")
+    return school
+
+
+@api_view(["GET", "POST"])
+def export_data(request):
+    """
+    Export students, scores, payments or attendance as csv, xlsx or ndjson.
+    GET streams the file straight back; POST queues an ExportJob that writes
+    it to storage, for exports too large to download in one request; poll
+    exports/<id>/ for its download_url. Filters (session, term, class_id,
+    date_from, date_to, ...) depend on the export type.
+    """
+    school = _export_school(request)
+    data = request.query_params if request.method == "GET" else request.data
+    export_type = data.get("type", "students")
+    file_format = data.get("file_format", "csv")
+
+    if export_type not in EXPORTS:
+        return Response({"error": f"Unsupported export type: {export_type}"}, status=400)
+    if file_format not in FORMATS:
+        return Response({"error": f"Unsupported file format: {file_format}"}, status=400)
+    params = {key: data.get(key) for key in EXPORTS[export_type].filters if data.get(key) not in (None, "")}
+    try:
+        export_filters(export_type, params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    if request.method == "GET":
+        return stream_export(export_type, file_format, school, params)
+
+    job = ExportJob.objects.create(
+        school=school,
+        export_type=export_type,
+        file_format=file_format,
+        params=params,
+        created_by=request.user.username,
+    )
+    transaction.on_commit(lambda: run_export_job.delay(job.id))
+    return Response(_export_job_data(job), status=202)
+
+
+def _export_job_data(job):
+    return {
+        "id": job.id,
+        "export_type": job.export_type,
+        "file_format": job.file_format,
+        "params": job.params,
+        "status": job.status,
+        "row_count": job.row_count,
+        "error": job.error,
+        "download_url": default_storage.url(job.file_url) if job.status == "completed" and job.file_url else None,
+        "created_by": job.created_by,
+        "created_at": job.created_at.isoformat(),
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+    }
+
+
+@api_view(["GET"])
+def export_job_detail(request, job_id):
+    """Get export job details, with a download link once it has completed."""
+    try:
+        job = ExportJob.objects.get(id=job_id, school=_export_school(request))
+    except ExportJob.DoesNotExist:
+        return Response({"error": "Job not found"}, status=404)
+    return Response(_export_job_data(job))
+
+
+@api_view(["GET"])
+def export_job_list(request):
+    """List export jobs."""
+    jobs = ExportJob.objects.filter(school=_export_school(request)).order_by("-created_at")[:20]
+    return Response([_export_job_data(job) for job in jobs])
+
+
 urlpatterns = [
     path("import/", import_data, name="import_data"),
     path("jobs/", import_job_list, name="import_job_list"),
     path("jobs/<int:job_id>/", import_job_detail, name="import_job_detail"),
+    path("export/", export_data, name="export_data"),
+    path("exports/", export_job_list, name="export_job_list"),
+    path("exports/<int:job_id>/", export_job_detail, name="export_job_detail"),
 ]
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Email campaign dispatcher.
+
+A campaign's message is rendered once (every recipient gets the same
+content) and sent through one transport (see emails.transport) built from the
+provider configuration loaded once per run. Recipients are read in user-id
+order a checkpoint at a time; each checkpoint is split into provider batches
+sent by a bounded thread pool, all drawing from one token bucket. After each
+checkpoint its EmailLog rows are bulk-written together with the campaign's
+counters and `last_recipient_id`, in one transaction.
+
+A run that dies part-way leaves the campaign in "sending": the next run
+(the task is acked late, and resume_stalled_campaigns re-queues it) carries
+on after `last_recipient_id`, so at most the one unfinished checkpoint is
+sent again. A per-campaign cache lock keeps two workers off the same campaign;
+it is refreshed after every provider batch, so a slow provider or a low send
+rate never lets it expire mid-checkpoint.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import EmailCampaign, EmailLog
+from .transport import OutgoingEmail, TokenBucket, get_transport, load_email_config
+from .utils import render_template_email, wrap_professional_email
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SIZE = getattr(settings, "EMAIL_CAMPAIGN_CHECKPOINT_SIZE", 1000)
+CONCURRENCY = getattr(settings, "EMAIL_DISPATCH_CONCURRENCY", 4)
+SEND_RATE = getattr(settings, "EMAIL_SEND_RATE", 10)  # SMTP messages or API calls per second
+SEND_BURST = getattr(settings, "EMAIL_SEND_BURST", SEND_RATE)
+LOCK_TIMEOUT = 10 * 60  # refreshed after every provider batch
+
+
+def _lock_key(campaign_id):
+    return f"emails:campaign-lock:{campaign_id}"
+
+
+def campaign_recipients(campaign):
+    """Active users matching the campaign's audience filter."""
+    filters = campaign.audience_filter or {}
+    users = get_user_model().objects.filter(is_active=True).exclude(email="")
+
+    if filters.get("role"):
+        users = users.filter(role=filters["role"])
+    if filters.get("school_id"):
+        users = users.filter(school_id=filters["school_id"])
+    return users
+
+
+def campaign_message(campaign):
+    """(OutgoingEmail, template, log metadata) for a campaign."""
+    if campaign.template:
+        context = {"campaign_title": campaign.title}
+        subject, html, text = render_template_email(campaign.template, context)
+        return OutgoingEmail(subject, html, text), campaign.template, context
+    html = wrap_professional_email(campaign.custom_body or "")
+    return OutgoingEmail(campaign.custom_subject or campaign.title, html, strip_tags(html)), None, {}
+
+
+def dispatch_campaign(campaign_id):
+    """
+    Send (or resume) a campaign. Returns the campaign, or None if it does not
+    exist, is already completed, or another worker is sending it.
+    """
+    if not cache.add(_lock_key(campaign_id), 1, LOCK_TIMEOUT):
+        logger.info(f"Campaign {campaign_id} is already being sent")
+        return None
+    try:
+        campaign = EmailCampaign.objects.select_related("template").filter(pk=campaign_id).first()
+        if campaign is None:
+            logger.error(f"Campaign {campaign_id} not found")
+            return None
+        if campaign.status == "completed":
+            return None
+
+        recipients = campaign_recipients(campaign)
+        if campaign.status != "sending":
+            campaign.status = "sending"
+            campaign.started_at = timezone.now()
+            campaign.completed_at = None
+            campaign.sent_count = campaign.failed_count = 0
+            campaign.last_recipient_id = None
+            campaign.total_recipients = recipients.count()
+            campaign.save()
+        else:
+            logger.info(f"Resuming campaign {campaign.title} after user {campaign.last_recipient_id}")
+
+        try:
+            message = campaign_message(campaign)
+        except Exception as e:
+            # A template that does not render will not render on a retry either
+            logger.error(f"Campaign {campaign.title} could not be rendered: {e}")
+            campaign.status = "failed"
+            campaign.completed_at = timezone.now()
+            campaign.save(update_fields=["status", "completed_at", "updated_at"])
+            return campaign
+
+        _send_checkpoints(campaign, recipients, *message)
+
+        campaign.refresh_from_db()
+        campaign.status = "completed" if campaign.failed_count == 0 else "failed"
+        campaign.completed_at = timezone.now()
+        campaign.save(update_fields=["status", "completed_at", "updated_at"])
+        logger.info(f"Campaign {campaign.title} finished: {campaign.sent_count} sent, {campaign.failed_count} failed")
+        return campaign
+    finally:
+        cache.delete(_lock_key(campaign_id))
+
+
+def _send_checkpoints(campaign, recipients, message, template, metadata):
+    transport = get_transport(load_email_config(), TokenBucket(SEND_RATE, SEND_BURST), pool_size=CONCURRENCY)
+    cursor = campaign.last_recipient_id or 0
+
+    def send_batch(batch):
+        results = transport.send(message, batch)
+        cache.touch(_lock_key(campaign.pk), LOCK_TIMEOUT)
+        return results
+
+    try:
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+            while True:
+                chunk = list(
+                    recipients.filter(pk__gt=cursor).order_by("pk").values_list("pk", "email")[:CHECKPOINT_SIZE]
+                )
+                if not chunk:
+                    break
+                emails = [email for _, email in chunk]
+                batches = [emails[i:i + transport.batch_size] for i in range(0, len(emails), transport.batch_size)]
+                sent = pool.map(send_batch, batches)
+                results = [result for batch_results in sent for result in batch_results]
+                cursor = chunk[-1][0]
+                _checkpoint(campaign, cursor, results, message, template, metadata)
+    finally:
+        transport.close()
+
+
+def _checkpoint(campaign, cursor, results, message, template, metadata):
+    failed = sum(1 for _, error in results if error)
+    with transaction.atomic():
+        EmailLog.objects.bulk_create(
+            [
+                EmailLog(
+                    recipient=recipient,
+                    template=template,
+                    campaign=campaign,
+                    subject=message.subject,
+                    status="failed" if error else "sent",
+                    error_message=error,
+                    metadata=metadata,
+                )
+                for recipient, error in results
+            ],
+            batch_size=500,
+        )
+        EmailCampaign.objects.filter(pk=campaign.pk).update(
+            sent_count=F("sent_count") + len(results) - failed,
+            failed_count=F("failed_count") + failed,
+            last_recipient_id=cursor,
+            updated_at=timezone.now(),
+        )
+
+
+def stalled_campaign_ids():
+    """Campaigns left in "sending" with no worker holding their lock."""
+    ids = EmailCampaign.objects.filter(status="sending").values_list("pk", flat=True)
+    return [pk for pk in ids if cache.get(_lock_key(pk)) is None]
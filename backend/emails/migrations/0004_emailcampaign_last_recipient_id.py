@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0003_emaillog_subject_alter_emaillog_template_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='last_recipient_id',
+            field=models.BigIntegerField(blank=True, help_text='Checkpoint: id of the last user dispatched, so an interrupted run resumes', null=True),
+        ),
+    ]
@@ -48,6 +48,9 @@ class EmailCampaign(models.Model):
     total_recipients = models.IntegerField(default=0)
     sent_count = models.IntegerField(default=0)
     failed_count = models.IntegerField(default=0)
+    last_recipient_id = models.BigIntegerField(
+        null=True, blank=True, help_text="Checkpoint: id of the last user dispatched, so an interrupted run resumes"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
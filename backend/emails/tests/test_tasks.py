@@ -1,3 +1,4 @@
+from django.core import mail
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from unittest.mock import patch, MagicMock
@@ -33,12 +34,8 @@ class EmailTasksTests(TestCase):
         send_email_task("task-template", "user@test.com", context={"key": "val"})
         mock_send.assert_called_once_with("task-template", "user@test.com", {"key": "val"}, campaign=None)
 
-    @patch('emails.tasks.send_template_email')
-    @patch('time.sleep', return_value=None) # Speed up test
-    def test_process_campaign_filters_and_updates(self, mock_sleep, mock_send):
+    def test_process_campaign_filters_and_updates(self):
         """Verify that campaign processing filters by role and updates counts."""
-        mock_send.return_value = True
-        
         campaign = EmailCampaign.objects.create(
             title="Teacher Announcement",
             template=self.template,
@@ -53,16 +50,15 @@ class EmailTasksTests(TestCase):
         self.assertEqual(campaign.sent_count, 1)
         
         # Verify it was sent to the teacher only
-        mock_send.assert_called_once()
-        args, kwargs = mock_send.call_args
-        self.assertEqual(args[1], self.teacher.email)
+        self.assertEqual([m.to for m in mail.outbox], [[self.teacher.email]])
+        self.assertEqual(mail.outbox[0].subject, "Task Subject")
+        log = EmailLog.objects.get(campaign=campaign)
+        self.assertEqual((log.recipient, log.status, log.template), (self.teacher.email, "sent", self.template))
+        self.assertEqual(campaign.last_recipient_id, self.teacher.id)
 
-    @patch('emails.tasks.send_template_email')
-    @patch('time.sleep', return_value=None)
-    def test_process_campaign_handles_failures(self, mock_sleep, mock_send):
+    @patch('django.core.mail.EmailMultiAlternatives.send', side_effect=ConnectionRefusedError("refused"))
+    def test_process_campaign_handles_failures(self, mock_send):
         """Verify that campaign records individual email failures."""
-        mock_send.return_value = False
-        
         campaign = EmailCampaign.objects.create(
             title="Failed Campaign",
             template=self.template,
@@ -74,3 +70,63 @@ class EmailTasksTests(TestCase):
         campaign.refresh_from_db()
         self.assertEqual(campaign.status, "failed")
         self.assertEqual(campaign.failed_count, 1)
+        self.assertIn("refused", EmailLog.objects.get(campaign=campaign).error_message)
+
+    def test_process_campaign_resumes_after_checkpoint(self):
+        """An interrupted campaign carries on after its last checkpointed recipient."""
+        campaign = EmailCampaign.objects.create(
+            title="Resumed Campaign",
+            template=self.template,
+            audience_filter={"school_id": self.school.id},
+            status="sending",
+            total_recipients=2,
+            sent_count=1,
+            last_recipient_id=self.admin.id,
+        )
+
+        process_campaign_task(campaign.id)
+
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.status, campaign.sent_count), ("completed", 2))
+        self.assertEqual([m.to for m in mail.outbox], [[self.teacher.email]])
+
+    @patch('requests.Session.post')
+    def test_brevo_campaign_sends_recipients_in_one_call(self, mock_post):
+        """With the Brevo API provider a batch of recipients goes out in a single request."""
+        from schools.models import PlatformSettings
+
+        PlatformSettings.objects.create(email_provider="brevo_api", email_api_key="key", email_from="no-reply@tasks.com")
+        mock_post.return_value = MagicMock(status_code=201, text="")
+        campaign = EmailCampaign.objects.create(
+            title="Brevo Campaign", template=self.template, audience_filter={"school_id": self.school.id}
+        )
+
+        process_campaign_task(campaign.id)
+
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.status, campaign.sent_count), ("completed", 2))
+        mock_post.assert_called_once()
+        versions = mock_post.call_args.kwargs["json"]["messageVersions"]
+        self.assertEqual(
+            sorted(v["to"][0]["email"] for v in versions), sorted([self.admin.email, self.teacher.email])
+        )
+        self.assertEqual(EmailLog.objects.filter(campaign=campaign, status="sent").count(), 2)
+
+    def test_campaign_lock_is_refreshed_after_every_batch(self):
+        """The dispatch lock is kept alive while batches are still going out, not only between checkpoints."""
+        from emails import dispatcher
+        from emails.transport import SMTPTransport
+
+        campaign = EmailCampaign.objects.create(
+            title="Batched Campaign", template=self.template, audience_filter={"school_id": self.school.id}
+        )
+
+        with patch.object(SMTPTransport, "batch_size", 1), patch(
+            "emails.dispatcher.cache", wraps=dispatcher.cache
+        ) as cache:
+            process_campaign_task(campaign.id)
+
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.status, campaign.sent_count), ("completed", 2))
+        self.assertEqual(cache.touch.call_count, 2)
+        cache.touch.assert_called_with(dispatcher._lock_key(campaign.id), dispatcher.LOCK_TIMEOUT)
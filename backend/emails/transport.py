@@ -0,0 +1,231 @@
+"""
+Email delivery transports.
+
+load_email_config() reads the provider settings (PlatformSettings, falling
+back to settings.py) once; a transport built from it is then reused for any
+number of messages:
+
+- SMTPTransport keeps one open SMTP connection per sending thread and
+  reconnects once if the server drops it;
+- BrevoTransport sends through one requests.Session (keep-alive) and delivers
+  a whole batch of recipients per API call using Brevo's messageVersions.
+
+Both draw from a TokenBucket, one token per SMTP message or API call, so the
+provider rate is respected without fixed sleeps between sends.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+logger = logging.getLogger(__name__)
+
+BREVO_URL = "https://api.brevo.com/v3/smtp/email"
+BREVO_BATCH_SIZE = getattr(settings, "EMAIL_BREVO_BATCH_SIZE", 500)
+SMTP_BATCH_SIZE = getattr(settings, "EMAIL_SMTP_BATCH_SIZE", 50)
+
+
+@dataclass(frozen=True)
+class EmailConfig:
+    provider: str
+    from_email: str
+    from_name: str
+    api_key: str = None
+    host: str = None
+    port: int = None
+    username: str = None
+    password: str = None
+    use_tls: bool = True
+    use_ssl: bool = False
+
+    @property
+    def sender(self):
+        return f"{self.from_name} <{self.from_email}>"
+
+
+@dataclass(frozen=True)
+class OutgoingEmail:
+    subject: str
+    html: str
+    text: str
+
+
+def load_email_config():
+    """Provider configuration from PlatformSettings, falling back to settings.py."""
+    from schools.models import PlatformSettings
+
+    p_settings = PlatformSettings.objects.first()
+    if not p_settings:
+        return EmailConfig(
+            provider="smtp",
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            from_name="Registra",
+            host=settings.EMAIL_HOST,
+            port=settings.EMAIL_PORT,
+            username=settings.EMAIL_HOST_USER,
+            password=settings.EMAIL_HOST_PASSWORD,
+        )
+
+    def _clean(value, default):
+        return value.strip() if value else default
+
+    return EmailConfig(
+        provider=p_settings.email_provider,
+        from_email=p_settings.email_from or settings.DEFAULT_FROM_EMAIL,
+        from_name=p_settings.email_from_name or "Registra",
+        api_key=_clean(p_settings.email_api_key, None),
+        host=_clean(p_settings.email_host, settings.EMAIL_HOST),
+        port=p_settings.email_port or settings.EMAIL_PORT,
+        username=_clean(p_settings.email_user, settings.EMAIL_HOST_USER),
+        password=_clean(p_settings.email_password, settings.EMAIL_HOST_PASSWORD),
+        use_tls=p_settings.email_use_tls,
+        use_ssl=p_settings.email_use_ssl,
+    )
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SMTPTransport:
+    batch_size = SMTP_BATCH_SIZE
+
+    def __init__(self, config, limiter=None):
+        self.config = config
+        self.limiter = limiter
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self, reconnect=False):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and reconnect:
+            connection.close()
+            connection = None
+        if connection is None:
+            connection = get_connection(
+                host=self.config.host,
+                port=self.config.port,
+                username=self.config.username,
+                password=self.config.password,
+                use_tls=self.config.use_tls,
+                use_ssl=self.config.use_ssl,
+                timeout=10,
+            )
+            connection.open()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _send_one(self, message, recipient, reconnect=False):
+        email = EmailMultiAlternatives(
+            subject=message.subject,
+            body=message.text,
+            from_email=self.config.sender,
+            to=[recipient],
+            connection=self._connection(reconnect),
+        )
+        email.attach_alternative(message.html, "text/html")
+        email.send()
+
+    def send(self, message, recipients):
+        """[(recipient, error or "")] for each recipient, sent over this thread's open connection."""
+        results = []
+        for recipient in recipients:
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                try:
+                    self._send_one(message, recipient)
+                except smtplib.SMTPServerDisconnected:
+                    self._send_one(message, recipient, reconnect=True)
+                results.append((recipient, ""))
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e)}"
+                logger.error(f"Failed to send SMTP email to {recipient}: {error}")
+                results.append((recipient, error))
+        return results
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+class BrevoTransport:
+    batch_size = BREVO_BATCH_SIZE
+
+    def __init__(self, config, limiter=None, pool_size=10):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.config = config
+        self.limiter = limiter
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers.update(
+            {"accept": "application/json", "content-type": "application/json", "api-key": config.api_key}
+        )
+
+    def send(self, message, recipients):
+        """Send one message to a batch of recipients in a single API call; [(recipient, error or "")]."""
+        if self.limiter:
+            self.limiter.acquire()
+        payload = {
+            "sender": {"name": self.config.from_name, "email": self.config.from_email},
+            "subject": message.subject,
+            "htmlContent": message.html,
+            "textContent": message.text,
+        }
+        if len(recipients) == 1:
+            payload["to"] = [{"email": recipients[0]}]
+        else:
+            # One version per recipient, so nobody sees the other addresses
+            payload["messageVersions"] = [{"to": [{"email": recipient}]} for recipient in recipients]
+        try:
+            response = self.session.post(BREVO_URL, json=payload, timeout=30)
+            error = "" if response.status_code in (200, 201, 202) else response.text
+        except Exception as e:
+            error = str(e)
+        if error:
+            logger.error(f"Brevo API error for a batch of {len(recipients)}: {error}")
+        return [(recipient, error) for recipient in recipients]
+
+    def close(self):
+        self.session.close()
+
+
+def get_transport(config=None, limiter=None, pool_size=10):
+    config = config or load_email_config()
+    if config.provider == "brevo_api" and config.api_key:
+        return BrevoTransport(config, limiter, pool_size=pool_size)
+    return SMTPTransport(config, limiter)
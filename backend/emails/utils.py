@@ -1,11 +1,11 @@
 import logging
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
 from django.template import Context, Template
 from django.utils.html import strip_tags
 
 from .models import EmailLog, EmailTemplate
+from .transport import OutgoingEmail, get_transport
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +27,19 @@ def wrap_professional_email(html_content, platform_name="Registra"):
     return render_to_string("emails/base_email.html", context)
 
 
+def render_template_email(email_template, context, use_wrapper=True):
+    """(subject, html, text) of an EmailTemplate rendered with `context`."""
+    subject = Template(email_template.subject).render(Context(context))
+    html_content = Template(email_template.body_html).render(Context(context))
+
+    # Wrap in professional layout if requested
+    if use_wrapper:
+        html_content = wrap_professional_email(html_content)
+
+    # Generate Plain Text (Fallback)
+    return subject, html_content, strip_tags(html_content)
+
+
 def send_template_email(template_name, recipient_email, context=None, campaign=None, use_wrapper=True):
     """
     Sends an email using a database-stored template.
@@ -56,20 +69,8 @@ def send_template_email(template_name, recipient_email, context=None, campaign=N
             logger.error(f"Failed to create EmailLog for missing template: {log_error}")
         return False
 
-    # 2. Render Subject
-    subject_template = Template(email_template.subject)
-    subject = subject_template.render(Context(context))
-
-    # 3. Render Body (HTML)
-    html_template = Template(email_template.body_html)
-    html_content = html_template.render(Context(context))
-
-    # 4. Wrap in professional layout if requested
-    if use_wrapper:
-        html_content = wrap_professional_email(html_content)
-
-    # 5. Generate Plain Text (Fallback)
-    text_content = strip_tags(html_content)
+    # 2. Render subject and body
+    subject, html_content, text_content = render_template_email(email_template, context, use_wrapper)
 
     return _send_raw_email(
         recipient_email,
@@ -102,93 +103,12 @@ def send_custom_email(recipient_email, subject, body_html, campaign=None, use_wr
 
 def _send_raw_email(recipient_email, subject, html_content, text_content, template=None, campaign=None, context=None):
     """Internal helper to handle the actual sending logic (SMTP/Brevo)."""
-    import requests
-
-    from django.core.mail import get_connection
-
-    from schools.models import PlatformSettings
-
-    p_settings = PlatformSettings.objects.first()
-
-    provider = "smtp"
-    email_from = settings.DEFAULT_FROM_EMAIL
-    email_from_name = "Registra"
-    api_key = None
-
-    if p_settings:
-        provider = p_settings.email_provider
-        email_from = p_settings.email_from or settings.DEFAULT_FROM_EMAIL
-        email_from_name = p_settings.email_from_name or "Registra"
-        api_key = p_settings.email_api_key.strip() if p_settings.email_api_key else None
-
-    status = "sent"
-    error_message = ""
-
-    if provider == "brevo_api" and api_key:
-        # Use Brevo API
-        url = "https://api.brevo.com/v3/smtp/email"
-        headers = {"accept": "application/json", "content-type": "application/json", "api-key": api_key}
-        payload = {
-            "sender": {"name": email_from_name, "email": email_from},
-            "to": [{"email": recipient_email}],
-            "subject": subject,
-            "htmlContent": html_content,
-            "textContent": text_content,
-        }
-        try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
-            if response.status_code not in [200, 201, 202]:
-                status = "failed"
-                error_message = response.text
-                logger.error(f"Brevo API error: {response.text}")
-        except Exception as e:
-            status = "failed"
-            error_message = str(e)
-            logger.error(f"Failed to send Brevo API email: {e}")
-    else:
-        # Use Dynamic SMTP (fallback to settings.py)
-        email_host = getattr(p_settings, "email_host", None) if p_settings else None
-        email_host = email_host.strip() if email_host else settings.EMAIL_HOST
-
-        email_port = getattr(p_settings, "email_port", settings.EMAIL_PORT) if p_settings else settings.EMAIL_PORT
-
-        email_user = getattr(p_settings, "email_user", None) if p_settings else None
-        email_user = email_user.strip() if email_user else settings.EMAIL_HOST_USER
-
-        email_password = getattr(p_settings, "email_password", None) if p_settings else None
-        email_password = email_password.strip() if email_password else settings.EMAIL_HOST_PASSWORD
-
-        use_tls = getattr(p_settings, "email_use_tls", True) if p_settings else True
-        use_ssl = getattr(p_settings, "email_use_ssl", False) if p_settings else False
-
-        try:
-            connection = get_connection(
-                host=email_host,
-                port=email_port,
-                username=email_user,
-                password=email_password,
-                use_tls=use_tls,
-                use_ssl=use_ssl,
-                timeout=10,
-            )
-
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=f"{email_from_name} <{email_from}>",
-                to=[recipient_email],
-                connection=connection,
-            )
-            email.attach_alternative(html_content, "text/html")
-            email.send()
-        except Exception as e:
-            status = "failed"
-            error_message = f"{type(e).__name__}: {str(e)}"
-            logger.error(f"Failed to send SMTP email to {recipient_email}: {error_message}")
-            if settings.DEBUG:
-                import traceback
-
-                logger.error(traceback.format_exc())
+    transport = get_transport()
+    try:
+        [(_, error_message)] = transport.send(OutgoingEmail(subject, html_content, text_content), [recipient_email])
+    finally:
+        transport.close()
+    status = "failed" if error_message else "sent"
 
     # Log the attempt
     try:
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr', '0002_alter_payrollentry_options_payroll_generated_by_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='generation_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='generation_processed',
+            field=models.IntegerField(default=0, help_text='Staff computed so far in the current run'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='generation_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='completed', max_length=20),
+        ),
+    ]
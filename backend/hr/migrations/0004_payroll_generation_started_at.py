@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr', '0003_payroll_generation_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='generation_started_at',
+            field=models.DateTimeField(blank=True, help_text='When the current run was queued, then when a worker claimed it', null=True),
+        ),
+    ]
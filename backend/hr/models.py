@@ -1,5 +1,6 @@
 from django.db import models
 from academic.models import Teacher, TenantModel
+from bursary.models import LedgerSourceMixin
 
 # ==========================================
 # PAYROLL SYSTEM MODELS
@@ -81,7 +82,7 @@ class StaffSalaryStructure(TenantModel):
         return f"Structure - {self.staff.name}"
 
 
-class Payroll(TenantModel):
+class Payroll(LedgerSourceMixin, TenantModel):
     """
     Represents a monthly payroll run for the entire school.
     Workflow: Draft → Approved → Paid
@@ -92,6 +93,12 @@ class Payroll(TenantModel):
         ("approved", "Approved"),
         ("paid", "Paid"),
     )
+    GENERATION_STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    )
     month = models.DateField(help_text="First day of the month (e.g. 2025-10-01)")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="draft")
     notes = models.TextField(blank=True, help_text="Admin remarks for this payroll run")
@@ -99,6 +106,14 @@ class Payroll(TenantModel):
     total_wage_bill = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     total_staff = models.IntegerField(default=0)
 
+    # Background generation (hr.tasks.generate_payroll_job)
+    generation_status = models.CharField(max_length=20, choices=GENERATION_STATUS_CHOICES, default="completed")
+    generation_processed = models.IntegerField(default=0, help_text="Staff computed so far in the current run")
+    generation_error = models.TextField(blank=True)
+    generation_started_at = models.DateTimeField(
+        null=True, blank=True, help_text="When the current run was queued, then when a worker claimed it"
+    )
+
     generated_by = models.ForeignKey(
         "users.User", on_delete=models.SET_NULL, null=True, blank=True, related_name="generated_payrolls"
     )
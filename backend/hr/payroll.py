@@ -0,0 +1,231 @@
+"""
+Payroll computation engine.
+
+Each StaffSalaryStructure's JSON is compiled once into an evaluation plan -
+(name, percentage, fixed amount) tuples with the Decimals already parsed - and
+cached by a fingerprint of its content, so staff sharing a structure share a
+plan and an edited structure simply gets a new one. Staff are streamed in
+chunks: each chunk's plans are fetched with one cache round trip, its entries
+are computed in memory and written with one upsert, and the payroll's progress
+is updated. Payslip numbers are allocated from a single counter per run.
+
+Generating an existing draft recomputes only the staff whose record or salary
+structure changed after their entry was written (plus staff without an entry);
+pass `full=True` to recompute everyone.
+
+A run still queued or running after PAYROLL_JOB_TIME_LIMIT lost its worker (the
+task was killed at its hard limit, the worker crashed or the broker dropped the
+message); expire_stale_payroll_runs() marks it failed so the month can be
+generated again.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from academic.models import Teacher
+
+from .models import Payroll, PayrollEntry, StaffSalaryStructure
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+PLAN_TIMEOUT = 60 * 60 * 24  # plans are keyed by content, so they never go stale
+HUNDRED = Decimal("100")
+PAYROLL_JOB_TIME_LIMIT = 60 * 30
+ENTRY_FIELDS = ["basic_salary", "total_allowances", "total_deductions", "net_pay", "breakdown", "updated_at"]
+
+
+def _decimal(value, label):
+    try:
+        return Decimal(str(value if value not in (None, "") else 0))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount {value!r} for salary component {label!r}")
+
+
+def plan_fingerprint(structure_data):
+    payload = json.dumps(structure_data or {}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def compile_structure(structure_data):
+    """
+    Compile structure_data into {"allowances": [...], "deductions": [...]} of
+    (name, percentage or None, fixed amount or None) tuples.
+    """
+    data = structure_data or {}
+    plan = {}
+    for kind in ("allowances", "deductions"):
+        components = []
+        for item in data.get(kind, []):
+            name = item.get("name", "")
+            if item.get("type") == "percentage":
+                components.append((name, _decimal(item.get("value", 0), name), None))
+            else:
+                components.append((name, None, _decimal(item.get("amount", 0), name)))
+        plan[kind] = components
+    return plan
+
+
+def get_salary_plans(structures):
+    """{fingerprint: plan} for an iterable of structure_data dicts, one cache round trip."""
+    structures = {plan_fingerprint(data): data for data in structures}
+    keys = {f"hr:salary-plan:{fingerprint}": fingerprint for fingerprint in structures}
+    plans = {keys[key]: plan for key, plan in cache.get_many(list(keys)).items()}
+
+    missing = {key: fingerprint for key, fingerprint in keys.items() if fingerprint not in plans}
+    if missing:
+        compiled = {key: compile_structure(structures[fingerprint]) for key, fingerprint in missing.items()}
+        cache.set_many(compiled, PLAN_TIMEOUT)
+        plans.update((missing[key], plan) for key, plan in compiled.items())
+    return plans
+
+
+def evaluate_plan(plan, basic):
+    """Apply a compiled plan to a basic salary: (allowance details, total, deduction details, total)."""
+    result = []
+    for kind in ("allowances", "deductions"):
+        details, total = [], Decimal("0")
+        for name, percentage, amount in plan[kind]:
+            if percentage is not None:
+                amount = basic * percentage / HUNDRED
+            details.append({"name": name, "amount": float(amount)})
+            total += amount
+        result.extend((details, total))
+    return result
+
+
+def _next_payslip_number(payroll):
+    """Highest payslip sequence already used for the payroll's month in this school."""
+    prefix = f"PSL-{payroll.month.strftime('%Y%m')}-"
+    highest = 0
+    for number in PayrollEntry.objects.filter(
+        school_id=payroll.school_id, payslip_number__startswith=prefix
+    ).values_list("payslip_number", flat=True):
+        try:
+            highest = max(highest, int(number.split("-")[-1]))
+        except (ValueError, IndexError):
+            continue
+    return prefix, highest
+
+
+def _chunks(iterator, size):
+    chunk = []
+    for item in iterator:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def staff_to_compute(payroll, full=False):
+    """Staff rows (values) whose entry is missing or older than their record/salary structure."""
+    staff = Teacher.objects.filter(school_id=payroll.school_id)
+    if not full:
+        entry_updated_at = PayrollEntry.objects.filter(payroll=payroll, staff=OuterRef("pk")).values("updated_at")[:1]
+        staff = staff.annotate(entry_updated_at=Subquery(entry_updated_at)).filter(
+            Q(entry_updated_at__isnull=True)
+            | Q(updated_at__gt=F("entry_updated_at"))
+            | Q(salary_structure__updated_at__gt=F("entry_updated_at"))
+        )
+    return staff.order_by("id").values(
+        "id", "basic_salary", "bank_name", "account_number", "account_name", "salary_structure__structure_data"
+    )
+
+
+def expire_stale_payroll_runs(payrolls):
+    """Mark queued/running generations started more than PAYROLL_JOB_TIME_LIMIT ago as failed. Returns the count."""
+    return payrolls.filter(
+        Q(generation_started_at__isnull=True)
+        | Q(generation_started_at__lt=timezone.now() - timedelta(seconds=PAYROLL_JOB_TIME_LIMIT)),
+        generation_status__in=("queued", "running"),
+    ).update(generation_status="failed", generation_error="Generation did not finish within its time limit")
+
+
+def generate_payroll(payroll, full=False, chunk_size=CHUNK_SIZE):
+    """Compute (or recompute) a draft payroll's entries and totals. Returns the number of entries written."""
+    school_id = payroll.school_id
+
+    # Every staff member gets a structure, as before (an empty one pays basic only)
+    StaffSalaryStructure.objects.bulk_create(
+        [
+            StaffSalaryStructure(school_id=school_id, staff_id=staff_id)
+            for staff_id in Teacher.objects.filter(school_id=school_id, salary_structure__isnull=True).values_list(
+                "id", flat=True
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+    existing_numbers = dict(payroll.entries.values_list("staff_id", "payslip_number"))
+    prefix, sequence = _next_payslip_number(payroll)
+    written = 0
+
+    for chunk in _chunks(staff_to_compute(payroll, full).iterator(chunk_size=chunk_size), chunk_size):
+        plans = get_salary_plans(row["salary_structure__structure_data"] or {} for row in chunk)
+        now = timezone.now()
+        entries = []
+        for row in chunk:
+            basic = Decimal(str(row["basic_salary"])) if row["basic_salary"] else Decimal("0")
+            plan = plans[plan_fingerprint(row["salary_structure__structure_data"] or {})]
+            allowance_details, total_allowances, deduction_details, total_deductions = evaluate_plan(plan, basic)
+
+            payslip_number = existing_numbers.get(row["id"])
+            if not payslip_number:
+                sequence += 1
+                payslip_number = f"{prefix}{sequence:03d}"
+
+            entries.append(
+                PayrollEntry(
+                    school_id=school_id,
+                    payroll=payroll,
+                    staff_id=row["id"],
+                    payslip_number=payslip_number,
+                    basic_salary=basic,
+                    total_allowances=total_allowances,
+                    total_deductions=total_deductions,
+                    net_pay=basic + total_allowances - total_deductions,
+                    breakdown={
+                        "allowances": allowance_details,
+                        "deductions": deduction_details,
+                        "bank": {
+                            "name": row["bank_name"] or "",
+                            "account": row["account_number"] or "",
+                            "account_name": row["account_name"] or "",
+                        },
+                    },
+                    updated_at=now,
+                )
+            )
+
+        PayrollEntry.objects.bulk_create(
+            entries, update_conflicts=True, unique_fields=["payroll", "staff"], update_fields=ENTRY_FIELDS
+        )
+        written += len(entries)
+        Payroll.objects.filter(pk=payroll.pk).update(generation_processed=written)
+
+    totals = payroll.entries.aggregate(total=Sum("net_pay"), count=Count("id"))
+    payroll.total_wage_bill = totals["total"] or Decimal("0")
+    payroll.total_staff = totals["count"]
+    payroll.generation_status = "completed"
+    payroll.generation_processed = written
+    payroll.generation_error = ""
+    payroll.save(
+        update_fields=[
+            "total_wage_bill",
+            "total_staff",
+            "generation_status",
+            "generation_processed",
+            "generation_error",
+            "updated_at",
+        ]
+    )
+    return written
@@ -148,6 +148,9 @@ class PayrollSerializer(serializers.ModelSerializer):
             "notes",
             "total_wage_bill",
             "total_staff",
+            "generation_status",
+            "generation_processed",
+            "generation_error",
             "generated_by",
             "generated_by_name",
             "approved_by",
@@ -158,4 +161,13 @@ class PayrollSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ("school", "generated_by", "approved_by", "approved_at", "paid_at")
+        read_only_fields = (
+            "school",
+            "generated_by",
+            "approved_by",
+            "approved_at",
+            "paid_at",
+            "generation_status",
+            "generation_processed",
+            "generation_error",
+        )
@@ -0,0 +1,32 @@
+import logging
+
+from celery import shared_task
+from django.utils import timezone
+
+from .models import Payroll
+from .payroll import PAYROLL_JOB_TIME_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, time_limit=PAYROLL_JOB_TIME_LIMIT, soft_time_limit=PAYROLL_JOB_TIME_LIMIT - 60)
+def generate_payroll_job(self, payroll_id, full=False):
+    """
+    Compute the entries of a queued draft payroll (see hr/payroll.py).
+    The soft time limit raises SoftTimeLimitExceeded, which marks the run failed below.
+    """
+    from .payroll import generate_payroll
+
+    claimed = Payroll.objects.filter(id=payroll_id, status="draft", generation_status="queued").update(
+        generation_status="running", generation_processed=0, generation_error="", generation_started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+
+    payroll = Payroll.objects.get(id=payroll_id)
+    try:
+        return generate_payroll(payroll, full=full)
+    except Exception as e:
+        logger.error(f"Payroll generation {payroll_id} failed: {e}")
+        Payroll.objects.filter(pk=payroll_id).update(generation_status="failed", generation_error=str(e))
+        return None
@@ -1,3 +1,130 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from academic.models import Teacher
+from schools.models import School
+
+from .models import Payroll, PayrollEntry, StaffSalaryStructure
+
+User = get_user_model()
+
+STANDARD_STRUCTURE = {
+    "allowances": [
+        {"name": "Transport", "amount": 5000, "type": "fixed"},
+        {"name": "Housing", "value": 10, "type": "percentage"},
+    ],
+    "deductions": [{"name": "Pension", "value": 8, "type": "percentage"}],
+}
+
+
+class PayrollGenerationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.school = School.objects.create(name="Payroll School", domain="payroll-school")
+        self.admin = User.objects.create_user(
+            username="admin@payroll-school", password="password123", role="SCHOOL_ADMIN", school=self.school
+        )
+        self.client.force_authenticate(user=self.admin)
+
+        self.ada = Teacher.objects.create(school=self.school, name="Ada Obi", basic_salary=100000, bank_name="GTBank")
+        self.bola = Teacher.objects.create(school=self.school, name="Bola Ade", basic_salary=80000)
+        self.chidi = Teacher.objects.create(school=self.school, name="Chidi Eze", basic_salary=50000)
+        for teacher in (self.ada, self.bola):
+            StaffSalaryStructure.objects.create(school=self.school, staff=teacher, structure_data=STANDARD_STRUCTURE)
+
+    def _generate(self, **payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                "/api/hr/payrolls/generate/",
+                {"month": "2025-10", **payload},
+                format="json",
+                HTTP_X_TENANT_ID=self.school.domain,
+            )
+
+    def _payroll(self, payroll_id):
+        return self.client.get(f"/api/hr/payrolls/{payroll_id}/", HTTP_X_TENANT_ID=self.school.domain)
+
+    def test_generate_computes_entries_in_background(self):
+        response = self._generate()
+        # The job is queued on commit, so the request only acknowledges it
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["generation_status"], "queued")
+
+        response = self._payroll(response.data["id"])
+        self.assertEqual(response.data["generation_status"], "completed")
+        self.assertEqual(response.data["total_staff"], 3)
+
+        entries = {e.staff_id: e for e in PayrollEntry.objects.filter(payroll_id=response.data["id"])}
+        ada = entries[self.ada.id]
+        self.assertEqual(ada.total_allowances, Decimal("15000.00"))
+        self.assertEqual(ada.total_deductions, Decimal("8000.00"))
+        self.assertEqual(ada.net_pay, Decimal("107000.00"))
+        self.assertEqual(ada.breakdown["bank"]["name"], "GTBank")
+        # Staff without a structure get an empty one and are paid basic only
+        self.assertEqual(entries[self.chidi.id].net_pay, Decimal("50000.00"))
+        self.assertTrue(StaffSalaryStructure.objects.filter(staff=self.chidi).exists())
+
+        numbers = sorted(e.payslip_number for e in entries.values())
+        self.assertEqual(numbers, ["PSL-202510-001", "PSL-202510-002", "PSL-202510-003"])
+        self.assertEqual(Decimal(response.data["total_wage_bill"]), Decimal("243600.00"))
+
+    def test_shared_structures_compile_once(self):
+        from hr import payroll
+
+        with mock.patch.object(payroll, "compile_structure", wraps=payroll.compile_structure) as compile_structure:
+            self._generate()
+        # One plan for the shared structure, one for the empty structure
+        self.assertEqual(compile_structure.call_count, 2)
+
+    def test_regenerating_a_draft_recomputes_only_changed_staff(self):
+        payroll_id = self._generate().data["id"]
+        before = {e.staff_id: e for e in PayrollEntry.objects.filter(payroll_id=payroll_id)}
+
+        self.bola.basic_salary = 90000
+        self.bola.save()
+        self.assertEqual(self._generate().status_code, status.HTTP_202_ACCEPTED)
+
+        self.assertEqual(self._payroll(payroll_id).data["generation_processed"], 1)
+        after = {e.staff_id: e for e in PayrollEntry.objects.filter(payroll_id=payroll_id)}
+        self.assertEqual(after[self.bola.id].net_pay, Decimal("96800.00"))
+        self.assertEqual(after[self.bola.id].payslip_number, before[self.bola.id].payslip_number)
+        self.assertEqual(after[self.ada.id].updated_at, before[self.ada.id].updated_at)
+        self.assertEqual(Payroll.objects.get(pk=payroll_id).total_wage_bill, Decimal("253800.00"))
+
+        self._generate(full=True)
+        self.assertEqual(self._payroll(payroll_id).data["generation_processed"], 3)
+
+    def test_only_drafts_can_be_regenerated(self):
+        payroll = Payroll.objects.get(pk=self._generate().data["id"])
+        payroll.status = "approved"
+        payroll.save()
+
+        response = self._generate()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("already exists", response.data["error"])
+
+    def test_invalid_structure_fails_the_job(self):
+        StaffSalaryStructure.objects.filter(staff=self.ada).update(
+            structure_data={"allowances": [{"name": "Bonus", "amount": "lots", "type": "fixed"}]}
+        )
+        response = self._payroll(self._generate().data["id"])
+
+        self.assertEqual(response.data["generation_status"], "failed")
+        self.assertIn("Bonus", response.data["generation_error"])
+
+    def test_a_run_that_lost_its_worker_expires(self):
+        payroll_id = self._generate().data["id"]
+        Payroll.objects.filter(pk=payroll_id).update(generation_status="running", generation_started_at=timezone.now())
+        self.assertEqual(self._generate().status_code, status.HTTP_409_CONFLICT)
+
+        # Killed at the hard limit (or the message was lost): the run is failed and can be queued again
+        Payroll.objects.filter(pk=payroll_id).update(generation_started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self._generate().status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self._payroll(payroll_id).data["generation_status"], "completed")
@@ -1,6 +1,6 @@
 from datetime import datetime
-from decimal import Decimal
 
+from django.db import transaction
 from django.db.models import Sum, Count, Q, DecimalField, Value
 from django.db.models.functions import Coalesce
 from django.utils import timezone
@@ -27,6 +27,8 @@ from .serializers import (
     SalaryDeductionSerializer,
     StaffSalaryStructureSerializer,
 )
+from .payroll import expire_stale_payroll_runs
+from .tasks import generate_payroll_job
 
 
 # ==========================================
@@ -145,8 +147,11 @@ class PayrollViewSet(TenantViewSet):
     @action(detail=False, methods=["post"])
     def generate(self, request):
         """
-        Generate Draft Payroll for a given month.
+        Generate Draft Payroll for a given month in the background.
         Requires: month (YYYY-MM-DD or YYYY-MM)
+        Calling it again for a draft re-computes only the staff whose record or
+        salary structure changed; pass full=true to re-compute every entry.
+        Poll the payroll's generation_status/generation_processed for progress.
         """
         month_str = request.data.get("month")
         if not month_str:
@@ -166,111 +171,55 @@ class PayrollViewSet(TenantViewSet):
         if not school:
             return Response({"error": "School context not found"}, status=400)
 
-        # Check if exists
-        if Payroll.objects.filter(school=school, month=month_start).exists():
-            return Response(
-                {"error": f"Payroll for {month_start.strftime('%B %Y')} already exists."},
-                status=400,
-            )
+        full = str(request.data.get("full", "")).strip().lower() in {"1", "true", "yes", "on"}
 
-        payroll = Payroll.objects.create(
+        payroll, created = Payroll.objects.get_or_create(
             school=school,
             month=month_start,
-            status="draft",
-            generated_by=request.user,
-        )
-
-        # Fetch active staff with pre-fetched salary structure
-        active_staff = Teacher.objects.filter(school=school).select_related("salary_structure")
-
-        # Ensure all active staff have a salary structure (Bulk Create if missing)
-        existing_staff_ids = set(
-            StaffSalaryStructure.objects.filter(school=school).values_list("staff_id", flat=True)
+            defaults={
+                "status": "draft",
+                "generated_by": request.user,
+                "generation_status": "queued",
+                "generation_started_at": timezone.now(),
+            },
         )
-        staff_without_structure = [s.id for s in active_staff if s.id not in existing_staff_ids]
-
-        if staff_without_structure:
-            StaffSalaryStructure.objects.bulk_create(
-                [StaffSalaryStructure(staff_id=sid, school=school) for sid in staff_without_structure]
-            )
-            # Re-fetch to include the newly created structures
-            active_staff = Teacher.objects.filter(school=school).select_related("salary_structure")
-
-        total_bill = Decimal("0")
-        count = 0
-        entries_to_create = []
-
-        for staff_member in active_staff:
-            try:
-                structure = staff_member.salary_structure
-            except StaffSalaryStructure.DoesNotExist:
-                continue
-
-            data = structure.structure_data or {}
-            basic = Decimal(str(staff_member.basic_salary)) if staff_member.basic_salary else Decimal("0")
-
-            # Calculate allowances (supports percentage-based)
-            allowance_details = []
-            total_allowances = Decimal("0")
-            for item in data.get("allowances", []):
-                if item.get("type") == "percentage":
-                    amount = basic * Decimal(str(item.get("value", 0))) / Decimal("100")
-                else:
-                    amount = Decimal(str(item.get("amount", 0)))
-                allowance_details.append({"name": item.get("name", ""), "amount": float(amount)})
-                total_allowances += amount
-
-            # Calculate deductions (supports percentage-based)
-            deduction_details = []
-            total_deductions = Decimal("0")
-            for item in data.get("deductions", []):
-                if item.get("type") == "percentage":
-                    amount = basic * Decimal(str(item.get("value", 0))) / Decimal("100")
-                else:
-                    amount = Decimal(str(item.get("amount", 0)))
-                deduction_details.append({"name": item.get("name", ""), "amount": float(amount)})
-                total_deductions += amount
-
-            net = basic + total_allowances - total_deductions
-
-            entry = PayrollEntry(
-                school=school,
-                payroll=payroll,
-                staff=staff_member,
-                basic_salary=basic,
-                total_allowances=total_allowances,
-                total_deductions=total_deductions,
-                net_pay=net,
-                breakdown={
-                    "allowances": allowance_details,
-                    "deductions": deduction_details,
-                    "bank": {
-                        "name": staff_member.bank_name or "",
-                        "account": staff_member.account_number or "",
-                        "account_name": staff_member.account_name or "",
-                    },
-                },
+        if not created:
+            if payroll.status != "draft":
+                return Response(
+                    {"error": f"Payroll for {month_start.strftime('%B %Y')} already exists and is {payroll.status}."},
+                    status=400,
+                )
+            expire_stale_payroll_runs(Payroll.objects.filter(pk=payroll.pk))
+            queued = (
+                Payroll.objects.filter(pk=payroll.pk)
+                .exclude(generation_status__in=("queued", "running"))
+                .update(
+                    generation_status="queued",
+                    generation_processed=0,
+                    generation_error="",
+                    generation_started_at=timezone.now(),
+                )
             )
-            entry.generate_payslip_number()
-            entries_to_create.append(entry)
-
-            total_bill += net
-            count += 1
+            if not queued:
+                return Response(
+                    {"error": f"Payroll for {month_start.strftime('%B %Y')} is already being generated."},
+                    status=409,
+                )
 
-        # Bulk create all payroll entries in one query
-        PayrollEntry.objects.bulk_create(entries_to_create)
-
-        payroll.total_wage_bill = total_bill
-        payroll.total_staff = count
-        payroll.save()
+        transaction.on_commit(lambda: generate_payroll_job.delay(payroll.pk, full=full))
 
-        return Response(self.get_serializer(payroll).data, status=201)
+        payroll = self.get_queryset().get(pk=payroll.pk)
+        if payroll.generation_status != "completed":
+            return Response(self.get_serializer(payroll).data, status=202)
+        return Response(self.get_serializer(payroll).data, status=201 if created else 200)
 
     @action(detail=True, methods=["post"])
     def approve(self, request, pk=None):
         payroll = self.get_object()
         if payroll.status != "draft":
             return Response({"error": "Only draft payrolls can be approved"}, status=400)
+        if payroll.generation_status != "completed":
+            return Response({"error": "Payroll generation has not completed"}, status=400)
 
         payroll.status = "approved"
         payroll.approved_by = request.user
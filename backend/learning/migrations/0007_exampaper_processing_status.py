@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0006_alter_questionbank_created_by'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exampaper',
+            name='status',
+            field=models.CharField(choices=[('not_started', 'Not Started'), ('in_progress', 'In Progress'), ('processing', 'Submitted, Grading Queued'), ('submitted', 'Submitted'), ('graded', 'Graded')], default='not_started', max_length=20),
+        ),
+    ]
@@ -258,6 +258,7 @@ class ExamPaper(TenantModel):
     STATUS_CHOICES = (
         ("not_started", "Not Started"),
         ("in_progress", "In Progress"),
+        ("processing", "Submitted, Grading Queued"),
         ("submitted", "Submitted"),
         ("graded", "Graded"),
     )
@@ -0,0 +1,157 @@
+"""
+Write-behind buffer for CBT answer autosaves.
+
+Autosaves land in a per-paper hash ({question_id: answer json}) plus a "dirty"
+set of paper ids, so each save is O(1) and never touches Postgres.
+`flush_answer_buffers` (run on a timer by Celery beat, and for one paper at
+submit time) moves a paper's hash into a "flushing" hash with one atomic
+script, upserts it into ExamAnswer and only then deletes it. A worker that dies
+mid-flush leaves the flushing hash and an "inflight" marker behind, and the
+next flush picks them up again, so in-flight answers are not lost.
+
+Redis is used when REDIS_URL is configured; otherwise a process-local stand-in
+with the same interface keeps development and tests working.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BUFFER_TTL = 60 * 60 * 24  # buffered answers outlive any exam sitting
+DIRTY_KEY = "cbt:buffer:dirty"
+INFLIGHT_KEY = "cbt:buffer:inflight"
+
+# KEYS: main hash, flushing hash, dirty set, inflight set; ARGV: paper id, ttl
+CLAIM_SCRIPT = """
+local data = redis.call('HGETALL', KEYS[1])
+for i = 1, #data, 2 do
+    redis.call('HSET', KEYS[2], data[i], data[i + 1])
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[3], ARGV[1])
+redis.call('SADD', KEYS[4], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return redis.call('HGETALL', KEYS[2])
+"""
+
+
+def _encode(text_answer, selected_option):
+    return json.dumps({"text_answer": text_answer, "selected_option": selected_option, "saved_at": time.time()})
+
+
+def _decode(fields):
+    return {int(question_id): json.loads(value) for question_id, value in fields.items()}
+
+
+class RedisAnswerBuffer:
+    def __init__(self, client):
+        self.client = client
+        self._claim = client.register_script(CLAIM_SCRIPT)
+
+    @staticmethod
+    def _key(paper_id):
+        return f"cbt:buffer:{paper_id}"
+
+    @staticmethod
+    def _flushing_key(paper_id):
+        return f"cbt:buffer:{paper_id}:flushing"
+
+    def save(self, paper_id, answers):
+        """answers: {question_id: (text_answer, selected_option)}"""
+        key = self._key(paper_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(key, mapping={str(qid): _encode(*value) for qid, value in answers.items()})
+        pipe.expire(key, BUFFER_TTL)
+        pipe.sadd(DIRTY_KEY, paper_id)
+        pipe.execute()
+
+    def peek(self, paper_id):
+        """Buffered answers not yet in the database (newest wins)."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(self._flushing_key(paper_id))
+        pipe.hgetall(self._key(paper_id))
+        flushing, pending = pipe.execute()
+        return _decode({k.decode(): v for k, v in {**flushing, **pending}.items()})
+
+    def pending_papers(self):
+        return {int(pid) for pid in self.client.sunion(DIRTY_KEY, INFLIGHT_KEY)}
+
+    def claim(self, paper_id):
+        fields = self._claim(
+            keys=[self._key(paper_id), self._flushing_key(paper_id), DIRTY_KEY, INFLIGHT_KEY],
+            args=[paper_id, BUFFER_TTL],
+        )
+        return _decode({fields[i].decode(): fields[i + 1] for i in range(0, len(fields), 2)})
+
+    def ack(self, paper_id):
+        pipe = self.client.pipeline()
+        pipe.delete(self._flushing_key(paper_id))
+        pipe.srem(INFLIGHT_KEY, paper_id)
+        pipe.execute()
+
+
+class LocalAnswerBuffer:
+    """In-process stand-in for RedisAnswerBuffer (single process, not durable)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushing = {}
+
+    def save(self, paper_id, answers):
+        encoded = {int(qid): _encode(*value) for qid, value in answers.items()}
+        with self._lock:
+            self._pending.setdefault(paper_id, {}).update(encoded)
+
+    def peek(self, paper_id):
+        with self._lock:
+            fields = {**self._flushing.get(paper_id, {}), **self._pending.get(paper_id, {})}
+        return {qid: json.loads(value) for qid, value in fields.items()}
+
+    def pending_papers(self):
+        with self._lock:
+            return set(self._pending) | set(self._flushing)
+
+    def claim(self, paper_id):
+        with self._lock:
+            flushing = self._flushing.setdefault(paper_id, {})
+            flushing.update(self._pending.pop(paper_id, {}))
+            fields = dict(flushing)
+        return {qid: json.loads(value) for qid, value in fields.items()}
+
+    def ack(self, paper_id):
+        with self._lock:
+            self._flushing.pop(paper_id, None)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_answer_buffer():
+    """Redis-backed buffer when REDIS_URL is set and reachable, else the local stand-in."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = _connect()
+    return _buffer
+
+
+def _connect():
+    redis_url = getattr(settings, "REDIS_URL", None)
+    if redis_url:
+        try:
+            import redis
+
+            client = redis.from_url(redis_url)
+            client.ping()
+            return RedisAnswerBuffer(client)
+        except Exception as e:
+            logger.warning(f"CBT answer buffer falling back to local memory, Redis unavailable: {e}")
+    return LocalAnswerBuffer()
@@ -0,0 +1,323 @@
+"""
+CBT exam submission engine.
+
+A submission used to cost a question lookup, an update_or_create and a save
+per answer. Here the exam's answer key is loaded once and cached per exam,
+objective answers (MCQ, true/false, fill-in-the-blank) are graded in memory,
+and all of a paper's answers are written with one bulk upsert. Autosaves go
+through the write-behind buffer in answer_buffer.py; they are flushed here in
+batches and merged into the paper at submit. In queued mode the answers are
+stored ungraded, the paper is marked "processing" and
+`learning.tasks.grade_exam_paper` grades it in the background.
+"""
+
+import logging
+import re
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from academic.models import GradeRange
+
+from ..models import ExamAnswer, ExamPaper, ExamQuestion
+from .answer_buffer import get_answer_buffer
+
+logger = logging.getLogger(__name__)
+
+ANSWER_KEY_TIMEOUT = 60 * 60 * 6  # an exam sitting; invalidated on question/range writes
+PAPER_META_TIMEOUT = 60
+OBJECTIVE_TYPES = ("mcq", "true_false", "fill_blank")
+ANSWER_FIELDS = ["text_answer", "selected_option", "marks_obtained", "is_graded", "updated_at"]
+AUTOSAVE_FIELDS = ["text_answer", "selected_option", "updated_at"]
+
+
+def _answer_key_cache_key(exam_id):
+    return f"learning:exam-key:{exam_id}"
+
+
+def _grade_ranges_cache_key(scheme_id):
+    return f"learning:grade-ranges:{scheme_id}"
+
+
+def _paper_meta_cache_key(paper_id):
+    return f"learning:paper-meta:{paper_id}"
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+def get_exam_answer_key(exam_id):
+    """
+    {question_id: {"type", "marks", "has_options", "correct_options", "accepted"}} for an exam,
+    cached until one of its questions changes. `accepted` holds the normalised
+    model answers ("|" separates alternatives) used for fill-in-the-blank.
+    """
+    key = _answer_key_cache_key(exam_id)
+    answer_key = cache.get(key)
+    if answer_key is None:
+        answer_key = {}
+        for question_id, question_type, marks, options, model_answer in ExamQuestion.objects.filter(
+            exam_id=exam_id
+        ).values_list("id", "question_type", "marks", "options", "model_answer"):
+            correct = [
+                index
+                for index, option in enumerate(options if isinstance(options, list) else [])
+                if isinstance(option, dict) and option.get("is_correct")
+            ]
+            answer_key[question_id] = {
+                "type": question_type,
+                "marks": marks,
+                "correct_options": correct,
+                "has_options": bool(options),
+                "accepted": [_normalize(a) for a in (model_answer or "").split("|") if _normalize(a)],
+            }
+        cache.set(key, answer_key, ANSWER_KEY_TIMEOUT)
+    return answer_key
+
+
+def invalidate_exam_answer_key(exam_id):
+    cache.delete(_answer_key_cache_key(exam_id))
+
+
+def get_paper_meta(paper_id):
+    """{"school_id", "exam_id", "status"} for a paper, cached briefly so autosaves skip the database."""
+    key = _paper_meta_cache_key(paper_id)
+    meta = cache.get(key)
+    if meta is None:
+        meta = ExamPaper.objects.filter(pk=paper_id).values("school_id", "exam_id", "status").first() or {}
+        cache.set(key, meta, PAPER_META_TIMEOUT)
+    return meta or None
+
+
+def invalidate_paper_meta(paper_id):
+    cache.delete(_paper_meta_cache_key(paper_id))
+
+
+def get_grade_ranges(scheme_id):
+    """[(min, max, grade, remark)] in GradeRange order (highest first), cached per scheme."""
+    if not scheme_id:
+        return []
+    key = _grade_ranges_cache_key(scheme_id)
+    ranges = cache.get(key)
+    if ranges is None:
+        ranges = list(
+            GradeRange.objects.filter(scheme_id=scheme_id).values_list("min_score", "max_score", "grade", "remark")
+        )
+        cache.set(key, ranges, ANSWER_KEY_TIMEOUT)
+    return ranges
+
+
+def invalidate_grade_ranges(scheme_id):
+    cache.delete(_grade_ranges_cache_key(scheme_id))
+
+
+def grade_answer(answer, question):
+    """Auto-grade one objective answer in place. Theory answers are left for the teacher."""
+    if question["type"] in ("mcq", "true_false") and question["has_options"]:
+        answer.is_graded = answer.selected_option is not None
+        correct = answer.selected_option in question["correct_options"]
+    elif question["type"] in OBJECTIVE_TYPES and question["accepted"]:
+        answer.is_graded = bool(_normalize(answer.text_answer))
+        correct = _normalize(answer.text_answer) in question["accepted"]
+    else:
+        return
+    answer.marks_obtained = question["marks"] if correct else 0.0
+
+
+def normalize_answers(items):
+    """[{question_id, text_answer, selected_option}] -> {question_id: (text_answer, selected_option)}."""
+    answers = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            question_id = int(item.get("question_id"))
+        except (TypeError, ValueError):
+            continue
+        selected_option = item.get("selected_option")
+        try:
+            selected_option = int(selected_option) if selected_option not in (None, "") else None
+        except (TypeError, ValueError):
+            selected_option = None
+        # Later entries for the same question win, as with the old per-answer upsert
+        answers[question_id] = (item.get("text_answer") or "", selected_option)
+    return answers
+
+
+def _answer_rows(school_id, paper_id, answer_key, answers):
+    """Unsaved ExamAnswer rows for the answers whose question belongs to the exam."""
+    now = timezone.now()
+    return [
+        ExamAnswer(
+            school_id=school_id,
+            paper_id=paper_id,
+            question_id=question_id,
+            text_answer=text_answer,
+            selected_option=selected_option,
+            updated_at=now,
+        )
+        for question_id, (text_answer, selected_option) in answers.items()
+        if question_id in answer_key
+    ]
+
+
+def _upsert_answers(rows, fields):
+    if rows:
+        ExamAnswer.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=["paper", "question"], update_fields=fields, batch_size=1000
+        )
+
+
+def finalize_paper(paper):
+    """Total the paper's marks, apply the exam's grading scheme and mark it submitted."""
+    exam = paper.exam
+    paper.total_score = paper.answers.aggregate(total=Sum("marks_obtained"))["total"] or 0.0
+    if exam.total_marks > 0:
+        paper.percentage = (paper.total_score / exam.total_marks) * 100
+
+    for min_score, max_score, grade, remark in get_grade_ranges(exam.grading_scheme_id):
+        if min_score <= paper.percentage <= max_score:
+            paper.grade = grade
+            paper.remark = remark
+            break
+
+    paper.status = "submitted"
+    paper.save(update_fields=["submitted_at", "total_score", "percentage", "grade", "remark", "status", "updated_at"])
+
+
+def submit_paper(paper, answers_data, queued=False):
+    """
+    Store (and unless `queued`, grade) a paper's answers with one upsert.
+    Answers already autosaved - flushed or still buffered - are included, with
+    the submitted ones taking precedence. Answers outside the exam are ignored.
+    """
+    answer_key = get_exam_answer_key(paper.exam_id)
+    buffer = get_answer_buffer()
+
+    answers = {}
+    if not queued:
+        # Flushed autosaves get graded with the rest (the queued task grades stored rows itself)
+        answers.update(
+            (question_id, (text_answer, selected_option))
+            for question_id, text_answer, selected_option in paper.answers.values_list(
+                "question_id", "text_answer", "selected_option"
+            )
+        )
+    buffered = _claim(buffer, paper.pk)
+    answers.update(
+        (question_id, (saved.get("text_answer") or "", saved.get("selected_option")))
+        for question_id, saved in (buffered or {}).items()
+    )
+    answers.update(normalize_answers(answers_data))
+
+    rows = _answer_rows(paper.school_id, paper.pk, answer_key, answers)
+    if not queued:
+        for answer in rows:
+            grade_answer(answer, answer_key[answer.question_id])
+
+    with transaction.atomic():
+        _upsert_answers(rows, ANSWER_FIELDS)
+        paper.submitted_at = timezone.now()
+        if queued:
+            paper.status = "processing"
+            paper.save(update_fields=["submitted_at", "status", "updated_at"])
+        else:
+            finalize_paper(paper)
+        if buffered is not None:
+            transaction.on_commit(lambda: _ack(buffer, paper.pk))
+
+    if queued:
+        from ..tasks import grade_exam_paper
+
+        transaction.on_commit(lambda: grade_exam_paper.delay(paper.pk))
+    return paper
+
+
+def _claim(buffer, paper_id):
+    """A paper's buffered answers, or None if the buffer is unavailable (the stored answers are used as they are)."""
+    try:
+        return buffer.claim(paper_id)
+    except Exception as e:
+        logger.warning(f"CBT answer buffer unavailable, using stored answers of paper {paper_id}: {e}")
+        return None
+
+
+def _ack(buffer, paper_id):
+    try:
+        buffer.ack(paper_id)
+    except Exception as e:
+        # Left in "flushing"; the next flush discards it once the paper is no longer in progress
+        logger.warning(f"CBT answer buffer ack failed for paper {paper_id}: {e}")
+
+
+def autosave_answers(paper_id, answers):
+    """Buffer autosaved answers; falls back to a direct upsert if the buffer is unavailable."""
+    try:
+        get_answer_buffer().save(paper_id, answers)
+        return True
+    except Exception as e:
+        logger.warning(f"CBT autosave buffer unavailable, writing paper {paper_id} directly: {e}")
+        paper = ExamPaper.objects.only("id", "school_id", "exam_id").get(pk=paper_id)
+        rows = _answer_rows(paper.school_id, paper.pk, get_exam_answer_key(paper.exam_id), answers)
+        _upsert_answers(rows, AUTOSAVE_FIELDS)
+        return False
+
+
+def flush_answer_buffers(paper_ids=None, batch_size=200):
+    """
+    Write buffered autosaves to ExamAnswer, one upsert per batch of papers.
+    Answers for papers no longer in progress are discarded (submit already
+    merged them). Returns the number of answers written.
+    """
+    buffer = get_answer_buffer()
+    paper_ids = sorted(paper_ids if paper_ids is not None else buffer.pending_papers())
+    written = 0
+
+    for start in range(0, len(paper_ids), batch_size):
+        chunk = paper_ids[start:start + batch_size]
+        papers = {
+            paper_id: (school_id, exam_id)
+            for paper_id, school_id, exam_id in ExamPaper.objects.filter(
+                id__in=chunk, status="in_progress"
+            ).values_list("id", "school_id", "exam_id")
+        }
+        rows = []
+        claimed = []
+        for paper_id in chunk:
+            buffered = _claim(buffer, paper_id)
+            if buffered is None:
+                continue
+            claimed.append(paper_id)
+            if paper_id not in papers or not buffered:
+                continue
+            school_id, exam_id = papers[paper_id]
+            answers = {
+                question_id: (saved.get("text_answer") or "", saved.get("selected_option"))
+                for question_id, saved in buffered.items()
+            }
+            rows.extend(_answer_rows(school_id, paper_id, get_exam_answer_key(exam_id), answers))
+
+        with transaction.atomic():
+            _upsert_answers(rows, AUTOSAVE_FIELDS)
+        for paper_id in claimed:
+            _ack(buffer, paper_id)
+        written += len(rows)
+
+    return written
+
+
+def grade_stored_paper(paper):
+    """Grade the stored answers of a queued paper and finalize it."""
+    answer_key = get_exam_answer_key(paper.exam_id)
+    answers = list(paper.answers.all())
+    for answer in answers:
+        question = answer_key.get(answer.question_id)
+        if question:
+            grade_answer(answer, question)
+    with transaction.atomic():
+        ExamAnswer.objects.bulk_update(answers, ["marks_obtained", "is_graded"], batch_size=500)
+        finalize_paper(paper)
+    return paper
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from academic.models import GradeRange
+
+from .models import Exam, ExamPaper, ExamQuestion
+from .services.exam_submission import invalidate_exam_answer_key, invalidate_grade_ranges, invalidate_paper_meta
+
+
+@receiver(post_save, sender=ExamQuestion)
+@receiver(post_delete, sender=ExamQuestion)
+def invalidate_answer_key_on_question_change(sender, instance, **kwargs):
+    invalidate_exam_answer_key(instance.exam_id)
+
+
+@receiver(post_delete, sender=Exam)
+def invalidate_answer_key_on_exam_delete(sender, instance, **kwargs):
+    invalidate_exam_answer_key(instance.pk)
+
+
+@receiver(post_save, sender=GradeRange)
+@receiver(post_delete, sender=GradeRange)
+def invalidate_grade_ranges_on_change(sender, instance, **kwargs):
+    invalidate_grade_ranges(instance.scheme_id)
+
+
+@receiver(post_save, sender=ExamPaper)
+@receiver(post_delete, sender=ExamPaper)
+def invalidate_paper_meta_on_change(sender, instance, **kwargs):
+    invalidate_paper_meta(instance.pk)
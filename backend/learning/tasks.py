@@ -0,0 +1,34 @@
+import logging
+
+from celery import shared_task
+
+from .models import ExamPaper
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def grade_exam_paper(self, paper_id):
+    """Grade a paper submitted in queued mode (status "processing")."""
+    from .services.exam_submission import grade_stored_paper
+
+    paper = ExamPaper.objects.select_related("exam").filter(id=paper_id, status="processing").first()
+    if not paper:
+        return None
+    try:
+        grade_stored_paper(paper)
+    except Exception as e:
+        logger.error(f"Grading exam paper {paper_id} failed: {e}")
+        raise self.retry(exc=e)
+    return paper.total_score
+
+
+@shared_task
+def flush_answer_buffers():
+    """Write buffered CBT autosaves to ExamAnswer. Runs every few seconds via Celery Beat."""
+    from .services.exam_submission import flush_answer_buffers as flush
+
+    written = flush()
+    if written:
+        logger.info(f"Flushed {written} buffered CBT answers.")
+    return written
@@ -0,0 +1,193 @@
+from datetime import date, time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from academic.models import Class, GradeRange, GradingScheme, Student, Subject
+from learning.models import Exam, ExamAnswer, ExamPaper, ExamQuestion
+from learning.services.answer_buffer import LocalAnswerBuffer
+from schools.models import School
+
+User = get_user_model()
+
+
+class ExamPaperTestBase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.buffer = LocalAnswerBuffer()
+        patcher = mock.patch("learning.services.answer_buffer._buffer", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.school = School.objects.create(name="CBT School", domain="cbt-school")
+        self.admin = User.objects.create_user(
+            username="admin@cbt-school", password="password123", role="SCHOOL_ADMIN", school=self.school
+        )
+        self.client.force_authenticate(user=self.admin)
+
+        student_class = Class.objects.create(name="SS 1", school=self.school)
+        subject = Subject.objects.create(name="Geography", school=self.school)
+        scheme = GradingScheme.objects.create(school=self.school, name="Standard")
+        GradeRange.objects.create(school=self.school, scheme=scheme, grade="A", min_score=70, max_score=100, remark="Excellent")
+        GradeRange.objects.create(school=self.school, scheme=scheme, grade="F", min_score=0, max_score=69.99, remark="Fail")
+
+        self.exam = Exam.objects.create(
+            school=self.school, title="Mid-term", subject=subject, student_class=student_class,
+            session="2025/2026", term="First Term", exam_date=date(2025, 11, 3),
+            start_time=time(9, 0), end_time=time(10, 0), total_marks=10, grading_scheme=scheme, status="active",
+        )
+        self.mcq = ExamQuestion.objects.create(
+            school=self.school, exam=self.exam, question_number=1, question_text="Capital of Ghana?",
+            question_type="mcq", marks=4, options=[{"text": "Lagos"}, {"text": "Accra", "is_correct": True}],
+        )
+        self.blank = ExamQuestion.objects.create(
+            school=self.school, exam=self.exam, question_number=2, question_text="Capital of Nigeria: ___",
+            question_type="fill_blank", marks=4, model_answer="Abuja|Abuja FCT",
+        )
+        self.essay = ExamQuestion.objects.create(
+            school=self.school, exam=self.exam, question_number=3, question_text="Describe the Sahel.",
+            question_type="long", marks=2,
+        )
+        student = Student.objects.create(
+            school=self.school, student_no="CBT001", names="Ada Obi", current_class=student_class
+        )
+        self.paper = ExamPaper.objects.create(school=self.school, exam=self.exam, student=student, status="in_progress")
+
+    def _answers(self):
+        return {
+            "answers": [
+                {"question_id": self.mcq.id, "selected_option": 1},
+                {"question_id": self.blank.id, "text_answer": "  abuja  fct "},
+                {"question_id": self.essay.id, "text_answer": "Semi-arid belt"},
+                {"question_id": 999999, "text_answer": "not in this exam"},
+            ]
+        }
+
+    def _submit(self, payload):
+        return self.client.post(
+            f"/api/learning/exam-papers/{self.paper.id}/submit_exam/",
+            payload,
+            format="json",
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+
+
+class ExamSubmissionTests(ExamPaperTestBase):
+    def test_submit_grades_objective_answers_with_one_upsert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._submit(self._answers())
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_score"], 8)
+        self.assertEqual(response.data["percentage"], 80)
+        self.assertEqual(response.data["grade"], "A")
+
+        answer_writes = [q for q in ctx.captured_queries if "learning_examanswer" in q["sql"] and "INSERT" in q["sql"]]
+        self.assertEqual(len(answer_writes), 1)
+
+        answers = {a.question_id: a for a in ExamAnswer.objects.filter(paper=self.paper)}
+        self.assertEqual(len(answers), 3)
+        self.assertTrue(answers[self.mcq.id].is_graded)
+        self.assertTrue(answers[self.blank.id].is_graded)
+        self.assertFalse(answers[self.essay.id].is_graded)
+
+        self.paper.refresh_from_db()
+        self.assertEqual(self.paper.status, "submitted")
+        self.assertEqual(self.paper.remark, "Excellent")
+
+        # A paper can only be submitted once
+        self.assertEqual(self._submit(self._answers()).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_answer_key_follows_question_edits(self):
+        from learning.services.exam_submission import get_exam_answer_key
+
+        self.assertEqual(get_exam_answer_key(self.exam.id)[self.mcq.id]["correct_options"], [1])
+        self.mcq.options = [{"text": "Lagos", "is_correct": True}, {"text": "Accra"}]
+        self.mcq.save()
+        self.assertEqual(get_exam_answer_key(self.exam.id)[self.mcq.id]["correct_options"], [0])
+
+    def test_queued_mode_acknowledges_then_grades(self):
+        payload = self._answers()
+        payload["mode"] = "queued"
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._submit(payload)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], "processing")
+
+        # Celery runs eagerly in tests, so the grading task has already finished
+        self.paper.refresh_from_db()
+        self.assertEqual(self.paper.status, "submitted")
+        self.assertEqual(self.paper.total_score, 8)
+        self.assertEqual(self.paper.grade, "A")
+
+
+class AnswerBufferTests(ExamPaperTestBase):
+    def _autosave(self, payload):
+        return self.client.post(
+            f"/api/learning/exam-papers/{self.paper.id}/autosave/",
+            payload,
+            format="json",
+            HTTP_X_TENANT_ID=self.school.domain,
+        )
+
+    def test_autosave_buffers_without_writing_answers(self):
+        with CaptureQueriesContext(connection) as ctx:
+            for text in ("A", "Ab", "Abuja"):
+                response = self._autosave({"question_id": self.blank.id, "text_answer": text})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in ctx.captured_queries if "learning_examanswer" in q["sql"]])
+        self.assertEqual(self.buffer.peek(self.paper.id)[self.blank.id]["text_answer"], "Abuja")
+
+        from learning.services.exam_submission import flush_answer_buffers
+
+        self.assertEqual(flush_answer_buffers(), 1)
+        self.assertEqual(ExamAnswer.objects.get(paper=self.paper, question=self.blank).text_answer, "Abuja")
+        self.assertEqual(flush_answer_buffers(), 0)
+
+    def test_interrupted_flush_is_recovered(self):
+        from learning.services.exam_submission import flush_answer_buffers
+
+        self._autosave({"answers": [{"question_id": self.mcq.id, "selected_option": 1}]})
+        self.buffer.claim(self.paper.id)  # worker died after claiming, before writing
+        self._autosave({"question_id": self.blank.id, "text_answer": "Abuja"})
+
+        self.assertEqual(flush_answer_buffers(), 2)
+        self.assertEqual(ExamAnswer.objects.filter(paper=self.paper).count(), 2)
+
+    def test_submit_merges_buffered_and_flushed_answers(self):
+        from learning.services.exam_submission import flush_answer_buffers
+
+        self._autosave({"question_id": self.mcq.id, "selected_option": 1})
+        flush_answer_buffers()
+        self._autosave({"question_id": self.blank.id, "text_answer": "abuja"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._submit({"answers": []})
+        self.assertEqual(response.data["total_score"], 8)
+        self.assertEqual(self.buffer.pending_papers(), set())
+
+        # Autosaves after submission are rejected
+        self.assertEqual(
+            self._autosave({"question_id": self.mcq.id, "selected_option": 0}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    def test_submit_grades_stored_answers_when_the_buffer_is_down(self):
+        from learning.services.exam_submission import flush_answer_buffers
+
+        self._autosave({"question_id": self.mcq.id, "selected_option": 1})
+        flush_answer_buffers()
+
+        with mock.patch.object(self.buffer, "claim", side_effect=ConnectionError("redis down")):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self._submit({"answers": [{"question_id": self.blank.id, "text_answer": "Abuja"}]})
+            self.assertEqual(flush_answer_buffers([self.paper.id]), 0)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_score"], 8)
@@ -103,7 +103,7 @@ class SubmissionViewSet(LearningTenantViewSet):
             "rubric": "",  # Could be expanded later if rubric field exists
         }
 
-        ai = AcademicAI()
+        ai = AcademicAI(school=submission.school_id)
         evaluation = ai.evaluate_submission(ai_data)
 
         if not evaluation:
@@ -145,7 +145,7 @@ class QuizViewSet(LearningTenantViewSet):
                 {"error": "Lesson has no text content to generate quiz from"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        ai = AcademicAI()
+        ai = AcademicAI(school=school)
         questions_data = ai.generate_quiz_from_content(
             content_text=lesson.content,
             subject_name=lesson.subject.name if lesson.subject else "General",
@@ -332,7 +332,7 @@ class AttemptViewSet(LearningTenantViewSet):
         if not theory_answers.exists():
             return Response({"detail": "No theory questions found in this attempt"}, status=status.HTTP_400_BAD_REQUEST)
 
-        ai = AcademicAI()
+        ai = AcademicAI(school=attempt.school_id)
         results = []
 
         with transaction.atomic():
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
 from django.db.models import Count, Q
 
 from academic.views.base import TenantViewSet
@@ -10,6 +11,7 @@ from learning.models import (
     QuestionBank, BankQuestion, BankOption, FillBlankAnswer,
     Exam, ExamPaper, ExamQuestion, ExamAnswer, ExamRoom
 )
+from learning.services.exam_submission import autosave_answers, get_paper_meta, normalize_answers, submit_paper
 from learning.serializers_exam import (
     QuestionBankSerializer, QuestionBankDetailSerializer, BankQuestionSerializer,
     BankQuestionCreateSerializer, ExamSerializer, ExamDetailSerializer,
@@ -228,9 +230,40 @@ class ExamPaperViewSet(TenantViewSet):
             "duration_minutes": paper.exam.duration_minutes
         })
     
+    @action(detail=True, methods=["post"])
+    def autosave(self, request, pk=None):
+        """
+        Buffer in-progress answers without touching the answer table.
+        Body: one answer ({question_id, text_answer, selected_option}) or {"answers": [...]}.
+        Buffered answers are flushed in batches and merged at submit.
+        """
+        try:
+            paper_id = int(pk)
+        except (TypeError, ValueError):
+            return Response({"error": "Exam paper not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        meta = get_paper_meta(paper_id)
+        school = get_request_school(request)
+        if not meta or (meta["school_id"] != getattr(school, "id", None) and not request.user.is_superuser):
+            return Response({"error": "Exam paper not found"}, status=status.HTTP_404_NOT_FOUND)
+        if meta["status"] != "in_progress":
+            return Response({"error": "Exam not in progress"}, status=status.HTTP_400_BAD_REQUEST)
+
+        items = request.data.get("answers")
+        answers = normalize_answers(items if isinstance(items, list) else [request.data])
+        if not answers:
+            return Response({"error": "No answers to save"}, status=status.HTTP_400_BAD_REQUEST)
+
+        buffered = autosave_answers(paper_id, answers)
+        return Response({"saved": len(answers), "buffered": buffered})
+
     @action(detail=True, methods=["post"])
     def submit_exam(self, request, pk=None):
-        """Submit exam paper."""
+        """
+        Submit exam paper. Objective answers are auto-graded in one pass.
+        With mode="queued" (or CBT_QUEUED_SUBMISSIONS) the answers are stored
+        and acknowledged immediately, and grading runs in the background.
+        """
         paper = self.get_object()
         
         if paper.status != "in_progress":
@@ -239,62 +272,20 @@ class ExamPaperViewSet(TenantViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Process answers
         answers_data = request.data.get("answers", [])
-        
-        for ans in answers_data:
-            question_id = ans.get("question_id")
-            text_answer = ans.get("text_answer", "")
-            selected_option = ans.get("selected_option")
-            
-            question = paper.exam.exam_questions.filter(id=question_id).first()
-            if not question:
-                continue
-            
-            exam_answer, _ = ExamAnswer.objects.update_or_create(
-                paper=paper,
-                question=question,
-                defaults={
-                    "text_answer": text_answer,
-                    "selected_option": selected_option
-                }
+        if not isinstance(answers_data, list):
+            return Response({"error": "answers must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+
+        mode = request.data.get("mode")
+        queued = mode == "queued" if mode else getattr(settings, "CBT_QUEUED_SUBMISSIONS", False)
+
+        submit_paper(paper, answers_data, queued=queued)
+
+        if queued:
+            return Response(
+                {"status": paper.status, "submitted_at": paper.submitted_at},
+                status=status.HTTP_202_ACCEPTED,
             )
-            
-            # Auto-grade MCQ
-            if question.question_type == "mcq" and question.options:
-                options = question.options
-                if isinstance(options, list) and selected_option is not None:
-                    try:
-                        selected = options[selected_option]
-                        if selected.get("is_correct"):
-                            exam_answer.marks_obtained = question.marks
-                            exam_answer.is_graded = True
-                    except (IndexError, KeyError):
-                        pass
-                    exam_answer.save()
-        
-        import datetime
-        paper.submitted_at = datetime.datetime.now()
-        paper.status = "submitted"
-        
-        # Calculate total score
-        total_score = sum(a.marks_obtained for a in paper.answers.all())
-        paper.total_score = total_score
-        
-        if paper.exam.total_marks > 0:
-            paper.percentage = (total_score / paper.exam.total_marks) * 100
-        
-        # Assign grade
-        if paper.exam.grading_scheme:
-            grade = paper.exam.grading_scheme.ranges.filter(
-                min_score__lte=paper.percentage,
-                max_score__gte=paper.percentage
-            ).first()
-            if grade:
-                paper.grade = grade.grade
-                paper.remark = grade.remark
-        
-        paper.save()
         
         return Response({
             "status": "submitted",
@@ -1,12 +1,14 @@
 import logging
 
-from django.db import models
-from django.db.models.signals import post_save, pre_save
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from core.tenant_registry import invalidate_tenants
+from core.tenant_utils import invalidate_current_period
 from emails.tasks import send_email_task
 
-from .models import School
+from .models import School, SchoolSettings
 
 logger = logging.getLogger(__name__)
 
@@ -77,3 +79,28 @@ def send_school_status_email(sender, instance, created, **kwargs):
         except Exception as e:
             logger.error(f"Failed to queue approval email for {instance.name}: {e}")
 
+
+# --- Tenant registry ---------------------------------------------------------
+# TenantMiddleware serves schools from core.tenant_registry; any change to what
+# a tenant record holds (name, domains) drops it.
+
+
+def refresh_tenant_registry(sender, instance, **kwargs):
+    invalidate_tenants()
+    # Again once committed, so no process keeps a record it reloaded before the commit
+    transaction.on_commit(invalidate_tenants)
+
+
+post_save.connect(refresh_tenant_registry, sender=School, dispatch_uid="tenant_registry_save")
+post_delete.connect(refresh_tenant_registry, sender=School, dispatch_uid="tenant_registry_delete")
+
+
+# --- Current session/term -------------------------------------------------------
+# core.tenant_utils.get_current_period caches each school's current period.
+
+
+@receiver(post_save, sender=SchoolSettings)
+@receiver(post_delete, sender=SchoolSettings)
+def refresh_current_period(sender, instance, **kwargs):
+    invalidate_current_period(instance.school_id)
+    transaction.on_commit(lambda: invalidate_current_period(instance.school_id))
@@ -121,3 +121,43 @@ class SchoolPaymentSettingsTests(APITestCase):
         self.assertIn("enabled_methods", response.data)
         self.assertIn("paystack", response.data["enabled_methods"])
         self.assertIn("cash", response.data["enabled_methods"])
+
+
+class TenantRegistryTests(APITestCase):
+    def setUp(self):
+        self.school = School.objects.create(
+            name="Registry School", domain="registry", custom_domain="portal.registry.test"
+        )
+
+    def test_records_are_compact_and_served_from_process_memory(self):
+        from unittest.mock import patch
+
+        from core.tenant_registry import get_tenant_record, tenant_school
+
+        record = get_tenant_record("portal.registry.test")
+        self.assertEqual(
+            record,
+            {
+                "id": self.school.id,
+                "name": "Registry School",
+                "domain": "registry",
+                "custom_domain": "portal.registry.test",
+            },
+        )
+        with self.assertNumQueries(0), patch("core.tenant_registry.cache") as shared_cache:
+            self.assertEqual(get_tenant_record("portal.registry.test"), record)
+            school = tenant_school(record)
+        shared_cache.get.assert_not_called()
+        self.assertEqual((school, school.name), (self.school, "Registry School"))
+
+    def test_changes_are_visible_on_the_next_lookup(self):
+        from core.tenant_registry import get_tenant_record
+
+        self.assertIsNotNone(get_tenant_record("registry"))
+        self.assertIsNone(get_tenant_record("registry-renamed"))
+
+        self.school.domain = "registry-renamed"
+        self.school.save()
+
+        self.assertIsNone(get_tenant_record("registry"))
+        self.assertEqual(get_tenant_record("registry-renamed")["id"], self.school.id)
@@ -17,6 +17,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from core.models import GlobalActivityLog
+from core.search import search
 
 from .models import School
 
@@ -93,7 +94,25 @@ class SystemHealthView(APIView):
             celery_status = "offline"
             celery_error = str(e)
 
-        # 4. Database Latency
+        # 4. Activity log buffer (entries not yet written to GlobalActivityLog)
+        activity_log_queue = None
+        try:
+            from core.activity_buffer import buffer_stats
+
+            activity_log_queue = buffer_stats()
+        except Exception as e:
+            logger.warning(f"Health check: activity log buffer unavailable: {e}")
+
+        # 5. API response cache hit/miss per endpoint
+        api_cache = None
+        try:
+            from core.cache_utils import cache_stats
+
+            api_cache = cache_stats()
+        except Exception as e:
+            logger.warning(f"Health check: API cache statistics unavailable: {e}")
+
+        # 6. Database Latency
         import time
 
         db_start = time.time()
@@ -111,6 +130,8 @@ class SystemHealthView(APIView):
                 "celery_status": celery_status,
                 "celery_error": celery_error,
                 "db_latency": db_latency,
+                "activity_log_queue": activity_log_queue,
+                "api_cache": api_cache,
                 "platform_stats": platform_stats,
                 "timestamp": timezone.now(),
             }
@@ -201,9 +222,10 @@ class GlobalSearchView(APIView):
 
         from django.db.models import Q
 
-        schools = School.objects.filter(
-            Q(name__icontains=query) | Q(domain__icontains=query) | Q(email__icontains=query)
-        )[:10]
+        # Schools come from the platform search index, best matches first
+        ranked = [entry["id"] for entry in search(query, kinds=["school"])["school"]]
+        found = School.objects.select_related("subscription").in_bulk(ranked)
+        schools = [found[school_id] for school_id in ranked if school_id in found]
 
         logs = GlobalActivityLog.objects.filter(Q(description__icontains=query) | Q(action__icontains=query))[:10]
 